@@ -0,0 +1,163 @@
+"""
+Run the validator benchmarks on a synthetic Milepoint table, served by the stub arcpy, and write the timings and
+counts of each scenario to a JSON file. Run from the src directory:
+
+    python -m benchmarks --routes 100000 --dot-id-fanout 4 --repeat 5 --output results.json
+
+Passing --compare with the JSON file of an earlier run adds the ratio of each scenario's median time to the
+earlier median, so the effect of a change can be measured on the same synthetic table (use the same --routes,
+--dot-id-fanout, error rates and --seed).
+
+The stub arcpy has no database or geoprocessing costs, so the timings measure the Python work of the validators
+(reading arrays, evaluating rules, grouping and staging rows) and the counts measure the round trips that would
+reach ArcGIS (selections, Reviewer writes).
+"""
+import argparse
+import datetime
+import json
+import platform
+import sys
+import timeit
+
+from benchmarks import stub_arcpy, synthetic
+import validation_helpers.files as files
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--routes', type=int, default=10000, help='The number of routes in the synthetic table')
+    parser.add_argument('--dot-id-fanout', type=int, default=4, help='The maximum number of counties per DOT_ID')
+    parser.add_argument('--county-order-error-rate', type=float, default=0.01,
+                        help='The share of DOT_IDs with an invalid COUNTY_ORDER sequence')
+    parser.add_argument('--attribute-error-rate', type=float, default=0.01,
+                        help='The share of routes that break a roadway level attribute rule')
+    parser.add_argument('--edit-fraction', type=float, default=0.05,
+                        help='The share of DOT_IDs edited in the benchmarked job')
+    parser.add_argument('--edited-attribute-error-rate', type=float, default=0.1,
+                        help='The share of the edited routes that break a roadway level attribute rule')
+    parser.add_argument('--large-dot-id-routes', type=int, default=10000,
+                        help='The number of routes of the one large DOT_ID of the minority_attributes scenarios')
+    parser.add_argument('--seed', type=int, default=0, help='The seed of the synthetic table')
+    parser.add_argument('--repeat', type=int, default=3, help='The number of timed runs of each scenario')
+    parser.add_argument('--workload', choices=['edits', 'full_db', 'all'], default='all',
+                        help='Benchmark the edits-only validations, the full database validations, or both')
+    parser.add_argument('--scenario', action='append', default=None,
+                        help='Only run this scenario. Can be passed more than once')
+    parser.add_argument('--output', default='benchmark_results.json', help='The path of the JSON results')
+    parser.add_argument('--compare', default=None, help='The path of the JSON results of an earlier run')
+    return parser.parse_args(argv)
+
+def time_scenario(run, repeat):
+    """
+    Time `repeat` calls of a scenario's run function.
+
+    Returns
+    -------
+    :returns dict: The minimum and median seconds of the runs, and the counts returned by the last run
+    """
+    timings = []
+    counts = None
+    for _ in range(max(repeat, 1)):
+        start = timeit.default_timer()
+        counts = run()
+        timings.append(timeit.default_timer() - start)
+    timings.sort()
+    middle = len(timings) // 2
+    median = timings[middle] if len(timings) % 2 else (timings[middle - 1] + timings[middle]) / 2.0
+    return {'min_seconds': timings[0], 'median_seconds': median, 'runs': len(timings), 'counts': counts}
+
+def compare_results(results, baseline_path):
+    """
+    Add the ratio of each scenario's median time to its median time in the baseline results.
+    """
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get('parameters') != results['parameters']:
+        print('Warning: the baseline was run with different parameters, so the ratios are not comparable')
+    for name, result in results['scenarios'].items():
+        baseline_result = baseline.get('scenarios', {}).get(name)
+        if baseline_result and baseline_result['median_seconds']:
+            result['median_ratio'] = result['median_seconds'] / baseline_result['median_seconds']
+
+def write_results(results, output_path):
+    """
+    Write the results with files.write_json, so an interrupted run never leaves a partial file.
+    """
+    files.write_json(output_path, results)
+
+def main(argv=None):
+    args = parse_args(argv)
+    parameters = {
+        'routes': args.routes,
+        'dot_id_fanout': args.dot_id_fanout,
+        'county_order_error_rate': args.county_order_error_rate,
+        'attribute_error_rate': args.attribute_error_rate,
+        'edit_fraction': args.edit_fraction,
+        'edited_attribute_error_rate': args.edited_attribute_error_rate,
+        'large_dot_id_routes': args.large_dot_id_routes,
+        'seed': args.seed,
+    }
+
+    rows = synthetic.generate_milepoint_rows(
+        route_count=args.routes,
+        dot_id_fanout=args.dot_id_fanout,
+        county_order_error_rate=args.county_order_error_rate,
+        attribute_error_rate=args.attribute_error_rate,
+        edit_fraction=args.edit_fraction,
+        edited_attribute_error_rate=args.edited_attribute_error_rate,
+        seed=args.seed
+    )
+    # The minority_attributes scenarios group the routes of one large DOT_ID, which is a table of its own so the
+    #  other scenarios keep the layout of the real network
+    large_dot_id_rows = synthetic.generate_milepoint_rows(
+        route_count=args.large_dot_id_routes,
+        dot_id_fanout=args.dot_id_fanout,
+        attribute_error_rate=args.attribute_error_rate,
+        edit_fraction=args.edit_fraction,
+        edited_attribute_error_rate=args.edited_attribute_error_rate,
+        large_dot_id_routes=args.large_dot_id_routes,
+        seed=args.seed
+    )
+    workspace = stub_arcpy.StubWorkspace()
+    workspace.add_table('LRSN_Milepoint', rows)
+    workspace.make_layer('milepoint_layer', 'LRSN_Milepoint')
+    arcpy = stub_arcpy.install(workspace)
+
+    # validation_helpers imports arcpy, so the scenarios are imported once the stub is installed
+    from benchmarks import scenarios
+
+    context = {
+        'rows': rows,
+        'large_dot_id_rows': large_dot_id_rows,
+        'workspace': workspace,
+        'layer': 'milepoint_layer',
+    }
+    workloads = scenarios.WORKLOADS if args.workload == 'all' else (args.workload,)
+    results = {
+        'created': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'parameters': parameters,
+        'edited_routes': len(synthetic.edited_rows(rows)),
+        'scenarios': {},
+    }
+    for name, scenario_workloads, scenario in scenarios.SCENARIOS:
+        if args.scenario and name not in args.scenario:
+            continue
+        for workload in workloads:
+            if workload not in scenario_workloads:
+                continue
+            key = '{}/{}'.format(workload, name)
+            # The writers leave their selection on the layer, which the reads of the next scenario would honor
+            arcpy.SelectLayerByAttribute_management(context['layer'], 'CLEAR_SELECTION')
+            results['scenarios'][key] = time_scenario(scenario(context, workload), args.repeat)
+            print('{:<45} {:>10.4f} s'.format(key, results['scenarios'][key]['median_seconds']))
+
+    if args.compare:
+        compare_results(results, args.compare)
+    write_results(results, args.output)
+    print('Wrote {}'.format(args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Frozen copies of validator code as it was before the optimizations, so the benchmarks can time the old path next to
+the new one, and the tests can check that the new path returns the same results. Do not change these functions.
+"""
+from collections import defaultdict
+import re
+
+
+def validate_by_roadway_type(roadway_type, attributes):
+    """
+    validations.validate_by_roadway_type as of commit 45d4df1, which checked one cursor row at a time with
+    if statements. Do not change it.
+    """
+    (route_id, dot_id, county_order, signing, route_number,
+        route_suffix, route_qualifier, parkway_flag, roadway_feature) = attributes
+    if roadway_type not in [1, 2, 3, 4, 5]:
+        raise AttributeError(
+            'ROADWAY_TYPE is outside of the valid range. Must be one of (1, 2, 3, 4 ,5). ' +
+            'Currently ROADWAY_TYPE={}'.format(roadway_type)
+        )
+
+    violations = defaultdict(list)
+
+    # All validations regardless of ROADWAY_TYPE
+    if not re.match(r'^\d{9}$', str(route_id)):
+        violations['ROUTE_ID must be a nine digit number'].append(route_id)
+    if not re.match(r'^\d{6}$', str(dot_id)):
+        violations['DOT_ID must be a six digit number'].append(route_id)
+    if not re.match(r'^\d{2}$', str(county_order)):
+        violations['COUNTY_ORDER must be a zero padded two digit number (e.g. \'01\')'].append(route_id)
+
+    # Only run these validations if the county order is a number
+    if re.match(r'^\d{2}$', str(county_order)):
+        if county_order and int(county_order) == 0:
+            violations['COUNTY_ORDER must be greater than \'00\''].append(route_id)
+        if county_order and int(county_order) > 28:
+            violations['COUNTY_ORDER should be less than \'29\''].append(route_id)
+
+    # Validations for ROADWAY_TYPE = Road or Ramp
+    if roadway_type == 1 or roadway_type == 2:
+        if signing:
+            violations['SIGNING must be null when ROADWAY_TYPE in (\'Road\', \'Ramp\')'].append(route_id)
+        if route_number:
+            violations['ROUTE_NUMBER must be null when ROADWAY_TYPE in (\'Road\', \'Ramp\')'].append(route_id)
+        if route_suffix:
+            violations['ROUTE_SUFFIX must be null when ROADWAY_TYPE in (\'Road\', \'Ramp\')'].append(route_id)
+        if route_qualifier != 10:    # 10 is "No Qualifier"
+            violations[(
+                'ROUTE_QUALIFIER must be \'No Qualifier\' when ROADWAY_TYPE in (\'Road\', \'Ramp\')'
+            )].append(route_id)
+        if parkway_flag == 'T':      # T is "Yes"
+            violations['PARKWAY_FLAG must be \'No\' when ROADWAY_TYPE in (\'Road\', \'Ramp\')'].append(route_id)
+        if roadway_feature:
+            violations['ROADWAY_FEATURE must be null when ROADWAY_TYPE in (\'Road\', \'Ramp\')'].append(route_id)
+
+    # Validations for ROADWAY_TYPE = Route
+    elif roadway_type == 3:
+        if not route_number:
+            violations['ROUTE_NUMBER must not be null when ROADWAY_TYPE=Route'].append(route_id)
+        if roadway_feature:
+            violations['ROADWAY_FEATURE must be null when ROADWAY_TYPE=Route'].append(route_id)
+        if not signing and not re.match(r'^9\d{2}$', str(route_number)):
+            violations[(
+                'ROUTE_NUMBER must be a \'900\' route (i.e. 9xx) when ' +
+                'ROADWAY_TYPE=Route and SIGNING is null'
+            )].append(route_id)
+
+    # Validations for ROADWAY_TYPE = Non-Mainline
+    elif roadway_type == 5:
+        if signing:
+            violations['SIGNING must be null when ROADWAY_TYPE=Non-Mainline'].append(route_id)
+        if route_number:
+            violations['ROUTE_NUMBER must be null when ROADWAY_TYPE=Non-Mainline'].append(route_id)
+        if route_suffix:
+            violations['ROUTE_SUFFIX must be null when ROADWAY_TYPE=Non-Mainline'].append(route_id)
+        if route_qualifier != 10:   # 10 is "No Qualifier"
+            violations['ROUTE_QUALIFIER must be null when ROADWAY_TYPE=Non-Mainline'].append(route_id)
+        if parkway_flag == 'T':      # T is "Yes"
+            violations['PARKWAY_FLAG must be \'No\' when ROADWAY_TYPE=Non-Mainline'].append(route_id)
+        if not roadway_feature:
+            violations['ROADWAY_FEATURE must not be null when ROADWAY_TYPE=Non-Mainline'].append(route_id)
+
+    else:
+        raise AttributeError(
+            'ROADWAY_TYPE is outside of the valid range. Must be one of (1, 2, 3, 4 ,5). ' +
+            'Currently ROADWAY_TYPE={}'.format(roadway_type)
+        )
+
+    return violations
+
+def rdwy_attrs_route_ids(rows):
+    """
+    The grouping of write.rdwy_attrs_sql_result_to_reviewer_table as of commit 45d4df1, which counted each
+    attribute combination with list.count over every route of the offending DOT_IDs. The `rows` are the rows of
+    its SearchCursor: ROUTE_ID followed by the roadway level attributes. Do not change it.
+
+    The dictionary views are wrapped in list() so it runs on Python 3, where they are not lists.
+    """
+    milepoint_attrs = {row[0]: list(row[1:]) for row in rows}
+    milepoint_attr_values = list(milepoint_attrs.values())
+    unique_attrs_occurrence_count = [
+        [milepoint_attr_values.count(row), row] for row in milepoint_attr_values
+    ]
+    route_ids = [
+        list(milepoint_attrs.keys())[list(milepoint_attrs.values()).index(row[1])]
+        for row in unique_attrs_occurrence_count
+        if row[0] == 1
+    ]
+    return route_ids
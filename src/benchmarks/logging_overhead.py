@@ -0,0 +1,136 @@
+"""
+A micro-benchmark of the overhead of `utils.log_it` in a loop over many rows. Run from the src directory:
+
+    python -m benchmarks.logging_overhead --rows 100000
+
+Each variant logs one message per row, and is compared with the same loop without logging:
+- filtered_eager: a debug message formatted at the call site, with the logger at the info level. This is how the
+  validators called log_it before messages were built lazily, so the call site cost is paid for nothing
+- filtered_lazy: the same debug message with its values passed to log_it, which never formats it
+- gp_unbatched: the 'gp' level as it was, fetching arcpy.GetMessages and writing a log record for every tool
+- gp_batched: the 'gp' level, which writes the messages of config.GP_MESSAGE_BATCH_SIZE tools per log record
+- large_payload: an info message with a where_clause of --payload-values ROUTE_IDs, truncated to
+  config.LOG_MESSAGE_MAX_LENGTH characters before it reaches the log handler
+
+The log records are written to a handler that discards them, so the timings measure log_it itself.
+"""
+import argparse
+import datetime
+import logging
+import sys
+import timeit
+
+from benchmarks import stub_arcpy
+
+
+class _DiscardHandler(logging.Handler):
+    """
+    A logging handler that formats every record it receives and discards it, like a file handler without the disk.
+    """
+    def emit(self, record):
+        self.format(record)
+
+
+class _GPMessages(object):
+    """
+    Stands in for the messages object of a Python Toolbox's execute method, and counts the messages it receives.
+    """
+    def __init__(self):
+        self.count = 0
+
+    def addMessage(self, message):
+        self.count += 1
+
+    def addGPMessages(self):
+        self.count += 1
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.logging_overhead',
+                                     description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000, help='The number of log_it calls per variant')
+    parser.add_argument('--payload-values', type=int, default=5000,
+                        help='The number of ROUTE_IDs in the where_clause of the large_payload variant')
+    parser.add_argument('--repeat', type=int, default=3, help='The number of timed runs of each variant')
+    return parser.parse_args(argv)
+
+def eager_gp_log_it(arcpy, logger, arcpy_messages):
+    """
+    The 'gp' level of `log_it` before the GP messages were batched, for comparison.
+    """
+    arcpy_messages.addMessage('{datetime} [{level:<5}]  {message}'.format(
+        datetime=datetime.datetime.now(),
+        level='GP',
+        message=''
+    ))
+    arcpy_messages.addGPMessages()
+    logger.info(arcpy.GetMessages())
+
+def main(argv=None):
+    args = parse_args(argv)
+    arcpy = stub_arcpy.install(stub_arcpy.StubWorkspace())
+
+    # validation_helpers imports arcpy, so it is imported once the stub is installed
+    import validation_helpers.utils as utils
+
+    logger = logging.getLogger()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    handler = _DiscardHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s [%(threadName)-12.12s] [%(levelname)-5.5s]  %(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    arcpy_messages = _GPMessages()
+
+    route_ids = ['{:06d}0{}'.format(value, value % 3) for value in range(args.rows)]
+    where_clause = 'ROUTE_ID IN ({})'.format(', '.join(
+        '\'{}\''.format(route_id) for route_id in route_ids[:args.payload_values]
+    ))
+
+    def baseline():
+        for route_id in route_ids:
+            pass
+
+    def filtered_eager():
+        for route_id in route_ids:
+            utils.log_it('Validating {} with where_clause={}'.format(route_id, where_clause),
+                level='debug', logger=logger, arcpy_messages=arcpy_messages)
+
+    def filtered_lazy():
+        for route_id in route_ids:
+            utils.log_it('Validating {route_id} with where_clause={where_clause}',
+                route_id=route_id, where_clause=where_clause,
+                level='debug', logger=logger, arcpy_messages=arcpy_messages)
+
+    def gp_unbatched():
+        for route_id in route_ids:
+            eager_gp_log_it(arcpy, logger, arcpy_messages)
+
+    def gp_batched():
+        for route_id in route_ids:
+            utils.log_it('', level='gp', logger=logger, arcpy_messages=arcpy_messages)
+        utils.flush_gp_messages()
+
+    def large_payload():
+        for route_id in route_ids[:max(args.rows // 100, 1)]:
+            utils.log_it('Selecting {route_id} with where_clause={where_clause}',
+                route_id=route_id, where_clause=where_clause,
+                level='info', logger=logger, arcpy_messages=arcpy_messages)
+
+    variants = [
+        ('baseline', baseline, args.rows),
+        ('filtered_eager', filtered_eager, args.rows),
+        ('filtered_lazy', filtered_lazy, args.rows),
+        ('gp_unbatched', gp_unbatched, args.rows),
+        ('gp_batched', gp_batched, args.rows),
+        ('large_payload', large_payload, max(args.rows // 100, 1)),
+    ]
+    print('{:<16} {:>10} {:>10} {:>14}'.format('Variant', 'Calls', 'Seconds', 'us per call'))
+    for name, variant, calls in variants:
+        seconds = min(timeit.repeat(variant, number=1, repeat=max(args.repeat, 1)))
+        print('{:<16} {:>10} {:>10.4f} {:>14.3f}'.format(name, calls, seconds, 1e6 * seconds / calls))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
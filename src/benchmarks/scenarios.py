@@ -0,0 +1,385 @@
+"""
+The timed benchmark scenarios. Each scenario runs a part of the validators on the synthetic Milepoint table served by
+the stub arcpy (see stub_arcpy.py), for one or both workloads:
+- edits: the routes that synthetic.EDITED_BY edited since synthetic.EDITED_SINCE, as a Workflow Manager job validates
+- full_db: every active route, as the full_db_flag validates
+
+A scenario function takes the benchmark context and the workload, does its setup, and returns a function with no
+arguments that does the timed work and returns a dictionary of counts (e.g. the number of violations). The counts
+make regressions in the results visible next to the timings.
+
+The stub arcpy must be installed before this module is imported, since validation_helpers imports arcpy.
+"""
+from collections import defaultdict
+import json
+import multiprocessing
+
+import arcpy
+import numpy as np
+
+import validation_helpers.rules as rules
+import validation_helpers.tiling as tiling
+import validation_helpers.utils as utils
+import validation_helpers.validations as validations
+import validation_helpers.write as write
+from validation_helpers.config import (
+    ACTIVE_ROUTES_WHERE_CLAUSE,
+    DOMAIN,
+    EDITED_ROUTES_QUERY_FMT,
+)
+from benchmarks import baseline, synthetic
+
+
+WORKLOADS = ('edits', 'full_db')
+
+# The rows of each chunk of the streaming_pipeline scenario
+STREAM_CHUNK_SIZE = 1000
+
+# The roadway level attribute fields, in the order of run_roadway_level_attribute_checks
+ATTRIBUTE_FIELDS = [
+    'ROADWAY_TYPE', 'ROUTE_ID', 'DOT_ID', 'COUNTY_ORDER', 'SIGNING', 'ROUTE_NUMBER',
+    'ROUTE_SUFFIX', 'ROUTE_QUALIFIER', 'PARKWAY_FLAG', 'ROADWAY_FEATURE', 'DIRECTION',
+]
+
+# The fields that write.rdwy_attrs_sql_result_to_reviewer_table reads for write.minority_attribute_route_ids
+MINORITY_ATTRIBUTE_FIELDS = [
+    'ROUTE_ID', 'DOT_ID', 'COUNTY_ORDER', 'SIGNING', 'ROUTE_NUMBER', 'ROUTE_SUFFIX',
+    'ROADWAY_TYPE', 'ROUTE_QUALIFIER', 'ROADWAY_FEATURE', 'PARKWAY_FLAG',
+]
+
+
+def workload_where_clause(workload):
+    """
+    Return the where_clause of the routes that a workload validates.
+    """
+    if workload == 'full_db':
+        return ACTIVE_ROUTES_WHERE_CLAUSE
+    return EDITED_ROUTES_QUERY_FMT.format(
+        date=synthetic.EDITED_SINCE,
+        user_upper=synthetic.EDITED_BY.upper(),
+        user_lower=synthetic.EDITED_BY.lower(),
+        domain=DOMAIN,
+        active_routes=ACTIVE_ROUTES_WHERE_CLAUSE
+    )
+
+def roadway_rules_row_by_row(context, workload):
+    """
+    Read the routes with a SearchCursor and call the original `validate_by_roadway_type` (see baseline.py) once per
+    route, as the validator did before the rules were vectorized.
+    """
+    def run():
+        violations = defaultdict(list)
+        with arcpy.da.SearchCursor(context['layer'], ATTRIBUTE_FIELDS[:-1],
+                                   where_clause=workload_where_clause(workload)) as curs:
+            for row in curs:
+                for rule, route_ids in baseline.validate_by_roadway_type(row[0], row[1:]).items():
+                    violations[rule].extend(route_ids)
+        return {'violations': _count(violations)}
+    return run
+
+def roadway_rules_vectorized(context, workload):
+    """
+    Read the routes with TableToNumPyArray and validate them with `validate_by_roadway_type_vectorized`.
+    """
+    def run():
+        milepoint_rows = utils.milepoint_attributes_to_array(
+            context['layer'],
+            ATTRIBUTE_FIELDS,
+            where_clause=workload_where_clause(workload)
+        )
+        violations = validations.validate_by_roadway_type_vectorized(milepoint_rows)
+        return {'routes': len(milepoint_rows), 'violations': _count(violations)}
+    return run
+
+def county_order_per_route(context, workload):
+    """
+    Call `validate_county_order_value` for every validated route, as the validator did before the verdicts were
+    precomputed once per DOT_ID.
+    """
+    dot_id_routes = _dot_id_routes(context)
+    milepoint_rows = utils.milepoint_attributes_to_array(
+        context['layer'],
+        ['DOT_ID', 'DIRECTION', 'COUNTY_ORDER'],
+        where_clause=workload_where_clause(workload)
+    )
+
+    def run():
+        violations = defaultdict(list)
+        for dot_id, direction, county_order in milepoint_rows.tolist():
+            if dot_id not in dot_id_routes:
+                continue
+            for rule, route_ids in validations.validate_county_order_value(dot_id_routes, dot_id, direction).items():
+                violations[rule].extend(route_ids)
+        return {'routes': len(milepoint_rows), 'violations': _count(violations)}
+    return run
+
+def county_order_precomputed(context, workload):
+    """
+    Organize the active routes by DOT_ID and analyze each DOT_ID's COUNTY_ORDER sequence once.
+    """
+    def run():
+        verdicts = validations.precompute_county_order_verdicts(_dot_id_routes(context))
+        return {'dot_ids_with_violations': len(verdicts)}
+    return run
+
+def minority_attributes_count_scan(context, workload):
+    """
+    Find the routes of the large DOT_ID with a minority roadway level attribute combination with the list.count
+    scan of the original validator (`baseline.rdwy_attrs_route_ids`), which is quadratic in the routes of a DOT_ID.
+    It only returns the combinations of a single route, so it finds fewer routes than minority_attributes_grouped.
+    """
+    rows = [row[:1] + row[3:] for row in _large_dot_id_attribute_rows(context)]
+
+    def run():
+        return {'routes': len(rows), 'route_ids': len(baseline.rdwy_attrs_route_ids(rows))}
+    return run
+
+def minority_attributes_grouped(context, workload):
+    """
+    Find the routes of the large DOT_ID with a minority roadway level attribute combination in their
+    DOT_ID/COUNTY_ORDER with `write.minority_attribute_route_ids`, which groups them in a single pass.
+    """
+    rows = _large_dot_id_attribute_rows(context)
+
+    def run():
+        return {'routes': len(rows), 'route_ids': len(write.minority_attribute_route_ids(rows))}
+    return run
+
+def per_rule_writer(context, workload):
+    """
+    Commit the roadway level attribute violations with one selection, copy and write per rule
+    (`write.roadway_level_attribute_result_to_reviewer_table`).
+    """
+    violations = _violations(context, workload)
+
+    def run():
+        context['workspace'].reset_counters()
+        write.roadway_level_attribute_result_to_reviewer_table(
+            violations,
+            context['layer'],
+            'reviewer_ws',
+            'Session 1 : benchmark',
+            'LRSN_Milepoint',
+            base_where_clause=workload_where_clause(workload)
+        )
+        return _reviewer_counts(context, rules=len(violations))
+    return run
+
+def batch_writer(context, workload):
+    """
+    Commit the roadway level attribute violations in one pass (`write.batch_result_to_reviewer_table`), selecting
+    the violating routes by ROUTE_ID.
+    """
+    violations = _violations(context, workload)
+
+    def run():
+        context['workspace'].reset_counters()
+        write.batch_result_to_reviewer_table(
+            violations,
+            context['layer'],
+            'reviewer_ws',
+            'Session 1 : benchmark',
+            'LRSN_Milepoint',
+            base_where_clause=workload_where_clause(workload)
+        )
+        return _reviewer_counts(context, rules=len(violations))
+    return run
+
+def batch_writer_rule_sql(context, workload):
+    """
+    Commit the roadway level attribute violations in one pass, selecting the violating routes with the SQL form of
+    the rules, as full database runs do.
+    """
+    violations = _violations(context, workload)
+    field_types = dict((field.name, field.type) for field in arcpy.ListFields(context['layer']))
+
+    def run():
+        context['workspace'].reset_counters()
+        write.batch_result_to_reviewer_table(
+            violations,
+            context['layer'],
+            'reviewer_ws',
+            'Session 1 : benchmark',
+            'LRSN_Milepoint',
+            base_where_clause=workload_where_clause(workload),
+            selection_where_clause=rules.violations_where_clause(field_types=field_types)
+        )
+        return _reviewer_counts(context, rules=len(violations))
+    return run
+
+def roadway_level_in_process(context, workload):
+    """
+    Validate the roadway level attributes and COUNTY_ORDER sequences of every active route in this process with
+    `validations.roadway_level_violations`.
+    """
+    milepoint_rows = utils.milepoint_attributes_to_array(
+        context['layer'],
+        ATTRIBUTE_FIELDS,
+        where_clause=workload_where_clause(workload)
+    )
+
+    def run():
+        violations = validations.roadway_level_violations(milepoint_rows)
+        return {'routes': len(milepoint_rows), 'violations': _count(violations)}
+    return run
+
+def roadway_level_sharded(context, workload):
+    """
+    Validate the same routes as `roadway_level_in_process` in one shard of DOT_IDs per CPU, with
+    `validations.roadway_level_violations_sharded`. The time includes starting the worker processes.
+    """
+    milepoint_rows = utils.milepoint_attributes_to_array(
+        context['layer'],
+        ATTRIBUTE_FIELDS,
+        where_clause=workload_where_clause(workload)
+    )
+    shard_count = max(2, multiprocessing.cpu_count())
+
+    def run():
+        violations = validations.roadway_level_violations_sharded(milepoint_rows, shard_count)
+        return {'routes': len(milepoint_rows), 'violations': _count(violations), 'shards': shard_count}
+    return run
+
+def streaming_pipeline(context, workload):
+    """
+    Read the routes from a cursor in chunks, validate each chunk and commit the violations every
+    config.REVIEWER_FLUSH_SIZE violations, as `run_roadway_level_attribute_checks` does with a stream_chunk_size.
+    The COUNTY_ORDER verdicts are precomputed in setup.
+    """
+    county_order_verdicts = validations.precompute_county_order_verdicts(_dot_id_routes(context))
+    stream_layer = arcpy.MakeFeatureLayer_management(context['layer'], 'milepoint_stream')
+
+    def run():
+        context['workspace'].reset_counters()
+        violation_count, record_count = write.violation_stream_to_reviewer_table(
+            validations.roadway_level_violation_chunks(
+                utils.milepoint_attribute_chunks(
+                    stream_layer,
+                    ATTRIBUTE_FIELDS,
+                    STREAM_CHUNK_SIZE,
+                    where_clause=workload_where_clause(workload)
+                ),
+                county_order_verdicts
+            ),
+            context['layer'],
+            'reviewer_ws',
+            'Session 1 : benchmark',
+            'LRSN_Milepoint',
+            base_where_clause=workload_where_clause(workload)
+        )
+        return _reviewer_counts(context, violations=violation_count)
+    return run
+
+def edit_area_dissolved(context, workload):
+    """
+    Buffer the edited routes into one dissolved multipart polygon, the single area of interest the Reviewer Batch Job
+    searches when the edits are not clustered. The counts include the number of Milepoint features in the area, which
+    the batch job validates.
+    """
+    def run():
+        arcpy.SelectLayerByAttribute_management(context['layer'], 'NEW_SELECTION', workload_where_clause(workload))
+        arcpy.Buffer_analysis(context['layer'], 'in_memory\\edit_area', '10 Meters', dissolve_option='ALL')
+        arcpy.SelectLayerByAttribute_management(context['layer'], 'CLEAR_SELECTION')
+        areas = [row[0] for row in arcpy.da.SearchCursor('in_memory\\edit_area', ['SHAPE@'])]
+        arcpy.Delete_management('in_memory\\edit_area')
+        return _area_counts(context, [area.parts for area in areas])
+    return run
+
+def edit_clusters(context, workload):
+    """
+    Buffer the edited routes and group them into clusters with `tiling.edit_cluster_tiles`, the areas of interest the
+    Reviewer Batch Job searches when the edits are clustered. The counts include the number of Milepoint features in
+    each area, which the batch jobs validate. A feature near two clusters is validated, and counted, twice. Counting
+    compares each buffer with every feature once, as edit_area_dissolved does, so it adds the same time to both.
+    """
+    def run():
+        arcpy.SelectLayerByAttribute_management(context['layer'], 'NEW_SELECTION', workload_where_clause(workload))
+        tiles = tiling.edit_cluster_tiles(context['layer'])
+        arcpy.SelectLayerByAttribute_management(context['layer'], 'CLEAR_SELECTION')
+        return _area_counts(context, [json.loads(tile['geometry'])['parts'] for tile in tiles])
+    return run
+
+
+# The scenarios, in the order they run: (name, workloads, scenario function)
+SCENARIOS = [
+    ('roadway_rules_row_by_row', ('edits',), roadway_rules_row_by_row),
+    ('roadway_rules_vectorized', WORKLOADS, roadway_rules_vectorized),
+    ('county_order_per_route', ('edits',), county_order_per_route),
+    ('county_order_precomputed', ('full_db',), county_order_precomputed),
+    ('minority_attributes_count_scan', ('full_db',), minority_attributes_count_scan),
+    ('minority_attributes_grouped', ('full_db',), minority_attributes_grouped),
+    ('per_rule_writer', WORKLOADS, per_rule_writer),
+    ('batch_writer', WORKLOADS, batch_writer),
+    ('batch_writer_rule_sql', ('full_db',), batch_writer_rule_sql),
+    ('roadway_level_in_process', ('full_db',), roadway_level_in_process),
+    ('roadway_level_sharded', ('full_db',), roadway_level_sharded),
+    ('streaming_pipeline', WORKLOADS, streaming_pipeline),
+    ('edit_area_dissolved', ('edits',), edit_area_dissolved),
+    ('edit_clusters', ('edits',), edit_clusters),
+]
+
+
+def _count(violations):
+    """
+    Return the number of rule/ROUTE_ID pairs in a violations dictionary.
+    """
+    return sum(len(route_ids) for route_ids in violations.values())
+
+def _reviewer_counts(context, **counts):
+    """
+    Return the Reviewer records, writes and selections that the stub counted, with the other `counts`.
+    """
+    counts.update({
+        'reviewer_records': context['workspace'].reviewer_records,
+        'reviewer_writes': context['workspace'].reviewer_writes,
+        'selections': context['workspace'].selections,
+    })
+    return counts
+
+def _dot_id_routes(context):
+    """
+    Read the active routes and organize them by DOT_ID and COUNTY_ORDER.
+    """
+    return validations.build_dot_id_routes(utils.milepoint_attributes_to_array(
+        context['layer'],
+        ['DOT_ID', 'COUNTY_ORDER', 'ROUTE_ID', 'DIRECTION'],
+        where_clause=ACTIVE_ROUTES_WHERE_CLAUSE
+    ))
+
+def _violations(context, workload):
+    """
+    Return the roadway level attribute violations of a workload, which the writer scenarios commit.
+    """
+    return validations.validate_by_roadway_type_vectorized(utils.milepoint_attributes_to_array(
+        context['layer'],
+        ATTRIBUTE_FIELDS,
+        where_clause=workload_where_clause(workload)
+    ))
+
+def _large_dot_id_attribute_rows(context):
+    """
+    Return the routes of synthetic.LARGE_DOT_ID as the rows of the SearchCursor in
+    `write.rdwy_attrs_sql_result_to_reviewer_table`: ROUTE_ID, DOT_ID, COUNTY_ORDER, then the roadway level
+    attributes.
+    """
+    rows = context['large_dot_id_rows']
+    return rows[MINORITY_ATTRIBUTE_FIELDS].tolist()
+
+def _area_counts(context, areas):
+    """
+    Count the areas of interest, and the Milepoint features that intersect each of them. Each area is a list of
+    (xmin, ymin, xmax, ymax) parts (see stub_arcpy.StubGeometry).
+    """
+    rows = context['rows']
+    feature_counts = []
+    for parts in areas:
+        in_area = np.zeros(len(rows), dtype=bool)
+        for xmin, ymin, xmax, ymax in parts:
+            in_area |= ((rows['SHAPE_XMIN'] <= xmax) & (rows['SHAPE_XMAX'] >= xmin) &
+                        (rows['SHAPE_YMIN'] <= ymax) & (rows['SHAPE_YMAX'] >= ymin))
+        feature_counts.append(int(in_area.sum()))
+    return {
+        'areas': len(areas),
+        'features_in_areas': sum(feature_counts),
+        'max_features_in_area': max(feature_counts) if feature_counts else 0,
+    }
@@ -0,0 +1,785 @@
+"""
+A stand-in for the parts of arcpy that validation_helpers uses, backed by in-memory tables, so the validators can be
+timed without ArcGIS or an SDE database. `install` puts the stub in sys.modules as `arcpy`, so it must be called
+before validation_helpers is imported.
+
+The tables are NumPy structured arrays (see synthetic.py). NULL values are stored as the same sentinels that
+`utils.milepoint_attributes_to_array` uses (config.NUMPY_NULL_INTEGER, '', config.NUMPY_NULL_DATE), and cursors return
+them as None, like arcpy does. The extent of each feature is stored in the SHAPE_XMIN, SHAPE_YMIN, SHAPE_XMAX and
+SHAPE_YMAX columns, which cursors return as a StubGeometry for SHAPE@. A geometry is a list of rectangular parts, and
+the feature classes that the stub creates also store the parts of each feature (e.g. a dissolved buffer of many
+features), in the SHAPE_PARTS column.
+
+Where clauses are parsed into Python predicates (see `compile_where_clause`). The parser understands the SQL the
+validators generate: AND, OR, NOT, parentheses, comparisons, IN (...), IS [NOT] NULL, LIKE with % and [0-9] patterns,
+COLLATE, DATALENGTH, RTRIM and CURRENT_TIMESTAMP. Text is compared like the default collation of SQL Server does it:
+case-insensitively, and ignoring trailing spaces. A binary collation (e.g. COLLATE Latin1_General_BIN) compares the
+case, but trailing spaces are still ignored. Data Reviewer is reduced to counting the records that WriteToReviewerTable_Reviewer receives,
+and versions to the names that ListVersions returns. The workspace can sleep for a `connection_latency` on each
+database connection, to emulate the start up costs of a validation run.
+
+Example
+-------
+>>> workspace = stub_arcpy.StubWorkspace()
+>>> workspace.add_table('LRSN_Milepoint', synthetic.generate_milepoint_rows(route_count=10000))
+>>> arcpy = stub_arcpy.install(workspace)
+>>> import validation_helpers.validations as validations
+"""
+from collections import defaultdict
+import datetime
+import fnmatch
+import json
+import numbers
+import re
+import sys
+import time
+import types
+
+import numpy as np
+
+from validation_helpers.config import NUMPY_NULL_DATE, NUMPY_NULL_INTEGER
+
+
+# The columns that hold the extent of each feature. They are hidden from ListFields
+SHAPE_COLUMNS = ('SHAPE_XMIN', 'SHAPE_YMIN', 'SHAPE_XMAX', 'SHAPE_YMAX')
+# The column that holds the parts of each feature, in the feature classes the stub creates. It is hidden from ListFields
+SHAPE_PARTS_COLUMN = 'SHAPE_PARTS'
+
+
+class StubExtent(object):
+    """
+    The attributes of an arcpy.Extent that the validators read.
+    """
+    def __init__(self, XMin=None, YMin=None, XMax=None, YMax=None, *args, **kwargs):
+        self.XMin = XMin
+        self.YMin = YMin
+        self.XMax = XMax
+        self.YMax = YMax
+
+
+class StubGeometry(object):
+    """
+    A feature geometry, reduced to a list of rectangular parts of (xmin, ymin, xmax, ymax). A union keeps the parts of
+    both geometries, and the extent is the envelope of the parts.
+    """
+    def __init__(self, xmin, ymin, xmax, ymax, parts=None):
+        self.parts = list(parts) if parts else [(xmin, ymin, xmax, ymax)]
+        self.extent = StubExtent(xmin, ymin, xmax, ymax)
+
+    @classmethod
+    def from_parts(cls, parts):
+        return cls(
+            min(part[0] for part in parts),
+            min(part[1] for part in parts),
+            max(part[2] for part in parts),
+            max(part[3] for part in parts),
+            parts=parts
+        )
+
+    def union(self, other):
+        return StubGeometry.from_parts(self.parts + other.parts)
+
+    @property
+    def JSON(self):
+        return json.dumps({'xmin': self.extent.XMin, 'ymin': self.extent.YMin,
+                           'xmax': self.extent.XMax, 'ymax': self.extent.YMax,
+                           'parts': [list(part) for part in self.parts]})
+
+
+class StubDescription(object):
+    """
+    The attributes of an arcpy.Describe result that the validators read.
+    """
+    def __init__(self, shape_type):
+        self.shapeType = shape_type
+        self.hasM = True
+        self.hasZ = False
+        self.spatialReference = 'stub'
+
+
+class StubField(object):
+    """
+    The attributes of an arcpy Field that the validators read.
+    """
+    def __init__(self, name, field_type, length=None):
+        self.name = name
+        self.type = field_type
+        self.length = length
+
+
+class StubResult(object):
+    """
+    The geoprocessing tool result, e.g. of GetCount_management.
+    """
+    def __init__(self, *outputs):
+        self.outputs = outputs
+
+    def getOutput(self, index):
+        return self.outputs[index]
+
+
+class StubTable(object):
+    """
+    A table or feature class. The rows are a list of tuples with None for NULL values, in the order of `fields`.
+    """
+    def __init__(self, name, fields, rows=None, shape_type='Polyline'):
+        self.name = name
+        self.fields = list(fields)
+        self.rows = rows if rows is not None else []
+        self.shape_type = shape_type
+
+    def field_index(self, name):
+        """
+        Return the position of a field in the rows, accepting the OID@ token and case-insensitive names.
+        """
+        if name == 'OID@':
+            name = 'OBJECTID'
+        for index, field in enumerate(self.fields):
+            if field.name.upper() == name.upper():
+                return index
+        raise RuntimeError('Cannot find field \'{}\' in {}'.format(name, self.name))
+
+
+class StubLayer(object):
+    """
+    A feature layer: a table and the indexes of the selected rows. None selects every row.
+    """
+    def __init__(self, name, table):
+        self.name = name
+        self.table = table
+        self.selection = None
+
+    def selected_rows(self):
+        if self.selection is None:
+            return self.table.rows
+        return [self.table.rows[index] for index in sorted(self.selection)]
+
+
+class StubCursor(object):
+    """
+    A SearchCursor or InsertCursor over a StubTable or StubLayer.
+    """
+    def __init__(self, workspace, dataset, fields, where_clause=None, insert=False):
+        self.dataset = workspace.get(dataset)
+        self.table = self.dataset.table if isinstance(self.dataset, StubLayer) else self.dataset
+        self.getters = [self._getter(field) for field in fields]
+        self.insert_indexes = None
+        if insert:
+            self.insert_indexes = [self._insert_index(field) for field in fields]
+            return
+
+        rows = self.dataset.selected_rows() if isinstance(self.dataset, StubLayer) else self.table.rows
+        if where_clause:
+            predicate = compile_where_clause(where_clause, self.table)
+            rows = [row for row in rows if predicate(row)]
+        self.rows = rows
+
+    def _getter(self, field):
+        if field == 'SHAPE@':
+            if any(stub_field.name == SHAPE_PARTS_COLUMN for stub_field in self.table.fields):
+                parts_index = self.table.field_index(SHAPE_PARTS_COLUMN)
+                return lambda row: StubGeometry.from_parts(row[parts_index])
+            indexes = [self.table.field_index(column) for column in SHAPE_COLUMNS]
+            return lambda row: StubGeometry(*[row[index] for index in indexes])
+        index = self.table.field_index(field)
+        return lambda row: row[index]
+
+    def _insert_index(self, field):
+        return 'SHAPE@' if field == 'SHAPE@' else self.table.field_index(field)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+    def __iter__(self):
+        getters = self.getters
+        for row in self.rows:
+            yield tuple(getter(row) for getter in getters)
+
+    def insertRow(self, values):
+        row = [None] * len(self.table.fields)
+        for index, value in zip(self.insert_indexes, values):
+            if index == 'SHAPE@':
+                # SHAPE@ is stored as its extent, and as its parts if the feature class has a parts column
+                for column, coordinate in zip(SHAPE_COLUMNS, (
+                        value.extent.XMin, value.extent.YMin, value.extent.XMax, value.extent.YMax)):
+                    row[self.table.field_index(column)] = coordinate
+                if any(field.name == SHAPE_PARTS_COLUMN for field in self.table.fields):
+                    row[self.table.field_index(SHAPE_PARTS_COLUMN)] = tuple(value.parts)
+            else:
+                row[index] = value
+        self.table.rows.append(tuple(row))
+
+
+class StubWorkspace(object):
+    """
+    The datasets that the stub arcpy serves, and counters of the work the validators asked it to do.
+    """
+    def __init__(self):
+        self.datasets = dict()
+        self.reviewer_records = 0
+        self.reviewer_writes = 0
+        # The number of records written with each review status
+        self.reviewer_statuses = defaultdict(int)
+        self.selections = 0
+        # The version names that ListVersions returns
+        self.versions = ['sde.DEFAULT', 'ELRS.Lockroot']
+        # The seconds that connecting to the database costs, which ListVersions, MakeFeatureLayer_management and
+        #  CheckOutExtension sleep, so the start up costs of a validation run can be emulated
+        self.connection_latency = 0.0
+        self.connections = 0
+
+    def add_table(self, name, array, shape_type='Polyline'):
+        """
+        Add a NumPy structured array as a feature class. NULL sentinels are stored as None.
+
+        Arguments
+        ---------
+        :param name: The name of the feature class
+        :param array: A NumPy structured array, e.g. from synthetic.generate_milepoint_rows
+
+        Returns
+        -------
+        :returns StubTable: The new table
+        """
+        fields = [StubField(name_, _field_type(array.dtype[name_]), _field_length(array.dtype[name_]))
+                  for name_ in array.dtype.names]
+        columns = [[_null_to_none(value) for value in array[field.name].tolist()] for field in fields]
+        table = StubTable(name, fields, rows=list(zip(*columns)), shape_type=shape_type)
+        self.datasets[name] = table
+        return table
+
+    def make_layer(self, name, table_name):
+        """
+        Create a feature layer of a table, or of the table of another layer.
+        """
+        table = self.get(table_name)
+        if isinstance(table, StubLayer):
+            table = table.table
+        self.datasets[name] = StubLayer(name, table)
+        return name
+
+    def add_reviewer_session(self, session_id, username, session_name):
+        """
+        Add a row to the Data Reviewer session table (GDB_REVSESSIONTABLE), which is created if it does not exist.
+        """
+        if 'GDB_REVSESSIONTABLE' not in self.datasets:
+            self.datasets['GDB_REVSESSIONTABLE'] = StubTable('GDB_REVSESSIONTABLE', [
+                StubField('OBJECTID', 'OID'),
+                StubField('SESSIONID', 'Integer'),
+                StubField('USERNAME', 'String', 50),
+                StubField('SESSIONNAME', 'String', 50),
+            ], shape_type=None)
+        table = self.datasets['GDB_REVSESSIONTABLE']
+        table.rows.append((len(table.rows) + 1, session_id, username, str(session_name)))
+
+    def connect(self):
+        """
+        Count a connection to the database, and sleep for the `connection_latency`.
+        """
+        self.connections += 1
+        if self.connection_latency:
+            time.sleep(self.connection_latency)
+
+    def get(self, dataset):
+        """
+        Return the StubTable or StubLayer of a dataset name, with or without its workspace.
+        """
+        if isinstance(dataset, (StubTable, StubLayer)):
+            return dataset
+        name = re.split(r'[\\/]', str(dataset))[-1]
+        if name not in self.datasets:
+            raise RuntimeError('Dataset {} does not exist'.format(dataset))
+        return self.datasets[name]
+
+    def exists(self, dataset):
+        return re.split(r'[\\/]', str(dataset))[-1] in self.datasets
+
+    def reset_counters(self):
+        self.reviewer_records = 0
+        self.reviewer_writes = 0
+        self.reviewer_statuses = defaultdict(int)
+        self.selections = 0
+
+
+def install(workspace):
+    """
+    Build a stub arcpy module that serves the datasets of `workspace`, and register it (and arcpy.da) in
+    sys.modules. A real arcpy that is already imported is never replaced.
+
+    Arguments
+    ---------
+    :param workspace: A StubWorkspace
+
+    Returns
+    -------
+    :returns module: The stub arcpy module
+    :raises RuntimeError: Raises a RuntimeError if the real arcpy is already imported
+    """
+    existing = sys.modules.get('arcpy')
+    if existing is not None and not getattr(existing, 'IS_STUB', False):
+        raise RuntimeError('The real arcpy is already imported, so the stub cannot be installed')
+
+    arcpy = types.ModuleType('arcpy')
+    arcpy.IS_STUB = True
+    arcpy.workspace = workspace
+    arcpy.Extent = StubExtent
+
+    class Env(object):
+        workspace = None
+        outputCoordinateSystem = None
+    arcpy.env = Env()
+
+    da = types.ModuleType('arcpy.da')
+    da.SearchCursor = lambda dataset, fields, where_clause=None, *args, **kwargs: StubCursor(
+        workspace, dataset, fields, where_clause=where_clause)
+    da.InsertCursor = lambda dataset, fields: StubCursor(workspace, dataset, fields, insert=True)
+    da.TableToNumPyArray = lambda dataset, fields, where_clause=None, null_value=None, *args, **kwargs: (
+        _table_to_numpy_array(workspace, dataset, fields, where_clause, null_value))
+    arcpy.da = da
+
+    def create_featureclass(out_path, out_name, geometry_type='POLYLINE', *args, **kwargs):
+        fields = [StubField('OBJECTID', 'OID')] + [StubField(column, 'Double') for column in SHAPE_COLUMNS] + [
+            StubField(SHAPE_PARTS_COLUMN, 'Blob')]
+        workspace.datasets[out_name] = StubTable(out_name, fields, shape_type=geometry_type.title())
+        return StubResult('{}\\{}'.format(out_path, out_name))
+
+    def create_table(out_path, out_name, *args, **kwargs):
+        workspace.datasets[out_name] = StubTable(out_name, [StubField('OBJECTID', 'OID')])
+        return StubResult('{}\\{}'.format(out_path, out_name))
+
+    def add_field(dataset, field_name, field_type, *args, **kwargs):
+        table = workspace.get(dataset)
+        table = table.table if isinstance(table, StubLayer) else table
+        table.fields.append(StubField(field_name, _ADD_FIELD_TYPES.get(field_type, field_type),
+                                      kwargs.get('field_length')))
+        table.rows = [row + (None,) for row in table.rows]
+
+    def select_layer_by_attribute(layer, selection_type='NEW_SELECTION', where_clause=None, *args, **kwargs):
+        stub_layer = workspace.get(layer)
+        workspace.selections += 1
+        if selection_type == 'CLEAR_SELECTION':
+            stub_layer.selection = None
+            return layer
+
+        predicate = compile_where_clause(where_clause, stub_layer.table) if where_clause else (lambda row: True)
+        matches = set(index for index, row in enumerate(stub_layer.table.rows) if predicate(row))
+        if selection_type == 'ADD_TO_SELECTION' and stub_layer.selection is not None:
+            stub_layer.selection |= matches
+        elif selection_type == 'SUBSET_SELECTION' and stub_layer.selection is not None:
+            stub_layer.selection &= matches
+        else:
+            stub_layer.selection = matches
+        return layer
+
+    def get_count(dataset):
+        stub_dataset = workspace.get(dataset)
+        if isinstance(stub_dataset, StubLayer):
+            return StubResult(str(len(stub_dataset.selected_rows())))
+        return StubResult(str(len(stub_dataset.rows)))
+
+    def describe(dataset):
+        stub_dataset = workspace.get(dataset)
+        table = stub_dataset.table if isinstance(stub_dataset, StubLayer) else stub_dataset
+        return StubDescription(table.shape_type)
+
+    def write_to_reviewer_table(reviewer_ws, session, dataset, id_field, origin_table, review_status, *args):
+        # Like the geoprocessing tool, only the selected features of a layer are written
+        stub_dataset = workspace.get(dataset)
+        record_count = len(stub_dataset.selected_rows() if isinstance(stub_dataset, StubLayer) else stub_dataset.rows)
+        workspace.reviewer_writes += 1
+        workspace.reviewer_records += record_count
+        workspace.reviewer_statuses[review_status] += record_count
+
+    def delete(dataset, *args, **kwargs):
+        workspace.datasets.pop(str(dataset).split('\\')[-1], None)
+
+    def buffer_analysis(in_features, out_feature_class, buffer_distance, line_side='FULL', line_end_type='ROUND',
+                        dissolve_option='NONE', *args, **kwargs):
+        # The buffers are the parts of the features, grown by the distance (e.g. '10 Meters'). With the ALL
+        #  dissolve_option, they are one multipart feature
+        distance = float(str(buffer_distance).split()[0])
+        name = out_feature_class.split('\\')[-1]
+        create_featureclass('in_memory', name, 'POLYGON')
+        with StubCursor(workspace, in_features, ['SHAPE@']) as search_curs:
+            buffers = [StubGeometry.from_parts([
+                (part[0] - distance, part[1] - distance, part[2] + distance, part[3] + distance)
+                for part in row[0].parts
+            ]) for row in search_curs]
+        if dissolve_option == 'ALL' and buffers:
+            buffers = [StubGeometry.from_parts([part for buff in buffers for part in buff.parts])]
+        with StubCursor(workspace, name, ['SHAPE@'], insert=True) as insert_curs:
+            for buff in buffers:
+                insert_curs.insertRow([buff])
+
+    def list_fields(dataset, *args, **kwargs):
+        stub_dataset = workspace.get(dataset)
+        table = stub_dataset.table if isinstance(stub_dataset, StubLayer) else stub_dataset
+        return [field for field in table.fields if field.name not in SHAPE_COLUMNS + (SHAPE_PARTS_COLUMN,)]
+
+    def list_datasets(wildcard=None, feature_classes=True):
+        return [
+            name for name, dataset in sorted(workspace.datasets.items())
+            if isinstance(dataset, StubTable) and bool(dataset.shape_type) == feature_classes
+            and fnmatch.fnmatch(name.upper(), (wildcard or '*').upper())
+        ]
+
+    def list_versions(production_ws):
+        workspace.connect()
+        return list(workspace.versions)
+
+    def make_feature_layer(in_features, out_layer, *args, **kwargs):
+        # Layers of in_memory datasets do not reach the database
+        if not str(in_features).startswith('in_memory'):
+            workspace.connect()
+        return workspace.make_layer(out_layer, in_features)
+
+    checked_out = set()
+
+    def check_out_extension(extension):
+        # Checking out an extension that is already checked out does not reach the license manager
+        if extension not in checked_out:
+            workspace.connect()
+            checked_out.add(extension)
+        return 'CheckedOut'
+
+    def check_in_extension(extension):
+        checked_out.discard(extension)
+        return 'CheckedIn'
+
+    arcpy.ListFeatureClasses = lambda wildcard=None, *args, **kwargs: list_datasets(wildcard, feature_classes=True)
+    arcpy.ListTables = lambda wildcard=None, *args, **kwargs: list_datasets(wildcard, feature_classes=False)
+    arcpy.ListVersions = list_versions
+    arcpy.MakeFeatureLayer_management = make_feature_layer
+    # The layers of the stub are not versioned, so changing their version returns them as they are
+    arcpy.ChangeVersion_management = lambda in_features, *args, **kwargs: in_features
+    arcpy.ClearWorkspaceCache_management = lambda *args: None
+    arcpy.Buffer_analysis = buffer_analysis
+    arcpy.CreateFeatureclass_management = create_featureclass
+    arcpy.CreateTable_management = create_table
+    arcpy.AddField_management = add_field
+    arcpy.SelectLayerByAttribute_management = select_layer_by_attribute
+    arcpy.GetCount_management = get_count
+    arcpy.Describe = describe
+    arcpy.ListFields = list_fields
+    arcpy.WriteToReviewerTable_Reviewer = write_to_reviewer_table
+    arcpy.Exists = workspace.exists
+    arcpy.Delete_management = delete
+    arcpy.GetMessages = lambda *args: ''
+    arcpy.AddMessage = arcpy.AddWarning = arcpy.AddError = lambda *args: None
+    arcpy.CheckOutExtension = check_out_extension
+    arcpy.CheckInExtension = check_in_extension
+
+    sys.modules['arcpy'] = arcpy
+    sys.modules['arcpy.da'] = da
+    return arcpy
+
+def compile_where_clause(where_clause, table):
+    """
+    Compile an SQL where_clause into a function that takes a row of `table` and returns True if the row matches.
+
+    Arguments
+    ---------
+    :param where_clause: The where_clause, e.g. "ROUTE_ID IN ('100001011') AND (TO_DATE IS NULL)"
+    :param table: The StubTable that the rows belong to
+
+    Returns
+    -------
+    :returns function: The predicate
+    :raises ValueError: Raises a ValueError if the where_clause uses SQL that the parser does not understand
+    """
+    parser = _WhereClauseParser(_tokenize(where_clause), table)
+    predicate = parser.parse_or()
+    if parser.position != len(parser.tokens):
+        raise ValueError('Unexpected {} in where_clause: {}'.format(parser.tokens[parser.position], where_clause))
+    return predicate
+
+
+_TOKEN_PATTERN = re.compile(
+    r"\s*(?:(?P<string>'(?:[^']|'')*')|(?P<number>-?\d+(?:\.\d+)?)|(?P<operator><>|!=|>=|<=|=|<|>)|"
+    r"(?P<punctuation>[(),])|(?P<word>[A-Za-z_@][A-Za-z0-9_.@]*))"
+)
+
+_ADD_FIELD_TYPES = {
+    'TEXT': 'String',
+    'LONG': 'Integer',
+    'SHORT': 'SmallInteger',
+    'DOUBLE': 'Double',
+    'FLOAT': 'Single',
+    'DATE': 'Date',
+}
+
+
+class _WhereClauseParser(object):
+    """
+    A recursive descent parser that turns where_clause tokens into nested Python predicates.
+    """
+    def __init__(self, tokens, table):
+        self.tokens = tokens
+        self.table = table
+        self.position = 0
+
+    def peek(self, offset=0):
+        if self.position + offset < len(self.tokens):
+            return self.tokens[self.position + offset]
+        return (None, None)
+
+    def keyword(self, *words):
+        kind, value = self.peek()
+        if kind == 'word' and value.upper() in words:
+            self.position += 1
+            return value.upper()
+        return None
+
+    def expect(self, value):
+        if self.peek()[1] != value:
+            raise ValueError('Expected {} but found {}'.format(value, self.peek()[1]))
+        self.position += 1
+
+    def parse_or(self):
+        predicates = [self.parse_and()]
+        while self.keyword('OR'):
+            predicates.append(self.parse_and())
+        if len(predicates) == 1:
+            return predicates[0]
+        return lambda row: any(predicate(row) for predicate in predicates)
+
+    def parse_and(self):
+        predicates = [self.parse_not()]
+        while self.keyword('AND'):
+            predicates.append(self.parse_not())
+        if len(predicates) == 1:
+            return predicates[0]
+        return lambda row: all(predicate(row) for predicate in predicates)
+
+    def parse_not(self):
+        if self.keyword('NOT'):
+            predicate = self.parse_not()
+            return lambda row: not predicate(row)
+        if self.peek()[1] == '(':
+            self.position += 1
+            predicate = self.parse_or()
+            self.expect(')')
+            return predicate
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        left = self.parse_operand()
+        binary = self.parse_collation()
+        if self.keyword('IS'):
+            negate = bool(self.keyword('NOT'))
+            if not self.keyword('NULL'):
+                raise ValueError('Expected NULL after IS')
+            return (lambda row: left(row) is not None) if negate else (lambda row: left(row) is None)
+
+        negate = bool(self.keyword('NOT'))
+        if self.keyword('IN'):
+            self.expect('(')
+            values = set()
+            while True:
+                values.add(self.parse_operand()(None))
+                if self.peek()[1] == ',':
+                    self.position += 1
+                    continue
+                break
+            self.expect(')')
+            predicate = lambda row: left(row) in values
+        elif self.keyword('LIKE'):
+            pattern = _like_pattern(self.parse_operand()(None), binary)
+            predicate = lambda row: left(row) is not None and pattern.match(str(left(row)).rstrip(' ')) is not None
+        else:
+            kind, operator = self.peek()
+            if kind != 'operator':
+                raise ValueError('Expected a comparison operator but found {}'.format(operator))
+            self.position += 1
+            right = self.parse_operand()
+            binary = self.parse_collation() or binary
+            compare = _COMPARISONS[operator]
+            predicate = lambda row: _compare(compare, left(row), right(row), binary)
+        return (lambda row: not predicate(row)) if negate else predicate
+
+    def parse_collation(self):
+        """
+        Parse an optional COLLATE clause. Returns True for a binary collation.
+        """
+        if not self.keyword('COLLATE'):
+            return False
+        kind, collation = self.peek()
+        self.position += 1
+        return '_BIN' in collation.upper()
+
+    def parse_operand(self):
+        kind, value = self.peek()
+        self.position += 1
+        if kind == 'string':
+            literal = value[1:-1].replace('\'\'', '\'')
+            return lambda row: literal
+        if kind == 'number':
+            number = float(value) if '.' in value else int(value)
+            return lambda row: number
+        if kind == 'word' and value.upper() == 'CURRENT_TIMESTAMP':
+            now = datetime.datetime.now()
+            return lambda row: now
+        if kind == 'word' and value.upper() == 'NULL':
+            return lambda row: None
+        if kind == 'word' and value.upper() in _FUNCTIONS and self.peek()[1] == '(':
+            self.position += 1
+            argument = self.parse_operand()
+            self.expect(')')
+            function = _FUNCTIONS[value.upper()]
+            return lambda row: None if argument(row) is None else function(argument(row))
+        if kind == 'word':
+            index = self.table.field_index(value.split('.')[-1])
+            return lambda row: row[index]
+        raise ValueError('Unexpected {} in where_clause'.format(value))
+
+
+_COMPARISONS = {
+    '=': lambda left, right: left == right,
+    '<>': lambda left, right: left != right,
+    '!=': lambda left, right: left != right,
+    '>': lambda left, right: left > right,
+    '<': lambda left, right: left < right,
+    '>=': lambda left, right: left >= right,
+    '<=': lambda left, right: left <= right,
+}
+
+_FUNCTIONS = {
+    # The stub's text is single byte characters, like varchar
+    'DATALENGTH': lambda value: len(str(value)),
+    'RTRIM': lambda value: str(value).rstrip(' '),
+}
+
+
+def _tokenize(where_clause):
+    """
+    Split a where_clause into (kind, value) tokens.
+    """
+    tokens = []
+    position = 0
+    where_clause = where_clause.strip()
+    while position < len(where_clause):
+        match = _TOKEN_PATTERN.match(where_clause, position)
+        if not match or match.end() == position:
+            raise ValueError('Cannot parse where_clause at: {}'.format(where_clause[position:]))
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        position = match.end()
+        while position < len(where_clause) and where_clause[position].isspace():
+            position += 1
+    return tokens
+
+def _compare(compare, left, right, binary=False):
+    """
+    Compare two values like SQL does: NULL never matches, dates compare with date strings, and text ignores trailing
+    spaces, and also case unless the comparison is `binary`.
+    """
+    if left is None or right is None:
+        return False
+    if isinstance(left, str) and isinstance(right, str):
+        left, right = left.rstrip(' '), right.rstrip(' ')
+        if not binary:
+            left, right = left.lower(), right.lower()
+    if isinstance(left, datetime.datetime) and not isinstance(right, datetime.datetime):
+        right = _parse_date(right)
+    elif isinstance(right, datetime.datetime) and not isinstance(left, datetime.datetime):
+        left = _parse_date(left)
+    try:
+        return compare(left, right)
+    except TypeError:
+        # e.g. an integer field compared with a string literal. SQL Server would convert the string
+        return compare(str(left), str(right))
+
+def _parse_date(value):
+    """
+    Parse the date strings used in where_clauses, e.g. '2020-01-28 14:31:22.435000'.
+    """
+    value = str(value)
+    for date_format, length in (('%Y-%m-%d %H:%M:%S', 19), ('%Y-%m-%d', 10)):
+        try:
+            return datetime.datetime.strptime(value[:length], date_format)
+        except ValueError:
+            continue
+    raise ValueError('Cannot compare a date with {}'.format(value))
+
+def _like_pattern(pattern, binary=False):
+    """
+    Convert an SQL LIKE pattern (with SQL Server [...] character classes) to a compiled regular expression, which
+    ignores case unless the comparison is `binary`.
+    """
+    expression = ''
+    index = 0
+    while index < len(pattern):
+        character = pattern[index]
+        if character == '%':
+            expression += '.*'
+        elif character == '_':
+            expression += '.'
+        elif character == '[':
+            end = pattern.index(']', index)
+            expression += pattern[index:end + 1]
+            index = end
+        else:
+            expression += re.escape(character)
+        index += 1
+    return re.compile('^{}$'.format(expression), re.DOTALL if binary else re.DOTALL | re.IGNORECASE)
+
+def _field_type(dtype):
+    """
+    Return the arcpy field type of a NumPy column.
+    """
+    if dtype.kind in ('S', 'U'):
+        return 'String'
+    elif dtype.kind == 'M':
+        return 'Date'
+    elif dtype.kind == 'f':
+        return 'Double'
+    return 'Integer'
+
+def _field_length(dtype):
+    """
+    Return the arcpy field length of a NumPy text column, or None.
+    """
+    if dtype.kind == 'S':
+        return dtype.itemsize
+    elif dtype.kind == 'U':
+        return dtype.itemsize // 4
+    return None
+
+def _null_to_none(value):
+    """
+    Convert the NULL sentinels of the synthetic arrays to None, the way arcpy cursors return NULL.
+    """
+    if value == '' or value == NUMPY_NULL_DATE:
+        return None
+    if isinstance(value, numbers.Integral) and not isinstance(value, bool) and value == NUMPY_NULL_INTEGER:
+        return None
+    return value
+
+def _table_to_numpy_array(workspace, dataset, fields, where_clause, null_value):
+    """
+    The stub of arcpy.da.TableToNumPyArray. NULL values are replaced with the `null_value` of their field.
+    """
+    stub_dataset = workspace.get(dataset)
+    table = stub_dataset.table if isinstance(stub_dataset, StubLayer) else stub_dataset
+    null_value = null_value or dict()
+
+    with StubCursor(workspace, dataset, fields, where_clause=where_clause) as curs:
+        rows = [
+            tuple(null_value.get(field) if value is None else value for field, value in zip(fields, row))
+            for row in curs
+        ]
+
+    dtype = []
+    for field in fields:
+        stub_field = table.fields[table.field_index(field)]
+        if stub_field.type == 'String':
+            dtype.append((field, np.dtype((str, max(stub_field.length or 1, 1)))))
+        elif stub_field.type == 'Date':
+            dtype.append((field, 'M8[us]'))
+        elif stub_field.type in ('Double', 'Single'):
+            dtype.append((field, 'f8'))
+        else:
+            dtype.append((field, 'i8'))
+    return np.array(rows, dtype=dtype)
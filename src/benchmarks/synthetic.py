@@ -0,0 +1,262 @@
+"""
+A generator of synthetic LRSN_Milepoint attribute tables for the benchmarks. The tables have the columns of
+config.SNAPSHOT_FIELDS and the extent of each route (see stub_arcpy.SHAPE_COLUMNS), with NULL values stored as the
+sentinels of `utils.milepoint_attributes_to_array`.
+
+The routes are laid out like the real network:
+- Each DOT_ID crosses 1 to `dot_id_fanout` counties, with a COUNTY_ORDER per county starting at '01'
+- Each DOT_ID/COUNTY_ORDER has one primary route (DIRECTION '0'), or two routes (DIRECTION '1' and '2') when the
+  roadway is divided
+- The ROADWAY_TYPE of each DOT_ID is drawn from `roadway_type_mix`, and its roadway level attributes are valid for it
+- A `county_order_error_rate` share of the DOT_IDs have a gap, a duplicate, or a bad start in their COUNTY_ORDER
+  sequence, and an `attribute_error_rate` share of the routes break one roadway level attribute rule
+- An `edit_fraction` share of the DOT_IDs were edited by EDITED_BY since EDITED_SINCE, and an
+  `edited_attribute_error_rate` share of their routes break one roadway level attribute rule, so the edits-only
+  scenarios have violations to commit
+- Optionally, the first DOT_ID is one large DOT_ID of `large_dot_id_routes` routes spread over its counties, like
+  the local road DOT_IDs that group thousands of routes
+
+The same arguments and seed always generate the same table.
+
+Example
+-------
+>>> rows = generate_milepoint_rows(route_count=10000, dot_id_fanout=4, seed=1)
+>>> edits = edited_rows(rows)
+"""
+import datetime
+import random
+
+import numpy as np
+
+from validation_helpers.config import NUMPY_NULL_DATE, NUMPY_NULL_INTEGER
+
+
+# The share of each ROADWAY_TYPE (1 Road, 2 Ramp, 3 Route, 5 Non-Mainline). ROADWAY_TYPE=4 stops the validations
+ROADWAY_TYPE_MIX = {1: 0.55, 2: 0.15, 3: 0.25, 5: 0.05}
+# The user whose edits the edits-only scenarios validate, and the start of their job
+EDITED_BY = 'AVITALE'
+EDITED_SINCE = datetime.datetime(2020, 1, 1)
+# The extent of the synthetic network, about the size of New York State in meters
+NETWORK_EXTENT = (0.0, 0.0, 500000.0, 400000.0)
+# The length of a county's piece of a route, in meters
+ROUTE_LENGTH = (500.0, 15000.0)
+# The DOT_ID of the large DOT_ID, whose ROUTE_IDs are numbered from LARGE_DOT_ID_FIRST_ROUTE_ID
+LARGE_DOT_ID = '100000'
+LARGE_DOT_ID_FIRST_ROUTE_ID = 900000000
+
+MILEPOINT_DTYPE = [
+    ('OBJECTID', 'i8'),
+    ('ROUTE_ID', (str, 9)),
+    ('DOT_ID', (str, 6)),
+    ('COUNTY_ORDER', (str, 2)),
+    ('DIRECTION', (str, 1)),
+    ('ROADWAY_TYPE', 'i8'),
+    ('SIGNING', 'i8'),
+    ('ROUTE_NUMBER', (str, 10)),
+    ('ROUTE_SUFFIX', (str, 5)),
+    ('ROUTE_QUALIFIER', 'i8'),
+    ('PARKWAY_FLAG', (str, 1)),
+    ('ROADWAY_FEATURE', 'i8'),
+    ('EDITED_BY', (str, 30)),
+    ('EDITED_DATE', 'M8[us]'),
+    ('FROM_DATE', 'M8[us]'),
+    ('TO_DATE', 'M8[us]'),
+    ('SHAPE_XMIN', 'f8'),
+    ('SHAPE_YMIN', 'f8'),
+    ('SHAPE_XMAX', 'f8'),
+    ('SHAPE_YMAX', 'f8'),
+]
+
+
+def generate_milepoint_rows(route_count=10000, dot_id_fanout=4, county_order_error_rate=0.01,
+                            attribute_error_rate=0.01, roadway_type_mix=ROADWAY_TYPE_MIX, divided_rate=0.3,
+                            edit_fraction=0.05, edited_attribute_error_rate=0.1, large_dot_id_routes=0, seed=0):
+    """
+    Generate a synthetic Milepoint table. See the module docstring for how the routes are laid out.
+
+    Keyword Arguments
+    -----------------
+    :param route_count: Defaults to 10000. The number of routes. The last DOT_ID is cut short to hit it exactly
+    :param dot_id_fanout: Defaults to 4. The maximum number of counties (COUNTY_ORDERs) per DOT_ID
+    :param county_order_error_rate: Defaults to 0.01. The share of DOT_IDs with an invalid COUNTY_ORDER sequence
+    :param attribute_error_rate: Defaults to 0.01. The share of routes that break a roadway level attribute rule
+    :param roadway_type_mix: Defaults to ROADWAY_TYPE_MIX. A dictionary of ROADWAY_TYPE to its share of DOT_IDs
+    :param divided_rate: Defaults to 0.3. The share of DOT_ID/COUNTY_ORDERs with two directional routes
+    :param edit_fraction: Defaults to 0.05. The share of DOT_IDs edited by EDITED_BY since EDITED_SINCE
+    :param edited_attribute_error_rate: Defaults to 0.1. The share of the routes of the edited DOT_IDs that break a
+        roadway level attribute rule, in place of the `attribute_error_rate`
+    :param large_dot_id_routes: Defaults to 0. If set, the first `large_dot_id_routes` routes (up to `route_count`)
+        all belong to LARGE_DOT_ID, with primary routes spread over its COUNTY_ORDERs. Their ROUTE_IDs are numbered
+        from LARGE_DOT_ID_FIRST_ROUTE_ID, since a DOT_ID/COUNTY_ORDER has more than one route
+    :param seed: Defaults to 0. The seed of the random number generator
+
+    Returns
+    -------
+    :returns numpy.ndarray: A structured array with the MILEPOINT_DTYPE columns
+    """
+    generator = random.Random(seed)
+    roadway_types = sorted(roadway_type_mix)
+    weights = [roadway_type_mix[roadway_type] for roadway_type in roadway_types]
+
+    rows = []
+    if large_dot_id_routes:
+        _add_large_dot_id(generator, rows, min(large_dot_id_routes, route_count), roadway_types, weights,
+                          dot_id_fanout, attribute_error_rate, edit_fraction, edited_attribute_error_rate)
+
+    dot_id_number = 100000
+    while len(rows) < route_count:
+        dot_id_number += 1
+        dot_id = str(dot_id_number)
+        roadway_type = _weighted_choice(generator, roadway_types, weights)
+        attributes = _valid_attributes(generator, roadway_type)
+        edited = generator.random() < edit_fraction
+        error_rate = edited_attribute_error_rate if edited else attribute_error_rate
+        county_orders = _county_orders(generator, dot_id_fanout, generator.random() < county_order_error_rate)
+
+        x = generator.uniform(NETWORK_EXTENT[0], NETWORK_EXTENT[2])
+        y = generator.uniform(NETWORK_EXTENT[1], NETWORK_EXTENT[3])
+        for county_order in county_orders:
+            length = generator.uniform(*ROUTE_LENGTH)
+            directions = ['1', '2'] if generator.random() < divided_rate else ['0']
+            for direction in directions:
+                if len(rows) == route_count:
+                    break
+                route_attributes = dict(attributes)
+                if generator.random() < error_rate:
+                    _break_attribute(generator, roadway_type, route_attributes)
+                rows.append((
+                    len(rows) + 1,
+                    '{}{:0>2}{}'.format(dot_id, county_order, direction)[:9],
+                    dot_id,
+                    county_order,
+                    direction,
+                    roadway_type,
+                    route_attributes['SIGNING'],
+                    route_attributes['ROUTE_NUMBER'],
+                    route_attributes['ROUTE_SUFFIX'],
+                    route_attributes['ROUTE_QUALIFIER'],
+                    route_attributes['PARKWAY_FLAG'],
+                    route_attributes['ROADWAY_FEATURE'],
+                    EDITED_BY if edited else 'SYSTEM',
+                    EDITED_SINCE + datetime.timedelta(days=generator.randint(1, 30)) if edited else
+                        EDITED_SINCE - datetime.timedelta(days=generator.randint(1, 3000)),
+                    NUMPY_NULL_DATE,
+                    NUMPY_NULL_DATE,
+                    x, y, x + length, y + length / 4.0,
+                ))
+            x += length
+
+    return np.array(rows, dtype=MILEPOINT_DTYPE)
+
+def edited_rows(rows, edited_by=EDITED_BY, edited_since=EDITED_SINCE):
+    """
+    Return the rows of a synthetic table that `edited_by` edited since `edited_since`, the routes that the
+    edits-only scenarios validate.
+    """
+    mask = (rows['EDITED_BY'] == edited_by) & (rows['EDITED_DATE'] >= np.datetime64(edited_since))
+    return rows[mask]
+
+def _weighted_choice(generator, values, weights):
+    """
+    Choose one of the `values` with the probability of its weight.
+    """
+    threshold = generator.random() * sum(weights)
+    for value, weight in zip(values, weights):
+        threshold -= weight
+        if threshold < 0:
+            return value
+    return values[-1]
+
+def _county_orders(generator, dot_id_fanout, invalid):
+    """
+    Return the COUNTY_ORDER sequence of a DOT_ID. An invalid sequence has a gap, a duplicate, or starts at '02'.
+    """
+    count = generator.randint(1, dot_id_fanout)
+    county_orders = list(range(1, count + 1))
+    if invalid:
+        error = generator.choice(['gap', 'duplicate', 'start'])
+        if error == 'gap':
+            county_orders = county_orders + [count + 2]
+        elif error == 'duplicate':
+            county_orders = county_orders + [count]
+        else:
+            county_orders = [county_order + 1 for county_order in county_orders]
+    return ['{:02d}'.format(county_order) for county_order in county_orders]
+
+def _valid_attributes(generator, roadway_type):
+    """
+    Return roadway level attributes that pass every rule for the `roadway_type`.
+    """
+    attributes = {
+        'SIGNING': NUMPY_NULL_INTEGER,
+        'ROUTE_NUMBER': '',
+        'ROUTE_SUFFIX': '',
+        'ROUTE_QUALIFIER': 10,
+        'PARKWAY_FLAG': 'F',
+        'ROADWAY_FEATURE': NUMPY_NULL_INTEGER,
+    }
+    if roadway_type == 3:
+        if generator.random() < 0.9:
+            attributes['SIGNING'] = generator.randint(1, 4)
+            attributes['ROUTE_NUMBER'] = str(generator.randint(1, 890))
+        else:
+            attributes['ROUTE_NUMBER'] = str(generator.randint(900, 999))
+        attributes['ROUTE_QUALIFIER'] = generator.choice([1, 2, 10])
+        attributes['PARKWAY_FLAG'] = generator.choice(['T', 'F'])
+    elif roadway_type == 5:
+        attributes['ROADWAY_FEATURE'] = generator.randint(1, 5)
+    return attributes
+
+def _break_attribute(generator, roadway_type, attributes):
+    """
+    Change one roadway level attribute so the route breaks a rule, or differs from the other routes of its
+    DOT_ID/COUNTY_ORDER.
+    """
+    if roadway_type in (1, 2):
+        choices = [('SIGNING', 1), ('ROUTE_NUMBER', '12'), ('ROUTE_SUFFIX', 'A'), ('PARKWAY_FLAG', 'T')]
+    elif roadway_type == 3:
+        choices = [('ROADWAY_FEATURE', 2), ('ROUTE_NUMBER', ''), ('ROUTE_SUFFIX', 'B')]
+    else:
+        choices = [('ROADWAY_FEATURE', NUMPY_NULL_INTEGER), ('ROUTE_QUALIFIER', 1), ('SIGNING', 2)]
+    field, value = generator.choice(choices)
+    attributes[field] = value
+
+def _add_large_dot_id(generator, rows, route_count, roadway_types, weights, dot_id_fanout, attribute_error_rate,
+                      edit_fraction, edited_attribute_error_rate):
+    """
+    Add the `route_count` routes of LARGE_DOT_ID to the `rows`. The routes share the roadway level attributes of the
+    DOT_ID, except for the share that break one of them (the `edited_attribute_error_rate` if the DOT_ID was edited),
+    so every COUNTY_ORDER has a majority combination and a few minority combinations.
+    """
+    roadway_type = _weighted_choice(generator, roadway_types, weights)
+    attributes = _valid_attributes(generator, roadway_type)
+    edited = generator.random() < edit_fraction
+    error_rate = edited_attribute_error_rate if edited else attribute_error_rate
+    county_orders = _county_orders(generator, dot_id_fanout, False)
+    for index in range(route_count):
+        route_attributes = dict(attributes)
+        if generator.random() < error_rate:
+            _break_attribute(generator, roadway_type, route_attributes)
+        x = generator.uniform(NETWORK_EXTENT[0], NETWORK_EXTENT[2])
+        y = generator.uniform(NETWORK_EXTENT[1], NETWORK_EXTENT[3])
+        length = generator.uniform(*ROUTE_LENGTH)
+        rows.append((
+            len(rows) + 1,
+            str(LARGE_DOT_ID_FIRST_ROUTE_ID + index),
+            LARGE_DOT_ID,
+            county_orders[index % len(county_orders)],
+            '0',
+            roadway_type,
+            route_attributes['SIGNING'],
+            route_attributes['ROUTE_NUMBER'],
+            route_attributes['ROUTE_SUFFIX'],
+            route_attributes['ROUTE_QUALIFIER'],
+            route_attributes['PARKWAY_FLAG'],
+            route_attributes['ROADWAY_FEATURE'],
+            EDITED_BY if edited else 'SYSTEM',
+            EDITED_SINCE + datetime.timedelta(days=generator.randint(1, 30)) if edited else
+                EDITED_SINCE - datetime.timedelta(days=generator.randint(1, 3000)),
+            NUMPY_NULL_DATE,
+            NUMPY_NULL_DATE,
+            x, y, x + length, y + length / 4.0,
+        ))
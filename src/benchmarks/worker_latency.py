@@ -0,0 +1,114 @@
+"""
+Compare the latency of validation jobs that each start from scratch with jobs served by a resident worker (see
+validation_helpers/worker.py), on the synthetic Milepoint table served by the stub arcpy. Run from the src directory:
+
+    python -m benchmarks.worker_latency --routes 20000 --jobs 5 --connection-latency 0.5
+
+- cold: each job runs like `python -m validation_helpers roadway` in a new process: the Data Reviewer extension is
+  checked out, the version names and Reviewer tables are looked up, and a versioned Milepoint layer is created. The
+  import of arcpy is not included, since the stub imports in no time
+- warm: the jobs are submitted to a queue directory, which a worker thread serves after warming up once
+
+The stub sleeps --connection-latency seconds for every database connection (ListVersions, MakeFeatureLayer and
+CheckOutExtension), which stands in for the SDE connection and license costs that the worker saves.
+"""
+import argparse
+import logging
+import shutil
+import sys
+import tempfile
+import threading
+import timeit
+
+from benchmarks import stub_arcpy, synthetic
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.worker_latency',
+                                     description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--routes', type=int, default=20000, help='The number of routes in the synthetic table')
+    parser.add_argument('--jobs', type=int, default=5, help='The number of jobs of each variant')
+    parser.add_argument('--connection-latency', type=float, default=0.5,
+                        help='The seconds that the stub sleeps for each database connection')
+    parser.add_argument('--seed', type=int, default=0, help='The seed of the synthetic table')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    workspace = stub_arcpy.StubWorkspace()
+    workspace.add_table('LRSN_Milepoint', synthetic.generate_milepoint_rows(route_count=args.routes, seed=args.seed))
+    workspace.add_reviewer_session(1, synthetic.EDITED_BY, 'benchmark')
+    workspace.connection_latency = args.connection_latency
+    arcpy = stub_arcpy.install(workspace)
+
+    # validation_helpers imports arcpy, so it is imported once the stub is installed
+    import validation_helpers.job_queue as job_queue
+    import validation_helpers.metadata_cache as metadata_cache
+    import validation_helpers.worker as worker
+
+    logger = logging.getLogger()
+    logger.setLevel(logging.WARNING)
+    request = {
+        'command': 'roadway',
+        'job__id': 'benchmark',
+        'job__owned_by': synthetic.EDITED_BY,
+        'job__started_date': str(synthetic.EDITED_SINCE),
+    }
+
+    cold_seconds = []
+    for _ in range(args.jobs):
+        # A new process starts with an empty metadata cache and checks the extension out and in again
+        metadata_cache.invalidate()
+        start = timeit.default_timer()
+        arcpy.CheckOutExtension('datareviewer')
+        result = worker.run_request(request, 'production.sde', 'reviewer.sde', logger=logger)
+        cold_seconds.append(timeit.default_timer() - start)
+        _check(result)
+
+    queue_dir = tempfile.mkdtemp(prefix='validation_queue_')
+    try:
+        metadata_cache.invalidate()
+        serve_thread = threading.Thread(
+            target=worker.serve,
+            args=(queue_dir, 'production.sde', 'reviewer.sde'),
+            kwargs={'poll_interval': 0.01, 'max_requests': args.jobs, 'logger': logger}
+        )
+        start = timeit.default_timer()
+        serve_thread.start()
+        # The worker warms up before it serves the first request, so the jobs are submitted once it is ready
+        job_queue.wait_for_result(queue_dir, job_queue.submit(queue_dir, request),
+                                  poll_interval=0.01)
+        warm_up_seconds = timeit.default_timer() - start
+
+        warm_seconds = []
+        for _ in range(args.jobs - 1):
+            start = timeit.default_timer()
+            result = job_queue.wait_for_result(queue_dir, job_queue.submit(queue_dir, request), poll_interval=0.01)
+            warm_seconds.append(timeit.default_timer() - start)
+            _check(result)
+        serve_thread.join()
+    finally:
+        shutil.rmtree(queue_dir, ignore_errors=True)
+
+    print('{:<30} {:>10.3f} s'.format('cold job (median)', _median(cold_seconds)))
+    print('{:<30} {:>10.3f} s'.format('worker start + first job', warm_up_seconds))
+    if warm_seconds:
+        print('{:<30} {:>10.3f} s'.format('warm job (median)', _median(warm_seconds)))
+    print('{:<30} {:>10}'.format('database connections', workspace.connections))
+    return 0
+
+def _check(result):
+    """
+    Stop the benchmark if a job failed, since its timing would not be comparable.
+    """
+    if not result or not result.get('success'):
+        raise RuntimeError('The validation job failed: {}'.format(result))
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2.0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,12 @@
+"""
+The tests run without ArcGIS. The stub arcpy of the benchmarks (see benchmarks/stub_arcpy.py) is installed before any
+test imports validation_helpers, which imports arcpy.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import stub_arcpy  # noqa: E402
+
+stub_arcpy.install(stub_arcpy.StubWorkspace())
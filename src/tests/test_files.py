@@ -0,0 +1,64 @@
+"""
+Write files through a temporary file with validation_helpers/files.py.
+"""
+import json
+import os
+
+import pytest
+
+import validation_helpers.files as files
+
+
+def test_write_json_replaces_the_file(tmpdir):
+    path = str(tmpdir.join('progress', 'run.json'))
+
+    files.write_json(path, {'completed_tiles': [1]})
+    files.write_json(path, {'completed_tiles': [1, 2]})
+
+    with open(path) as json_file:
+        assert json.load(json_file) == {'completed_tiles': [1, 2]}
+    assert os.listdir(os.path.dirname(path)) == ['run.json']
+
+def test_interrupted_write_keeps_the_old_file(tmpdir):
+    path = str(tmpdir.join('run.json'))
+    files.write_json(path, {'completed_tiles': [1]})
+
+    with pytest.raises(ValueError):
+        with files.atomic_write(path) as json_file:
+            json_file.write('{"completed_')
+            raise ValueError('interrupted')
+
+    with open(path) as json_file:
+        assert json.load(json_file) == {'completed_tiles': [1]}
+    assert os.listdir(str(tmpdir)) == ['run.json']
+
+def test_temporary_file_in_another_directory(tmpdir):
+    results_dir = tmpdir.mkdir('results')
+
+    with files.atomic_write(str(results_dir.join('result.json')), temp_dir=str(tmpdir)) as json_file:
+        json_file.write('{}')
+        # A reader of the results directory never sees the temporary file
+        assert results_dir.listdir() == []
+
+    assert [path.basename for path in results_dir.listdir()] == ['result.json']
+
+def test_lock_file_waits_for_the_holder(tmpdir):
+    lock_path = str(tmpdir.join('cache.json.lock'))
+
+    with files.lock_file(lock_path) as locked:
+        assert locked
+        # A second holder gives up after its timeout, and does not remove the lock of the first one
+        with files.lock_file(lock_path, timeout=0.1) as second_locked:
+            assert not second_locked
+        assert os.path.exists(lock_path)
+
+    assert not os.path.exists(lock_path)
+
+def test_lock_file_breaks_a_stale_lock(tmpdir):
+    lock_path = tmpdir.join('cache.json.lock')
+    lock_path.write('')
+    # Left behind by a process that stopped while it held the lock
+    lock_path.setmtime(lock_path.mtime() - 120)
+
+    with files.lock_file(str(lock_path), timeout=0.1, stale_after=60) as locked:
+        assert locked
@@ -0,0 +1,87 @@
+"""
+Overlay a job's edits on the shared routes of the base version (see validation_helpers/job_batch.py), and compare the
+result with validating the job's version as a whole, on the synthetic Milepoint table.
+"""
+import datetime
+
+import numpy as np
+import pytest
+
+import validation_helpers.job_batch as job_batch
+import validation_helpers.snapshot as snapshot
+import validation_helpers.validations as validations
+from benchmarks import synthetic
+
+
+@pytest.fixture(scope='module')
+def job():
+    """
+    The base version, and a job's version of it: the job's edited rows, with a COUNTY_ORDER changed, a route retired
+    by its TO_DATE, and a new route added to an edited DOT_ID.
+    """
+    base_rows = synthetic.generate_milepoint_rows(route_count=3000, seed=6)
+    edit_rows = synthetic.edited_rows(base_rows).copy()
+    edit_rows['COUNTY_ORDER'][0] = '07'
+    edit_rows['TO_DATE'][1] = np.datetime64(datetime.datetime.now() - datetime.timedelta(days=1))
+    new_route = edit_rows[2:3].copy()
+    new_route['OBJECTID'] = base_rows['OBJECTID'].max() + 1
+    new_route['ROUTE_ID'] = '999999999'
+    edit_rows = np.concatenate([edit_rows, new_route])
+
+    version_rows = np.concatenate([
+        base_rows[~np.isin(base_rows['OBJECTID'], edit_rows['OBJECTID'])],
+        edit_rows,
+    ])
+    return base_rows, edit_rows, snapshot.active_milepoint_rows(version_rows)
+
+def sorted_dot_id_routes(dot_id_routes):
+    return dict(
+        (dot_id, dict((county_order, sorted(routes)) for county_order, routes in county_orders.items()))
+        for dot_id, county_orders in dot_id_routes.items()
+    )
+
+def sorted_violations(violations):
+    return dict((rule, sorted(route_ids)) for rule, route_ids in violations.items())
+
+
+def test_job_dot_id_routes_match_the_version(job):
+    base_rows, edit_rows, version_rows = job
+    active_edit_rows = snapshot.active_milepoint_rows(edit_rows)
+    dot_ids = set(active_edit_rows['DOT_ID'].tolist())
+
+    dot_id_routes = job_batch.job_dot_id_routes(
+        job_batch.build_shared_routes(snapshot.active_milepoint_rows(base_rows)),
+        edit_rows,
+        active_edit_rows,
+        dot_ids
+    )
+
+    expected = validations.build_dot_id_routes(version_rows[np.isin(version_rows['DOT_ID'], list(dot_ids))])
+    assert sorted_dot_id_routes(dot_id_routes) == sorted_dot_id_routes(expected)
+    # The retired route is gone, and the new route is there
+    routes = [route for county_orders in dot_id_routes.values() for entries in county_orders.values()
+              for route in entries]
+    assert not any(route.startswith(edit_rows['ROUTE_ID'][1] + ':') for route in routes)
+    assert any(route.startswith('999999999:') for route in routes)
+
+def test_job_violations_match_the_version(job):
+    base_rows, edit_rows, version_rows = job
+    active_edit_rows = snapshot.active_milepoint_rows(edit_rows)
+
+    route_count, violations = job_batch.job_roadway_level_violations(
+        job_batch.build_shared_routes(snapshot.active_milepoint_rows(base_rows)),
+        edit_rows
+    )
+
+    # The edited routes are validated with the COUNTY_ORDER sequences of their DOT_IDs in the whole version
+    expected = validations.validate_by_roadway_type_vectorized(active_edit_rows)
+    validations.add_county_order_verdicts(
+        expected,
+        active_edit_rows,
+        validations.precompute_county_order_verdicts(validations.build_dot_id_routes(version_rows))
+    )
+    assert route_count == len(edit_rows) - 1
+    assert sorted_violations(violations) == sorted_violations(expected)
+    # The changed COUNTY_ORDER breaks the sequence of its DOT_ID
+    assert any(edit_rows['ROUTE_ID'][0] in route_ids for rule, route_ids in violations.items()
+               if 'COUNTY_ORDER' in rule)
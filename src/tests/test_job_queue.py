@@ -0,0 +1,182 @@
+"""
+Drive the request queue of the resident worker (see validation_helpers/job_queue.py) through submit, claim, complete
+and requeue, and serve requests with worker.serve on the synthetic Milepoint table of the stub arcpy.
+"""
+import json
+import logging
+import os
+import time
+
+import arcpy
+import pytest
+
+import validation_helpers.job_queue as job_queue
+import validation_helpers.metadata_cache as metadata_cache
+import validation_helpers.worker as worker
+from benchmarks import synthetic
+
+
+REQUEST = {
+    'command': 'roadway',
+    'job__id': 'test',
+    'job__owned_by': synthetic.EDITED_BY,
+    'job__started_date': str(synthetic.EDITED_SINCE),
+}
+
+
+@pytest.fixture
+def queue_dir(tmpdir):
+    return str(tmpdir.join('queue'))
+
+@pytest.fixture
+def milepoint():
+    """
+    Serve a small synthetic Milepoint table and a Reviewer session through the stub arcpy.
+    """
+    workspace = arcpy.workspace
+    workspace.add_table('LRSN_Milepoint', synthetic.generate_milepoint_rows(route_count=500, seed=1))
+    workspace.add_reviewer_session(1, synthetic.EDITED_BY, 'test')
+    metadata_cache.invalidate()
+    yield workspace
+    workspace.datasets.clear()
+    metadata_cache.invalidate()
+
+def expire_lease(queue_dir, worker_id, seconds):
+    """
+    Set the last heartbeat of a worker `seconds` into the past.
+    """
+    lease_path = os.path.join(queue_dir, job_queue.PROCESSING, worker_id, job_queue.LEASE_FILE)
+    lease_time = os.path.getmtime(lease_path) - seconds
+    os.utime(lease_path, (lease_time, lease_time))
+
+def incoming_files(queue_dir):
+    return sorted(os.listdir(os.path.join(queue_dir, job_queue.INCOMING)))
+
+
+def test_submit_claim_complete(queue_dir):
+    request_id = job_queue.submit(queue_dir, REQUEST)
+    worker_id, _ = job_queue.register_worker(queue_dir)
+
+    claimed_path, request = job_queue.claim_next(queue_dir, worker_id)
+    assert request['request_id'] == request_id
+    assert os.path.dirname(claimed_path) == os.path.join(queue_dir, job_queue.PROCESSING, worker_id)
+    assert incoming_files(queue_dir) == []
+    assert job_queue.claim_next(queue_dir, worker_id) is None
+    assert job_queue.read_result(queue_dir, request_id) is None
+
+    job_queue.complete(queue_dir, claimed_path, {'request_id': request_id, 'success': True})
+    assert job_queue.read_result(queue_dir, request_id) == {'request_id': request_id, 'success': True}
+    assert not os.path.exists(claimed_path)
+
+def test_requeue_moves_only_expired_leases(queue_dir):
+    live_request_id = job_queue.submit(queue_dir, dict(REQUEST, request_id='live'))
+    dead_request_id = job_queue.submit(queue_dir, dict(REQUEST, request_id='dead'))
+    live_worker, _ = job_queue.register_worker(queue_dir)
+    dead_worker, _ = job_queue.register_worker(queue_dir)
+    live_path, _ = job_queue.claim_next(queue_dir, live_worker)
+    dead_path, _ = job_queue.claim_next(queue_dir, dead_worker)
+    expire_lease(queue_dir, dead_worker, 600)
+
+    now = job_queue.heartbeat(queue_dir, live_worker)
+    assert job_queue.requeue_expired(queue_dir, 120, now=now) == 1
+
+    assert os.path.exists(live_path)
+    assert not os.path.exists(os.path.join(queue_dir, job_queue.PROCESSING, dead_worker))
+    assert [name.endswith('_{}.json'.format(dead_request_id)) for name in incoming_files(queue_dir)] == [True]
+    # The requeued request can be claimed again, and the live worker's request stays where it is
+    claimed_path, request = job_queue.claim_next(queue_dir, live_worker)
+    assert request['request_id'] == dead_request_id
+    assert job_queue.requeue_expired(queue_dir, 120, now=job_queue.heartbeat(queue_dir, live_worker)) == 0
+    with open(live_path) as live_file:
+        assert json.load(live_file)['request_id'] == live_request_id
+
+def test_release_worker_requeues_unfinished_requests(queue_dir):
+    job_queue.submit(queue_dir, REQUEST)
+    worker_id, _ = job_queue.register_worker(queue_dir)
+    job_queue.claim_next(queue_dir, worker_id)
+
+    assert job_queue.release_worker(queue_dir, worker_id) == 1
+    assert len(incoming_files(queue_dir)) == 1
+    assert not os.path.exists(os.path.join(queue_dir, job_queue.PROCESSING, worker_id))
+
+def test_requeued_worker_loses_its_lease(queue_dir):
+    request_id = job_queue.submit(queue_dir, REQUEST)
+    slow_worker, _ = job_queue.register_worker(queue_dir)
+    other_worker, _ = job_queue.register_worker(queue_dir)
+    claimed_path, _ = job_queue.claim_next(queue_dir, slow_worker)
+    expire_lease(queue_dir, slow_worker, 600)
+    assert job_queue.requeue_expired(queue_dir, 120, now=job_queue.heartbeat(queue_dir, other_worker)) == 1
+
+    with pytest.raises(job_queue.LeaseLostError):
+        job_queue.heartbeat(queue_dir, slow_worker)
+    # The request runs again elsewhere, so the slow worker's result is not written
+    assert not job_queue.complete(queue_dir, claimed_path, {'request_id': request_id, 'success': True})
+    assert job_queue.read_result(queue_dir, request_id) is None
+    assert job_queue.release_worker(queue_dir, slow_worker) == 0
+    assert len(incoming_files(queue_dir)) == 1
+
+def test_keep_alive_renews_the_lease(queue_dir):
+    worker_id, _ = job_queue.register_worker(queue_dir)
+    expire_lease(queue_dir, worker_id, 600)
+    with job_queue.keep_alive(queue_dir, worker_id, 0.01):
+        time.sleep(0.1)
+    assert job_queue.requeue_expired(queue_dir, 120) == 0
+    assert os.path.isdir(os.path.join(queue_dir, job_queue.PROCESSING, worker_id))
+
+def test_stop_only_stops_workers_that_started_before_it(queue_dir):
+    job_queue.request_stop(queue_dir)
+    stop_path = os.path.join(queue_dir, job_queue.STOP_FILE)
+    _, started = job_queue.register_worker(queue_dir)
+    os.utime(stop_path, (started - 60, started - 60))
+
+    assert not job_queue.stop_requested(queue_dir, since=started)
+    assert job_queue.stop_requested(queue_dir)
+    assert os.path.exists(stop_path)
+
+    job_queue.request_stop(queue_dir)
+    os.utime(stop_path, (started + 1, started + 1))
+    assert job_queue.stop_requested(queue_dir, since=started)
+
+def test_worker_serves_new_and_requeued_requests(queue_dir, milepoint):
+    # A stop requested before the worker starts, and a request left behind by a worker that died
+    job_queue.request_stop(queue_dir)
+    stop_path = os.path.join(queue_dir, job_queue.STOP_FILE)
+    os.utime(stop_path, (time.time() - 60, time.time() - 60))
+    dead_request_id = job_queue.submit(queue_dir, REQUEST)
+    dead_worker, _ = job_queue.register_worker(queue_dir)
+    job_queue.claim_next(queue_dir, dead_worker)
+    expire_lease(queue_dir, dead_worker, 600)
+    request_id = job_queue.submit(queue_dir, REQUEST)
+
+    logger = logging.getLogger('test_job_queue')
+    completed = worker.serve(queue_dir, 'production.sde', 'reviewer.sde', poll_interval=0.01, max_requests=2,
+                             heartbeat_interval=0.05, lease_timeout=120, logger=logger)
+
+    assert completed == 2
+    for served_id in (dead_request_id, request_id):
+        result = job_queue.read_result(queue_dir, served_id)
+        assert result['success'], result['error']
+        assert result['command'] == 'roadway'
+    assert os.path.exists(stop_path)
+    assert os.listdir(os.path.join(queue_dir, job_queue.PROCESSING)) == []
+
+def test_worker_stops_when_its_lease_is_requeued(queue_dir, milepoint, monkeypatch):
+    request_id = job_queue.submit(queue_dir, REQUEST)
+    other_worker, _ = job_queue.register_worker(queue_dir)
+
+    def slow_request(request, *args, **kwargs):
+        # The worker stalls for longer than the lease timeout, and another worker requeues its request
+        serving_worker = [worker_id for worker_id in os.listdir(os.path.join(queue_dir, job_queue.PROCESSING))
+                          if worker_id != other_worker][0]
+        expire_lease(queue_dir, serving_worker, 600)
+        job_queue.requeue_expired(queue_dir, 120, now=job_queue.heartbeat(queue_dir, other_worker))
+        return {'request_id': request['request_id'], 'success': True}
+    monkeypatch.setattr(worker, 'serve_request', slow_request)
+
+    completed = worker.serve(queue_dir, 'production.sde', 'reviewer.sde', poll_interval=0.01, max_requests=1,
+                             heartbeat_interval=0.05, lease_timeout=120)
+
+    assert completed == 0
+    assert job_queue.read_result(queue_dir, request_id) is None
+    assert [name.endswith('_{}.json'.format(request_id)) for name in incoming_files(queue_dir)] == [True]
+    assert os.listdir(os.path.join(queue_dir, job_queue.PROCESSING)) == [other_worker]
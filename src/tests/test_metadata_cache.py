@@ -0,0 +1,27 @@
+"""
+Share cached metadata between processes through the disk cache of validation_helpers/metadata_cache.py.
+"""
+import threading
+
+import validation_helpers.metadata_cache as metadata_cache
+
+
+def test_concurrent_writers_merge_their_values_into_the_disk_cache(tmpdir):
+    cache_path = str(tmpdir.join('metadata_cache.json'))
+    keys = [('state_id', 'workspace_{}'.format(index)) for index in range(80)]
+
+    def cache_values(writer_keys):
+        for key in writer_keys:
+            metadata_cache.get(key, lambda: 10, cache_path=cache_path)
+
+    # Writers that read the disk cache while the others write it, like the worker processes of parallel.py
+    writers = [threading.Thread(target=cache_values, args=(keys[index::8],)) for index in range(8)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    assert sorted(metadata_cache._read_disk_cache(cache_path)) == sorted(
+        metadata_cache._encode_key(key) for key in keys
+    )
+    metadata_cache.invalidate(cache_path=cache_path)
@@ -0,0 +1,189 @@
+"""
+Check that the roadway level attribute rules return exactly what the original row by row validation returned. The
+original `validate_by_roadway_type` (before the rules moved to rules.py) is frozen in benchmarks/baseline.py, and is
+compared with both entry points of validations.py on random routes, with NULL values as Python None (as read by a
+cursor) and as the sentinels of utils.milepoint_attributes_to_array. The SQL form of the rules is compared with the
+vectorized form on the stub arcpy, which compares text like the default collation of SQL Server.
+"""
+from collections import defaultdict
+import random
+
+import arcpy
+import numpy as np
+import pytest
+
+import validation_helpers.rules as rules
+import validation_helpers.validations as validations
+from benchmarks import stub_arcpy
+from benchmarks.baseline import validate_by_roadway_type as baseline_validate_by_roadway_type
+from validation_helpers.config import NUMPY_NULL_INTEGER
+
+
+ATTRIBUTE_FIELDS = [
+    'ROUTE_ID', 'DOT_ID', 'COUNTY_ORDER', 'SIGNING', 'ROUTE_NUMBER',
+    'ROUTE_SUFFIX', 'ROUTE_QUALIFIER', 'PARKWAY_FLAG', 'ROADWAY_FEATURE',
+]
+
+# The values each field is drawn from. None is NULL
+FIELD_VALUES = {
+    'ROADWAY_TYPE': [1, 2, 3, 5],
+    'DOT_ID': ['123456', '12345', '1234567', 'ABCDEF', '', None],
+    'COUNTY_ORDER': ['01', '00', '12', '28', '29', '99', '1', 'AB', '', None],
+    'SIGNING': [1, 2, 3, 0, None],
+    'ROUTE_NUMBER': ['87', '901', '999', '9', '9AB', '1000', '', None],
+    'ROUTE_SUFFIX': ['A', 'BUS', '', None],
+    'ROUTE_QUALIFIER': [10, 1, 5, 0, None],
+    'PARKWAY_FLAG': ['T', 'F', '', None],
+    'ROADWAY_FEATURE': [1, 3, 0, None],
+}
+
+SENTINEL_DTYPE = [
+    ('ROADWAY_TYPE', 'i8'),
+    ('ROUTE_ID', (str, 9)),
+    ('DOT_ID', (str, 7)),
+    ('COUNTY_ORDER', (str, 2)),
+    ('SIGNING', 'i8'),
+    ('ROUTE_NUMBER', (str, 10)),
+    ('ROUTE_SUFFIX', (str, 5)),
+    ('ROUTE_QUALIFIER', 'i8'),
+    ('PARKWAY_FLAG', (str, 1)),
+    ('ROADWAY_FEATURE', 'i8'),
+]
+
+
+def random_routes(route_count, seed):
+    """
+    Return `route_count` random routes as dictionaries, with None for NULL. Every ROUTE_ID is unique, and about one
+    in five is not a nine digit number.
+    """
+    generator = random.Random(seed)
+    routes = []
+    for index in range(route_count):
+        route = dict((field, generator.choice(values)) for field, values in FIELD_VALUES.items())
+        route_id_format = generator.choice(['{:09d}', '{:09d}', '{:09d}', '{:09d}', '{:08d}', 'R{:08d}'])
+        route['ROUTE_ID'] = route_id_format.format(index + 1)
+        routes.append(route)
+    return routes
+
+def baseline_violations(routes):
+    """
+    Merge the violations of the baseline row by row validation of each route, in route order.
+    """
+    violations = defaultdict(list)
+    for route in routes:
+        attributes = [route[field] for field in ATTRIBUTE_FIELDS]
+        for rule, route_ids in baseline_validate_by_roadway_type(route['ROADWAY_TYPE'], attributes).items():
+            violations[rule].extend(route_ids)
+    return dict(violations)
+
+def sentinel_array(routes):
+    """
+    Return the `routes` as a structured array, with NULL text as '' and NULL numbers as config.NUMPY_NULL_INTEGER,
+    as utils.milepoint_attributes_to_array reads them.
+    """
+    rows = []
+    for route in routes:
+        row = []
+        for field, dtype in SENTINEL_DTYPE:
+            value = route[field]
+            if value is None:
+                value = NUMPY_NULL_INTEGER if dtype == 'i8' else ''
+            row.append(value)
+        rows.append(tuple(row))
+    return np.array(rows, dtype=SENTINEL_DTYPE)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_row_by_row_matches_baseline(seed):
+    routes = random_routes(2000, seed)
+    violations = defaultdict(list)
+    for route in routes:
+        attributes = [route[field] for field in ATTRIBUTE_FIELDS]
+        for rule, route_ids in validations.validate_by_roadway_type(route['ROADWAY_TYPE'], attributes).items():
+            violations[rule].extend(route_ids)
+    assert dict(violations) == baseline_violations(routes)
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_vectorized_with_sentinels_matches_baseline(seed):
+    routes = random_routes(2000, seed)
+    violations = validations.validate_by_roadway_type_vectorized(sentinel_array(routes))
+    assert dict(violations) == baseline_violations(routes)
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_vectorized_with_none_matches_baseline(seed):
+    routes = random_routes(2000, seed)
+    columns = dict((field, [route[field] for route in routes]) for field, _ in SENTINEL_DTYPE)
+    violations = validations.validate_by_roadway_type_vectorized(columns)
+    assert dict(violations) == baseline_violations(routes)
+
+@pytest.mark.parametrize('roadway_type', [4, 0, 6, None])
+def test_invalid_roadway_type_raises_like_baseline(roadway_type):
+    attributes = ['123456789', '123456', '01', None, None, None, 10, None, None]
+    with pytest.raises(AttributeError):
+        baseline_validate_by_roadway_type(roadway_type, attributes)
+    with pytest.raises(AttributeError):
+        validations.validate_by_roadway_type(roadway_type, attributes)
+
+    routes = random_routes(10, 0)
+    routes[5]['ROADWAY_TYPE'] = roadway_type
+    columns = dict((field, [route[field] for route in routes]) for field, _ in SENTINEL_DTYPE)
+    with pytest.raises(AttributeError):
+        validations.validate_by_roadway_type_vectorized(columns)
+
+# Text values that SQL Server's default collation compares differently from Python: other cases, and trailing spaces
+SQL_FIELD_VALUES = dict(FIELD_VALUES, **{
+    'DOT_ID': FIELD_VALUES['DOT_ID'] + ['123456 ', ' 123456'],
+    'COUNTY_ORDER': FIELD_VALUES['COUNTY_ORDER'] + ['28 ', '00 ', '1 ', ' '],
+    'ROUTE_NUMBER': FIELD_VALUES['ROUTE_NUMBER'] + ['901 ', ' ', '9ab'],
+    'ROUTE_SUFFIX': FIELD_VALUES['ROUTE_SUFFIX'] + [' ', 'a '],
+    'PARKWAY_FLAG': FIELD_VALUES['PARKWAY_FLAG'] + ['t', 'T ', ' '],
+})
+
+SQL_DTYPE = [(field, (str, 12)) if dtype != 'i8' else (field, dtype) for field, dtype in SENTINEL_DTYPE]
+
+
+@pytest.fixture
+def sql_routes():
+    generator = random.Random(5)
+    routes = []
+    for index in range(3000):
+        route = dict((field, generator.choice(values)) for field, values in SQL_FIELD_VALUES.items())
+        route['ROUTE_ID'] = generator.choice(['{:09d}', '{:09d}', '{:09d} ', 'R{:08d}']).format(index + 1)
+        routes.append(route)
+    rows = np.array([tuple(
+        (NUMPY_NULL_INTEGER if dtype == 'i8' else '') if route[field] is None else route[field]
+        for field, dtype in SQL_DTYPE
+    ) for route in routes], dtype=SQL_DTYPE)
+    yield rows, arcpy.workspace.add_table('LRSN_Milepoint', rows)
+    arcpy.workspace.datasets.clear()
+
+def test_sql_where_clauses_match_vectorized(sql_routes):
+    rows, table = sql_routes
+    violations = rules.evaluate(rows)
+
+    for rule in rules.ROADWAY_LEVEL_RULES:
+        predicate = stub_arcpy.compile_where_clause(rules.rule_where_clause(rule), table)
+        route_ids = [row[table.field_index('ROUTE_ID')] for row in table.rows if predicate(row)]
+        assert route_ids == violations.get(rule.description, []), rule.rule_id
+
+    predicate = stub_arcpy.compile_where_clause(rules.violations_where_clause(), table)
+    assert sum(1 for row in table.rows if predicate(row)) == len(set(
+        route_id for route_ids in violations.values() for route_id in route_ids))
+
+def test_sql_compares_text_exactly(sql_routes):
+    rows, table = sql_routes
+
+    def sql_matches(condition, value):
+        where_clause = rules.rule_where_clause(rules.Rule('test', 'test', None, condition))
+        predicate = stub_arcpy.compile_where_clause(where_clause, table)
+        row = list(table.rows[0])
+        row[table.field_index(condition[1])] = value
+        return predicate(tuple(row))
+
+    assert sql_matches(rules.equals('PARKWAY_FLAG', 'T'), 'T')
+    assert not sql_matches(rules.equals('PARKWAY_FLAG', 'T'), 't')
+    assert not sql_matches(rules.equals('PARKWAY_FLAG', 'T'), 'T ')
+    assert sql_matches(rules.is_set('ROUTE_SUFFIX'), ' ')
+    assert not sql_matches(rules.digits('ROUTE_ID', 9), '123456789 ')
+    assert sql_matches(rules.greater_than('COUNTY_ORDER', '28'), '28 ')
+    assert not sql_matches(rules.greater_than('COUNTY_ORDER', '28'), '28')
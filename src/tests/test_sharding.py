@@ -0,0 +1,77 @@
+"""
+Split the routes into shards of DOT_IDs and merge their violations (see validation_helpers/sharding.py), and compare
+the sharded roadway level validation with the unsharded one on the synthetic Milepoint table.
+"""
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+import validation_helpers.sharding as sharding
+import validation_helpers.validations as validations
+from benchmarks import synthetic
+from validation_helpers.config import ROADWAY_ATTRIBUTE_FIELDS
+
+
+@pytest.fixture(scope='module')
+def milepoint_rows():
+    rows = synthetic.generate_milepoint_rows(route_count=3000, county_order_error_rate=0.05, seed=4)
+    return rows[ROADWAY_ATTRIBUTE_FIELDS]
+
+def shard_dot_ids(shards):
+    return [sorted(set(shard['DOT_ID'].tolist())) for shard in shards]
+
+def sorted_violations(violations):
+    return dict((rule, sorted(route_ids)) for rule, route_ids in violations.items())
+
+
+def test_every_route_of_a_dot_id_is_in_one_shard(milepoint_rows):
+    shards = sharding.shard_rows(milepoint_rows, 'DOT_ID', 4)
+
+    assert len(shards) == 4
+    assert sum(len(shard) for shard in shards) == len(milepoint_rows)
+    dot_ids = [dot_id for shard_dot_ids in shard_dot_ids(shards) for dot_id in shard_dot_ids]
+    assert len(dot_ids) == len(set(dot_ids)) == len(set(milepoint_rows['DOT_ID'].tolist()))
+    for shard in shards:
+        # The routes of a shard keep their original order
+        positions = [milepoint_rows['ROUTE_ID'].tolist().index(route_id) for route_id in shard['ROUTE_ID'][:50]]
+        assert positions == sorted(positions)
+
+def test_shards_only_depend_on_the_rows_and_the_shard_count(milepoint_rows):
+    shuffled = milepoint_rows[np.random.RandomState(0).permutation(len(milepoint_rows))]
+
+    assert shard_dot_ids(sharding.shard_rows(shuffled, 'DOT_ID', 4)) == \
+        shard_dot_ids(sharding.shard_rows(milepoint_rows, 'DOT_ID', 4))
+    assert shard_dot_ids(sharding.shard_rows(milepoint_rows, 'DOT_ID', 4)) != \
+        shard_dot_ids(sharding.shard_rows(milepoint_rows, 'DOT_ID', 3))
+
+def test_shard_count_is_limited_by_the_keys(milepoint_rows):
+    rows = milepoint_rows[np.isin(milepoint_rows['DOT_ID'], milepoint_rows['DOT_ID'][:1])]
+
+    assert len(sharding.shard_rows(rows, 'DOT_ID', 4)) == 1
+    assert len(sharding.shard_rows(milepoint_rows, 'DOT_ID', 1)) == 1
+    assert len(sharding.shard_rows(milepoint_rows[:0], 'DOT_ID', 4)) == 1
+
+def test_merge_violations_keeps_the_shard_order():
+    shard_violations = [
+        {'SIGNING must be null': ['3', '1'], 'ROUTE_NUMBER must be null': ['2']},
+        defaultdict(list),
+        {'ROUTE_NUMBER must be null': ['9', '4'], 'SIGNING must be null': ['5']},
+    ]
+
+    assert sharding.merge_violations(shard_violations) == {
+        'SIGNING must be null': ['3', '1', '5'],
+        'ROUTE_NUMBER must be null': ['2', '9', '4'],
+    }
+
+@pytest.mark.parametrize('shard_count', [2, 5])
+def test_sharded_violations_match_unsharded(milepoint_rows, shard_count):
+    unsharded = validations.roadway_level_violations(milepoint_rows)
+    sharded = validations.roadway_level_violations_sharded(milepoint_rows, shard_count, processes=1)
+
+    # The same rule/ROUTE_ID pairs, grouped by shard rather than in row order
+    assert sorted_violations(sharded) == sorted_violations(unsharded)
+    # The COUNTY_ORDER sequences are validated within the shards
+    assert 'COUNTY_ORDER must increment by a value of 1 for this DOT_ID' in unsharded
+    # Sharding the same rows again returns the same lists, in the same order
+    assert validations.roadway_level_violations_sharded(milepoint_rows, shard_count, processes=1) == sharded
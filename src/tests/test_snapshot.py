@@ -0,0 +1,143 @@
+"""
+Build, reuse and refresh the local Milepoint snapshot (see validation_helpers/snapshot.py) with in-memory stand-ins for
+the versioned Milepoint layer of the SDE database.
+"""
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+import validation_helpers.snapshot as snapshot
+from benchmarks import synthetic
+
+
+VERSION = '"SVC\\AVITALE".HDS_GENERAL_EDITING_JOB_1234'
+NOW = datetime.datetime(2020, 6, 1)
+
+
+class StandInVersion(object):
+    """
+    The rows of a database version, with the read callables of `load_milepoint_snapshot`, counting their calls.
+    """
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = {'source': 0, 'keys': 0, 'delta': []}
+
+    def read_source(self):
+        self.calls['source'] += 1
+        return self.rows.copy()
+
+    def read_keys(self):
+        self.calls['keys'] += 1
+        return self.rows[['OBJECTID', 'EDITED_DATE']]
+
+    def read_delta(self, object_ids):
+        self.calls['delta'].append(sorted(object_ids))
+        return self.rows[np.isin(self.rows['OBJECTID'], object_ids)]
+
+    def load(self, cache_dir, state_id, now=NOW):
+        return snapshot.load_milepoint_snapshot(
+            cache_dir,
+            VERSION,
+            state_id,
+            self.read_source,
+            read_keys=self.read_keys,
+            read_delta=self.read_delta,
+            now=now
+        )
+
+
+@pytest.fixture
+def version():
+    return StandInVersion(synthetic.generate_milepoint_rows(route_count=300, seed=3))
+
+@pytest.fixture
+def cache_dir(tmpdir):
+    return str(tmpdir.join('snapshots'))
+
+def snapshot_files(cache_dir):
+    return sorted(filename for filename in os.listdir(cache_dir) if filename.endswith('.npy'))
+
+
+def test_first_build_reads_the_source_once(version, cache_dir):
+    rows = version.load(cache_dir, 10)
+
+    assert isinstance(rows, np.memmap)
+    assert np.array_equal(rows, version.rows)
+    assert version.calls == {'source': 1, 'keys': 0, 'delta': []}
+    assert snapshot_files(cache_dir) == [os.path.basename(snapshot.snapshot_path(cache_dir, VERSION, 10))]
+    assert snapshot.read_metadata(cache_dir, VERSION)['state_id'] == 10
+
+def test_same_state_memory_maps_the_snapshot(version, cache_dir):
+    version.load(cache_dir, 10)
+    rows = version.load(cache_dir, 10)
+
+    assert isinstance(rows, np.memmap)
+    assert np.array_equal(rows, version.rows)
+    # Nothing is read from the database the second time
+    assert version.calls == {'source': 1, 'keys': 0, 'delta': []}
+
+def test_refresh_rereads_new_and_edited_rows_and_drops_missing_ones(version, cache_dir):
+    version.load(cache_dir, 10)
+    rows = version.rows.copy()
+    edited, retired, deleted = rows['OBJECTID'][:3].tolist()
+
+    # An edited row, a row retired by its TO_DATE, and a deleted row
+    rows['ROUTE_NUMBER'][0] = '999'
+    rows['EDITED_DATE'][0] = np.datetime64(NOW)
+    rows['TO_DATE'][1] = np.datetime64(NOW - datetime.timedelta(days=1))
+    rows['EDITED_DATE'][1] = np.datetime64(NOW)
+    rows = rows[rows['OBJECTID'] != deleted]
+    # A row posted from a child version, whose EDITED_DATE is older than every date in the snapshot
+    posted = rows[:1].copy()
+    posted['OBJECTID'] = rows['OBJECTID'].max() + 1
+    posted['EDITED_DATE'] = np.datetime64(datetime.datetime(2000, 1, 1))
+    version.rows = np.concatenate([rows, posted])
+
+    refreshed = version.load(cache_dir, 11)
+
+    assert version.calls['source'] == 1
+    assert version.calls['delta'] == [sorted([edited, retired, int(posted['OBJECTID'][0])])]
+    object_ids = refreshed['OBJECTID'].tolist()
+    assert retired not in object_ids
+    assert deleted not in object_ids
+    assert int(posted['OBJECTID'][0]) in object_ids
+    assert refreshed['ROUTE_NUMBER'][object_ids.index(edited)] == '999'
+    assert len(refreshed) == len(version.rows) - 1
+    # The snapshot of the previous state is removed
+    assert snapshot_files(cache_dir) == [os.path.basename(snapshot.snapshot_path(cache_dir, VERSION, 11))]
+
+def test_unchanged_rows_still_read_the_columns(version, cache_dir):
+    version.load(cache_dir, 10)
+    refreshed = version.load(cache_dir, 11)
+
+    assert version.calls['delta'] == [[]]
+    assert np.array_equal(refreshed, version.rows)
+
+def test_changed_columns_rebuild_the_snapshot(version, cache_dir):
+    version.load(cache_dir, 10)
+    rows = np.zeros(len(version.rows), dtype=version.rows.dtype.descr + [('NEW_FIELD', 'i8')])
+    for name in version.rows.dtype.names:
+        rows[name] = version.rows[name]
+    version.rows = rows
+
+    rebuilt = version.load(cache_dir, 11)
+
+    assert version.calls['source'] == 2
+    assert 'NEW_FIELD' in rebuilt.dtype.names
+
+def test_old_snapshots_are_rebuilt_from_a_full_read(version, cache_dir):
+    version.load(cache_dir, 10)
+    version.load(cache_dir, 11, now=NOW + datetime.timedelta(days=snapshot.SNAPSHOT_FULL_REFRESH_DAYS + 1))
+
+    assert version.calls == {'source': 2, 'keys': 0, 'delta': []}
+
+def test_remove_stale_snapshots_keeps_other_versions(version, cache_dir):
+    version.load(cache_dir, 10)
+    keep = snapshot.save_snapshot(version.rows, snapshot.snapshot_path(cache_dir, VERSION, 12))
+    other = snapshot.save_snapshot(version.rows, snapshot.snapshot_path(cache_dir, 'ELRS.Lockroot', 10))
+
+    snapshot.remove_stale_snapshots(cache_dir, VERSION, keep=keep)
+
+    assert snapshot_files(cache_dir) == sorted([os.path.basename(keep), os.path.basename(other)])
@@ -0,0 +1,67 @@
+"""
+Cluster the edit extents and find the duplicate Reviewer records of a tiled batch job (see
+validation_helpers/tiling.py).
+"""
+import validation_helpers.tiling as tiling
+
+
+def test_cluster_extents_links_chains_of_near_extents():
+    extents = [
+        (0, 0, 10, 10),
+        # Within 5 of the first extent
+        (14, 0, 20, 10),
+        # Within 5 of the second extent only, so in the same cluster through it
+        (24, 0, 30, 10),
+        # Far to the right
+        (100, 0, 110, 10),
+        # Overlaps the first extent on the x axis, but far above it
+        (0, 100, 10, 110),
+    ]
+
+    assert tiling.cluster_extents(extents, 5) == [[0, 1, 2], [3], [4]]
+    assert tiling.cluster_extents(extents, 3) == [[0], [1], [2], [3], [4]]
+    assert tiling.cluster_extents(extents, 100) == [[0, 1, 2, 3, 4]]
+
+def test_cluster_extents_does_not_depend_on_the_order_of_the_extents():
+    extents = [(100, 0, 110, 10), (24, 0, 30, 10), (0, 0, 10, 10), (14, 0, 20, 10)]
+
+    assert tiling.cluster_extents(extents, 5) == [[0], [1, 2, 3]]
+    assert tiling.cluster_extents([], 5) == []
+
+def test_merge_record_id_ranges():
+    assert tiling.merge_record_id_ranges([[5, 9], [1, 4], [8, 12]]) == [[1, 12]]
+    assert tiling.merge_record_id_ranges([[20, 25], [1, 4], [6, 9]]) == [[1, 4], [6, 9], [20, 25]]
+    assert tiling.merge_record_id_ranges([]) == []
+
+def test_duplicate_records_come_from_another_tile():
+    # Three tiles, written one after the other
+    record_id_ranges = [[1, 10], [11, 20], [21, 30]]
+    gap = ('LRSN_Milepoint', 7, 'Gap')
+    overlap = ('LRSN_Milepoint', 8, 'Overlap')
+    records = [
+        # A feature that crosses the edge of the first two tiles, found by both
+        (1, gap), (11, gap),
+        # A feature with two errors of the same check within one tile
+        (2, overlap), (3, overlap),
+    ]
+
+    assert tiling.duplicate_record_ids(records, record_id_ranges) == [11]
+
+def test_duplicate_records_keep_the_tile_with_the_most_records():
+    record_id_ranges = [[21, 30], [1, 10], [11, 20]]
+    gap = ('LRSN_Milepoint', 7, 'Gap')
+    records = [
+        (1, gap),
+        # The second tile sees more of the feature, and both of its errors are kept
+        (11, gap), (12, gap),
+        (21, gap),
+        # Records outside the ranges of the tiles are never duplicates
+        (40, gap),
+    ]
+
+    assert tiling.duplicate_record_ids(records, record_id_ranges) == [1, 21]
+
+def test_records_of_one_tile_are_never_duplicates():
+    records = [(record_id, ('LRSN_Milepoint', 7, 'Gap')) for record_id in range(1, 6)]
+
+    assert tiling.duplicate_record_ids(records, [[1, 10], [11, 20]]) == []
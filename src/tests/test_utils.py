@@ -0,0 +1,51 @@
+"""
+Build the log messages of validation_helpers/utils.py `log_it`, with a stand-in for the arcpy messages of a Python
+Toolbox.
+"""
+import validation_helpers.utils as utils
+from validation_helpers.config import LOG_MESSAGE_MAX_LENGTH
+
+
+class ToolMessages(object):
+    """
+    Records the messages added to the GP Tool's dialog, without their timestamp and level.
+    """
+    def __init__(self):
+        self.messages = []
+
+    def _add(self, message):
+        self.messages.append(message.split(']  ', 1)[1])
+
+    addMessage = addWarningMessage = addErrorMessage = _add
+
+
+LONG_WHERE_CLAUSE = 'ROUTE_ID IN ({})'.format(', '.join('\'{:09d}\''.format(index) for index in range(1000)))
+
+
+def test_long_format_values_are_truncated():
+    messages = ToolMessages()
+
+    utils.log_it('Selecting {count} routes with "{where_clause}" took {seconds:.2f} seconds',
+        count=1000, where_clause=LONG_WHERE_CLAUSE, seconds=1.5, arcpy_messages=messages)
+
+    message = messages.messages[0]
+    assert message.startswith('Selecting 1000 routes with "ROUTE_ID IN (')
+    assert message.endswith('" took 1.50 seconds')
+    assert 'characters omitted' in message
+    assert len(message) < LOG_MESSAGE_MAX_LENGTH + 100
+
+def test_messages_are_not_truncated():
+    messages = ToolMessages()
+
+    utils.log_it(LONG_WHERE_CLAUSE, arcpy_messages=messages)
+    utils.log_it(lambda: LONG_WHERE_CLAUSE, level='warn', arcpy_messages=messages)
+
+    assert messages.messages == [LONG_WHERE_CLAUSE, LONG_WHERE_CLAUSE]
+
+def test_error_messages_are_not_truncated():
+    messages = ToolMessages()
+
+    utils.log_it('Failed to select "{where_clause}"', where_clause=LONG_WHERE_CLAUSE, level='error',
+        arcpy_messages=messages)
+
+    assert messages.messages == ['Failed to select "{}"'.format(LONG_WHERE_CLAUSE)]
@@ -0,0 +1,157 @@
+"""
+Commit violations to the Reviewer Table with the writers of validation_helpers/write.py, on the synthetic Milepoint
+table of the stub arcpy.
+"""
+import arcpy
+import numpy as np
+import pytest
+
+import validation_helpers.write as write
+from validation_helpers.config import REVIEWER_FLUSH_SIZE
+from benchmarks import synthetic
+
+
+@pytest.fixture
+def milepoint_layer():
+    workspace = arcpy.workspace
+    rows = synthetic.generate_milepoint_rows(route_count=200, seed=2)
+    # A second active feature of the first ROUTE_ID, e.g. a route that was split in two
+    repeated = rows[:1].copy()
+    repeated['OBJECTID'] = rows['OBJECTID'].max() + 1
+    rows = np.concatenate([rows, repeated])
+    workspace.add_table('LRSN_Milepoint', rows)
+    workspace.make_layer('milepoint_layer', 'LRSN_Milepoint')
+    workspace.reset_counters()
+    yield rows
+    workspace.datasets.clear()
+
+
+def test_batch_writer_writes_each_rule_with_its_own_review_status(milepoint_layer):
+    route_ids = [str(route_id) for route_id in milepoint_layer['ROUTE_ID'][1:6]]
+    violations = {
+        'ROUTE_NUMBER must be null': route_ids[:3],
+        # A route can violate several rules, and a rule's text can contain quotes
+        'SIGNING must be \'Other\'': route_ids[2:],
+    }
+
+    record_count = write.batch_result_to_reviewer_table(
+        violations,
+        'milepoint_layer',
+        'reviewer_ws',
+        'Session 1 : test',
+        'LRSN_Milepoint'
+    )
+
+    assert record_count == 6
+    assert arcpy.workspace.reviewer_writes == 2
+    assert dict(arcpy.workspace.reviewer_statuses) == {
+        'ROUTE_NUMBER must be null': 3,
+        'SIGNING must be \'Other\'': 3,
+    }
+    # The staged feature class and its layer are deleted
+    assert sorted(arcpy.workspace.datasets) == ['LRSN_Milepoint', 'milepoint_layer']
+
+def test_batch_writer_writes_every_feature_of_a_repeated_route_id(milepoint_layer):
+    route_id = str(milepoint_layer['ROUTE_ID'][0])
+    assert (milepoint_layer['ROUTE_ID'] == route_id).sum() == 2
+
+    record_count = write.batch_result_to_reviewer_table(
+        {'ROUTE_NUMBER must be null': [route_id], 'SIGNING must be null': [route_id]},
+        'milepoint_layer',
+        'reviewer_ws',
+        'Session 1 : test',
+        'LRSN_Milepoint'
+    )
+
+    # Both features are written for each rule, like the per rule writer, which copies the whole selection
+    assert record_count == 4
+    assert dict(arcpy.workspace.reviewer_statuses) == {
+        'ROUTE_NUMBER must be null': 2,
+        'SIGNING must be null': 2,
+    }
+
+def test_batch_writer_writes_only_the_given_objectids(milepoint_layer):
+    route_id = str(milepoint_layer['ROUTE_ID'][0])
+    object_ids = milepoint_layer['OBJECTID'][milepoint_layer['ROUTE_ID'] == route_id].tolist()
+    other_object_id = int(milepoint_layer['OBJECTID'][1])
+
+    record_count = write.batch_result_to_reviewer_table(
+        {'Non-Unique COUNTY_ORDER and DIRECTION for this DOT_ID': [object_ids[-1], other_object_id]},
+        'milepoint_layer',
+        'reviewer_ws',
+        'Session 1 : test',
+        'LRSN_Milepoint',
+        key_field='OBJECTID'
+    )
+
+    # The other feature of the repeated ROUTE_ID did not violate the rule, so it is not written
+    assert record_count == 2
+    assert dict(arcpy.workspace.reviewer_statuses) == {'Non-Unique COUNTY_ORDER and DIRECTION for this DOT_ID': 2}
+
+class SessionLookup(object):
+    """
+    A stand-in for `utils.get_reviewer_session_name` that counts its calls.
+    """
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return 'Session 1 : test'
+
+def test_stream_writer_flushes_every_reviewer_flush_size_violations(milepoint_layer):
+    route_ids = [str(route_id) for route_id in milepoint_layer['ROUTE_ID'][1:-1]]
+    rule = 'ROUTE_NUMBER must be null'
+    below_flush_size = [route_ids[index % len(route_ids)] for index in range(REVIEWER_FLUSH_SIZE - 1)]
+    chunks = [
+        {rule: below_flush_size},
+        # The buffer reaches REVIEWER_FLUSH_SIZE violations and is committed
+        {rule: route_ids[:1]},
+        # Whatever is left is committed once the stream ends
+        {rule: route_ids[1:3]},
+    ]
+    session_lookup = SessionLookup()
+
+    violation_count, record_count = write.violation_stream_to_reviewer_table(
+        iter(chunks),
+        'milepoint_layer',
+        'reviewer_ws',
+        session_lookup,
+        'LRSN_Milepoint'
+    )
+
+    assert violation_count == REVIEWER_FLUSH_SIZE + 2
+    # Each flush commits a ROUTE_ID once per rule
+    assert record_count == len(set(below_flush_size + route_ids[:1])) + 2
+    assert arcpy.workspace.reviewer_writes == 2
+    # The session is looked up once, on the first flush
+    assert session_lookup.calls == 1
+
+def test_stream_writer_below_reviewer_flush_size_flushes_once_at_the_end(milepoint_layer):
+    route_ids = [str(route_id) for route_id in milepoint_layer['ROUTE_ID'][1:4]]
+
+    violation_count, record_count = write.violation_stream_to_reviewer_table(
+        iter([{'ROUTE_NUMBER must be null': route_ids[:2]}, {}, {'SIGNING must be null': route_ids[2:]}]),
+        'milepoint_layer',
+        'reviewer_ws',
+        'Session 1 : test',
+        'LRSN_Milepoint'
+    )
+
+    assert (violation_count, record_count) == (3, 3)
+    assert arcpy.workspace.reviewer_writes == 2
+
+def test_stream_writer_without_violations_does_not_look_up_the_session(milepoint_layer):
+    session_lookup = SessionLookup()
+
+    result = write.violation_stream_to_reviewer_table(
+        iter([{}, {'ROUTE_NUMBER must be null': []}]),
+        'milepoint_layer',
+        'reviewer_ws',
+        session_lookup,
+        'LRSN_Milepoint'
+    )
+
+    assert result == (0, 0)
+    assert session_lookup.calls == 0
+    assert arcpy.workspace.reviewer_writes == 0
@@ -0,0 +1,217 @@
+"""
+Run the validators from the command line, without ArcMap, ArcCatalog or the Python Toolbox. From the src directory,
+with the python.exe of the ArcGIS installation:
+
+    python -m validation_helpers roadway --job-id 1234 --owned-by SVC\\AVITALE --started-date 2020-01-01 ^
+        --production-ws "Database Connections\\dev_elrs_ad_Lockroot.sde" ^
+        --reviewer-ws "Database Connections\\dev_elrs_datareviewer_ad.sde"
+    python -m validation_helpers all --batch-job-file C:\\checks\\network.rbj --parallel ...
+
+The commands run one validator (roadway, sql, rbj) or all of them (all), with the same arguments as the Python
+Toolbox tools. Log messages are written to stderr (and the --log-path), and a JSON summary of the run is written to
+stdout (or the --output file):
+- success, and the error of each validator that failed
+- the Reviewer records that each validator committed. The Reviewer Batch Job writes its own results, so the
+  records of the rbj command are not counted (null)
+- the seconds of each phase of the run, so the cold start of a validation process is measured separately from the
+  validation itself:
+  - import: importing arcpy and validation_helpers, which is paid once per process
+  - setup: finding the database version and creating the versioned Milepoint layer
+  - validation: running the validators
+- the stage timings of the run (see timing.py)
+
+The exit code is 0 if every validator succeeded, and 1 otherwise.
+
+The serve command starts a resident worker that runs the requests of a queue directory without paying the cold
+start for each of them (see worker.py and job_queue.py):
+
+    python -m validation_helpers serve C:\\validation_queue --production-ws ... --reviewer-ws ...
+
+The batch command runs the roadway level attribute checks of many jobs at once, reading the routes they share once
+(see job_batch.py). The --jobs file is a JSON list of [job__id, job__owned_by, job__started_date, version] lists:
+
+    python -m validation_helpers batch --jobs C:\\checks\\jobs.json --production-ws ... --reviewer-ws ...
+"""
+import timeit
+
+# Importing arcpy is most of the cold start of a validation process, so it is timed before anything else
+_IMPORT_START = timeit.default_timer()
+
+import argparse
+import json
+import logging
+import sys
+import traceback
+
+import arcpy
+
+import validation_helpers.job_batch as job_batch
+import validation_helpers.timing as timing
+import validation_helpers.utils as utils
+import validation_helpers.worker as worker
+
+_IMPORT_SECONDS = timeit.default_timer() - _IMPORT_START
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m validation_helpers', description=__doc__.strip().splitlines()[0])
+    workspaces = argparse.ArgumentParser(add_help=False)
+    workspaces.add_argument('--production-ws', required=True, help='Filepath to the SDE file of the production database')
+    workspaces.add_argument('--reviewer-ws', required=True, help='Filepath to the Reviewer Workspace')
+    workspaces.add_argument('--log-path', default=None, help='A log file, in addition to the stderr log')
+    workspaces.add_argument('--log-level', choices=['DEBUG', 'INFO'], default='INFO', help='The logging level')
+    common = argparse.ArgumentParser(add_help=False, parents=[workspaces])
+    common.add_argument('--started-date', required=True, help='The date value from the WMX [JOB:STARTED_DATE] token')
+    common.add_argument('--owned-by', required=True, help='The username from the WMX [JOB:OWNED_BY] token')
+    common.add_argument('--job-id', required=True, help='The Workflow Manager Job ID')
+    common.add_argument('--version', default='ELRS.Lockroot',
+                        help='ELRS.Lockroot (the default) or any other value to validate the edit version of the job')
+    common.add_argument('--output', default=None, help='Write the JSON summary to this file instead of stdout')
+
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('roadway', parents=[common], help='Run the roadway level attribute checks') \
+        .add_argument('--full-db', action='store_true', help='Validate every route, not only the edited ones')
+    commands.add_parser('sql', parents=[common], help='Run the network SQL validations')
+    rbj = commands.add_parser('rbj', parents=[common], help='Run the Reviewer Batch Job on the buffered edits')
+    rbj.add_argument('--batch-job-file', required=True, help='Filepath to the Reviewer Batch Job file (.rbj)')
+    rbj.add_argument('--full-db', action='store_true', help='Validate the whole network, not only the edits')
+    all_validators = commands.add_parser('all', parents=[common], help='Run all of the validators')
+    all_validators.add_argument('--batch-job-file', required=True,
+                                help='Filepath to the Reviewer Batch Job file (.rbj)')
+    all_validators.add_argument('--full-db', action='store_true', help='Validate every feature, not only the edits')
+    all_validators.add_argument('--parallel', action='store_true',
+                                help='Run the validators at the same time in separate worker processes')
+
+    serve = commands.add_parser('serve', parents=[workspaces],
+                                help='Run the validation requests of a queue directory in a resident worker')
+    serve.add_argument('queue_dir', help='The queue directory (see job_queue.py)')
+    serve.add_argument('--batch-job-file', default=None,
+                       help='Filepath to the Reviewer Batch Job file of the requests that do not set their own')
+    serve.add_argument('--max-requests', type=int, default=None, help='Stop after this many requests')
+    serve.add_argument('--idle-timeout', type=float, default=None,
+                       help='Stop when no request arrived for this many seconds')
+
+    batch = commands.add_parser('batch', parents=[workspaces],
+                                help='Run the roadway level attribute checks of many jobs at once')
+    batch.add_argument('--jobs', required=True, help='A JSON file of the jobs (see job_batch.read_jobs_file)')
+    batch.add_argument('--base-version', default='ELRS.Lockroot',
+                       help='The version whose routes the jobs share. Defaults to the Lockroot version')
+    batch.add_argument('--snapshot-dir', default=None,
+                       help='Read the routes of the base version from a local snapshot in this directory')
+    batch.add_argument('--output', default=None, help='Write the JSON summary to this file instead of stdout')
+    return parser.parse_args(argv)
+
+def run_batch(args, logger=None):
+    """
+    Run the roadway level attribute checks of the jobs in the --jobs file (see
+    job_batch.run_roadway_level_attribute_checks_for_jobs), and summarize the run.
+
+    Returns
+    -------
+    :returns dict: A summary with the keys success, error, jobs (the result of each job), seconds (import and
+        total) and stages (the summary of the trace)
+    """
+    summary = {'success': False, 'error': None, 'jobs': [], 'seconds': {'import': _IMPORT_SECONDS}}
+    with timing.Trace(
+        'validation_helpers batch',
+        trace_path=timing.job_trace_path(args.log_path),
+        logger=logger
+    ) as trace:
+        try:
+            summary['jobs'] = job_batch.run_roadway_level_attribute_checks_for_jobs(
+                job_batch.read_jobs_file(args.jobs),
+                args.reviewer_ws,
+                args.production_ws,
+                base_version_name=args.base_version,
+                snapshot_dir=args.snapshot_dir,
+                logger=logger
+            )
+        except Exception:
+            summary['error'] = traceback.format_exc()
+    arcpy.ClearWorkspaceCache_management()
+
+    summary['success'] = summary['error'] is None and not any(result['error'] for result in summary['jobs'])
+    summary['seconds']['total'] = trace.seconds + _IMPORT_SECONDS
+    summary['stages'] = trace.to_dict()['summary']
+    return summary
+
+def run_command(args, logger=None):
+    """
+    Run the validators of a parsed command line (see worker.run_request), and add the seconds it took to import
+    arcpy and validation_helpers to the summary.
+
+    Arguments
+    ---------
+    :param args: The argparse.Namespace of `parse_args`
+
+    Keyword Arguments
+    -----------------
+    :param logger: Defaults to None. If set, should be Python logging module logger object.
+
+    Returns
+    -------
+    :returns dict: The summary of the run that is written as JSON (see the module docstring)
+    """
+    summary = worker.run_request(
+        {
+            'command': args.command,
+            'job__id': args.job_id,
+            'job__owned_by': args.owned_by,
+            'job__started_date': args.started_date,
+            'production_ws_version_flag': args.version,
+            'full_db_flag': getattr(args, 'full_db', False),
+            'parallel': getattr(args, 'parallel', False),
+        },
+        args.production_ws,
+        args.reviewer_ws,
+        batch_job_file=getattr(args, 'batch_job_file', None),
+        log_path=args.log_path,
+        log_level=_log_level(args),
+        logger=logger
+    )
+    arcpy.ClearWorkspaceCache_management()
+    summary['seconds']['import'] = _IMPORT_SECONDS
+    summary['seconds']['total'] += _IMPORT_SECONDS
+    return summary
+
+def write_summary(summary, output_path=None):
+    """
+    Write the JSON summary to the `output_path`, or to stdout if it is None.
+    """
+    text = json.dumps(summary, indent=2, sort_keys=True)
+    if output_path:
+        with open(output_path, 'w') as output_file:
+            output_file.write(text)
+    else:
+        sys.stdout.write(text + '\n')
+
+def main(argv=None):
+    args = parse_args(argv)
+    logger = utils.initialize_logger(log_path=args.log_path, log_level=_log_level(args))
+    if args.command == 'serve':
+        worker.serve(
+            args.queue_dir,
+            args.production_ws,
+            args.reviewer_ws,
+            batch_job_file=args.batch_job_file,
+            max_requests=args.max_requests,
+            idle_timeout=args.idle_timeout,
+            log_path=args.log_path,
+            log_level=_log_level(args),
+            logger=logger
+        )
+        return 0
+
+    if args.command == 'batch':
+        summary = run_batch(args, logger=logger)
+    else:
+        summary = run_command(args, logger=logger)
+    write_summary(summary, args.output)
+    return 0 if summary['success'] else 1
+
+def _log_level(args):
+    return logging.DEBUG if args.log_level == 'DEBUG' else logging.INFO
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -24,18 +24,98 @@ Format Example
 "EDITED_DATE >= '2020-01-28 14:31:22.435000' AND (EDITED_BY = 'AVITALE' OR EDITED_BY = 'avitale@svc') AND ((FROM_DATE 
 IS NULL OR FROM_DATE <= CURRENT_TIMESTAMP) AND (TO_DATE IS NULL OR TO_DATE >= CURRENT_TIMESTAMP))"
 """
+import datetime
 
 
 # Config Variables
 DOMAIN = 'SVC'
 LRSN_FC_WILDCARD = '*LRSN_Milepoint'
-# TODO: Consider moving arcpy.da.cursor field lists to this file. For now, leave them in the code for readability
+# NumPy integer arrays cannot hold NULL, so arcpy.da.TableToNumPyArray substitutes this value for NULL numeric fields
+NUMPY_NULL_INTEGER = -9999
+# Large `FIELD IN (...)` where clauses fail on the SDE server (around 20k values), so selections by a list of values
+#  are split into chunks of IN_CLAUSE_CHUNK_SIZE values, which are added to the selection one at a time
+IN_CLAUSE_CHUNK_SIZE = 1000
+# NumPy datetime arrays cannot hold NULL either. NULL FROM_DATE/TO_DATE values are read as this date
+NUMPY_NULL_DATE = datetime.datetime(1900, 1, 1)
+# The LRSN_Milepoint columns that are stored in the local snapshot (see snapshot.py)
+SNAPSHOT_FIELDS = [
+    'OBJECTID', 'ROUTE_ID', 'DOT_ID', 'COUNTY_ORDER', 'DIRECTION', 'ROADWAY_TYPE', 'SIGNING', 'ROUTE_NUMBER',
+    'ROUTE_SUFFIX', 'ROUTE_QUALIFIER', 'PARKWAY_FLAG', 'ROADWAY_FEATURE', 'EDITED_BY', 'EDITED_DATE',
+    'FROM_DATE', 'TO_DATE',
+]
+# A snapshot is refreshed by re-reading the rows whose EDITED_DATE changed. Edits that do not update EDITED_DATE are
+#  not seen by a refresh, so the snapshot is rebuilt from a full read when its last full read is older than this
+#  many days
+SNAPSHOT_FULL_REFRESH_DAYS = 7
+# Full database Reviewer Batch Jobs are split into a grid of (rows, columns) tiles that run in parallel processes
+#  (see tiling.py). None runs the batch job once on the full extent of Milepoint. A file geodatabase Reviewer Workspace
+#  is written by one process at a time, so its tiles run one after the other, and only make the run restartable
+BATCH_JOB_TILE_GRID = None
+# If EDIT_CLUSTER_TILES is True, the buffered edits are grouped into clusters, and the Reviewer Batch Job runs once per
+#  cluster rather than once on a single dissolved buffer of all edits (see tiling.edit_cluster_tiles). The clusters
+#  search the same features as the dissolved buffer (see the edit_clusters benchmark) but each pays the start up cost of
+#  a batch job, so it is off by default. Buffers closer than EDIT_CLUSTER_DISTANCE (in the units of the Milepoint
+#  spatial reference, meters) are in the same cluster. The distance is doubled until there are no more than
+#  EDIT_CLUSTER_MAX_COUNT clusters
+EDIT_CLUSTER_TILES = False
+EDIT_CLUSTER_DISTANCE = 1000
+EDIT_CLUSTER_MAX_COUNT = 8
+# Data Reviewer stores its records in REVTABLEMAIN, and the geometry of each record in one of the geometry tables,
+#  which refer to REVTABLEMAIN.RECORDID with their LINKID field
+REVIEWER_MAIN_TABLE = 'REVTABLEMAIN'
+REVIEWER_GEOMETRY_TABLES = ['REVTABLEPOINT', 'REVTABLELINE', 'REVTABLEPOLY']
+# Two Reviewer records from different tiles are duplicates when they have the same values in these fields. The records
+#  of one tile are never duplicates of each other (see tiling.duplicate_record_ids)
+REVIEWER_DUPLICATE_FIELDS = ['ORIGINTABLE', 'OBJECTID', 'CHECKTITLE']
+# Version names, Reviewer table paths and Reviewer session names are cached for METADATA_CACHE_TTL seconds (see
+#  metadata_cache.py). If METADATA_CACHE_PATH is set, the cache is also saved to that JSON file and shared between runs
+METADATA_CACHE_TTL = 300
+METADATA_CACHE_PATH = None
+# Full database runs can evaluate the roadway level attribute rules (see rules.py) in Python ('python') or as one SQL
+#  query against the versioned view of Milepoint ('sql')
+ROADWAY_RULE_ENGINE = 'python'
+# Full database runs of the rules in Python can split the active routes into this many shards of DOT_IDs, which are
+#  validated in a pool of worker processes (see sharding.py). None validates them in one process
+ROADWAY_RULE_SHARDS = None
+# If set, the roadway level attribute checks read the routes from a cursor in chunks of this many rows, and validate
+#  and commit them as they are read rather than all at once (see validations.roadway_level_violation_chunks). The
+#  violations are committed to the Reviewer Table every REVIEWER_FLUSH_SIZE violations
+ROADWAY_STREAM_CHUNK_SIZE = None
+REVIEWER_FLUSH_SIZE = 5000
+# The roadway level attribute fields that the rules are evaluated on in Python
+ROADWAY_ATTRIBUTE_FIELDS = [
+    'ROADWAY_TYPE', 'ROUTE_ID', 'DOT_ID', 'COUNTY_ORDER', 'SIGNING', 'ROUTE_NUMBER',
+    'ROUTE_SUFFIX', 'ROUTE_QUALIFIER', 'PARKWAY_FLAG', 'ROADWAY_FEATURE', 'DIRECTION',
+]
+MILEPOINT_VERSIONED_VIEW = 'ELRS.elrs.LRSN_Milepoint_evw'
+# Each tool run logs how long its stages took (see timing.py). When the tool logs to a file, the stage timings are
+#  also written to a JSON trace file next to it, named like the log file with this suffix. None turns the file off
+TRACE_FILE_SUFFIX = '_trace.json'
+# utils.log_it shortens the longer values that it formats into a message (e.g. where_clauses with thousands of
+#  ROUTE_IDs) to this many characters. Messages of the 'error' level, e.g. tracebacks, are never shortened
+LOG_MESSAGE_MAX_LENGTH = 2000
+# The messages of geoprocessing tools are written to the log file in batches of this many tools (see utils.log_it)
+GP_MESSAGE_BATCH_SIZE = 10
+# The resident validation worker (see worker.py) checks its request queue every WORKER_POLL_INTERVAL seconds, and keeps
+#  the versioned Milepoint layers of up to WORKER_LAYER_CACHE_SIZE database versions open between requests
+WORKER_POLL_INTERVAL = 0.5
+WORKER_LAYER_CACHE_SIZE = 4
+# Each worker renews its lease on the queue every WORKER_HEARTBEAT_INTERVAL seconds. The requests of a worker whose
+#  lease is older than WORKER_LEASE_TIMEOUT seconds are run again by another worker (see job_queue.py)
+WORKER_HEARTBEAT_INTERVAL = 15
+WORKER_LEASE_TIMEOUT = 120
+# The field lists that several modules share (e.g. SNAPSHOT_FIELDS, ROADWAY_ATTRIBUTE_FIELDS) are kept in this file. The
+#  arcpy.da cursor field lists that only one function uses are left in the code for readability
 
 # SQL Queries and Where Clauses
 ACTIVE_ROUTES_WHERE_CLAUSE = (
     '(FROM_DATE IS NULL OR FROM_DATE <= CURRENT_TIMESTAMP) AND (TO_DATE IS NULL OR TO_DATE >= CURRENT_TIMESTAMP)'
 )
 
+# Routes that have not been retired. Routes with a future FROM_DATE are kept in the snapshot, since they become active
+#  without being edited again
+UNRETIRED_ROUTES_WHERE_CLAUSE = '(TO_DATE IS NULL OR TO_DATE >= CURRENT_TIMESTAMP)'
+
 UNIQUE_RDWY_ATTRS_QUERY= (
     'SELECT DOT_ID, COUNTY_ORDER, ' +
         'COUNT (DISTINCT CONCAT(SIGNING, ROUTE_NUMBER, ROUTE_SUFFIX, ' +
@@ -59,9 +139,90 @@ UNIQUE_CO_DIR_QUERY = (
     'HAVING COUNT (1)>1;'
 )
 
+# These two queries return the offending routes themselves rather than the DOT_ID/COUNTY_ORDER aggregates, so their
+#  results can be committed to the Reviewer Table without grouping the routes again in Python.
+# UNIQUE_RDWY_ATTRS_ROUTES_QUERY returns the routes whose roadway level attribute combination differs from the most
+#  common combination of their DOT_ID/COUNTY_ORDER. If several combinations tie for most common, they're all returned.
+#  DISTINCT_ATTRS is a COUNT(DISTINCT ...) OVER (...), which SQL Server does not support directly.
+UNIQUE_RDWY_ATTRS_ROUTES_QUERY = (
+    'WITH active_routes AS (' +
+        'SELECT OBJECTID, ROUTE_ID, DOT_ID, COUNTY_ORDER, ' +
+            'CONCAT(SIGNING, ROUTE_NUMBER, ROUTE_SUFFIX, ROADWAY_TYPE, ' +
+            'ROUTE_QUALIFIER, ROADWAY_FEATURE, PARKWAY_FLAG) AS ATTRS ' +
+        'FROM ELRS.elrs.LRSN_Milepoint_evw ' +
+        'WHERE ' +
+            '(FROM_DATE IS NULL OR FROM_DATE <= CURRENT_TIMESTAMP) AND ' +
+            '(TO_DATE IS NULL OR TO_DATE >= CURRENT_TIMESTAMP)' +
+    '), counted_routes AS (' +
+        'SELECT OBJECTID, ROUTE_ID, DOT_ID, COUNTY_ORDER, ' +
+            'COUNT (1) OVER (PARTITION BY DOT_ID, COUNTY_ORDER, ATTRS) AS ATTRS_COUNT, ' +
+            'DENSE_RANK() OVER (PARTITION BY DOT_ID, COUNTY_ORDER ORDER BY ATTRS) + ' +
+            'DENSE_RANK() OVER (PARTITION BY DOT_ID, COUNTY_ORDER ORDER BY ATTRS DESC) - 1 AS DISTINCT_ATTRS ' +
+        'FROM active_routes' +
+    '), majority_routes AS (' +
+        'SELECT OBJECTID, ROUTE_ID, DOT_ID, COUNTY_ORDER, ATTRS_COUNT, DISTINCT_ATTRS, ' +
+            'MAX (ATTRS_COUNT) OVER (PARTITION BY DOT_ID, COUNTY_ORDER) AS MAJORITY_COUNT ' +
+        'FROM counted_routes' +
+    '), tied_routes AS (' +
+        'SELECT OBJECTID, ROUTE_ID, DOT_ID, COUNTY_ORDER, ATTRS_COUNT, DISTINCT_ATTRS, MAJORITY_COUNT, ' +
+            'SUM (CASE WHEN ATTRS_COUNT = MAJORITY_COUNT THEN 1 ELSE 0 END) ' +
+                'OVER (PARTITION BY DOT_ID, COUNTY_ORDER) AS MAJORITY_ROWS ' +
+        'FROM majority_routes' +
+    ') ' +
+    'SELECT ROUTE_ID, OBJECTID, DOT_ID, COUNTY_ORDER ' +
+    'FROM tied_routes ' +
+    'WHERE DISTINCT_ATTRS > 1 AND (ATTRS_COUNT < MAJORITY_COUNT OR MAJORITY_ROWS > MAJORITY_COUNT) ' +
+    'ORDER BY DOT_ID, COUNTY_ORDER, ROUTE_ID;'
+)
+
+# UNIQUE_CO_DIR_ROUTES_QUERY returns the routes that share a DIRECTION code with another route of their
+#  DOT_ID/COUNTY_ORDER
+UNIQUE_CO_DIR_ROUTES_QUERY = (
+    'SELECT ROUTE_ID, OBJECTID, DOT_ID, COUNTY_ORDER, DIRECTION ' +
+    'FROM (' +
+        'SELECT ROUTE_ID, OBJECTID, DOT_ID, COUNTY_ORDER, DIRECTION, ' +
+            'COUNT (1) OVER (PARTITION BY DOT_ID, COUNTY_ORDER, DIRECTION) AS DIRECTION_COUNT ' +
+        'FROM ELRS.elrs.LRSN_Milepoint_evw ' +
+        'WHERE ' +
+            '(FROM_DATE IS NULL OR FROM_DATE <= CURRENT_TIMESTAMP) AND ' +
+            '(TO_DATE IS NULL OR TO_DATE >= CURRENT_TIMESTAMP)' +
+    ') AS co_dir_routes ' +
+    'WHERE DIRECTION_COUNT > 1 ' +
+    'ORDER BY DOT_ID, COUNTY_ORDER, ROUTE_ID;'
+)
+
 
 # SQL Query Formats
-EDITED_ROUTES_QUERY_FMT = (
+VERSION_STATE_QUERY_FMT = (
+    'SELECT STATE_ID FROM ELRS.sde.SDE_versions WHERE OWNER = \'{owner}\' AND NAME = \'{name}\';'
+)
+
+# SQL Server compares text case-insensitively and ignores trailing spaces in its default collation, so the SQL of the
+#  roadway level attribute rules (see rules.py) compares text fields in this binary collation, and checks that they do
+#  not end with spaces, to match the rules as Python evaluates them
+RULE_SQL_COLLATION = 'Latin1_General_BIN'
+# ROADWAY_LEVEL_RULES_QUERY_FMT returns one ROUTE_ID/OBJECTID/RULE_ID row per rule violation. Every rule is evaluated
+#  in a single scan of the view: CROSS APPLY turns each row into one (RULE_ID, VIOLATED) row per rule, where
+#  rule_cases is a list of ('rule_id', CASE WHEN <rule where_clause> THEN 1 ELSE 0 END) values
+ROADWAY_LEVEL_RULES_QUERY_FMT = (
+    'SELECT ROUTE_ID, OBJECTID, RULE_ID ' +
+    'FROM {view} ' +
+    'CROSS APPLY (VALUES {rule_cases}) AS rule_results (RULE_ID, VIOLATED) ' +
+    'WHERE ({where_clause}) AND VIOLATED = 1 ' +
+    'ORDER BY RULE_ID, ROUTE_ID;'
+)
+
+# INVALID_ROADWAY_TYPE_QUERY_FMT returns the first ROADWAY_TYPE that the rules do not validate. NULL is returned as
+#  null_integer
+INVALID_ROADWAY_TYPE_QUERY_FMT = (
+    'SELECT TOP 1 COALESCE(ROADWAY_TYPE, {null_integer}) ' +
+    'FROM {view} ' +
+    'WHERE ({where_clause}) AND (ROADWAY_TYPE IS NULL OR ROADWAY_TYPE NOT IN ({roadway_types}));'
+)
+
+# Every route the user edited since the job started, including the routes they retired
+JOB_EDITS_QUERY_FMT = (
     'EDITED_DATE >= \'{date}\' AND ' +
-    '(EDITED_BY = \'{user_upper}\' OR EDITED_BY = \'{user_lower}@{domain}\') AND ({active_routes})'
+    '(EDITED_BY = \'{user_upper}\' OR EDITED_BY = \'{user_lower}@{domain}\')'
 )
+EDITED_ROUTES_QUERY_FMT = JOB_EDITS_QUERY_FMT + ' AND ({active_routes})'
@@ -0,0 +1,120 @@
+"""
+Write files so that their readers never see a partial file. The content is written to a temporary file in the same
+directory (or another directory on the same drive), which then replaces the file with a rename. If the write is
+interrupted, the old file (or no file) is left in place, and only the temporary file is lost.
+
+Windows cannot rename a file onto an existing one, so the existing file is removed first. A reader that looks in
+between finds no file, rather than a partial one, and treats it like a file that was never written.
+
+A file that several processes read, modify and write (e.g. the disk cache of metadata_cache.py) is only written
+atomically, not merged: two processes that read it at the same time would each write back their own changes, and
+the first one's would be lost. They hold a `lock_file` around the read and the write instead.
+
+This module imports nothing but the standard library, so every other module can use it: timing.py, which utils.py
+imports, and job_queue.py, which must stay light enough to import without the cold start of arcpy.
+
+Example
+-------
+>>> write_json('C:\\logs\\job_1234_trace.json', trace.to_dict())
+>>> with atomic_write(snapshot_path, binary=True) as snapshot_file:
+>>>     np.save(snapshot_file, rows)
+"""
+import contextlib
+import errno
+import json
+import os
+import time
+import uuid
+
+
+@contextlib.contextmanager
+def atomic_write(path, temp_dir=None, binary=False):
+    """
+    A context manager that opens a temporary file for writing, and moves it to `path` when the block exits without
+    an exception. The directory of the `path` is created if it does not exist.
+
+    Arguments
+    ---------
+    :param path: The filepath to write
+
+    Keyword Arguments
+    -----------------
+    :param temp_dir: Defaults to None, which is the directory of the `path`. The directory of the temporary file,
+        which must be on the same drive as the `path`. A reader that lists the directory of the `path` never sees the
+        temporary file if it is elsewhere (see job_queue.py)
+    :param binary: Defaults to False. If True, the temporary file is opened in binary mode
+
+    Returns
+    -------
+    :returns file: The temporary file, opened for writing
+    :raises OSError: Raises exception if the `path` cannot be replaced, e.g. another process replaced it at the same
+        time. The temporary file is removed
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    temp_path = os.path.join(temp_dir or directory, '.{}.{}.tmp'.format(os.path.basename(path), uuid.uuid4().hex))
+    try:
+        with open(temp_path, 'wb' if binary else 'w') as temp_file:
+            yield temp_file
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+@contextlib.contextmanager
+def lock_file(lock_path, timeout=10.0, stale_after=60.0, poll_interval=0.05):
+    """
+    A context manager that holds an exclusive lock on `lock_path` while its block runs. The lock is a file that is
+    created with O_EXCL, which works on Windows shares as well as local drives, and removed when the block exits.
+    A lock file older than `stale_after` seconds was left behind by a process that stopped while it held the lock,
+    and is removed.
+
+    Arguments
+    ---------
+    :param lock_path: The filepath of the lock file
+
+    Keyword Arguments
+    -----------------
+    :param timeout: Defaults to 10.0. The number of seconds to wait for the lock
+    :param stale_after: Defaults to 60.0. The age in seconds after which a lock file is removed
+    :param poll_interval: Defaults to 0.05. The number of seconds between attempts to take the lock
+
+    Returns
+    -------
+    :returns bool: True if the lock is held. False if the `timeout` passed first, and the block runs without it
+    """
+    deadline = time.time() + timeout
+    locked = False
+    while True:
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            locked = True
+            break
+        except OSError as exc:
+            if exc.errno not in (errno.EEXIST, errno.EACCES):
+                raise
+        try:
+            if time.time() - os.path.getmtime(lock_path) > stale_after:
+                os.remove(lock_path)
+                continue
+        except OSError:
+            # The lock was released in the meantime
+            continue
+        if time.time() >= deadline:
+            break
+        time.sleep(poll_interval)
+    try:
+        yield locked
+    finally:
+        if locked and os.path.exists(lock_path):
+            os.remove(lock_path)
+
+def write_json(path, value, temp_dir=None):
+    """
+    Write `value` to the JSON file `path` with `atomic_write`, indented and with sorted keys.
+    """
+    with atomic_write(path, temp_dir=temp_dir) as json_file:
+        json.dump(value, json_file, indent=2, sort_keys=True)
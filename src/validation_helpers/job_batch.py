@@ -0,0 +1,366 @@
+"""
+Validate the roadway level attributes of many WMX jobs in one run, e.g. the jobs of a shift. Running
+`validations.run_roadway_level_attribute_checks` once per job reads every active route of Milepoint for each job,
+to analyze the COUNTY_ORDER sequences of the DOT_IDs, although a job only validates the routes it edited.
+
+A batch reads the active routes of the base version (the Lockroot version) once, and indexes them by DOT_ID. The jobs
+are grouped by the database version they validate, so each version's Milepoint layer is created once. Each job then
+reads only its own edits from its version, overlays them on the shared routes of the DOT_IDs it edited, and
+evaluates the rules and the COUNTY_ORDER sequences of those DOT_IDs only. The cost of a batch is one read of the
+base version and work that is proportional to the edited routes, rather than one read of Milepoint per job.
+
+A job's COUNTY_ORDER sequences are analyzed with the routes of its DOT_IDs as they are in the base version, with the
+job's own edits applied. That is the state the job's version will be in once it is posted. Edits of other users in
+the job's version are not part of it, unlike a run of `run_roadway_level_attribute_checks` against the version.
+"""
+from collections import defaultdict, OrderedDict
+import json
+import logging
+import traceback
+
+import arcpy
+
+import validation_helpers.scratch as scratch
+import validation_helpers.snapshot as snapshot
+import validation_helpers.timing as timing
+import validation_helpers.utils as utils
+import validation_helpers.validations as validations
+import validation_helpers.write as write
+from validation_helpers.config import (
+    ACTIVE_ROUTES_WHERE_CLAUSE,
+    DOMAIN,
+    EDITED_ROUTES_QUERY_FMT,
+    JOB_EDITS_QUERY_FMT,
+)
+
+
+@timing.timed()
+@scratch.scratch_scope
+def run_roadway_level_attribute_checks_for_jobs(jobs, reviewer_ws, production_ws,
+                                                base_version_name='ELRS.Lockroot',
+                                                snapshot_dir=None,
+                                                logger=None, messages=None):
+    """
+    Run the roadway level attribute checks of many WMX jobs, and commit each job's violations to its own Reviewer
+    session. See the module docstring.
+
+    A job that fails (e.g. its version or Reviewer session does not exist) is logged and reported in the results,
+    and the other jobs still run.
+
+    Arguments
+    ---------
+    :param jobs: A list of (job__id, job__owned_by, job__started_date, production_ws_version_flag) tuples. The
+        production_ws_version_flag is ELRS.Lockroot to validate the job's edits in the Lockroot version, or any
+        other value to validate them in the job's edit version (see utils.resolve_production_ws_version)
+    :param reviewer_ws: Filepath to a Data Reviewer enabled geodatabase
+    :param production_ws: Filepath to the SDE file pointing to the correct database.
+
+    Keyword Arguments
+    -----------------
+    :param base_version_name: Defaults to ELRS.Lockroot, which finds the Lockroot version like
+        `utils.get_lockroot_version`. The version whose active routes are shared by the jobs
+    :param snapshot_dir: Defaults to None. If set, the routes of the base version are read from a local snapshot
+        in this directory (see snapshot.py)
+    :param logger: Defaults to None. If set, should be Python logging module logger object.
+    :param messages: Defaults to None. If set, should refer to the arcpy.Messages variable that is present
+        in the `execute` method of Python Toolboxes.
+
+    Returns
+    -------
+    :returns list: A list with one dictionary per job, in the order of `jobs`, with the keys job__id,
+        production_ws_version, edited_routes, violations (the number of violating routes), reviewer_records and
+        error (None, or the traceback of the exception that stopped the job)
+    """
+    if not logger:
+        logger = utils.initialize_logger(log_path=None, log_level=logging.INFO)
+
+    results = [{
+        'job__id': job__id,
+        'production_ws_version': None,
+        'edited_routes': None,
+        'violations': None,
+        'reviewer_records': None,
+        'error': None,
+    } for job__id, job__owned_by, job__started_date, production_ws_version_flag in jobs]
+
+    arcpy.CheckOutExtension('datareviewer')
+    arcpy.env.workspace = production_ws
+    base_layer = None
+    try:
+        base_version = find_base_version(production_ws, base_version_name)
+        versions = group_jobs_by_version(jobs, production_ws, results, logger=logger, messages=messages)
+        utils.log_it('Validating {jobs} job(s) in {versions} version(s) against the routes of {base_version}',
+            jobs=len(jobs), versions=len(versions), base_version=base_version,
+            level='info', logger=logger, arcpy_messages=messages)
+
+        milepoint_fc, base_layer = utils.get_version_milepoint_layer(production_ws, base_version)
+        shared_routes = build_shared_routes(_read_base_rows(
+            production_ws,
+            base_version,
+            base_layer,
+            snapshot_dir=snapshot_dir,
+            logger=logger,
+            messages=messages
+        ))
+
+        for production_ws_version, job_indexes in versions.items():
+            if production_ws_version == base_version:
+                version_layer = base_layer
+            else:
+                milepoint_fc, version_layer = utils.get_version_milepoint_layer(production_ws, production_ws_version)
+            try:
+                for index in job_indexes:
+                    _run_job(jobs[index], results[index], shared_routes, version_layer, milepoint_fc, reviewer_ws,
+                             logger=logger, messages=messages)
+            finally:
+                if version_layer is not base_layer:
+                    arcpy.Delete_management(version_layer)
+    except Exception:
+        utils.log_it(traceback.format_exc(), level='error', logger=logger, arcpy_messages=messages)
+        raise
+    finally:
+        if base_layer:
+            arcpy.Delete_management(base_layer)
+        utils.check_in_extension('datareviewer')
+        utils.flush_gp_messages()
+
+    utils.log_it('{failed} of {jobs} job(s) failed', failed=sum(1 for result in results if result['error']),
+        jobs=len(jobs), level='info', logger=logger, arcpy_messages=messages)
+    return results
+
+def read_jobs_file(jobs_path):
+    """
+    Read the jobs of a batch from a JSON file. The file holds a list of jobs, each either a list of
+    [job__id, job__owned_by, job__started_date, production_ws_version_flag] or an object with those keys. The
+    production_ws_version_flag is optional and defaults to ELRS.Lockroot.
+
+    Returns
+    -------
+    :returns list: A list of (job__id, job__owned_by, job__started_date, production_ws_version_flag) tuples
+    :raises ValueError: Raises exception if a job does not have an id, owner and started date
+    """
+    with open(jobs_path) as jobs_file:
+        job_values = json.load(jobs_file)
+
+    jobs = []
+    for job in job_values:
+        if isinstance(job, dict):
+            job = [job.get('job__id'), job.get('job__owned_by'), job.get('job__started_date'),
+                   job.get('production_ws_version_flag')]
+        job = list(job) + [None] * (4 - len(job))
+        if not all(job[:3]):
+            raise ValueError('Each job needs a job__id, job__owned_by and job__started_date: {}'.format(job))
+        jobs.append((job[0], job[1], job[2], job[3] or 'ELRS.Lockroot'))
+    return jobs
+
+def find_base_version(production_ws, base_version_name='ELRS.Lockroot'):
+    """
+    Return the name of the version whose active routes the jobs of a batch share: the Lockroot version if the
+    `base_version_name` is ELRS.Lockroot, and the `base_version_name` otherwise.
+
+    :raises VersionDoesNotExistError: Raises exception if the version does not exist in the production_ws
+    """
+    if base_version_name == 'ELRS.Lockroot':
+        base_version = utils.get_lockroot_version(production_ws, base_version_name)
+        if not base_version:
+            raise utils.VersionDoesNotExistError('No Lockroot version found in {}'.format(production_ws))
+        return base_version
+    utils.check_for_version(base_version_name, production_ws)
+    return base_version_name
+
+def group_jobs_by_version(jobs, production_ws, results, logger=None, messages=None):
+    """
+    Find the database version of each job, and group the jobs by version. The version of each job is set in its
+    result, and a job whose version cannot be found gets the error in its result instead.
+
+    Returns
+    -------
+    :returns OrderedDict: The version names as keys, in the order of their first job, and the lists of the
+        indexes of their jobs in `jobs` as values
+    """
+    versions = OrderedDict()
+    for index, (job__id, job__owned_by, job__started_date, production_ws_version_flag) in enumerate(jobs):
+        try:
+            production_ws_version = utils.resolve_production_ws_version(
+                production_ws,
+                production_ws_version_flag,
+                job__owned_by,
+                job__id,
+                logger=logger,
+                arcpy_messages=messages
+            )
+        except Exception:
+            results[index]['error'] = traceback.format_exc()
+            utils.log_it('Job {job__id}: {error}', job__id=job__id, error=results[index]['error'],
+                level='error', logger=logger, arcpy_messages=messages)
+            continue
+        results[index]['production_ws_version'] = production_ws_version
+        versions.setdefault(production_ws_version, []).append(index)
+    return versions
+
+@timing.timed()
+def build_shared_routes(base_rows):
+    """
+    Index the active routes of the base version by DOT_ID, for `job_dot_id_routes`. Routes with a COUNTY_ORDER that
+    is not integer like are left out, as `validations.build_dot_id_routes` leaves them out.
+
+    Arguments
+    ---------
+    :param base_rows: A NumPy structured array of the active routes, with the OBJECTID, DOT_ID, COUNTY_ORDER,
+        ROUTE_ID and DIRECTION fields
+
+    Returns
+    -------
+    :returns dict: A dictionary with the keys dot_id_object_ids (the OBJECTIDs of the routes of each DOT_ID) and
+        entries (the DOT_ID, COUNTY_ORDER and ROUTE_ID:DIRECTION string of each OBJECTID)
+    """
+    dot_id_object_ids = defaultdict(list)
+    entries = dict()
+    for object_id, dot_id, county_order, route_id, direction in zip(base_rows['OBJECTID'].tolist(),
+                                                                    base_rows['DOT_ID'].tolist(),
+                                                                    base_rows['COUNTY_ORDER'].tolist(),
+                                                                    base_rows['ROUTE_ID'].tolist(),
+                                                                    base_rows['DIRECTION'].tolist()):
+        try:
+            county_order_int = int(county_order)
+        except (TypeError, ValueError):
+            continue
+        dot_id_object_ids[dot_id].append(object_id)
+        entries[object_id] = (county_order_int, '{}:{}'.format(route_id, direction))
+    return {'dot_id_object_ids': dot_id_object_ids, 'entries': entries}
+
+def job_dot_id_routes(shared_routes, edit_rows, active_edit_rows, dot_ids):
+    """
+    Build the `validations.build_dot_id_routes` dictionary of the `dot_ids` as they are with a job's edits: the
+    shared routes of each DOT_ID, without the routes the job edited, and with the job's edited routes that are
+    active.
+
+    Arguments
+    ---------
+    :param shared_routes: The result of `build_shared_routes`
+    :param edit_rows: A NumPy structured array of every route the job edited, including retired routes
+    :param active_edit_rows: The active routes of the `edit_rows`
+    :param dot_ids: The DOT_IDs to build
+
+    Returns
+    -------
+    :returns dict: A dictionary containing defaultdicts of lists, like `validations.build_dot_id_routes`
+    """
+    edited_object_ids = set(edit_rows['OBJECTID'].tolist())
+    dot_id_routes = dict()
+    for dot_id in dot_ids:
+        county_orders = defaultdict(list)
+        for object_id in shared_routes['dot_id_object_ids'].get(dot_id, []):
+            if object_id not in edited_object_ids:
+                county_order, entry = shared_routes['entries'][object_id]
+                county_orders[county_order].append(entry)
+        dot_id_routes[dot_id] = county_orders
+
+    for dot_id, county_orders in validations.build_dot_id_routes(active_edit_rows).items():
+        if dot_id in dot_id_routes:
+            for county_order, route_entries in county_orders.items():
+                dot_id_routes[dot_id][county_order].extend(route_entries)
+    return dot_id_routes
+
+def job_roadway_level_violations(shared_routes, edit_rows):
+    """
+    Validate the roadway level attributes of a job's edited routes that are active, and the COUNTY_ORDER sequences
+    of their DOT_IDs with the job's edits applied to the shared routes.
+
+    Arguments
+    ---------
+    :param shared_routes: The result of `build_shared_routes`
+    :param edit_rows: A NumPy structured array of every route the job edited, including retired routes, with the
+        config.SNAPSHOT_FIELDS
+
+    Returns
+    -------
+    :returns tuple: A tuple of the number of active edited routes and the violations defaultdict(list), like
+        `validations.validate_by_roadway_type_vectorized`
+    """
+    active_edit_rows = snapshot.active_milepoint_rows(edit_rows)
+    with timing.span('validate_by_roadway_type_vectorized', rows=len(active_edit_rows)):
+        violations = validations.validate_by_roadway_type_vectorized(active_edit_rows)
+
+    with timing.span('precompute_county_order_verdicts') as verdict_span:
+        dot_id_routes = job_dot_id_routes(
+            shared_routes,
+            edit_rows,
+            active_edit_rows,
+            set(active_edit_rows['DOT_ID'].tolist())
+        )
+        verdict_span.rows = len(dot_id_routes)
+        county_order_verdicts = validations.precompute_county_order_verdicts(dot_id_routes)
+    validations.add_county_order_verdicts(violations, active_edit_rows, county_order_verdicts)
+    return len(active_edit_rows), violations
+
+@timing.timed()
+def _run_job(job, result, shared_routes, version_layer, milepoint_fc, reviewer_ws, logger=None, messages=None):
+    """
+    Validate one job of a batch and commit its violations to its Reviewer session. Exceptions are logged and
+    recorded in the job's `result`, so the other jobs of the batch still run.
+    """
+    job__id, job__owned_by, job__started_date, production_ws_version_flag = job
+    try:
+        user = job__owned_by.split('\\')[-1]
+        edit_rows = snapshot.read_milepoint_source(version_layer, where_clause=JOB_EDITS_QUERY_FMT.format(
+            date=job__started_date,
+            user_upper=user.upper(),
+            user_lower=user.lower(),
+            domain=DOMAIN
+        ))
+        result['edited_routes'], violations = job_roadway_level_violations(shared_routes, edit_rows)
+        result['violations'] = sum(len(route_ids) for route_ids in violations.values())
+        utils.log_it('Job {job__id}: {violations} violation(s) in {routes} edited route(s)', job__id=job__id,
+            violations=result['violations'], routes=result['edited_routes'],
+            level='info', logger=logger, arcpy_messages=messages)
+        if not violations:
+            result['reviewer_records'] = 0
+            return
+
+        session_name = utils.get_reviewer_session_name(
+            reviewer_ws,
+            job__owned_by,
+            job__id,
+            logger=logger,
+            arcpy_messages=messages
+        )
+        result['reviewer_records'] = write.batch_result_to_reviewer_table(
+            violations,
+            version_layer,
+            reviewer_ws,
+            session_name,
+            milepoint_fc,
+            base_where_clause=EDITED_ROUTES_QUERY_FMT.format(
+                date=job__started_date,
+                user_upper=user.upper(),
+                user_lower=user.lower(),
+                domain=DOMAIN,
+                active_routes=ACTIVE_ROUTES_WHERE_CLAUSE
+            ),
+            logger=logger,
+            arcpy_messages=messages
+        )
+    except Exception:
+        result['error'] = traceback.format_exc()
+        utils.log_it('Job {job__id} failed:\n{error}', job__id=job__id, error=result['error'],
+            level='error', logger=logger, arcpy_messages=messages)
+
+def _read_base_rows(production_ws, base_version, base_layer, snapshot_dir=None, logger=None, messages=None):
+    """
+    Read the active routes of the base version, from the local snapshot if there is a `snapshot_dir`.
+    """
+    if snapshot_dir:
+        rows = snapshot.load_milepoint_snapshot(
+            snapshot_dir,
+            base_version,
+            snapshot.get_version_state_id(production_ws, base_version),
+            lambda: snapshot.read_milepoint_source(base_layer),
+            read_keys=lambda: snapshot.read_milepoint_keys(base_layer),
+            read_delta=lambda object_ids: snapshot.read_milepoint_delta(base_layer, object_ids),
+            logger=logger,
+            arcpy_messages=messages
+        )
+    else:
+        rows = snapshot.read_milepoint_source(base_layer)
+    return snapshot.active_milepoint_rows(rows)
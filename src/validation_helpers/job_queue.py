@@ -0,0 +1,443 @@
+"""
+A request queue in a directory, which the resident validation worker (see worker.py) reads. Any process that can
+write a file can submit a validation request, and this module imports neither arcpy nor the rest of
+validation_helpers (only files.py, which imports nothing but the standard library), so submitting a request does not
+pay the cold start that the worker saves.
+
+The queue directory has three subdirectories:
+- incoming: the submitted requests, as JSON files whose names sort in the order they were submitted
+- processing: a subdirectory per worker with the requests it is running. A worker claims a request by renaming it
+  into its own subdirectory, so two workers never run the same request
+- results: the JSON result of each request, named after its request_id
+
+Files are written to a temporary name in the queue directory and renamed (see files.atomic_write), so a reader never
+sees a partial request or result.
+
+Several workers (on one or more machines) can serve the same queue. Each worker holds a lease: a file in its
+processing subdirectory whose modified time it updates every few seconds, including while a request runs (see
+`keep_alive`). A worker whose lease has not been updated for the lease timeout has stopped without finishing its
+requests, and they are moved back to incoming by the next worker that checks (see `requeue_expired`). The requests
+of live workers are never moved. Lease times are compared with the modified time of the checking worker's own lease,
+so they are all from the clock of the file server. A worker that was only slow (e.g. its file server was unreachable
+for longer than the lease timeout) finds its processing subdirectory gone: its next `heartbeat` raises a
+LeaseLostError, and `complete` does not write the result of a request that was moved, since it runs again elsewhere.
+
+A stop request (see `request_stop`) stops the workers that were running when it was made. A worker that starts
+later ignores it, and it is never deleted, so a stop is never lost to a worker that happens to start at the same time.
+
+A request is a dictionary with the keys of a validation task (see parallel.run_validators_in_parallel) and the
+command of `python -m validation_helpers`: request_id, command, job__id, job__owned_by, job__started_date,
+production_ws_version_flag, full_db_flag and, optionally, reviewer_ws, batch_job_file and parallel.
+
+Example
+-------
+>>> request_id = job_queue.submit(queue_dir, {
+>>>     'command': 'roadway',
+>>>     'job__id': '1234',
+>>>     'job__owned_by': 'SVC\\AVITALE',
+>>>     'job__started_date': '2020-01-01',
+>>>     'production_ws_version_flag': 'ELRS.Lockroot',
+>>> })
+>>> result = job_queue.wait_for_result(queue_dir, request_id, timeout=600)
+
+The same request can be submitted from the command line, and the result printed as JSON:
+
+    python -m validation_helpers.job_queue C:\\validation_queue roadway --job-id 1234 --owned-by SVC\\AVITALE ^
+        --started-date 2020-01-01 --wait 600
+"""
+import argparse
+import datetime
+import json
+import contextlib
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+
+import validation_helpers.files as files
+
+
+INCOMING = 'incoming'
+PROCESSING = 'processing'
+RESULTS = 'results'
+# A worker stops once it finds this file in the queue directory, written after the worker started (see `request_stop`)
+STOP_FILE = 'stop'
+# The file in each worker's processing subdirectory whose modified time is the last heartbeat of the worker
+LEASE_FILE = 'lease'
+
+# The commands of `python -m validation_helpers` that the worker runs
+COMMANDS = ('roadway', 'sql', 'rbj', 'all')
+
+# The default values of the optional request keys
+REQUEST_DEFAULTS = {
+    'production_ws_version_flag': 'ELRS.Lockroot',
+    'full_db_flag': False,
+    'parallel': False,
+    'reviewer_ws': None,
+    'batch_job_file': None,
+}
+
+
+class LeaseLostError(Exception):
+    """
+    This exception is raised when a worker renews a lease that no longer exists, because another worker found it
+    expired and moved the worker's requests back to incoming (see `requeue_expired`). The worker must stop claiming
+    requests.
+    """
+    pass
+
+
+def ensure_queue(queue_dir):
+    """
+    Create the subdirectories of the queue directory that do not exist yet.
+    """
+    for subdir in (INCOMING, PROCESSING, RESULTS):
+        path = os.path.join(queue_dir, subdir)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+def submit(queue_dir, request):
+    """
+    Add a validation request to the queue.
+
+    Arguments
+    ---------
+    :param queue_dir: The queue directory
+    :param request: A dictionary of the request (see the module docstring). A request_id is generated if it is
+        not set
+
+    Returns
+    -------
+    :returns str: The request_id, which names the result file
+    :raises ValueError: Raises exception if the command is not one of COMMANDS
+    """
+    ensure_queue(queue_dir)
+    request = dict(REQUEST_DEFAULTS, **request)
+    if request.get('command') not in COMMANDS:
+        raise ValueError('Unknown command: {}. Choose from: {}'.format(request.get('command'), COMMANDS))
+    request.setdefault('request_id', uuid.uuid4().hex)
+    submitted = datetime.datetime.now()
+    request['submitted'] = submitted.isoformat()
+    request['submitted_time'] = time.time()
+
+    file_name = '{:%Y%m%d%H%M%S%f}_{}.json'.format(submitted, request['request_id'])
+    files.write_json(os.path.join(queue_dir, INCOMING, file_name), request, temp_dir=queue_dir)
+    return request['request_id']
+
+def register_worker(queue_dir, worker_id=None):
+    """
+    Create the processing subdirectory and the lease of a worker.
+
+    Arguments
+    ---------
+    :param queue_dir: The queue directory
+
+    Keyword Arguments
+    -----------------
+    :param worker_id: Defaults to None, which generates a unique worker_id
+
+    Returns
+    -------
+    :returns tuple: A tuple of the worker_id and the time of its first heartbeat (see `heartbeat`)
+    """
+    ensure_queue(queue_dir)
+    worker_id = worker_id or uuid.uuid4().hex
+    worker_dir = os.path.join(queue_dir, PROCESSING, worker_id)
+    if not os.path.isdir(worker_dir):
+        # The subdirectory is created with its lease under a hidden name, so `requeue_expired` never finds it
+        #  without a lease
+        temp_dir = os.path.join(queue_dir, PROCESSING, '.{}'.format(uuid.uuid4().hex))
+        os.makedirs(temp_dir)
+        with open(os.path.join(temp_dir, LEASE_FILE), 'w') as lease_file:
+            lease_file.write(datetime.datetime.now().isoformat())
+        os.rename(temp_dir, worker_dir)
+    return worker_id, heartbeat(queue_dir, worker_id)
+
+def heartbeat(queue_dir, worker_id):
+    """
+    Renew the lease of a worker, and return its new modified time, which is the current time of the file server.
+
+    Returns
+    -------
+    :returns float: The modified time of the lease
+    :raises LeaseLostError: Raises exception if the processing subdirectory of the worker was removed
+    """
+    worker_dir = os.path.join(queue_dir, PROCESSING, worker_id)
+    lease_path = os.path.join(worker_dir, LEASE_FILE)
+    try:
+        with open(lease_path, 'w') as lease_file:
+            lease_file.write(datetime.datetime.now().isoformat())
+        return os.path.getmtime(lease_path)
+    except (IOError, OSError):
+        if os.path.isdir(os.path.join(queue_dir, PROCESSING)) and not os.path.isdir(worker_dir):
+            raise LeaseLostError('The lease of worker {} expired, and its requests were requeued'.format(worker_id))
+        raise
+
+@contextlib.contextmanager
+def keep_alive(queue_dir, worker_id, interval):
+    """
+    A context manager that renews the lease of a worker every `interval` seconds in a background thread, so the
+    lease does not expire while the worker runs a long request.
+
+    Example
+    -------
+    >>> with keep_alive(queue_dir, worker_id, 30):
+    >>>     result = run_request(request, ...)
+    """
+    stopped = threading.Event()
+
+    def beat():
+        while not stopped.wait(interval):
+            try:
+                heartbeat(queue_dir, worker_id)
+            except LeaseLostError:
+                # The worker finds out at its own next heartbeat
+                return
+            except (IOError, OSError):
+                # The file server is unreachable for now, so the next heartbeat tries again
+                pass
+
+    thread = threading.Thread(target=beat, name='lease {}'.format(worker_id))
+    thread.daemon = True
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+def release_worker(queue_dir, worker_id):
+    """
+    Remove the processing subdirectory and the lease of a stopping worker. Requests that it claimed but did not
+    complete are moved back to incoming. Returns the number of requests that were moved, which is 0 if another
+    worker already requeued them.
+    """
+    return _requeue_worker(queue_dir, worker_id)
+
+def requeue_expired(queue_dir, lease_timeout, now=None):
+    """
+    Move the requests of the workers whose lease expired back to the incoming directory, so they run again, and
+    remove the processing subdirectories of those workers.
+
+    Arguments
+    ---------
+    :param queue_dir: The queue directory
+    :param lease_timeout: The seconds after its last heartbeat that the lease of a worker expires
+
+    Keyword Arguments
+    -----------------
+    :param now: Defaults to None, which is the time of this machine. The time the leases are compared with,
+        normally the time of the checking worker's own heartbeat
+
+    Returns
+    -------
+    :returns int: The number of requests that were moved
+    """
+    now = time.time() if now is None else now
+    processing_dir = os.path.join(queue_dir, PROCESSING)
+    moved = 0
+    for worker_id in sorted(os.listdir(processing_dir)):
+        if worker_id.startswith('.') or not os.path.isdir(os.path.join(processing_dir, worker_id)):
+            continue
+        lease_path = os.path.join(processing_dir, worker_id, LEASE_FILE)
+        try:
+            lease_time = os.path.getmtime(lease_path)
+        except OSError:
+            # A worker writes its lease as it creates its subdirectory, so a missing lease was released
+            lease_time = None
+        if lease_time is not None and now - lease_time <= lease_timeout:
+            continue
+        moved += _requeue_worker(queue_dir, worker_id)
+    return moved
+
+def claim_next(queue_dir, worker_id):
+    """
+    Claim the oldest request in the queue by moving it to the processing subdirectory of the worker.
+
+    Returns
+    -------
+    :returns tuple: A tuple of the filepath of the claimed request and the request dictionary, or None if the
+        queue is empty. A request file that is not valid JSON is returned with a request of None
+    """
+    incoming_dir = os.path.join(queue_dir, INCOMING)
+    for file_name in sorted(os.listdir(incoming_dir)):
+        if not file_name.endswith('.json'):
+            continue
+        claimed_path = os.path.join(queue_dir, PROCESSING, worker_id, file_name)
+        try:
+            os.rename(os.path.join(incoming_dir, file_name), claimed_path)
+        except OSError:
+            # Another worker claimed the request first
+            continue
+        try:
+            with open(claimed_path) as request_file:
+                return claimed_path, json.load(request_file)
+        except ValueError:
+            return claimed_path, None
+    return None
+
+def complete(queue_dir, claimed_path, result):
+    """
+    Write the result of a claimed request to the results directory, and remove the request from the processing
+    directory. The result is named after the request_id in the `result`, or after the request file if it has none.
+
+    If the request is no longer in the processing directory, the lease of the worker expired while the request ran,
+    and another worker moved it back to incoming. It runs again there, so its result is not written.
+
+    Returns
+    -------
+    :returns bool: True if the result was written
+    """
+    if not os.path.exists(claimed_path):
+        return False
+    request_id = result.get('request_id') or _request_id_from_path(claimed_path)
+    files.write_json(result_path(queue_dir, request_id), result, temp_dir=queue_dir)
+    if os.path.exists(claimed_path):
+        os.remove(claimed_path)
+    return True
+
+def result_path(queue_dir, request_id):
+    """
+    Return the filepath of the result of a request.
+    """
+    return os.path.join(queue_dir, RESULTS, '{}.json'.format(request_id))
+
+def read_result(queue_dir, request_id):
+    """
+    Return the result of a request, or None if the request has not finished.
+    """
+    path = result_path(queue_dir, request_id)
+    if not os.path.exists(path):
+        return None
+    with open(path) as result_file:
+        return json.load(result_file)
+
+def wait_for_result(queue_dir, request_id, timeout=None, poll_interval=0.5):
+    """
+    Wait for the result of a request.
+
+    Arguments
+    ---------
+    :param queue_dir: The queue directory
+    :param request_id: The request_id returned by `submit`
+
+    Keyword Arguments
+    -----------------
+    :param timeout: Defaults to None, which waits until the result is written. The number of seconds to wait
+    :param poll_interval: Defaults to 0.5. The number of seconds between checks for the result
+
+    Returns
+    -------
+    :returns dict: The result, or None if the timeout passed first
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    while True:
+        result = read_result(queue_dir, request_id)
+        if result is not None:
+            return result
+        if deadline is not None and time.time() >= deadline:
+            return None
+        time.sleep(poll_interval)
+
+def request_stop(queue_dir):
+    """
+    Ask the workers of the queue that are running now to stop once they finish their current request.
+    """
+    ensure_queue(queue_dir)
+    with open(os.path.join(queue_dir, STOP_FILE), 'w') as stop_file:
+        stop_file.write(datetime.datetime.now().isoformat())
+
+def stop_requested(queue_dir, since=None):
+    """
+    Return True if `request_stop` was called for the queue, at or after the time `since` (e.g. the time of a
+    worker's first heartbeat, see `register_worker`). If `since` is None, any stop request counts.
+    """
+    try:
+        stop_time = os.path.getmtime(os.path.join(queue_dir, STOP_FILE))
+    except OSError:
+        return False
+    return since is None or stop_time >= since
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m validation_helpers.job_queue',
+                                     description='Submit a validation request to the queue of a resident worker')
+    parser.add_argument('queue_dir', help='The queue directory of the worker')
+    parser.add_argument('command', choices=COMMANDS + ('stop',),
+                        help='The validators to run, or stop to stop the workers of the queue')
+    parser.add_argument('--started-date', help='The date value from the WMX [JOB:STARTED_DATE] token')
+    parser.add_argument('--owned-by', help='The username from the WMX [JOB:OWNED_BY] token')
+    parser.add_argument('--job-id', help='The Workflow Manager Job ID')
+    parser.add_argument('--version', default='ELRS.Lockroot',
+                        help='ELRS.Lockroot (the default) or any other value to validate the edit version of the job')
+    parser.add_argument('--reviewer-ws', default=None, help='Overrides the Reviewer Workspace of the worker')
+    parser.add_argument('--batch-job-file', default=None, help='Overrides the Reviewer Batch Job file of the worker')
+    parser.add_argument('--full-db', action='store_true', help='Validate every feature, not only the edits')
+    parser.add_argument('--parallel', action='store_true', help='Run the validators in separate worker processes')
+    parser.add_argument('--wait', type=float, default=None,
+                        help='Wait up to this many seconds for the result, and print it as JSON')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'stop':
+        request_stop(args.queue_dir)
+        return 0
+    if not (args.started_date and args.owned_by and args.job_id):
+        sys.stderr.write('--started-date, --owned-by and --job-id are required\n')
+        return 2
+
+    request_id = submit(args.queue_dir, {
+        'command': args.command,
+        'job__id': args.job_id,
+        'job__owned_by': args.owned_by,
+        'job__started_date': args.started_date,
+        'production_ws_version_flag': args.version,
+        'full_db_flag': args.full_db,
+        'parallel': args.parallel,
+        'reviewer_ws': args.reviewer_ws,
+        'batch_job_file': args.batch_job_file,
+    })
+    if args.wait is None:
+        sys.stdout.write(request_id + '\n')
+        return 0
+
+    result = wait_for_result(args.queue_dir, request_id, timeout=args.wait)
+    if result is None:
+        sys.stderr.write('No result for request {} after {} seconds\n'.format(request_id, args.wait))
+        return 1
+    sys.stdout.write(json.dumps(result, indent=2, sort_keys=True) + '\n')
+    return 0 if result.get('success') else 1
+
+def _requeue_worker(queue_dir, worker_id):
+    """
+    Move the requests in the processing subdirectory of a worker back to the incoming directory, and remove the
+    subdirectory. Returns the number of requests that were moved.
+    """
+    worker_dir = os.path.join(queue_dir, PROCESSING, worker_id)
+    if not os.path.isdir(worker_dir):
+        # Another worker requeued the requests first
+        return 0
+    moved = 0
+    for file_name in sorted(os.listdir(worker_dir)):
+        if file_name.endswith('.json'):
+            try:
+                os.rename(os.path.join(worker_dir, file_name), os.path.join(queue_dir, INCOMING, file_name))
+            except OSError:
+                # Another worker requeued the request first
+                continue
+            moved += 1
+    shutil.rmtree(worker_dir, ignore_errors=True)
+    return moved
+
+def _request_id_from_path(claimed_path):
+    """
+    Return the request_id part of a request file name (<submitted>_<request_id>.json).
+    """
+    file_name = os.path.splitext(os.path.basename(claimed_path))[0]
+    return file_name.split('_', 1)[-1]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+A cache of the geodatabase metadata that the validators look up on every run: the version names of the production
+workspace, the filepaths of the Data Reviewer tables, and the Reviewer session names. These lookups read the
+geodatabase system tables, and a full validation run repeats them in every validator.
+
+Values are cached in-process for METADATA_CACHE_TTL seconds. If METADATA_CACHE_PATH is set, they are also saved to a
+JSON file, so they are shared by separate tool runs (e.g. the worker processes of parallel.py) until they expire.
+The processes merge their values into the file while they hold a lock file next to it (see files.lock_file), so one
+process never overwrites the values that another added. A process that cannot get the lock in time only keeps its
+value in-process.
+Values must be JSON serializable. Keys are tuples that start with the kind of value, e.g.
+('versions', production_ws), and the cached values of one kind (or one workspace) can be removed with `invalidate`.
+"""
+import json
+import os
+import time
+
+import validation_helpers.files as files
+from validation_helpers.config import METADATA_CACHE_PATH, METADATA_CACHE_TTL
+
+
+# The lock file of the on-disk cache is named like the cache file, with this suffix
+LOCK_SUFFIX = '.lock'
+
+# The in-process cache. The keys are the JSON encoded cache keys, and the values are (expires_at, value) tuples
+_CACHE = dict()
+
+
+def get(key, loader, ttl=None, cache_path=None):
+    """
+    Return the cached value of `key`. If the value is not cached or has expired, it is loaded by calling
+    `loader`, and the result is cached. Falsy results (e.g. an empty list or None) are not cached, so a lookup
+    that found nothing is repeated the next time.
+
+    Arguments
+    ---------
+    :param key: A tuple that identifies the value. The first element is the kind of value, e.g. 'versions'
+    :param loader: A callable that takes no arguments and returns the value
+
+    Keyword Arguments
+    -----------------
+    :param ttl: Defaults to None, which is config.METADATA_CACHE_TTL. The number of seconds the value is cached
+    :param cache_path: Defaults to None, which is config.METADATA_CACHE_PATH. The JSON filepath of the on-disk
+        cache. If both are None, values are only cached in-process
+
+    Returns
+    -------
+    :returns: The cached or loaded value
+    """
+    ttl = METADATA_CACHE_TTL if ttl is None else ttl
+    cache_path = cache_path or METADATA_CACHE_PATH
+    cache_key = _encode_key(key)
+    now = time.time()
+
+    if cache_key in _CACHE and _CACHE[cache_key][0] > now:
+        return _CACHE[cache_key][1]
+
+    if cache_path:
+        disk_entry = _read_disk_cache(cache_path).get(cache_key)
+        if disk_entry and disk_entry[0] > now:
+            _CACHE[cache_key] = tuple(disk_entry)
+            return disk_entry[1]
+
+    value = loader()
+    if value:
+        _CACHE[cache_key] = (now + ttl, value)
+        if cache_path:
+            def add_entry(disk_cache):
+                disk_cache[cache_key] = [now + ttl, value]
+                return disk_cache
+            _update_disk_cache(cache_path, add_entry)
+    return value
+
+def invalidate(kind=None, workspace=None, cache_path=None):
+    """
+    Remove cached values, both in-process and on disk. With no arguments, everything is removed.
+
+    Keyword Arguments
+    -----------------
+    :param kind: Defaults to None. If set, only values of this kind (the first element of their key) are removed
+    :param workspace: Defaults to None. If set, only values whose key contains this workspace are removed
+    :param cache_path: Defaults to None, which is config.METADATA_CACHE_PATH. The JSON filepath of the on-disk cache
+    """
+    cache_path = cache_path or METADATA_CACHE_PATH
+
+    def matches(cache_key):
+        key = json.loads(cache_key)
+        if kind is not None and key[0] != kind:
+            return False
+        if workspace is not None and workspace_key(workspace) not in key[1:]:
+            return False
+        return True
+
+    for cache_key in [cache_key for cache_key in _CACHE if matches(cache_key)]:
+        del _CACHE[cache_key]
+
+    if cache_path and os.path.exists(cache_path):
+        _update_disk_cache(cache_path, lambda disk_cache: dict(
+            (cache_key, entry) for cache_key, entry in disk_cache.items() if not matches(cache_key)
+        ))
+
+def workspace_key(workspace):
+    """
+    Normalize a workspace filepath for use in a cache key, so the same workspace always has the same key.
+    """
+    return os.path.normcase(os.path.normpath(workspace))
+
+def _encode_key(key):
+    """
+    Encode a cache key tuple as a JSON string, which can be used as a dictionary key in memory and on disk.
+    """
+    return json.dumps(list(key))
+
+def _read_disk_cache(cache_path):
+    """
+    Read the on-disk cache. A missing or unreadable file is an empty cache.
+    """
+    if not os.path.exists(cache_path):
+        return dict()
+    try:
+        with open(cache_path, 'r') as cache_file:
+            return json.load(cache_file)
+    except (IOError, OSError, ValueError):
+        return dict()
+
+def _update_disk_cache(cache_path, update):
+    """
+    Read the on-disk cache, pass it to `update`, and write the dictionary it returns, dropping the expired values.
+    The read and the write happen while the lock file of the cache is held, so the changes of other processes are
+    kept. The cache is written with files.write_json, so the processes that read it without the lock never read a
+    partial file.
+    """
+    cache_dir = os.path.dirname(os.path.abspath(cache_path))
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    with files.lock_file(cache_path + LOCK_SUFFIX) as locked:
+        if not locked:
+            return
+        now = time.time()
+        disk_cache = update(_read_disk_cache(cache_path))
+        try:
+            files.write_json(
+                cache_path,
+                dict((cache_key, entry) for cache_key, entry in disk_cache.items() if entry[0] > now)
+            )
+        except OSError:
+            # A process whose lock was taken for a stale one replaced the file first. Its values are just as good
+            pass
@@ -0,0 +1,254 @@
+"""
+Run the validators in separate worker processes. The roadway level attribute checks, the Reviewer batch job and the
+network SQL validations read the database independently, so they can run at the same time. Each worker process opens
+its own connection to the database version and creates its own versioned Milepoint layer. The only thing the workers
+share is a lock around their commits to the Reviewer workspace (see write.reviewer_write_lock).
+
+ArcMap and ArcCatalog are not Python interpreters, so the worker processes are started with the python.exe of the
+ArcGIS installation. The worker functions live in this module, rather than the Python Toolbox, so the workers
+can import them.
+"""
+import logging
+import multiprocessing
+import os
+import time
+import traceback
+
+import arcpy
+
+import validation_helpers.timing as timing
+import validation_helpers.utils as utils
+import validation_helpers.validations as validations
+import validation_helpers.write as write
+
+
+# The validators that `run_validators_in_parallel` can run, in the order they are submitted to the workers
+VALIDATOR_NAMES = ('roadway_level_attributes', 'batch_job', 'network_sql')
+
+
+class ValidatorProcessError(Exception):
+    """
+    This exception is raised when one or more validators fail in their worker processes. The message
+    contains the traceback of each failure.
+    """
+    pass
+
+
+@timing.timed()
+def run_validators_in_parallel(reviewer_ws, batch_job_file, production_ws, job__id,
+                               job__started_date, job__owned_by, production_ws_version,
+                               full_db_flag=False, validators=VALIDATOR_NAMES, processes=None,
+                               log_path=None, log_level=logging.INFO,
+                               logger=None, arcpy_messages=None):
+    """
+    Run the validators concurrently in a pool of worker processes and wait for all of them to finish.
+    The validators commit to the same Reviewer session, and those commits are serialized with a lock
+    that is shared by the workers.
+
+    Arguments
+    ---------
+    :param reviewer_ws: Filepath to the Reviewer Workspace
+    :param batch_job_file: Filepath to the Reviewer Batch Job file (.rbj)
+    :param production_ws: Filepath to the SDE file pointing to the correct database.
+    :param job__id: The Workflow Manager Job ID
+    :param job__started_date: The date value from the WMX [JOB:STARTED_DATE] token
+    :param job__owned_by: The username from the WMX [JOB:OWNED_BY] token
+    :param production_ws_version: The database version to validate
+
+    Keyword Arguments
+    -----------------
+    :param full_db_flag: Defaults to False. If True, all features will be validated. If False, only
+        features edited by the user in their version will be validated.
+    :param validators: Defaults to VALIDATOR_NAMES. The names of the validators to run
+    :param processes: Defaults to None, which starts one worker process per validator
+    :param log_path: Defaults to None. If set, each worker logs to a file next to `log_path` that is suffixed
+        with the validator's name (see `validator_log_path`)
+    :param log_level: Defaults to logging.INFO. The log level of the worker processes
+    :param logger: Defaults to None. If set, should be Python logging module logger object.
+    :param arcpy_messages: Defaults to None. If set, should refer to the arcpy.Messages variable that is present
+        in the `execute` method of Python Toolboxes.
+
+    Returns
+    -------
+    :returns dict: A dictionary with the validator names as keys and the seconds each validator took as values
+    :raises ValidatorProcessError: Raises exception if any of the validators failed
+    """
+    unknown_validators = [name for name in validators if name not in VALIDATOR_NAMES]
+    if unknown_validators:
+        raise ValueError('Unknown validator(s): {}. Choose from: {}'.format(unknown_validators, VALIDATOR_NAMES))
+
+    tasks = [{
+        'validator': name,
+        'reviewer_ws': reviewer_ws,
+        'batch_job_file': batch_job_file,
+        'production_ws': production_ws,
+        'job__id': job__id,
+        'job__started_date': job__started_date,
+        'job__owned_by': job__owned_by,
+        'production_ws_version': production_ws_version,
+        'full_db_flag': full_db_flag,
+        'log_path': validator_log_path(log_path, name),
+        'log_level': log_level,
+    } for name in validators]
+
+    utils.set_worker_executable()
+    utils.log_it('Running {} validator(s) in parallel: {}'.format(len(tasks), ', '.join(validators)),
+        level='info', logger=logger, arcpy_messages=arcpy_messages)
+
+    start_time = time.time()
+    reviewer_lock = multiprocessing.Lock()
+    pool = multiprocessing.Pool(
+        processes=processes or len(tasks),
+        initializer=write.set_reviewer_write_lock,
+        initargs=(reviewer_lock,)
+    )
+    try:
+        async_results = [pool.apply_async(run_validator, (task,)) for task in tasks]
+        pool.close()
+        results = [async_result.get() for async_result in async_results]
+    finally:
+        pool.terminate()
+        pool.join()
+
+    timings = dict()
+    failures = []
+    trace = timing.active_trace()
+    for result in results:
+        timings[result['validator']] = result['seconds']
+        if trace and result.get('trace'):
+            # Add the stage timings of the worker process to the trace of this run
+            trace.merge(result['trace'], process=result['validator'])
+        if result['error']:
+            failures.append(result)
+            utils.log_it('{} failed after {:.2f} seconds:\n{}'.format(
+                result['validator'], result['seconds'], result['error']),
+                level='error', logger=logger, arcpy_messages=arcpy_messages)
+        else:
+            utils.log_it('{} finished in {:.2f} seconds'.format(result['validator'], result['seconds']),
+                level='info', logger=logger, arcpy_messages=arcpy_messages)
+
+    utils.log_it('All validator processes finished in {:.2f} seconds (sum of the validators: {:.2f} seconds)'.format(
+        time.time() - start_time, sum(timings.values())),
+        level='info', logger=logger, arcpy_messages=arcpy_messages)
+
+    if failures:
+        raise ValidatorProcessError('\n'.join(
+            '{}:\n{}'.format(failure['validator'], failure['error']) for failure in failures
+        ))
+
+    return timings
+
+def run_validator(task):
+    """
+    Run one validator in a worker process. This function is the target of the worker processes, so it
+    opens its own versioned Milepoint layer and logger rather than receiving them from the parent process.
+    Exceptions are caught and returned as text, since arcpy exceptions cannot always be pickled.
+
+    Arguments
+    ---------
+    :param task: A dictionary of the validator name and the arguments of `run_validators_in_parallel`
+
+    Returns
+    -------
+    :returns dict: A dictionary with the keys validator, seconds, error and trace. The error is None, or the
+        traceback of the exception that stopped the validator. The trace is the `timing.Trace.to_dict` of the
+        stages the validator timed
+    """
+    start_time = time.time()
+    error = None
+    version_milepoint_layer = None
+    # The stage timings are returned to the parent process, which logs them with its own
+    with timing.Trace(task['validator']) as trace:
+        try:
+            logger = utils.initialize_logger(log_path=task['log_path'], log_level=task['log_level'])
+            arcpy.env.workspace = task['production_ws']
+            milepoint_fc, version_milepoint_layer = utils.get_version_milepoint_layer(
+                task['production_ws'],
+                task['production_ws_version']
+            )
+            call_validator(
+                task,
+                version_milepoint_layer=version_milepoint_layer,
+                milepoint_fc=milepoint_fc,
+                logger=logger,
+                messages=None
+            )
+        except Exception:
+            error = traceback.format_exc()
+        finally:
+            try:
+                if version_milepoint_layer:
+                    arcpy.Delete_management(version_milepoint_layer)
+                arcpy.ClearWorkspaceCache_management()
+            except:
+                pass
+            utils.flush_gp_messages()
+
+    return {
+        'validator': task['validator'],
+        'seconds': time.time() - start_time,
+        'error': error,
+        'trace': trace.to_dict(),
+    }
+
+def call_validator(task, **validator_kwargs):
+    """
+    Call the validation function of the validator named in the `task`, in this process.
+
+    Arguments
+    ---------
+    :param task: A dictionary of the validator name and the arguments of `run_validators_in_parallel`
+
+    Keyword Arguments
+    -----------------
+    :param validator_kwargs: The version_milepoint_layer, milepoint_fc, logger and messages arguments that are
+        passed to the validation function with the task's production_ws_version
+
+    Returns
+    -------
+    :returns: The value returned by the validation function
+    :raises ValueError: Raises exception if the validator name is not one of VALIDATOR_NAMES
+    """
+    validator_kwargs.setdefault('production_ws_version', task['production_ws_version'])
+    if task['validator'] == 'roadway_level_attributes':
+        return validations.run_roadway_level_attribute_checks(
+            task['reviewer_ws'],
+            task['production_ws'],
+            task['job__id'],
+            task['job__started_date'],
+            task['job__owned_by'],
+            full_db_flag=task['full_db_flag'],
+            **validator_kwargs
+        )
+    elif task['validator'] == 'batch_job':
+        return validations.run_batch_on_buffered_edits(
+            task['reviewer_ws'],
+            task['batch_job_file'],
+            task['production_ws'],
+            task['job__id'],
+            task['job__started_date'],
+            task['job__owned_by'],
+            full_db_flag=task['full_db_flag'],
+            **validator_kwargs
+        )
+    elif task['validator'] == 'network_sql':
+        return validations.run_sql_validations(
+            task['reviewer_ws'],
+            task['production_ws'],
+            task['job__id'],
+            task['job__started_date'],
+            task['job__owned_by'],
+            **validator_kwargs
+        )
+    raise ValueError('Unknown validator: {}. Choose from: {}'.format(task['validator'], VALIDATOR_NAMES))
+
+def validator_log_path(log_path, validator):
+    """
+    Return the log filepath of a worker process, e.g. C:\\logs\\job_1234_batch_job.txt for the log_path
+    C:\\logs\\job_1234.txt. Each worker writes its own file, so the processes never write to the same file.
+    Returns None if the `log_path` is None.
+    """
+    if not log_path:
+        return None
+    root, extension = os.path.splitext(log_path)
+    return '{}_{}{}'.format(root, validator, extension)
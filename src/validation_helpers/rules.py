@@ -0,0 +1,514 @@
+"""
+The roadway level attribute rules, declared once and compiled into the two forms the validators need:
+1. A vectorized evaluator, which checks a NumPy structured array (or a mapping of field names to columns) of
+   Milepoint attributes with one boolean mask per condition, rather than one Python comparison per route
+2. An SQL where_clause, which selects the violating routes in the database. Full database runs select the
+   violating routes with it, rather than with tens of thousands of ROUTE_IDs in IN (...) clauses. The same
+   where_clauses make up `violations_query`, which evaluates every rule in the database in one query
+
+A rule is a Rule namedtuple: the rule_id, the description that is committed to the Reviewer Table, the ROADWAY_TYPE
+coded values the rule applies to (None for every ROADWAY_TYPE), and the predicate. The predicate is a condition
+that is True for the routes that VIOLATE the rule. Conditions are built with the functions of this module:
+`is_set`, `equals`, `digits`, `greater_than`, `not_`, `all_of`, and `any_of`. A new rule is added with `register`,
+and both compiled forms pick it up.
+
+Example
+-------
+>>> register(Rule(
+>>>     rule_id='rdwy_no_suffix',
+>>>     description='ROUTE_SUFFIX must be null when ROADWAY_TYPE in (\\'Road\\', \\'Ramp\\')',
+>>>     roadway_types=(1, 2),
+>>>     predicate=is_set('ROUTE_SUFFIX')
+>>> ))
+>>> violations = evaluate(milepoint_rows)
+>>> where_clause = violations_where_clause()
+
+NULL values follow `utils.milepoint_attributes_to_array`, which reads NULL text as an empty string and NULL numbers
+as config.NUMPY_NULL_INTEGER. Both are "not set", just like a Python None. The SQL of every condition is NULL safe
+(it is never UNKNOWN), so `not_` negates it the same way in Python and in the database.
+
+Python compares text exactly, while the default collation of SQL Server is case-insensitive and ignores trailing
+spaces ('t' = 'T ', and ' ' = ''). The SQL of the text conditions therefore compares in config.RULE_SQL_COLLATION and
+compares the DATALENGTH of the field with that of the field without its trailing spaces, so e.g. a PARKWAY_FLAG of 't'
+or a ROUTE_SUFFIX of ' ' is judged the same way in Python and in the database.
+"""
+from collections import defaultdict, namedtuple
+import numbers
+
+import numpy as np
+
+from validation_helpers.config import (
+    ACTIVE_ROUTES_WHERE_CLAUSE,
+    INVALID_ROADWAY_TYPE_QUERY_FMT,
+    MILEPOINT_VERSIONED_VIEW,
+    NUMPY_NULL_INTEGER,
+    ROADWAY_LEVEL_RULES_QUERY_FMT,
+    RULE_SQL_COLLATION,
+)
+
+
+Rule = namedtuple('Rule', ['rule_id', 'description', 'roadway_types', 'predicate'])
+
+# The registered rules, in the order they are evaluated
+ROADWAY_LEVEL_RULES = []
+
+# The text fields among the attributes the rules check. The SQL of `is_set` depends on the field type. Every other
+#  field is numeric. A layer's actual field types can be passed to `violations_where_clause` instead
+RULE_TEXT_FIELDS = ('ROUTE_ID', 'DOT_ID', 'COUNTY_ORDER', 'ROUTE_NUMBER', 'ROUTE_SUFFIX', 'PARKWAY_FLAG')
+
+# The ROADWAY_TYPE coded values in the domain. ROADWAY_TYPE=4 has no rules
+ROADWAY_TYPES = (1, 2, 3, 4, 5)
+
+# The compiled evaluator, which is rebuilt when a rule is registered
+_COMPILED_EVALUATOR = None
+
+
+def is_set(field):
+    """
+    A condition that is True when the `field` is not NULL, not an empty string, and not 0.
+    """
+    return ('is_set', field)
+
+def equals(field, value):
+    """
+    A condition that is True when the `field` equals `value`. NULL never equals anything.
+    """
+    return ('equals', field, value)
+
+def digits(field, length, prefix=''):
+    """
+    A condition that is True when the `field` is a string of exactly `length` digits that starts with `prefix`,
+    i.e. the regular expression ^prefix\\d{length - len(prefix)}$
+    """
+    return ('digits', field, length, prefix)
+
+def greater_than(field, value):
+    """
+    A condition that is True when the `field` is greater than `value`. Text fields are compared as text.
+    """
+    return ('greater_than', field, value)
+
+def not_(condition):
+    """
+    A condition that is True when the `condition` is False.
+    """
+    return ('not', condition)
+
+def all_of(*conditions):
+    """
+    A condition that is True when every one of the `conditions` is True.
+    """
+    return ('all',) + conditions
+
+def any_of(*conditions):
+    """
+    A condition that is True when any of the `conditions` is True.
+    """
+    return ('any',) + conditions
+
+def register(rule):
+    """
+    Add a rule to ROADWAY_LEVEL_RULES. Rule IDs must be unique.
+
+    Arguments
+    ---------
+    :param rule: A Rule namedtuple
+
+    Returns
+    -------
+    :returns Rule: The registered rule
+    :raises ValueError: Raises a ValueError if a rule with the same rule_id is already registered
+    """
+    global _COMPILED_EVALUATOR
+    if any(registered.rule_id == rule.rule_id for registered in ROADWAY_LEVEL_RULES):
+        raise ValueError('A rule with the rule_id {} is already registered'.format(rule.rule_id))
+    ROADWAY_LEVEL_RULES.append(rule)
+    _COMPILED_EVALUATOR = None
+    return rule
+
+def rule_fields(rules=None):
+    """
+    Return the sorted names of the fields that the `rules` (defaults to ROADWAY_LEVEL_RULES) read, including
+    ROADWAY_TYPE.
+    """
+    rules = ROADWAY_LEVEL_RULES if rules is None else rules
+    fields = set(['ROADWAY_TYPE'])
+    for rule in rules:
+        fields.update(_condition_fields(rule.predicate))
+    return sorted(fields)
+
+def validated_roadway_types(rules=None):
+    """
+    Return the sorted ROADWAY_TYPE coded values that the `rules` (defaults to ROADWAY_LEVEL_RULES) apply to. A rule
+    for every ROADWAY_TYPE doesn't count, so ROADWAY_TYPE=4 is not validated.
+    """
+    rules = ROADWAY_LEVEL_RULES if rules is None else rules
+    return sorted(set(value for rule in rules if rule.roadway_types for value in rule.roadway_types))
+
+def check_roadway_types(milepoint_rows, rules=None):
+    """
+    Stop the validation at the first route whose ROADWAY_TYPE the `rules` (defaults to ROADWAY_LEVEL_RULES)
+    do not validate.
+
+    Arguments
+    ---------
+    :param milepoint_rows: A NumPy structured array or a mapping of field names to columns with a ROADWAY_TYPE field
+
+    Keyword Arguments
+    -----------------
+    :param rules: Defaults to None, which is ROADWAY_LEVEL_RULES
+
+    Returns
+    -------
+    :returns None:
+    :raises AttributeError: Raises an AttributeError if any roadway_type is not within the valid range
+    """
+    roadway_types = np.asarray(milepoint_rows['ROADWAY_TYPE'])
+    valid = np.zeros(len(roadway_types), dtype=bool)
+    for value in validated_roadway_types(rules):
+        valid |= _equals_mask(roadway_types, value)
+
+    invalid_rows = np.flatnonzero(~valid)
+    if len(invalid_rows) > 0:
+        raise AttributeError(roadway_type_error_message(roadway_types[invalid_rows[0]]))
+
+def roadway_type_error_message(roadway_type):
+    """
+    Return the message of the AttributeError that stops a validation at an invalid `roadway_type`.
+    """
+    return 'ROADWAY_TYPE is outside of the valid range. Must be one of {}. Currently ROADWAY_TYPE={}'.format(
+        ROADWAY_TYPES, roadway_type)
+
+def evaluate(milepoint_rows, rules=None):
+    """
+    Evaluate the `rules` on every route of `milepoint_rows` at once.
+
+    Arguments
+    ---------
+    :param milepoint_rows: A NumPy structured array or a mapping of field names to columns. ROUTE_ID and the
+        fields of `rule_fields` must be present
+
+    Keyword Arguments
+    -----------------
+    :param rules: Defaults to None, which is ROADWAY_LEVEL_RULES (compiled once and reused)
+
+    Returns
+    -------
+    :returns defaultdict(list): The rule descriptions as keys, and lists of the offending ROUTE_IDs, in row order,
+        as values. Rules without violations are not in the dictionary
+    """
+    global _COMPILED_EVALUATOR
+    if rules is not None:
+        return compile_evaluator(rules)(milepoint_rows)
+    if _COMPILED_EVALUATOR is None:
+        _COMPILED_EVALUATOR = compile_evaluator(ROADWAY_LEVEL_RULES)
+    return _COMPILED_EVALUATOR(milepoint_rows)
+
+def compile_evaluator(rules):
+    """
+    Compile the `rules` into a function that takes `milepoint_rows` and returns the violations, like `evaluate`.
+    Each distinct condition is evaluated once per call, no matter how many rules use it.
+    """
+    compiled_rules = [
+        (rule.description, _compile_roadway_types(rule.roadway_types), _compile_condition(rule.predicate))
+        for rule in rules
+    ]
+
+    def evaluator(milepoint_rows):
+        route_ids = np.asarray(milepoint_rows['ROUTE_ID'])
+        violations = defaultdict(list)
+        if len(route_ids) == 0:
+            return violations
+
+        masks = dict()
+        for description, roadway_types_mask, predicate_mask in compiled_rules:
+            mask = roadway_types_mask(milepoint_rows, masks) & predicate_mask(milepoint_rows, masks)
+            if mask.any():
+                violations[description].extend(route_ids[mask].tolist())
+        return violations
+
+    return evaluator
+
+def violations_where_clause(rules=None, field_types=None):
+    """
+    Compile the `rules` into one SQL where_clause that matches the routes that violate any of them.
+
+    Keyword Arguments
+    -----------------
+    :param rules: Defaults to None, which is ROADWAY_LEVEL_RULES
+    :param field_types: Defaults to None. A dictionary of field names to arcpy field types (e.g. from
+        arcpy.ListFields). If None, the fields in RULE_TEXT_FIELDS are text and the others are numeric
+
+    Returns
+    -------
+    :returns str: The where_clause. It uses SQL Server syntax: the [0-9] character class of LIKE, COLLATE and
+        DATALENGTH
+    """
+    rules = ROADWAY_LEVEL_RULES if rules is None else rules
+    return ' OR '.join('({})'.format(rule_where_clause(rule, field_types=field_types)) for rule in rules) or '1 = 0'
+
+def rule_where_clause(rule, field_types=None):
+    """
+    Compile one rule into an SQL where_clause that matches the routes that violate it. See `violations_where_clause`.
+    """
+    predicate = _condition_sql(rule.predicate, field_types)
+    if rule.roadway_types is None:
+        return predicate
+    return 'ROADWAY_TYPE IN ({}) AND {}'.format(', '.join(str(value) for value in rule.roadway_types), predicate)
+
+def violations_query(rules=None, view=MILEPOINT_VERSIONED_VIEW, where_clause=ACTIVE_ROUTES_WHERE_CLAUSE,
+                     field_types=None):
+    """
+    Compile the `rules` into one SQL Server query that returns a (ROUTE_ID, OBJECTID, RULE_ID) row for every rule
+    that every route of the `view` violates. See config.ROADWAY_LEVEL_RULES_QUERY_FMT.
+
+    Keyword Arguments
+    -----------------
+    :param rules: Defaults to None, which is ROADWAY_LEVEL_RULES
+    :param view: Defaults to config.MILEPOINT_VERSIONED_VIEW. The versioned view of Milepoint
+    :param where_clause: Defaults to config.ACTIVE_ROUTES_WHERE_CLAUSE. The routes to validate
+    :param field_types: Defaults to None. See `violations_where_clause`
+
+    Returns
+    -------
+    :returns str: The query
+    """
+    rules = ROADWAY_LEVEL_RULES if rules is None else rules
+    return ROADWAY_LEVEL_RULES_QUERY_FMT.format(
+        view=view,
+        rule_cases=', '.join(
+            '({rule_id}, CASE WHEN {condition} THEN 1 ELSE 0 END)'.format(
+                rule_id=_sql_value(rule.rule_id),
+                condition=rule_where_clause(rule, field_types=field_types)
+            ) for rule in rules
+        ),
+        where_clause=where_clause
+    )
+
+def invalid_roadway_type_query(rules=None, view=MILEPOINT_VERSIONED_VIEW, where_clause=ACTIVE_ROUTES_WHERE_CLAUSE):
+    """
+    Return an SQL query for the first ROADWAY_TYPE of the `view` that the `rules` (defaults to ROADWAY_LEVEL_RULES)
+    do not validate, the database side equivalent of `check_roadway_types`. NULL is returned as
+    config.NUMPY_NULL_INTEGER. See config.INVALID_ROADWAY_TYPE_QUERY_FMT.
+    """
+    return INVALID_ROADWAY_TYPE_QUERY_FMT.format(
+        null_integer=NUMPY_NULL_INTEGER,
+        view=view,
+        where_clause=where_clause,
+        roadway_types=', '.join(str(value) for value in validated_roadway_types(rules))
+    )
+
+def _condition_fields(condition):
+    """
+    Return the set of field names that a condition reads.
+    """
+    if condition[0] in ('not', 'all', 'any'):
+        fields = set()
+        for child in (condition[1:] if condition[0] != 'not' else [condition[1]]):
+            fields.update(_condition_fields(child))
+        return fields
+    return set([condition[1]])
+
+def _compile_roadway_types(roadway_types):
+    """
+    Compile the ROADWAY_TYPE filter of a rule into a mask function.
+    """
+    if roadway_types is None:
+        return lambda milepoint_rows, masks: np.ones(len(milepoint_rows['ROUTE_ID']), dtype=bool)
+    return _compile_condition(any_of(*[equals('ROADWAY_TYPE', value) for value in roadway_types]))
+
+def _compile_condition(condition):
+    """
+    Compile a condition into a function that takes the `milepoint_rows` and a dictionary of the masks that were
+    already computed in this evaluation, and returns a boolean mask. Masks are cached by condition.
+    """
+    kind = condition[0]
+    if kind == 'not':
+        child = _compile_condition(condition[1])
+        compute = lambda milepoint_rows, masks: ~child(milepoint_rows, masks)
+    elif kind in ('all', 'any'):
+        children = [_compile_condition(child) for child in condition[1:]]
+        combine = np.logical_and if kind == 'all' else np.logical_or
+
+        def compute(milepoint_rows, masks):
+            mask = children[0](milepoint_rows, masks)
+            for child in children[1:]:
+                mask = combine(mask, child(milepoint_rows, masks))
+            return mask
+    elif kind == 'is_set':
+        compute = lambda milepoint_rows, masks: _truthy_mask(milepoint_rows[condition[1]])
+    elif kind == 'equals':
+        compute = lambda milepoint_rows, masks: _equals_mask(milepoint_rows[condition[1]], condition[2])
+    elif kind == 'digits':
+        def compute(milepoint_rows, masks):
+            strings = _string_array(milepoint_rows[condition[1]])
+            mask = _digits_mask(strings, condition[2])
+            if condition[3]:
+                mask &= np.char.startswith(strings, condition[3])
+            return mask
+    elif kind == 'greater_than':
+        def compute(milepoint_rows, masks):
+            column = np.asarray(milepoint_rows[condition[1]])
+            if not isinstance(condition[2], numbers.Number):
+                return np.asarray(_string_array(column) > condition[2], dtype=bool)
+            return np.asarray((column > condition[2]) & (column != NUMPY_NULL_INTEGER), dtype=bool)
+    else:
+        raise ValueError('Unknown rule condition: {}'.format(condition))
+
+    def cached(milepoint_rows, masks):
+        if condition not in masks:
+            masks[condition] = compute(milepoint_rows, masks)
+        return masks[condition]
+    return cached
+
+def _condition_sql(condition, field_types):
+    """
+    Compile a condition into SQL. Every leaf condition is False (rather than UNKNOWN) for NULL values.
+    """
+    kind = condition[0]
+    if kind == 'not':
+        return 'NOT {}'.format(_condition_sql(condition[1], field_types))
+    elif kind in ('all', 'any'):
+        operator = ' AND ' if kind == 'all' else ' OR '
+        return '({})'.format(operator.join(_condition_sql(child, field_types) for child in condition[1:]))
+
+    field = condition[1]
+    text = _is_text_field(field, field_types)
+    if kind == 'is_set':
+        if text:
+            # A string of spaces is set, but SQL Server compares it equal to ''
+            return '({field} IS NOT NULL AND DATALENGTH({field}) > 0)'.format(field=field)
+        return '({field} IS NOT NULL AND {field} <> 0)'.format(field=field)
+    elif kind == 'equals':
+        if text:
+            return '({field} IS NOT NULL AND {collated} = {value} AND {exact})'.format(
+                field=field, collated=_collated(field), value=_sql_value(condition[2]),
+                exact=_no_trailing_spaces(field))
+        return '({field} IS NOT NULL AND {field} = {value})'.format(field=field, value=_sql_value(condition[2]))
+    elif kind == 'digits':
+        pattern = condition[3] + '[0-9]' * (condition[2] - len(condition[3]))
+        return '({field} IS NOT NULL AND {collated} LIKE \'{pattern}\' AND {exact})'.format(
+            field=field, collated=_collated(field), pattern=pattern, exact=_no_trailing_spaces(field))
+    elif kind == 'greater_than':
+        if text:
+            # A value with trailing spaces is greater than the same value without them in Python, but equal in SQL
+            return ('({field} IS NOT NULL AND ({collated} > {value} OR ' +
+                    '({collated} = {value} AND NOT {exact})))').format(
+                field=field, collated=_collated(field), value=_sql_value(condition[2]),
+                exact=_no_trailing_spaces(field))
+        return '({field} IS NOT NULL AND {field} > {value})'.format(field=field, value=_sql_value(condition[2]))
+    raise ValueError('Unknown rule condition: {}'.format(condition))
+
+def _collated(field):
+    """
+    Return the SQL of a text `field` in config.RULE_SQL_COLLATION, which compares case-sensitively.
+    """
+    return '{field} COLLATE {collation}'.format(field=field, collation=RULE_SQL_COLLATION)
+
+def _no_trailing_spaces(field):
+    """
+    Return the SQL of a condition that is True when a text `field` does not end with a space. SQL Server ignores
+    trailing spaces when it compares text with = or LIKE, but DATALENGTH counts them.
+    """
+    return 'DATALENGTH({field}) = DATALENGTH(RTRIM({field}))'.format(field=field)
+
+def _is_text_field(field, field_types):
+    """
+    Return True if the `field` is a text field, according to `field_types` or RULE_TEXT_FIELDS.
+    """
+    if field_types and field in field_types:
+        return field_types[field] in ('String', 'Guid', 'GlobalID')
+    return field in RULE_TEXT_FIELDS
+
+def _sql_value(value):
+    """
+    Format a Python value as an SQL literal.
+    """
+    if isinstance(value, numbers.Number) and not isinstance(value, bool):
+        return str(value)
+    return '\'{}\''.format(str(value).replace('\'', '\'\''))
+
+def _string_array(column):
+    """
+    Convert a column to an array of strings, the same way `str` converts each value.
+    """
+    column = np.asarray(column)
+    if column.dtype.kind in ('S', 'U'):
+        return column
+    return np.array([str(value) for value in column])
+
+def _digits_mask(strings, length):
+    """
+    Vectorized equivalent of matching each string against the regular expression ^\\d{length}$
+    """
+    return (np.char.str_len(strings) == length) & np.char.isdigit(strings)
+
+def _truthy_mask(column, null_integer=NUMPY_NULL_INTEGER):
+    """
+    Vectorized equivalent of calling `bool` on each value in a column. NULL numeric values that were replaced
+    by `utils.milepoint_attributes_to_array` are falsy, just like the Python None they replaced.
+    """
+    column = np.asarray(column)
+    if column.dtype.kind in ('S', 'U'):
+        return np.char.str_len(column) > 0
+    elif column.dtype.kind == 'O':
+        return np.array([bool(value) for value in column], dtype=bool)
+    return (column != 0) & (column != null_integer)
+
+def _equals_mask(column, value):
+    """
+    Vectorized equivalent of testing each value in a column for equality with `value`.
+    """
+    column = np.asarray(column)
+    if column.dtype.kind == 'O':
+        return np.array([row_value == value for row_value in column], dtype=bool)
+    return np.asarray(column == value, dtype=bool)
+
+
+# All validations regardless of ROADWAY_TYPE
+register(Rule('route_id_format', 'ROUTE_ID must be a nine digit number', None, not_(digits('ROUTE_ID', 9))))
+register(Rule('dot_id_format', 'DOT_ID must be a six digit number', None, not_(digits('DOT_ID', 6))))
+register(Rule('county_order_format', 'COUNTY_ORDER must be a zero padded two digit number (e.g. \'01\')', None,
+    not_(digits('COUNTY_ORDER', 2))))
+register(Rule('county_order_minimum', 'COUNTY_ORDER must be greater than \'00\'', None,
+    all_of(digits('COUNTY_ORDER', 2), equals('COUNTY_ORDER', '00'))))
+register(Rule('county_order_maximum', 'COUNTY_ORDER should be less than \'29\'', None,
+    all_of(digits('COUNTY_ORDER', 2), greater_than('COUNTY_ORDER', '28'))))
+
+# Validations for ROADWAY_TYPE = Road or Ramp. ROUTE_QUALIFIER 10 is "No Qualifier", and PARKWAY_FLAG T is "Yes"
+register(Rule('road_ramp_signing', 'SIGNING must be null when ROADWAY_TYPE in (\'Road\', \'Ramp\')', (1, 2),
+    is_set('SIGNING')))
+register(Rule('road_ramp_route_number', 'ROUTE_NUMBER must be null when ROADWAY_TYPE in (\'Road\', \'Ramp\')', (1, 2),
+    is_set('ROUTE_NUMBER')))
+register(Rule('road_ramp_route_suffix', 'ROUTE_SUFFIX must be null when ROADWAY_TYPE in (\'Road\', \'Ramp\')', (1, 2),
+    is_set('ROUTE_SUFFIX')))
+register(Rule('road_ramp_route_qualifier',
+    'ROUTE_QUALIFIER must be \'No Qualifier\' when ROADWAY_TYPE in (\'Road\', \'Ramp\')', (1, 2),
+    not_(equals('ROUTE_QUALIFIER', 10))))
+register(Rule('road_ramp_parkway_flag', 'PARKWAY_FLAG must be \'No\' when ROADWAY_TYPE in (\'Road\', \'Ramp\')', (1, 2),
+    equals('PARKWAY_FLAG', 'T')))
+register(Rule('road_ramp_roadway_feature', 'ROADWAY_FEATURE must be null when ROADWAY_TYPE in (\'Road\', \'Ramp\')',
+    (1, 2), is_set('ROADWAY_FEATURE')))
+
+# Validations for ROADWAY_TYPE = Route
+register(Rule('route_route_number', 'ROUTE_NUMBER must not be null when ROADWAY_TYPE=Route', (3,),
+    not_(is_set('ROUTE_NUMBER'))))
+register(Rule('route_roadway_feature', 'ROADWAY_FEATURE must be null when ROADWAY_TYPE=Route', (3,),
+    is_set('ROADWAY_FEATURE')))
+register(Rule('route_unsigned_nine_hundred',
+    'ROUTE_NUMBER must be a \'900\' route (i.e. 9xx) when ROADWAY_TYPE=Route and SIGNING is null', (3,),
+    all_of(not_(is_set('SIGNING')), not_(digits('ROUTE_NUMBER', 3, prefix='9')))))
+
+# Validations for ROADWAY_TYPE = Non-Mainline
+register(Rule('non_mainline_signing', 'SIGNING must be null when ROADWAY_TYPE=Non-Mainline', (5,),
+    is_set('SIGNING')))
+register(Rule('non_mainline_route_number', 'ROUTE_NUMBER must be null when ROADWAY_TYPE=Non-Mainline', (5,),
+    is_set('ROUTE_NUMBER')))
+register(Rule('non_mainline_route_suffix', 'ROUTE_SUFFIX must be null when ROADWAY_TYPE=Non-Mainline', (5,),
+    is_set('ROUTE_SUFFIX')))
+register(Rule('non_mainline_route_qualifier', 'ROUTE_QUALIFIER must be null when ROADWAY_TYPE=Non-Mainline', (5,),
+    not_(equals('ROUTE_QUALIFIER', 10))))
+register(Rule('non_mainline_parkway_flag', 'PARKWAY_FLAG must be \'No\' when ROADWAY_TYPE=Non-Mainline', (5,),
+    equals('PARKWAY_FLAG', 'T')))
+register(Rule('non_mainline_roadway_feature', 'ROADWAY_FEATURE must not be null when ROADWAY_TYPE=Non-Mainline', (5,),
+    not_(is_set('ROADWAY_FEATURE'))))
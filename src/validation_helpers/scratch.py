@@ -0,0 +1,192 @@
+"""
+A registry of the scratch datasets (in_memory feature classes and tables) that a validation run creates. Every scratch
+dataset gets a unique name from `unique_name`, and is registered with the innermost active ScratchRegistry. When the
+registry exits, it deletes the datasets that it registered and that still exist, and nothing else. The in_memory
+workspace is shared by every tool in the ArcGIS process, so deleting everything in it would also delete the data of
+other tools (or other validators).
+
+Feature layers also get their names from `unique_name`, but are not registered. The versioned Milepoint layer is kept
+by the resident worker between requests, so a registry must never delete it.
+
+The size of the scratch datasets is tracked from the row counts that their creators report with `add_rows`, rather
+than measured with Exists and GetCount, which would cost a round trip per dataset.
+
+Example
+-------
+>>> with ScratchRegistry(logger=logger) as registry:
+>>>     buffer_fc = 'in_memory\\{}'.format(unique_name('mpbuff'))
+>>>     arcpy.Buffer_analysis(layer, buffer_fc, '10 Meters')
+>>>     add_rows(buffer_fc, feature_count)
+>>> # buffer_fc has been deleted
+
+The `scratch_scope` decorator runs a function inside a registry, using the function's logger and messages keyword
+arguments for the summary of the datasets it created.
+"""
+import datetime
+import functools
+import logging
+import uuid
+
+import arcpy
+
+
+# The stack of active registries. Names are registered with the last (innermost) one
+_REGISTRIES = []
+
+
+class ScratchRegistry(object):
+    """
+    A context manager that tracks the scratch datasets created while it is active, deletes them on exit, and reports
+    the peak number of datasets and the peak number of rows they held.
+    """
+    def __init__(self, logger=None, arcpy_messages=None):
+        self.logger = logger
+        self.arcpy_messages = arcpy_messages
+        # The registered datasets, in the order they were registered
+        self.datasets = []
+        # The number of rows of each registered dataset, as reported by add_rows
+        self.rows = {}
+        self.peak_count = 0
+        self.peak_rows = 0
+
+    def __enter__(self):
+        _REGISTRIES.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if self in _REGISTRIES:
+            _REGISTRIES.remove(self)
+        self.cleanup()
+        return False
+
+    def register(self, dataset):
+        """
+        Track the `dataset` (an in_memory path), so it is deleted when the registry exits.
+        """
+        if dataset not in self.datasets:
+            self.datasets.append(dataset)
+            self.rows[dataset] = 0
+            self.measure()
+        return dataset
+
+    def add_rows(self, dataset, count):
+        """
+        Add `count` rows to the row count of the registered `dataset`.
+        """
+        self.rows[dataset] = self.rows.get(dataset, 0) + count
+        self.measure()
+
+    def delete(self, dataset):
+        """
+        Delete the `dataset` now, and stop tracking it.
+        """
+        if dataset in self.datasets:
+            self.datasets.remove(dataset)
+            self.rows.pop(dataset, None)
+        _delete_dataset(dataset)
+
+    def measure(self):
+        """
+        Update the peak count and peak row count with the registered datasets and their reported row counts.
+        """
+        self.peak_count = max(self.peak_count, len(self.datasets))
+        self.peak_rows = max(self.peak_rows, sum(self.rows.values()))
+
+    def cleanup(self):
+        """
+        Delete every registered dataset that still exists, and log the peak count and size of the datasets.
+        """
+        deleted = []
+        for dataset in reversed(self.datasets):
+            if arcpy.Exists(dataset):
+                _delete_dataset(dataset)
+                deleted.append(dataset)
+        self.datasets = []
+        self.rows = {}
+
+        self._log_debug('Scratch datasets: deleted {} at exit | peak of {} dataset(s) holding {} row(s)'.format(
+            len(deleted), self.peak_count, self.peak_rows))
+
+    def _log_debug(self, message):
+        """
+        Log a debug message the way utils.log_it does. utils creates scratch datasets, so this module
+        cannot import it.
+        """
+        if not self.logger or self.logger.level > logging.DEBUG:
+            return
+        logging.debug(message)
+        if self.arcpy_messages:
+            self.arcpy_messages.addMessage('{datetime} [{level:<5}]  {message}'.format(
+                datetime=datetime.datetime.now(),
+                level='DEBUG',
+                message=message
+            ))
+
+
+def unique_name(prefix, workspace='in_memory'):
+    """
+    Return a unique dataset name that starts with `prefix`. If a registry is active, an in_memory dataset
+    (in_memory\\name) is registered with it. Feature layer names are not registered, so the caller deletes the
+    layers it does not keep. The name is returned without the workspace, since the geoprocessing tools that
+    create datasets take the workspace and the name separately.
+
+    Arguments
+    ---------
+    :param prefix: The start of the name, e.g. 'mpbuff'
+
+    Keyword Arguments
+    -----------------
+    :param workspace: Defaults to 'in_memory'. The workspace of the dataset, or None for a feature layer name
+
+    Returns
+    -------
+    :returns str: The unique name
+    """
+    name = '{}_{}'.format(prefix, uuid.uuid4().hex)
+    if _REGISTRIES and workspace == 'in_memory':
+        _REGISTRIES[-1].register('{}\\{}'.format(workspace, name))
+    return name
+
+def add_rows(dataset, count):
+    """
+    Report that `count` rows were written to a scratch dataset, for the peak row count of the registry that it is
+    registered with. Does nothing if the dataset is not registered.
+    """
+    for registry in reversed(_REGISTRIES):
+        if dataset in registry.datasets:
+            registry.add_rows(dataset, count)
+            return
+
+def delete(dataset):
+    """
+    Delete a scratch dataset now. If it is registered with an active registry, it is also unregistered.
+    """
+    for registry in reversed(_REGISTRIES):
+        if dataset in registry.datasets:
+            registry.delete(dataset)
+            return
+    _delete_dataset(dataset)
+
+def scratch_scope(function):
+    """
+    A decorator that runs the `function` inside a ScratchRegistry. The registry logs with the `logger` and
+    `messages` (or `arcpy_messages`) keyword arguments of the function call.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        registry = ScratchRegistry(
+            logger=kwargs.get('logger'),
+            arcpy_messages=kwargs.get('messages', kwargs.get('arcpy_messages'))
+        )
+        with registry:
+            return function(*args, **kwargs)
+    return wrapper
+
+def _delete_dataset(dataset):
+    """
+    Delete a dataset, ignoring datasets that are already gone or locked.
+    """
+    try:
+        arcpy.Delete_management(dataset)
+    except Exception:
+        pass
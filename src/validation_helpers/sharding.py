@@ -0,0 +1,95 @@
+"""
+Split a table of routes into shards that are validated in a pool of worker processes, and merge the violations of
+the shards. The routes are split by a key field (e.g. DOT_ID), so every route of a key is in the same shard, and the
+validations that compare the routes of a key (e.g. the COUNTY_ORDER sequence of a DOT_ID) stay within a shard.
+
+Each shard is a contiguous range of the sorted distinct keys, with the routes in their original order. The shards,
+and so the merged violations, only depend on the routes and the number of shards. They do not depend on the number
+of worker processes or on the order the shards finish in.
+
+The worker processes are started like those of parallel.py (see utils.set_worker_executable). The function that
+validates a shard must be a module level function, so the workers can import it.
+"""
+from collections import defaultdict
+import multiprocessing
+
+import numpy as np
+
+import validation_helpers.utils as utils
+
+
+def shard_rows(rows, key_field, shard_count):
+    """
+    Split the `rows` into shards of the distinct values of the `key_field`.
+
+    Arguments
+    ---------
+    :param rows: A NumPy structured array
+    :param key_field: The field whose values are kept together in one shard
+    :param shard_count: The number of shards. There are fewer shards if there are fewer distinct keys
+
+    Returns
+    -------
+    :returns list: A list of NumPy structured arrays, one per shard, with the rows in their original order
+    """
+    keys = np.asarray(rows[key_field])
+    if shard_count <= 1 or len(keys) == 0:
+        return [rows]
+
+    unique_keys, key_indexes = np.unique(keys, return_inverse=True)
+    shard_count = min(shard_count, len(unique_keys))
+    # The sorted distinct keys are numbered, and split into shard_count ranges of about the same number of keys
+    shard_numbers = key_indexes * shard_count // len(unique_keys)
+    return [rows[shard_numbers == shard_number] for shard_number in range(shard_count)]
+
+def map_shards(function, shards, processes=None):
+    """
+    Call `function` on each shard in a pool of worker processes, and return the results in shard order. When this
+    function already runs in a worker process (which cannot start processes of its own), or there is only one
+    shard or process, the shards are validated one after the other in this process instead.
+
+    Arguments
+    ---------
+    :param function: A module level function that takes a shard and returns a picklable result
+    :param shards: The shards of `shard_rows`
+
+    Keyword Arguments
+    -----------------
+    :param processes: Defaults to None, which starts one worker process per shard, up to the number of CPUs
+
+    Returns
+    -------
+    :returns list: The results of `function`, in the order of the `shards`
+    """
+    if multiprocessing.current_process().daemon or processes == 1 or len(shards) <= 1:
+        return [function(shard) for shard in shards]
+
+    utils.set_worker_executable()
+    pool = multiprocessing.Pool(processes=processes or min(len(shards), multiprocessing.cpu_count()))
+    try:
+        results = pool.map(function, shards)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return results
+
+def merge_violations(shard_violations):
+    """
+    Merge the violations dictionaries of the shards. The ROUTE_IDs of each rule are added in the order of the
+    `shard_violations`, so the merged lists do not depend on the order the shards finished in.
+
+    Arguments
+    ---------
+    :param shard_violations: A list of violations dictionaries, with the rule descriptions as keys and lists of
+        ROUTE_IDs as values, in shard order
+
+    Returns
+    -------
+    :returns defaultdict(list): The merged violations
+    """
+    violations = defaultdict(list)
+    for shard in shard_violations:
+        for rule in sorted(shard):
+            violations[rule].extend(shard[rule])
+    return violations
@@ -0,0 +1,428 @@
+"""
+A local, columnar snapshot of the LRSN_Milepoint roadway level attributes. Reading Milepoint through the versioned
+layer is the slowest part of a full database validation, and every tool invocation reads it again. The snapshot
+stores the SNAPSHOT_FIELDS of the active routes in a NumPy .npy file on local disk, keyed by the database version and
+its SDE state ID. While the version's state does not change, subsequent runs memory-map the file rather than reading
+the SDE database.
+
+The snapshot does not care where the rows come from. The `read_source` callable that's passed to
+`load_milepoint_snapshot` returns a NumPy structured array, which is typically `read_milepoint_source` against the
+versioned Milepoint layer. Anything else that returns the same columns (e.g. `numpy.load` of a saved .npy file) can
+stand in for the SDE database.
+
+When the version's state has changed, the snapshot is refreshed rather than rebuilt. A refresh reads only the
+OBJECTID and EDITED_DATE of every unretired route of the version (`read_keys`) and compares them with the snapshot:
+- Rows whose OBJECTID is missing from the version were deleted or retired, and are dropped
+- Rows whose OBJECTID is new, or whose EDITED_DATE differs from the snapshot, are read in full (`read_delta`) and
+  merged into the snapshot by OBJECTID
+- Rows whose TO_DATE has passed are retired
+
+Comparing every OBJECTID, rather than reading the rows edited since the newest EDITED_DATE in the snapshot, also
+catches rows that were posted or reconciled into the version from a child version. Those rows keep the EDITED_DATE
+of the child version's edit, which can be older than any date in the snapshot. Edits that do not update
+EDITED_DATE (e.g. SQL updates with editor tracking off) are only seen by a full read, so the snapshot is still
+rebuilt from a full read every SNAPSHOT_FULL_REFRESH_DAYS days. The state ID and the time of the last full read are
+stored in a small JSON file next to the snapshot.
+"""
+import datetime
+import hashlib
+import json
+import os
+import re
+
+import arcpy
+import numpy as np
+
+import validation_helpers.files as files
+import validation_helpers.timing as timing
+import validation_helpers.utils as utils
+from validation_helpers.config import (
+    NUMPY_NULL_DATE,
+    SNAPSHOT_FIELDS,
+    SNAPSHOT_FULL_REFRESH_DAYS,
+    UNRETIRED_ROUTES_WHERE_CLAUSE,
+    VERSION_STATE_QUERY_FMT,
+)
+
+# The format of the dates in the snapshot metadata
+METADATA_DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def get_version_state_id(production_ws, production_ws_version):
+    """
+    Query the SDE_versions system table for the state ID of the `production_ws_version`. The state ID changes
+    every time an edit is saved to the version, so it identifies the exact contents of the version.
+
+    Arguments
+    ---------
+    :param production_ws: Filepath to the SDE file pointing to the correct database.
+    :param production_ws_version: The version name, e.g. "SVC\\AVITALE".HDS_GENERAL_EDITING_JOB_1234 or ELRS.Lockroot
+
+    Returns
+    -------
+    :returns int: The state ID of the version
+    :raises VersionDoesNotExistError: Raises exception if the version is not in the SDE_versions table
+    """
+    owner, name = split_version_name(production_ws_version)
+    connection = arcpy.ArcSDESQLExecute(production_ws)
+    result = connection.execute(VERSION_STATE_QUERY_FMT.format(
+        owner=owner.replace('\'', '\'\''),
+        name=name.replace('\'', '\'\'')
+    ))
+    del connection
+
+    if isinstance(result, bool) or result is None:
+        raise utils.VersionDoesNotExistError(
+            'Could not determine the state ID of version \'{}\''.format(production_ws_version)
+        )
+    while isinstance(result, (list, tuple)):
+        result = result[0]
+    return int(result)
+
+def split_version_name(production_ws_version):
+    """
+    Split a fully qualified version name into the owner and name that are stored in the SDE_versions table.
+    The owner of a version created by a Windows user is quoted, e.g. "SVC\\AVITALE".HDS_GENERAL_EDITING_JOB_1234
+
+    Arguments
+    ---------
+    :param production_ws_version: The fully qualified version name
+
+    Returns
+    -------
+    :returns tuple: Returns a tuple of the version owner and the version name
+    """
+    owner, name = production_ws_version.rsplit('.', 1)
+    return owner.strip('"'), name
+
+def snapshot_path(cache_dir, production_ws_version, state_id):
+    """
+    Return the filepath of the snapshot of `production_ws_version` at `state_id` within the `cache_dir`.
+    """
+    return os.path.join(
+        cache_dir,
+        '{prefix}_state{state_id}.npy'.format(prefix=version_file_prefix(production_ws_version), state_id=state_id)
+    )
+
+def metadata_path(cache_dir, production_ws_version):
+    """
+    Return the filepath of the JSON file that records the state ID and the time of the last full read of the
+    snapshot of `production_ws_version`.
+    """
+    return os.path.join(cache_dir, '{prefix}.json'.format(prefix=version_file_prefix(production_ws_version)))
+
+def version_file_prefix(production_ws_version):
+    """
+    Convert a version name, which contains quotes and backslashes, to a prefix that is safe to use in a filename.
+    A short hash of the full name is appended, so two versions never share a prefix.
+    """
+    safe_name = re.sub(r'[^A-Za-z0-9_]+', '_', production_ws_version).strip('_')
+    digest = hashlib.md5(production_ws_version.encode('utf-8')).hexdigest()[:8]
+    return '{}_{}'.format(safe_name, digest)
+
+def read_milepoint_source(layer, fields=SNAPSHOT_FIELDS, where_clause=UNRETIRED_ROUTES_WHERE_CLAUSE):
+    """
+    Read the snapshot columns of the routes that have not been retired from the versioned Milepoint `layer`.
+    This is the default `read_source` for `load_milepoint_snapshot`.
+
+    Arguments
+    ---------
+    :param layer: The versioned Milepoint feature layer
+
+    Keyword Arguments
+    -----------------
+    :param fields: Defaults to config.SNAPSHOT_FIELDS. The columns to read
+    :param where_clause: Defaults to config.UNRETIRED_ROUTES_WHERE_CLAUSE. An ArcGIS where_clause that limits the rows
+
+    Returns
+    -------
+    :returns numpy.ndarray: A structured array with one column per field in `fields`
+    """
+    # Clear any existing selection, since it would limit the rows that are read
+    arcpy.SelectLayerByAttribute_management(layer, 'CLEAR_SELECTION')
+    return utils.milepoint_attributes_to_array(layer, fields, where_clause=where_clause)
+
+def read_milepoint_keys(layer, where_clause=UNRETIRED_ROUTES_WHERE_CLAUSE):
+    """
+    Read the OBJECTID and EDITED_DATE of the routes that have not been retired from the versioned Milepoint `layer`,
+    which a refresh compares with the snapshot. This is the default `read_keys` for `load_milepoint_snapshot`.
+
+    Arguments
+    ---------
+    :param layer: The versioned Milepoint feature layer
+
+    Keyword Arguments
+    -----------------
+    :param where_clause: Defaults to config.UNRETIRED_ROUTES_WHERE_CLAUSE. The where_clause of `read_milepoint_source`
+
+    Returns
+    -------
+    :returns numpy.ndarray: A structured array with OBJECTID and EDITED_DATE columns
+    """
+    return read_milepoint_source(layer, fields=['OBJECTID', 'EDITED_DATE'], where_clause=where_clause)
+
+def read_milepoint_delta(layer, object_ids, fields=SNAPSHOT_FIELDS):
+    """
+    Read the snapshot columns of the rows of the versioned Milepoint `layer` with the `object_ids`. This is the
+    default `read_delta` for `load_milepoint_snapshot`.
+
+    Arguments
+    ---------
+    :param layer: The versioned Milepoint feature layer
+    :param object_ids: A list of the OBJECTIDs to read. If it is empty, no rows are read, but the returned array
+        still has the columns of the layer
+
+    Keyword Arguments
+    -----------------
+    :param fields: Defaults to config.SNAPSHOT_FIELDS. The columns to read
+
+    Returns
+    -------
+    :returns numpy.ndarray: A structured array with one column per field in `fields`
+    """
+    if not len(object_ids):
+        # OBJECTID is never NULL, so this reads the columns without any rows
+        return read_milepoint_source(layer, fields=fields, where_clause='OBJECTID IS NULL')
+
+    utils.select_layer_by_values(layer, 'OBJECTID', object_ids, base_where_clause=UNRETIRED_ROUTES_WHERE_CLAUSE)
+    try:
+        return utils.milepoint_attributes_to_array(layer, fields)
+    finally:
+        arcpy.SelectLayerByAttribute_management(layer, 'CLEAR_SELECTION')
+
+@timing.timed()
+def load_milepoint_snapshot(cache_dir, production_ws_version, state_id, read_source, read_keys=None,
+                            read_delta=None, now=None, logger=None, arcpy_messages=None):
+    """
+    Return the snapshot of `production_ws_version` at `state_id`. If the snapshot is already in the `cache_dir`, it is
+    memory-mapped from disk. If an older snapshot of the version is there and `read_keys` and `read_delta` are set,
+    the older snapshot is refreshed (see the module docstring). Otherwise the rows are read with `read_source`.
+    The new snapshot is saved to the `cache_dir`, and any older snapshots of the version are removed.
+
+    Arguments
+    ---------
+    :param cache_dir: The directory where snapshots are stored. It is created if it does not exist
+    :param production_ws_version: The database version that the snapshot represents
+    :param state_id: The SDE state ID of the version (see `get_version_state_id`)
+    :param read_source: A callable that takes no arguments and returns a NumPy structured array of the Milepoint
+        rows. Text columns must be fixed width (not object), so the file can be memory-mapped
+
+    Keyword Arguments
+    -----------------
+    :param read_keys: Defaults to None, which always rebuilds the snapshot with `read_source`. If set, a callable
+        that takes no arguments and returns a NumPy structured array of the OBJECTID and EDITED_DATE of every row
+        that `read_source` would return
+    :param read_delta: Defaults to None, which always rebuilds the snapshot with `read_source`. If set, a callable
+        that takes a list of OBJECTIDs and returns their rows, with the same columns as `read_source`. It is
+        called with an empty list when no row changed, and must still return the columns
+    :param now: Defaults to None, which is the current time. The datetime.datetime that routes are retired at
+    :param logger: Defaults to None. If set, should be Python logging module logger object.
+    :param arcpy_messages: Defaults to None. If set, should refer to the arcpy.Messages variable that is present
+        in the `execute` method of Python Toolboxes.
+
+    Returns
+    -------
+    :returns numpy.ndarray: A read-only, memory-mapped structured array of the snapshot rows
+    """
+    now = now or datetime.datetime.now()
+    path = snapshot_path(cache_dir, production_ws_version, state_id)
+    if os.path.exists(path):
+        utils.log_it('Using Milepoint snapshot: {}'.format(path),
+            level='debug', logger=logger, arcpy_messages=arcpy_messages)
+        return np.load(path, mmap_mode='r')
+
+    rows = None
+    metadata = read_metadata(cache_dir, production_ws_version)
+    full_refresh_interval = datetime.timedelta(days=SNAPSHOT_FULL_REFRESH_DAYS)
+    if read_keys and read_delta and metadata and now - metadata['last_full_read'] < full_refresh_interval:
+        previous_rows = np.load(os.path.join(cache_dir, metadata['snapshot']), mmap_mode='r')
+        kept, changed_object_ids = compare_snapshot_keys(previous_rows, read_keys())
+        delta_rows = read_delta(changed_object_ids.tolist())
+        if delta_rows.dtype == previous_rows.dtype:
+            utils.log_it(('Refreshing Milepoint snapshot of version {} from state {} to state {}: kept {} of {} ' +
+                          'row(s) and re-read {} new or edited row(s)').format(
+                              production_ws_version, metadata['state_id'], state_id, int(kept.sum()), len(kept),
+                              len(delta_rows)),
+                level='info', logger=logger, arcpy_messages=arcpy_messages)
+            rows = merge_snapshot_rows(np.asarray(previous_rows)[kept], delta_rows, now=now)
+            last_full_read = metadata['last_full_read']
+        else:
+            utils.log_it('The Milepoint columns have changed since the snapshot was created. Rebuilding the snapshot',
+                level='warn', logger=logger, arcpy_messages=arcpy_messages)
+        # Release the memory-map, so the previous snapshot can be removed on Windows
+        del previous_rows
+
+    if rows is None:
+        utils.log_it('Creating Milepoint snapshot of version {} at state {}'.format(production_ws_version, state_id),
+            level='info', logger=logger, arcpy_messages=arcpy_messages)
+        rows = read_source()
+        last_full_read = now
+
+    save_snapshot(rows, path)
+    write_metadata(cache_dir, production_ws_version, state_id, os.path.basename(path), last_full_read)
+    remove_stale_snapshots(cache_dir, production_ws_version, keep=path)
+
+    return np.load(path, mmap_mode='r')
+
+def merge_snapshot_rows(rows, delta_rows, now=None):
+    """
+    Merge the `delta_rows` into the snapshot `rows`. A row of `delta_rows` replaces the snapshot row with the same
+    OBJECTID, or is added if there is none. Rows whose TO_DATE has passed are retired from the result.
+
+    Arguments
+    ---------
+    :param rows: A NumPy structured array of the snapshot rows
+    :param delta_rows: A NumPy structured array of the edited rows, with the same dtype as `rows`
+
+    Keyword Arguments
+    -----------------
+    :param now: Defaults to None, which is the current time. The datetime.datetime that routes are retired at
+
+    Returns
+    -------
+    :returns numpy.ndarray: A new structured array of the merged rows
+    """
+    now = np.datetime64(now or datetime.datetime.now())
+    edited_object_ids = set(delta_rows['OBJECTID'].tolist())
+    unchanged = np.array([object_id not in edited_object_ids for object_id in rows['OBJECTID'].tolist()], dtype=bool)
+    merged = np.concatenate([np.asarray(rows)[unchanged], np.asarray(delta_rows)])
+
+    null_date = np.datetime64(NUMPY_NULL_DATE)
+    to_dates = merged['TO_DATE']
+    return merged[(to_dates == null_date) | (to_dates >= now)]
+
+def compare_snapshot_keys(rows, keys):
+    """
+    Compare the snapshot `rows` with the OBJECTID and EDITED_DATE `keys` of the version.
+
+    Arguments
+    ---------
+    :param rows: A NumPy structured array of the snapshot rows
+    :param keys: A NumPy structured array of the OBJECTID and EDITED_DATE of every row of the version
+
+    Returns
+    -------
+    :returns tuple: A boolean array of the snapshot `rows` that are unchanged in the version, and an array of the
+        OBJECTIDs of the version that are new or have a different EDITED_DATE
+    """
+    key_order = np.argsort(keys['OBJECTID'], kind='mergesort')
+    key_object_ids = keys['OBJECTID'][key_order]
+    key_edited_dates = keys['EDITED_DATE'][key_order].astype(rows['EDITED_DATE'].dtype)
+
+    kept = np.zeros(len(rows), dtype=bool)
+    if len(key_object_ids):
+        positions = np.minimum(np.searchsorted(key_object_ids, rows['OBJECTID']), len(key_object_ids) - 1)
+        kept = ((key_object_ids[positions] == rows['OBJECTID']) &
+                (key_edited_dates[positions] == rows['EDITED_DATE']))
+
+    changed = ~_in_values(key_object_ids, np.asarray(rows['OBJECTID'])[kept])
+    return kept, key_object_ids[changed]
+
+def read_metadata(cache_dir, production_ws_version):
+    """
+    Read the metadata of the snapshot of `production_ws_version` from the `cache_dir`.
+
+    Returns
+    -------
+    :returns dict: A dict with the keys version, state_id, snapshot and last_full_read (a datetime.datetime), or
+        None if there is no usable metadata or the snapshot it refers to is missing
+    """
+    path = metadata_path(cache_dir, production_ws_version)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as metadata_file:
+            metadata = json.load(metadata_file)
+        metadata['last_full_read'] = datetime.datetime.strptime(metadata['last_full_read'], METADATA_DATE_FORMAT)
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not os.path.exists(os.path.join(cache_dir, metadata.get('snapshot', ''))):
+        return None
+    return metadata
+
+def write_metadata(cache_dir, production_ws_version, state_id, snapshot_filename, last_full_read):
+    """
+    Write the metadata of the snapshot of `production_ws_version` to the `cache_dir`. Like the snapshot, the metadata
+    is written with files.atomic_write.
+    """
+    metadata = {
+        'version': production_ws_version,
+        'state_id': state_id,
+        'snapshot': snapshot_filename,
+        'last_full_read': last_full_read.strftime(METADATA_DATE_FORMAT),
+    }
+    files.write_json(metadata_path(cache_dir, production_ws_version), metadata)
+
+def save_snapshot(rows, path):
+    """
+    Save the `rows` to `path`. The rows are written with files.atomic_write, so a snapshot that is interrupted part
+    way through never replaces a complete one.
+
+    Arguments
+    ---------
+    :param rows: A NumPy structured array without object columns
+    :param path: The .npy filepath
+
+    Returns
+    -------
+    :returns str: The `path`
+    :raises ValueError: Raises a ValueError if the rows contain object columns, which cannot be memory-mapped
+    """
+    if rows.dtype.hasobject:
+        raise ValueError('Snapshot rows cannot contain object columns. Columns: {}'.format(rows.dtype))
+
+    with files.atomic_write(path, binary=True) as snapshot_file:
+        np.save(snapshot_file, rows)
+
+    return path
+
+def remove_stale_snapshots(cache_dir, production_ws_version, keep=None):
+    """
+    Remove the snapshots of `production_ws_version` from the `cache_dir`, except for the `keep` filepath.
+    Snapshots that are memory-mapped by another process cannot be removed on Windows, so they are skipped.
+    """
+    prefix = version_file_prefix(production_ws_version) + '_state'
+    for filename in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, filename)
+        if not filename.startswith(prefix) or (keep and os.path.abspath(path) == os.path.abspath(keep)):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def active_milepoint_rows(rows, now=None):
+    """
+    Filter the snapshot `rows` to the routes that are active at `now`. This is the NumPy equivalent of
+    config.ACTIVE_ROUTES_WHERE_CLAUSE, with NULL dates stored as config.NUMPY_NULL_DATE.
+
+    Arguments
+    ---------
+    :param rows: A NumPy structured array with FROM_DATE and TO_DATE columns
+
+    Keyword Arguments
+    -----------------
+    :param now: Defaults to None, which is the current time. A datetime.datetime to test the routes against
+
+    Returns
+    -------
+    :returns numpy.ndarray: The active rows
+    """
+    now = np.datetime64(now or datetime.datetime.now())
+    null_date = np.datetime64(NUMPY_NULL_DATE)
+    from_dates = rows['FROM_DATE']
+    to_dates = rows['TO_DATE']
+
+    active = ((from_dates == null_date) | (from_dates <= now)) & ((to_dates == null_date) | (to_dates >= now))
+    return rows[active]
+
+def _in_values(values, test_values):
+    """
+    Return a boolean array of the `values` that are in `test_values`, like numpy.isin, which the NumPy of ArcGIS
+    Desktop does not have.
+    """
+    sorted_values = np.sort(test_values)
+    if not len(sorted_values):
+        return np.zeros(len(values), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return sorted_values[positions] == values
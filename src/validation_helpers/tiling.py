@@ -0,0 +1,543 @@
+"""
+Run a Reviewer Batch Job once per tile of a larger analysis area, across a pool of worker processes. There are two
+kinds of tiles:
+1. Grid tiles split the full extent of Milepoint into config.BATCH_JOB_TILE_GRID (rows, columns) tiles for full
+   database validations (see `grid_tiles`)
+2. Edit cluster tiles group the buffered edits that are near each other, so edits at opposite ends of the state are
+   validated as two compact areas rather than one multipart polygon with a huge envelope (see `edit_cluster_tiles`)
+
+The progress of a tiled run is saved to a JSON file after every tile. If the run is interrupted, running it again with
+the same progress file skips the tiles that already completed. A feature that crosses the edge of a tile is validated
+by each tile that it touches, so the duplicate Reviewer records are removed once all of the tiles are done. Each tile
+records the range of RECORDIDs that its batch job wrote, and only the records in those ranges are compared, so the
+records that other validators wrote to the same session are never removed. A record is only a duplicate of a record
+that another tile wrote, so a feature with several errors of the same check within one tile keeps all of them (see
+`duplicate_record_ids`).
+"""
+import bisect
+from collections import defaultdict
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import time
+import traceback
+
+import arcpy
+
+import validation_helpers.files as files
+import validation_helpers.scratch as scratch
+import validation_helpers.timing as timing
+import validation_helpers.utils as utils
+import validation_helpers.write as write
+from validation_helpers.config import (
+    EDIT_CLUSTER_DISTANCE,
+    EDIT_CLUSTER_MAX_COUNT,
+    REVIEWER_DUPLICATE_FIELDS,
+    REVIEWER_GEOMETRY_TABLES,
+    REVIEWER_MAIN_TABLE,
+)
+
+
+class TiledBatchJobError(Exception):
+    """
+    This exception is raised when the Reviewer Batch Job fails on one or more tiles. The message contains
+    the traceback of each failure. The completed tiles are kept in the progress file, so a rerun only
+    runs the failed tiles.
+    """
+    pass
+
+
+@timing.timed()
+def run_tiled_batch_job(reviewer_ws, reviewer_session, batch_job_file, production_ws, production_ws_version,
+                        tiles, processes=None, progress_path=None,
+                        logger=None, arcpy_messages=None):
+    """
+    Run the Reviewer Batch Job once per tile, then remove the duplicate Reviewer records of features that were
+    validated by more than one tile. Only the records that the tiles' batch jobs wrote are compared (see
+    `run_batch_job_tile`).
+
+    The tiles run in a pool of worker processes. When this function is already running in a worker process
+    (e.g. the batch_job validator of parallel.run_validators_in_parallel), the tiles run one after the other
+    instead, since worker processes cannot start processes of their own. A file geodatabase Reviewer Workspace
+    cannot be written by more than one process at a time, and the batch job writes to the Reviewer Workspace
+    for its whole run, so the tiles also run one after the other against a file geodatabase. There, tiling
+    only makes a long run restartable from its progress file, and does not make it faster.
+
+    Arguments
+    ---------
+    :param reviewer_ws: Filepath to a Data Reviewer enabled geodatabase
+    :param reviewer_session: The full Reviewer Session name, e.g. 'Session 1 : 1234'
+    :param batch_job_file: Filepath to the Reviewer Batch Job file (.rbj)
+    :param production_ws: Filepath to the SDE file pointing to the correct database
+    :param production_ws_version: The database version to validate
+    :param tiles: A list of tiles from `grid_tiles` or `edit_cluster_tiles`
+
+    Keyword Arguments
+    -----------------
+    :param processes: Defaults to None, which is the number of CPUs. The number of worker processes
+    :param progress_path: Defaults to None, which does not save the progress. If set, a JSON filepath where the
+        completed tiles are recorded. Tiles that are recorded as complete by an earlier run are skipped
+    :param logger: Defaults to None. If set, should be Python logging module logger object.
+    :param arcpy_messages: Defaults to None. If set, should refer to the arcpy.Messages variable that is present
+        in the `execute` method of Python Toolboxes.
+
+    Returns
+    -------
+    :returns int: The number of duplicate Reviewer records that were removed
+    :raises TiledBatchJobError: Raises exception if the batch job failed on any of the tiles
+    """
+    start_time = time.time()
+    # The progress file is only reused by a run of the same batch job, on the same tiles, in the same session
+    run_key = '{}|{}|{}|{}'.format(
+        reviewer_session,
+        production_ws_version,
+        batch_job_file,
+        hashlib.md5(json.dumps(tiles, sort_keys=True).encode('utf-8')).hexdigest()
+    )
+
+    progress = read_progress(progress_path, run_key)
+    if progress is None:
+        progress = {
+            'run_key': run_key,
+            'completed_tiles': [],
+            'record_id_ranges': [],
+        }
+        write_progress(progress_path, progress)
+    # Progress files of older runs did not record the RECORDIDs of their tiles, whose records are then kept
+    progress.setdefault('record_id_ranges', [])
+    remaining_tiles = [tile for tile in tiles if tile['tile_id'] not in progress['completed_tiles']]
+
+    utils.log_it('Running the Reviewer Batch Job on {} of {} tile(s)'.format(len(remaining_tiles), len(tiles)),
+        level='info', logger=logger, arcpy_messages=arcpy_messages)
+
+    tasks = [dict(tile, **{
+        'reviewer_ws': reviewer_ws,
+        'reviewer_session': reviewer_session,
+        'batch_job_file': batch_job_file,
+        'production_ws': production_ws,
+        'production_ws_version': production_ws_version,
+    }) for tile in remaining_tiles]
+
+    failures = []
+
+    def record_result(result):
+        if result['error']:
+            failures.append(result)
+            utils.log_it('Tile {} failed after {:.2f} seconds:\n{}'.format(
+                result['tile_id'], result['seconds'], result['error']),
+                level='error', logger=logger, arcpy_messages=arcpy_messages)
+            return
+        progress['completed_tiles'].append(result['tile_id'])
+        if result['record_id_range']:
+            progress['record_id_ranges'].append(result['record_id_range'])
+        write_progress(progress_path, progress)
+        utils.log_it('Tile {} finished in {:.2f} seconds | {} of {} tile(s) complete'.format(
+            result['tile_id'], result['seconds'], len(progress['completed_tiles']), len(tiles)),
+            level='info', logger=logger, arcpy_messages=arcpy_messages)
+
+    serial = multiprocessing.current_process().daemon or processes == 1 or len(tasks) == 1
+    if not serial and is_file_geodatabase(reviewer_ws):
+        utils.log_it('The Reviewer Workspace is a file geodatabase, so the tiles run one after the other',
+            level='debug', logger=logger, arcpy_messages=arcpy_messages)
+        serial = True
+
+    if serial:
+        for task in tasks:
+            record_result(run_batch_job_tile(task))
+    elif tasks:
+        utils.set_worker_executable()
+        pool = multiprocessing.Pool(processes=processes)
+        try:
+            for result in pool.imap_unordered(run_batch_job_tile, tasks):
+                record_result(result)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    if failures:
+        raise TiledBatchJobError('\n'.join(
+            'Tile {}:\n{}'.format(failure['tile_id'], failure['error']) for failure in failures
+        ))
+
+    removed_count = 0
+    if len(tiles) > 1:
+        # A single tile cannot duplicate its own records
+        with write.reviewer_write_lock():
+            removed_count = remove_duplicate_reviewer_records(
+                reviewer_ws,
+                reviewer_session,
+                progress['record_id_ranges'],
+                logger=logger,
+                arcpy_messages=arcpy_messages
+            )
+
+    if progress_path and os.path.exists(progress_path):
+        os.remove(progress_path)
+
+    utils.log_it('Tiled Reviewer Batch Job finished in {:.2f} seconds. Removed {} duplicate record(s)'.format(
+        time.time() - start_time, removed_count),
+        level='info', logger=logger, arcpy_messages=arcpy_messages)
+
+    return removed_count
+
+def run_batch_job_tile(task):
+    """
+    Run the Reviewer Batch Job on one tile. This function is the target of the worker processes. Exceptions
+    are caught and returned as text, like in parallel.run_validator.
+
+    The largest RECORDID of the session is read before and after the batch job, while the Reviewer write lock is
+    held, and the range between them is returned as the records that the tile wrote. The validators that run
+    alongside the tiles hold the same lock while they write (see parallel.run_validators_in_parallel), so their
+    records are never inside the range. Without a lock, the tiles of the pool may write at the same time, and a
+    tile's range can then hold records of another tile of the same batch job.
+
+    Arguments
+    ---------
+    :param task: A tile from `grid_tiles` or `edit_cluster_tiles`, plus the batch job arguments of
+        `run_tiled_batch_job`
+
+    Returns
+    -------
+    :returns dict: A dictionary with the keys tile_id, seconds, record_id_range and error. The record_id_range is
+        a [first, last] list of the RECORDIDs that the batch job wrote, or None if it wrote none. The error is None,
+        or the traceback of the exception that stopped the batch job
+    """
+    start_time = time.time()
+    error = None
+    record_id_range = None
+    try:
+        arcpy.CheckOutExtension('datareviewer')
+        if 'extent' in task:
+            analysis_area = arcpy.Extent(*task['extent'])
+        else:
+            analysis_area = arcpy.AsShape(task['geometry'], True)
+        with write.reviewer_write_lock():
+            last_record_id = max_reviewer_record_id(task['reviewer_ws'], task['reviewer_session'])
+            arcpy.ExecuteReviewerBatchJob_Reviewer(
+                task['reviewer_ws'],
+                task['reviewer_session'],
+                task['batch_job_file'],
+                production_workspace=task['production_ws'],
+                analysis_area=analysis_area,
+                changed_features='ALL_FEATURES',
+                production_workspaceversion=task['production_ws_version']
+            )
+            new_last_record_id = max_reviewer_record_id(task['reviewer_ws'], task['reviewer_session'])
+        if new_last_record_id > last_record_id:
+            record_id_range = [last_record_id + 1, new_last_record_id]
+    except Exception:
+        error = traceback.format_exc()
+
+    return {
+        'tile_id': task['tile_id'],
+        'seconds': time.time() - start_time,
+        'record_id_range': record_id_range,
+        'error': error,
+    }
+
+def grid_tiles(extent, rows, columns):
+    """
+    Split the `extent` into a grid of equally sized tiles.
+
+    Arguments
+    ---------
+    :param extent: An arcpy.Extent, or any object with XMin, YMin, XMax and YMax properties
+    :param rows: The number of rows in the grid
+    :param columns: The number of columns in the grid
+
+    Returns
+    -------
+    :returns list: A list of dictionaries with a tile_id, e.g. 'r0c1', and an extent tuple of
+        (xmin, ymin, xmax, ymax). The tuples can be pickled, which arcpy.Extent objects cannot
+    """
+    if rows < 1 or columns < 1:
+        raise ValueError('The tile grid must have at least one row and one column. Got: {}x{}'.format(rows, columns))
+
+    width = (extent.XMax - extent.XMin) / float(columns)
+    height = (extent.YMax - extent.YMin) / float(rows)
+    tiles = []
+    for row in range(rows):
+        for column in range(columns):
+            # Use the extent's own edges for the last row and column, so rounding never leaves a gap
+            xmax = extent.XMax if column == columns - 1 else extent.XMin + width * (column + 1)
+            ymax = extent.YMax if row == rows - 1 else extent.YMin + height * (row + 1)
+            tiles.append({
+                'tile_id': 'r{}c{}'.format(row, column),
+                'extent': (extent.XMin + width * column, extent.YMin + height * row, xmax, ymax),
+            })
+    return tiles
+
+@timing.timed()
+def edit_cluster_tiles(layer, buffer_distance='10 Meters', cluster_distance=EDIT_CLUSTER_DISTANCE,
+                       max_clusters=EDIT_CLUSTER_MAX_COUNT, logger=None, arcpy_messages=None):
+    """
+    Buffer the selected features of the `layer` and group the buffers that are within `cluster_distance` of each
+    other into clusters. The buffers of each cluster are dissolved into one polygon, which is the analysis area
+    of a tile. If there are more than `max_clusters` clusters, the `cluster_distance` is doubled until there are
+    not, since every batch job has a fixed cost to start.
+
+    Arguments
+    ---------
+    :param layer: A feature layer with the edited features selected
+
+    Keyword Arguments
+    -----------------
+    :param buffer_distance: Defaults to '10 Meters'. The buffer distance, as accepted by Buffer_analysis
+    :param cluster_distance: Defaults to config.EDIT_CLUSTER_DISTANCE. Buffers whose extents are closer than this
+        distance, in the units of the `layer`'s spatial reference, are in the same cluster
+    :param max_clusters: Defaults to config.EDIT_CLUSTER_MAX_COUNT. The maximum number of clusters
+    :param logger: Defaults to None. If set, should be Python logging module logger object.
+    :param arcpy_messages: Defaults to None. If set, should refer to the arcpy.Messages variable that is present
+        in the `execute` method of Python Toolboxes.
+
+    Returns
+    -------
+    :returns list: A list of dictionaries with a tile_id, e.g. 'cluster0', and the Esri JSON of the cluster's
+        polygon as the geometry. The JSON can be pickled, which arcpy geometries cannot
+    """
+    buffer_fc = 'in_memory\\{}'.format(scratch.unique_name('editbuff'))
+    arcpy.Buffer_analysis(layer, buffer_fc, buffer_distance, dissolve_option='NONE')
+    try:
+        buffers = [row[0] for row in arcpy.da.SearchCursor(buffer_fc, ['SHAPE@']) if row[0]]
+        scratch.add_rows(buffer_fc, len(buffers))
+    finally:
+        scratch.delete(buffer_fc)
+
+    extents = [(buff.extent.XMin, buff.extent.YMin, buff.extent.XMax, buff.extent.YMax) for buff in buffers]
+    clusters = cluster_extents(extents, cluster_distance)
+    while len(clusters) > max(max_clusters, 1):
+        cluster_distance = cluster_distance * 2 or 1
+        clusters = cluster_extents(extents, cluster_distance)
+
+    tiles = []
+    for cluster_number, indexes in enumerate(clusters):
+        polygon = buffers[indexes[0]]
+        for index in indexes[1:]:
+            polygon = polygon.union(buffers[index])
+        tiles.append({'tile_id': 'cluster{}'.format(cluster_number), 'geometry': polygon.JSON})
+
+    if clusters:
+        utils.log_it('Grouped {} buffered feature(s) into {} cluster(s) of up to {} feature(s)'.format(
+            len(buffers), len(clusters), max(len(indexes) for indexes in clusters)),
+            level='info', logger=logger, arcpy_messages=arcpy_messages)
+
+    return tiles
+
+def cluster_extents(extents, distance):
+    """
+    Group extents that are within `distance` of each other, directly or through a chain of other extents. This is
+    single-linkage clustering on the extents, using a sweep along the x axis.
+
+    Arguments
+    ---------
+    :param extents: A list of (xmin, ymin, xmax, ymax) tuples
+    :param distance: Extents that are closer than this distance are in the same cluster
+
+    Returns
+    -------
+    :returns list: A list of clusters, each a sorted list of indexes into `extents`. The clusters are sorted by
+        their first index
+    """
+    parents = list(range(len(extents)))
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    order = sorted(range(len(extents)), key=lambda index: extents[index][0])
+    active = []
+    for index in order:
+        xmin, ymin, xmax, ymax = extents[index]
+        # Extents that end more than `distance` to the left of this one cannot reach any of the extents that follow
+        active = [other for other in active if extents[other][2] + distance >= xmin]
+        for other in active:
+            other_ymin, other_ymax = extents[other][1], extents[other][3]
+            if other_ymin - distance <= ymax and ymin <= other_ymax + distance:
+                parents[find(other)] = find(index)
+        active.append(index)
+
+    clusters = defaultdict(list)
+    for index in range(len(extents)):
+        clusters[find(index)].append(index)
+    return sorted(clusters.values())
+
+def session_id_from_name(reviewer_session):
+    """
+    Return the session ID from a full Reviewer Session name, e.g. 1 from 'Session 1 : 1234'.
+    """
+    match = re.match(r'^\s*Session\s+(\d+)\s*:', reviewer_session)
+    if not match:
+        raise ValueError('Could not find the session ID in the Reviewer Session name \'{}\''.format(reviewer_session))
+    return int(match.group(1))
+
+def max_reviewer_record_id(reviewer_ws, reviewer_session):
+    """
+    Return the largest RECORDID of the Reviewer records in the `reviewer_session`, or 0 if there are none.
+    """
+    main_table = utils.find_reviewer_table(reviewer_ws, REVIEWER_MAIN_TABLE)
+    where_clause = 'SESSIONID = {}'.format(session_id_from_name(reviewer_session))
+    record_ids = [row[0] for row in arcpy.da.SearchCursor(main_table, ['OID@'], where_clause=where_clause)]
+    return max(record_ids) if record_ids else 0
+
+def remove_duplicate_reviewer_records(reviewer_ws, reviewer_session, record_id_ranges,
+                                      duplicate_fields=REVIEWER_DUPLICATE_FIELDS,
+                                      logger=None, arcpy_messages=None):
+    """
+    Remove the duplicate Reviewer records that were written by a tiled batch job. The records of the
+    `reviewer_session` with a RECORDID in one of the `record_id_ranges` and a CHECKTITLE are grouped by the
+    `duplicate_fields`, and the records of a group that other tiles wrote again are deleted along with their
+    geometry (see `duplicate_record_ids`). The records of the other validators (e.g.
+    write.rdwy_attrs_sql_result_to_reviewer_table) are outside the ranges and have no CHECKTITLE, so they are never
+    removed.
+
+    Arguments
+    ---------
+    :param reviewer_ws: Filepath to a Data Reviewer enabled geodatabase
+    :param reviewer_session: The full Reviewer Session name, e.g. 'Session 1 : 1234'
+    :param record_id_ranges: A list of the [first, last] RECORDID range that each tile of the batch job wrote (see
+        `run_batch_job_tile`). The ranges must not be merged, since they tell which tile wrote each record
+
+    Keyword Arguments
+    -----------------
+    :param duplicate_fields: Defaults to config.REVIEWER_DUPLICATE_FIELDS. The REVTABLEMAIN fields that identify
+        a duplicate record
+    :param logger: Defaults to None. If set, should be Python logging module logger object.
+    :param arcpy_messages: Defaults to None. If set, should refer to the arcpy.Messages variable that is present
+        in the `execute` method of Python Toolboxes.
+
+    Returns
+    -------
+    :returns int: The number of records that were removed
+    """
+    if len(record_id_ranges) < 2:
+        # Only the records of different tiles can be duplicates
+        return 0
+
+    main_table = utils.find_reviewer_table(reviewer_ws, REVIEWER_MAIN_TABLE)
+    oid_field = arcpy.Describe(main_table).OIDFieldName
+    # The where_clause only needs to find the records, so the ranges of consecutive tiles are merged in it
+    where_clause = 'SESSIONID = {} AND CHECKTITLE IS NOT NULL AND ({})'.format(
+        session_id_from_name(reviewer_session),
+        ' OR '.join('({field} >= {first} AND {field} <= {last})'.format(field=oid_field, first=first, last=last)
+                    for first, last in merge_record_id_ranges(record_id_ranges))
+    )
+
+    with arcpy.da.SearchCursor(main_table, ['OID@'] + list(duplicate_fields), where_clause=where_clause) as curs:
+        duplicate_ids = duplicate_record_ids(((row[0], tuple(row[1:])) for row in curs), record_id_ranges)
+    if not duplicate_ids:
+        return 0
+
+    utils.log_it('Removing {} duplicate Reviewer record(s) of features that crossed tile edges'.format(
+        len(duplicate_ids)),
+        level='debug', logger=logger, arcpy_messages=arcpy_messages)
+
+    _delete_rows(main_table, oid_field, duplicate_ids)
+    for geometry_table_name in REVIEWER_GEOMETRY_TABLES:
+        try:
+            geometry_table = utils.find_reviewer_table(reviewer_ws, geometry_table_name)
+        except ValueError:
+            continue
+        _delete_rows(geometry_table, 'LINKID', duplicate_ids)
+
+    return len(duplicate_ids)
+
+def duplicate_record_ids(records, record_id_ranges):
+    """
+    Find the Reviewer records that are duplicates of records from another tile. The records are grouped by their
+    key, and the records of each group are split by the tile whose RECORDID range holds them. When more than one
+    tile wrote a group, the records of the tile that wrote the most of them (the first of those tiles on a tie) are
+    kept and the records of the other tiles are duplicates. A group that one tile wrote is kept as it is, since a
+    feature can have several errors of the same check, e.g. two gaps along one route.
+
+    Arguments
+    ---------
+    :param records: An iterable of (RECORDID, key) tuples, where the key is a tuple of the values of the
+        config.REVIEWER_DUPLICATE_FIELDS
+    :param record_id_ranges: A list of the [first, last] RECORDID range that each tile wrote. The ranges of different
+        tiles do not overlap (see `run_batch_job_tile`)
+
+    Returns
+    -------
+    :returns list: The sorted RECORDIDs of the duplicate records
+    """
+    tile_ranges = sorted((int(first), int(last)) for first, last in record_id_ranges)
+
+    def tile_of(record_id):
+        index = bisect.bisect_right(tile_ranges, (record_id, float('inf'))) - 1
+        if index >= 0 and record_id <= tile_ranges[index][1]:
+            return index
+        return None
+
+    groups = defaultdict(lambda: defaultdict(list))
+    for record_id, key in records:
+        tile = tile_of(record_id)
+        if tile is not None:
+            groups[key][tile].append(record_id)
+
+    duplicate_ids = []
+    for tiles in groups.values():
+        if len(tiles) < 2:
+            continue
+        kept_tile = max(sorted(tiles), key=lambda tile: len(tiles[tile]))
+        for tile, record_ids in tiles.items():
+            if tile != kept_tile:
+                duplicate_ids.extend(record_ids)
+    return sorted(duplicate_ids)
+
+def merge_record_id_ranges(record_id_ranges):
+    """
+    Sort the [first, last] RECORDID ranges and merge the ranges that overlap or touch, e.g. [[5, 9], [1, 4], [8, 12]]
+    to [[1, 12]].
+    """
+    merged = []
+    for first, last in sorted(record_id_ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], int(last))
+        else:
+            merged.append([int(first), int(last)])
+    return merged
+
+def is_file_geodatabase(workspace):
+    """
+    Return True if the `workspace` is a file geodatabase, which cannot be written by more than one process at a time.
+    """
+    return os.path.splitext(workspace.rstrip('\\/'))[1].lower() == '.gdb'
+
+def read_progress(progress_path, run_key):
+    """
+    Read the progress of a tiled run from the `progress_path`. Returns None if there is no progress file, or if it
+    belongs to a different run (another session, version, batch job or tile grid).
+    """
+    if not progress_path or not os.path.exists(progress_path):
+        return None
+    try:
+        with open(progress_path, 'r') as progress_file:
+            progress = json.load(progress_file)
+    except ValueError:
+        return None
+    if progress.get('run_key') != run_key:
+        return None
+    return progress
+
+def write_progress(progress_path, progress):
+    """
+    Write the `progress` of a tiled run to the `progress_path` (see files.write_json). Does nothing if the
+    `progress_path` is None.
+    """
+    if not progress_path:
+        return
+    files.write_json(progress_path, progress)
+
+def _delete_rows(table, id_field, ids):
+    """
+    Delete the rows of the `table` whose `id_field` is in `ids`, a chunk of ids at a time.
+    """
+    for where_clause in utils.in_clause_chunks(id_field, ids):
+        with arcpy.da.UpdateCursor(table, [id_field], where_clause=where_clause) as curs:
+            for _ in curs:
+                curs.deleteRow()
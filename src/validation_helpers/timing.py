@@ -0,0 +1,291 @@
+"""
+Stage level timing of the validation runs. A Trace collects the spans that are timed while it is active: each span
+records the seconds a stage of the validators took (a version lookup, a selection, a cursor scan, the rule
+evaluation, an in_memory copy, a Reviewer write, ...) and, where it is known, the number of rows the stage handled.
+When the trace exits, it logs a summary table of the stages and, if it has a `trace_path`, writes every span to a
+JSON trace file.
+
+Spans nest, and the summary groups them by their path of stage names, so the same selection is reported separately
+under the roadway level attribute checks and under the SQL validations. Spans timed while no trace is active cost
+two clock reads and are not recorded.
+
+Example
+-------
+>>> with Trace('ExecuteAllValidations', trace_path='C:\\logs\\job_1234_trace.json', logger=logger) as trace:
+>>>     with span('select_edits') as select_span:
+>>>         arcpy.SelectLayerByAttribute_management(layer, 'NEW_SELECTION', where_clause)
+>>>         select_span.rows = int(arcpy.GetCount_management(layer).getOutput(0))
+>>> # The summary table has been logged and the trace file written
+
+The `timed` decorator runs a function inside a span named after it, and the `traced_tool` decorator runs the
+execute method of a Python Toolbox tool inside a Trace named after the tool.
+"""
+import datetime
+import functools
+import logging
+import os
+import timeit
+
+import validation_helpers.files as files
+from validation_helpers.config import TRACE_FILE_SUFFIX
+
+
+# The stack of active traces. Spans are recorded by the last (innermost) one
+_TRACES = []
+
+
+class Trace(object):
+    """
+    A context manager that records the spans timed while it is active, logs a summary table of them on exit, and
+    writes them to the `trace_path` if it is set.
+    """
+    def __init__(self, name, trace_path=None, logger=None, arcpy_messages=None):
+        self.name = name
+        self.trace_path = trace_path
+        self.logger = logger
+        self.arcpy_messages = arcpy_messages
+        self.started = None
+        self.seconds = None
+        # The recorded spans, in the order they finished
+        self.spans = []
+        # The names of the open spans, outermost first
+        self.open_spans = []
+        self._start_time = None
+
+    def __enter__(self):
+        self.started = datetime.datetime.now()
+        self._start_time = timeit.default_timer()
+        _TRACES.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if self in _TRACES:
+            _TRACES.remove(self)
+        self.seconds = timeit.default_timer() - self._start_time
+        self._log_info(self.summary_table())
+        if self.trace_path:
+            try:
+                self.write(self.trace_path)
+            except (IOError, OSError) as exc:
+                # The trace is a diagnostic, so failing to write it must not fail the validations
+                self._log_info('Could not write the trace file {}: {}'.format(self.trace_path, exc))
+        return False
+
+    def record(self, name, start, seconds, rows=None, path=None):
+        """
+        Record a finished span. The `start` is in seconds since the trace started, and the `path` is the list of
+        the names of the spans that contain it, which defaults to the open spans.
+        """
+        path = list(self.open_spans if path is None else path) + [name]
+        self.spans.append({
+            'name': name,
+            'path': ' > '.join(path),
+            'depth': len(path) - 1,
+            'start': round(start, 6),
+            'seconds': round(seconds, 6),
+            'rows': rows,
+        })
+
+    def merge(self, trace_dict, process=None):
+        """
+        Add the spans of a trace from another process (see `Trace.to_dict`), nested under the spans that are open
+        in this trace. The spans of processes that ran at the same time overlap, so the summary adds up more
+        seconds than the run took.
+        """
+        prefix = list(self.open_spans) + ([process] if process else [])
+        start = self.elapsed() - trace_dict.get('seconds', 0.0)
+        if process:
+            self.record(process, start, trace_dict.get('seconds', 0.0))
+        for recorded in trace_dict.get('spans', []):
+            self.record(
+                recorded['path'].split(' > ')[-1],
+                start + recorded['start'],
+                recorded['seconds'],
+                rows=recorded['rows'],
+                path=prefix + recorded['path'].split(' > ')[:-1]
+            )
+
+    def elapsed(self):
+        """
+        Return the seconds since the trace started.
+        """
+        return timeit.default_timer() - self._start_time
+
+    def summary(self):
+        """
+        Group the spans by their path.
+
+        Returns
+        -------
+        :returns list: A list of dictionaries with the path, name, depth, calls, seconds and rows of each stage,
+            in the order the stages first started. The rows are None if no span of the stage counted rows
+        """
+        stages = dict()
+        for recorded in sorted(self.spans, key=lambda recorded: recorded['start']):
+            stage = stages.get(recorded['path'])
+            if stage is None:
+                stage = stages[recorded['path']] = {
+                    'path': recorded['path'],
+                    'name': recorded['name'],
+                    'depth': recorded['depth'],
+                    'first_start': recorded['start'],
+                    'calls': 0,
+                    'seconds': 0.0,
+                    'rows': None,
+                }
+            stage['calls'] += 1
+            stage['seconds'] += recorded['seconds']
+            if recorded['rows'] is not None:
+                stage['rows'] = (stage['rows'] or 0) + recorded['rows']
+        return sorted(stages.values(), key=lambda stage: _path_order(stage, stages))
+
+    def summary_table(self):
+        """
+        Return the summary as a text table, with each stage indented under the stage that contains it.
+        """
+        total = self.seconds if self.seconds is not None else self.elapsed()
+        lines = [
+            'Stage timings of {} ({:.2f} seconds):'.format(self.name, total),
+            '{:<60} {:>6} {:>10} {:>6} {:>10}'.format('Stage', 'Calls', 'Seconds', '%', 'Rows'),
+        ]
+        for stage in self.summary():
+            lines.append('{:<60} {:>6} {:>10.2f} {:>6.1f} {:>10}'.format(
+                ('  ' * stage['depth'] + stage['name'])[:60],
+                stage['calls'],
+                stage['seconds'],
+                100.0 * stage['seconds'] / total if total else 0.0,
+                '' if stage['rows'] is None else stage['rows']
+            ))
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        """
+        Return the trace as a dictionary that can be written to JSON or pickled.
+        """
+        return {
+            'name': self.name,
+            'started': self.started.isoformat() if self.started else None,
+            'seconds': self.seconds if self.seconds is not None else self.elapsed(),
+            'spans': sorted(self.spans, key=lambda recorded: recorded['start']),
+            'summary': [
+                dict((key, stage[key]) for key in ('path', 'calls', 'seconds', 'rows')) for stage in self.summary()
+            ],
+        }
+
+    def write(self, trace_path):
+        """
+        Write the trace to a JSON file (see files.write_json).
+        """
+        files.write_json(trace_path, self.to_dict())
+
+    def _log_info(self, message):
+        """
+        Log an info message the way utils.log_it does. utils times its stages with this module, so this module
+        cannot import it.
+        """
+        if self.logger and self.logger.level <= logging.INFO:
+            logging.info(message)
+        if self.arcpy_messages:
+            self.arcpy_messages.addMessage('{datetime} [{level:<5}]  {message}'.format(
+                datetime=datetime.datetime.now(),
+                level='INFO',
+                message=message
+            ))
+
+
+class Span(object):
+    """
+    A context manager that times a stage and records it with the innermost active Trace. Set the `rows` attribute
+    inside the block to record the number of rows the stage handled.
+    """
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+        self.seconds = None
+        self._trace = None
+        self._start_time = None
+
+    def __enter__(self):
+        self._trace = _TRACES[-1] if _TRACES else None
+        if self._trace:
+            self._trace.open_spans.append(self.name)
+        self._start_time = timeit.default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.seconds = timeit.default_timer() - self._start_time
+        if self._trace:
+            self._trace.open_spans.pop()
+            self._trace.record(
+                self.name,
+                self._start_time - self._trace._start_time,
+                self.seconds,
+                rows=self.rows
+            )
+        return False
+
+
+def span(name, rows=None):
+    """
+    Return a Span that times the stage `name`. See the module docstring.
+    """
+    return Span(name, rows=rows)
+
+def timed(name=None):
+    """
+    A decorator that runs the function inside a span. The span is named `name`, or the function's name.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with Span(name or function.__name__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def traced_tool(execute):
+    """
+    A decorator for the execute method of a Python Toolbox tool, which runs it inside a Trace named after the tool's
+    class. The trace file is written next to the file of the tool's log_path parameter (see `job_trace_path`), and
+    the summary table is logged to the root logger that utils.initialize_logger configures, and to the tool's
+    messages.
+    """
+    @functools.wraps(execute)
+    def wrapper(tool, parameters, messages):
+        log_path = next((parameter.valueAsText for parameter in parameters if parameter.name == 'log_path'), None)
+        with Trace(
+            type(tool).__name__,
+            trace_path=job_trace_path(log_path),
+            logger=logging.getLogger(),
+            arcpy_messages=messages
+        ):
+            return execute(tool, parameters, messages)
+    return wrapper
+
+def active_trace():
+    """
+    Return the innermost active Trace, or None.
+    """
+    return _TRACES[-1] if _TRACES else None
+
+def job_trace_path(log_path):
+    """
+    Return the trace filepath of a tool run, e.g. C:\\logs\\job_1234_trace.json for the log_path C:\\logs\\job_1234.txt,
+    so every job that logs to its own file also gets its own trace file. Returns None if the `log_path` is empty,
+    and the trace is only logged.
+    """
+    if not log_path or not TRACE_FILE_SUFFIX:
+        return None
+    return '{}{}'.format(os.path.splitext(log_path)[0], TRACE_FILE_SUFFIX)
+
+def _path_order(stage, stages):
+    """
+    Return the sort key that keeps every stage right below the stage that contains it: the first start of each
+    stage along its path.
+    """
+    names = stage['path'].split(' > ')
+    key = []
+    for depth in range(1, len(names) + 1):
+        parent = stages.get(' > '.join(names[:depth]))
+        key.append(parent['first_start'] if parent else stage['first_start'])
+    return key
@@ -1,11 +1,43 @@
 import datetime
+import itertools
 import logging
+import multiprocessing
+import numbers
 import os
-import time
+import sys
 
 import arcpy
-
-from validation_helpers.config import LRSN_FC_WILDCARD
+import numpy as np
+
+import validation_helpers.metadata_cache as metadata_cache
+import validation_helpers.scratch as scratch
+import validation_helpers.timing as timing
+from validation_helpers.config import (
+    GP_MESSAGE_BATCH_SIZE,
+    IN_CLAUSE_CHUNK_SIZE,
+    LOG_MESSAGE_MAX_LENGTH,
+    LRSN_FC_WILDCARD,
+    NUMPY_NULL_DATE,
+    NUMPY_NULL_INTEGER,
+)
+
+
+# arcpy.ListFields field types, and the matching AddField_management field types
+_ADD_FIELD_TYPES = {
+    'String': 'TEXT',
+    'Integer': 'LONG',
+    'SmallInteger': 'SHORT',
+    'Double': 'DOUBLE',
+    'Single': 'FLOAT',
+    'Date': 'DATE',
+    'OID': 'LONG',
+    'Guid': 'GUID',
+    'GlobalID': 'GUID',
+}
+# The messages of geoprocessing tools that `log_it` collected for the Python logger (see flush_gp_messages)
+_GP_MESSAGES = []
+# The extensions that a resident worker keeps checked out between validation runs (see hold_extension)
+_HELD_EXTENSIONS = set()
 
 
 class VersionDoesNotExistError(Exception):
@@ -24,6 +56,7 @@ class NoReviewerSessionIDError(Exception):
     pass
 
 
+@timing.timed()
 def get_lockroot_version(production_ws, version_name, lockroot_version_name='ELRS.Lockroot'):
     """
     Check for the Lockroot version of a particular name in the available geodatabase versions.
@@ -45,7 +78,7 @@ def get_lockroot_version(production_ws, version_name, lockroot_version_name='ELR
             return version_name
         except VersionDoesNotExistError:
             pass
-    for version in arcpy.ListVersions(production_ws):
+    for version in list_versions(production_ws):
         # If the word lockroot appears in a version name, return the first occurrence
         if 'lockroot' in version.lower():
             return version
@@ -74,7 +107,10 @@ def check_for_version(production_ws_version, production_ws, version_names=None):
     :raises VersionDoesNotExistError: Raises exception if version does not exist in the production_ws
     """
     if not version_names:
-        version_names = arcpy.ListVersions(production_ws)
+        version_names = list_versions(production_ws)
+        if production_ws_version not in version_names:
+            # The version may have been created since the version names were cached
+            version_names = list_versions(production_ws, refresh=True)
 
     if not production_ws_version in version_names:
         raise VersionDoesNotExistError(
@@ -85,6 +121,7 @@ def check_for_version(production_ws_version, production_ws, version_names=None):
         )
     return True
 
+@timing.timed()
 def get_version_milepoint_layer(production_ws, production_ws_version,
                                 wildcard=LRSN_FC_WILDCARD,
                                 logger=None, arcpy_messages=None):
@@ -127,7 +164,7 @@ def get_version_milepoint_layer(production_ws, production_ws_version,
 
     sde_milepoint_layer = arcpy.MakeFeatureLayer_management(
         milepoint_fc,
-        'milepoint_layer_{}'.format(int(time.time()))
+        scratch.unique_name('milepoint_layer', workspace=None)
     )
 
     version_milepoint_layer = arcpy.ChangeVersion_management(
@@ -140,6 +177,7 @@ def get_version_milepoint_layer(production_ws, production_ws_version,
 
     return milepoint_fc, version_milepoint_layer
 
+@timing.timed()
 def get_user_and_version(job__owned_by, job__id, production_ws, logger=None, arcpy_messages=None):
     """
     This function uses the WMX tokens and the production workspace to determine the "short username",
@@ -176,31 +214,15 @@ def get_user_and_version(job__owned_by, job__id, production_ws, logger=None, arc
     # Assemble the version name from its component parts. This is much easier than passing in
     #  the version name, as version names contain " and \ characters :-|
     if '\\' in job__owned_by:
-        user = job__owned_by.split('\\')[1]
+        short_user = job__owned_by.split('\\')[1]
     else:
-        user = job__owned_by
-    production_ws_version = '"SVC\\{user}".HDS_GENERAL_EDITING_JOB_{job_id}'.format(
-        user=user,
-        job_id=job__id
-    )
-
-    version_names = arcpy.ListVersions(production_ws)
-    try:
-        check_for_version(production_ws_version, production_ws, version_names)
-    except VersionDoesNotExistError:
-        user = user.upper()
-        production_ws_version = '"SVC\\{user}".HDS_GENERAL_EDITING_JOB_{job_id}'.format(
-            user=user,
-            job_id=job__id
-        )
-        try:
-            check_for_version(production_ws_version, production_ws, version_names)
-        except VersionDoesNotExistError:
-            user = user.lower()
-            production_ws_version = '"SVC\\{user}".HDS_GENERAL_EDITING_JOB_{job_id}'.format(
-                user=user,
-                job_id=job__id
-            )
+        short_user = job__owned_by
+    version_names = list_versions(production_ws)
+    user, production_ws_version = _find_edit_version(short_user, job__id, version_names)
+    if production_ws_version not in version_names:
+        # The version may have been created since the version names were cached
+        version_names = list_versions(production_ws, refresh=True)
+        user, production_ws_version = _find_edit_version(short_user, job__id, version_names)
 
     check_for_version(production_ws_version, production_ws, version_names)
 
@@ -210,6 +232,89 @@ def get_user_and_version(job__owned_by, job__id, production_ws, logger=None, arc
 
     return user, production_ws_version
 
+def resolve_production_ws_version(production_ws, production_ws_version_flag, job__owned_by, job__id,
+                                  logger=None, arcpy_messages=None):
+    """
+    Determine which database version needs to be validated, the way the Python Toolbox tools do: the Lockroot
+    version if the `production_ws_version_flag` is ELRS.Lockroot and a Lockroot version exists, and the WMX edit
+    version of the job otherwise.
+
+    Arguments
+    ---------
+    :param production_ws: Filepath to the SDE file pointing to the correct database.
+    :param production_ws_version_flag: ELRS.Lockroot to validate the Lockroot version, or any other value to
+        validate the job's edit version
+    :param job__owned_by: The username from the WMX [JOB:OWNED_BY] token.
+    :param job__id: The [JOB:ID] WMX token or number if executed manually.
+
+    Keyword Arguments
+    -----------------
+    :param logger: Defaults to None. If set, should be Python logging module logger object.
+    :param arcpy_messages: Defaults to None. If set, should refer to the arcpy.Messages variable that is present
+        in the `execute` method of Python Toolboxes.
+
+    Returns
+    -------
+    :returns str: The name of the database version to validate
+    :raises VersionDoesNotExistError: Raises this exception when the edit version does not exist in the
+        production_ws
+    """
+    if production_ws_version_flag == 'ELRS.Lockroot':
+        production_ws_version = get_lockroot_version(production_ws, production_ws_version_flag)
+        if production_ws_version:
+            return production_ws_version
+        # If the Lockroot version is not found, validate the edit version instead
+        log_it('No Lockroot version found in {production_ws}, validating the edit version of job {job__id}',
+            production_ws=production_ws, job__id=job__id,
+            level='warn', logger=logger, arcpy_messages=arcpy_messages)
+
+    user, production_ws_version = get_user_and_version(
+        job__owned_by,
+        job__id,
+        production_ws,
+        logger=logger,
+        arcpy_messages=arcpy_messages
+    )
+    return production_ws_version
+
+def _find_edit_version(user, job__id, version_names):
+    """
+    Find the WMX edit version of the job in `version_names`, trying the short username as it's passed in, then in
+    all caps, then in all lowercase. If none of them exist, the all lowercase user and version name are returned.
+    """
+    for candidate_user in [user, user.upper(), user.lower()]:
+        production_ws_version = '"SVC\\{user}".HDS_GENERAL_EDITING_JOB_{job_id}'.format(
+            user=candidate_user,
+            job_id=job__id
+        )
+        if production_ws_version in version_names:
+            return candidate_user, production_ws_version
+    return candidate_user, production_ws_version
+
+def list_versions(production_ws, refresh=False):
+    """
+    Return the version names of the `production_ws`. The names are cached (see metadata_cache.py), so
+    arcpy.ListVersions is not called again for every lookup in a validation run.
+
+    Arguments
+    ---------
+    :param production_ws: Filepath to the SDE file pointing to the correct database.
+
+    Keyword Arguments
+    -----------------
+    :param refresh: Defaults to False. If True, the cached names are discarded and the versions are listed again
+
+    Returns
+    -------
+    :returns list: A list of the version names
+    """
+    if refresh:
+        metadata_cache.invalidate(kind='versions', workspace=production_ws)
+    return metadata_cache.get(
+        ('versions', metadata_cache.workspace_key(production_ws)),
+        lambda: list(arcpy.ListVersions(production_ws))
+    )
+
 def query_reviewer_table(reviewer_ws, reviewer_where_clause, logger=None, messages=None):
     """
     Passing the [REVSESSION:ID] token from WMX was not producing the desired result, so
@@ -238,22 +343,8 @@ def query_reviewer_table(reviewer_ws, reviewer_where_clause, logger=None, messag
     # Get the current workspace, set the new workspace to the Reviewer Workspace, then switch
     #  back to the original at the end of the function's work
     original_ws = arcpy.env.workspace
+    session_table = find_reviewer_table(reviewer_ws, 'GDB_REVSESSIONTABLE')
     arcpy.env.workspace = reviewer_ws
-    session_tables = [table for table in arcpy.ListTables('*GDB_REVSESSIONTABLE')]
-
-    # If reviewer_ws is an SDE workspace, session_tables will be a list with one element containing
-    #  the databasename.databaseuser.GDB_REVSESSIONTABLE
-    #  File geodatabases do not return this table when using ListTables, so if the length is not
-    #  1, try to join the reviewer_ws directly to the table name
-    if len(session_tables) == 1:
-        session_table = session_tables[0]
-    elif arcpy.Exists(os.path.join(reviewer_ws, 'GDB_REVSESSIONTABLE')):
-        session_table = os.path.join(reviewer_ws, 'GDB_REVSESSIONTABLE')
-    else:
-        raise ValueError(
-            'Too many or too few tables were selected while trying to find GDB_REVSESSIONTABLE. ' +
-            'Selected tables: {}'.format(session_tables)
-        )
     log_it('Reviewer Session table determined to be: {}'.format(session_table),
         level='debug', logger=logger, arcpy_messages=messages)
     reviewer_fields = ['SESSIONID', 'USERNAME', 'SESSIONNAME']
@@ -270,13 +361,58 @@ def query_reviewer_table(reviewer_ws, reviewer_where_clause, logger=None, messag
     arcpy.env.workspace = original_ws
     return session_id
 
+def find_reviewer_table(reviewer_ws, table_name):
+    """
+    Find a Data Reviewer table, such as GDB_REVSESSIONTABLE or REVTABLEMAIN, in the Reviewer Workspace.
+    The filepath is cached (see metadata_cache.py).
+
+    Arguments
+    ---------
+    :param reviewer_ws: Filepath to a Data Reviewer enabled geodatabase
+    :param table_name: The unqualified name of the table
+
+    Returns
+    -------
+    :returns str: The full filepath of the table
+    :raises ValueError: Raises a ValueError if the table cannot be found
+    """
+    return metadata_cache.get(
+        ('reviewer_table', metadata_cache.workspace_key(reviewer_ws), table_name),
+        lambda: _find_reviewer_table(reviewer_ws, table_name)
+    )
+
+def _find_reviewer_table(reviewer_ws, table_name):
+    """
+    Look for the Data Reviewer table in the Reviewer Workspace. This is the uncached lookup of `find_reviewer_table`.
+    """
+    original_ws = arcpy.env.workspace
+    arcpy.env.workspace = reviewer_ws
+    try:
+        # If reviewer_ws is an SDE workspace, the list will have one element containing
+        #  the databasename.databaseuser.table_name
+        #  File geodatabases do not return the Reviewer tables when using ListTables, so if the length is not
+        #  1, try to join the reviewer_ws directly to the table name
+        tables = [table for table in arcpy.ListTables('*' + table_name)]
+        if len(tables) == 1:
+            return os.path.join(reviewer_ws, tables[0])
+        elif arcpy.Exists(os.path.join(reviewer_ws, table_name)):
+            return os.path.join(reviewer_ws, table_name)
+        else:
+            raise ValueError(
+                'Too many or too few tables were selected while trying to find {}. '.format(table_name) +
+                'Selected tables: {}'.format(tables)
+            )
+    finally:
+        arcpy.env.workspace = original_ws
+
+@timing.timed()
 def get_reviewer_session_name(reviewer_ws, job__owned_by, job_id, logger=None, arcpy_messages=None):
     """
     This function manages the retrieval of the full Reviewer Session Name from the Data Reviewer
     Workspace. Due to a small WMX bug, the short username can be CamelCase, ALL CAPS, or lowercase.
-    To workaround the bug, this function first tries the short username as it's passed in. If that
-    doesn't work, it tries the short username in all lowercase. If that doesn't work, it tries the
-    short username in all caps. If that doesn't work, it quits with a NoReviewerSessionIDError exception.
+    To workaround the bug, this function reads the job's sessions in one query and compares the
+    usernames case-insensitively. If no session matches, it quits with a NoReviewerSessionIDError exception.
+    The session name is cached per workspace, user and job (see metadata_cache.py).
 
     Arguments
     ---------
@@ -297,70 +433,64 @@ def get_reviewer_session_name(reviewer_ws, job__owned_by, job_id, logger=None, a
     :raises NoReviewerSessionIDError: If the session_id cannot be determined while constructing the full session name,
         a NoReviewerSessionIDError Exception is raised
     """
-    try:
-        reviewer_where_clause = 'USERNAME = \'{user}\' AND SESSIONNAME = \'{job_id}\''.format(
-            user=job__owned_by,
-            job_id=job_id
-        )
-        log_it('Trying reviewer where_clause: {}'.format(reviewer_where_clause),
-            level='debug', logger=logger, arcpy_messages=arcpy_messages)
-
-        session_id = query_reviewer_table(
+    return metadata_cache.get(
+        ('reviewer_session', metadata_cache.workspace_key(reviewer_ws), job__owned_by.lower(), str(job_id)),
+        lambda: _resolve_reviewer_session_name(
             reviewer_ws,
-            reviewer_where_clause,
+            job__owned_by,
+            job_id,
             logger=logger,
-            messages=arcpy_messages
+            arcpy_messages=arcpy_messages
         )
-    except NoReviewerSessionIDError:
-        try:
-            reviewer_where_clause = 'USERNAME = \'{user}\' AND SESSIONNAME = \'{job_id}\''.format(
-                user=job__owned_by.lower(),
-                job_id=job_id
-            )
-            log_it('Trying reviewer where_clause: {}'.format(job__owned_by.lower()),
-                level='debug', logger=logger, arcpy_messages=arcpy_messages)
-
-            session_id = query_reviewer_table(
-                reviewer_ws,
-                reviewer_where_clause,
-                logger=logger,
-                messages=arcpy_messages
-            )
-        except NoReviewerSessionIDError:
-            reviewer_where_clause = 'USERNAME = \'{user}\' AND SESSIONNAME = \'{job_id}\''.format(
-                user=job__owned_by.upper(),
-                job_id=job_id
-            )
-            log_it('Trying reviewer where_clause: {}'.format(job__owned_by.upper()),
-                level='debug', logger=logger, arcpy_messages=arcpy_messages)
-
-            session_id = query_reviewer_table(
-                reviewer_ws,
-                reviewer_where_clause,
-                logger=logger,
-                messages=arcpy_messages
-            )
-    try:
-        reviewer_session = 'Session {session_id} : {job_id}'.format(
-            session_id=session_id,
-            job_id=job_id
-        )
-        log_it('Reviewer session name determined to be \'{}\''.format(reviewer_session),
-                level='debug', logger=logger, arcpy_messages=arcpy_messages)
-    except:
+    )
+
+def _resolve_reviewer_session_name(reviewer_ws, job__owned_by, job_id, logger=None, arcpy_messages=None):
+    """
+    Read the Reviewer Session name from the Reviewer Workspace. This is the uncached lookup of
+    `get_reviewer_session_name`. The session table is read once, for the sessions named after the job, and
+    the USERNAME is compared case-insensitively in Python. If the user has more than one session for the job,
+    the most recent (largest SESSIONID) is used.
+    """
+    # Only filter on SESSIONNAME in the database. Wrapping USERNAME in UPPER() would prevent the use of an index
+    reviewer_where_clause = 'SESSIONNAME = {}'.format(sql_literal(str(job_id)))
+    log_it('Reading reviewer sessions with where_clause: {where_clause}', where_clause=reviewer_where_clause,
+        level='debug', logger=logger, arcpy_messages=arcpy_messages)
+
+    session_table = find_reviewer_table(reviewer_ws, 'GDB_REVSESSIONTABLE')
+    session_id = None
+    user = job__owned_by.lower()
+    with arcpy.da.SearchCursor(session_table, ['SESSIONID', 'USERNAME'], where_clause=reviewer_where_clause) as curs:
+        for row_session_id, username in curs:
+            if (username or '').lower() == user and (session_id is None or row_session_id > session_id):
+                session_id = row_session_id
+
+    if session_id is None:
         raise NoReviewerSessionIDError(
-            'Could not determine the session ID with where_clause: {}'.format(reviewer_where_clause)
+            'Could not determine the session ID of user \'{}\' with where_clause: {}'.format(
+                job__owned_by,
+                reviewer_where_clause
+            )
         )
+
+    reviewer_session = 'Session {session_id} : {job_id}'.format(
+        session_id=session_id,
+        job_id=job_id
+    )
+    log_it('Reviewer session name determined to be \'{}\''.format(reviewer_session),
+            level='debug', logger=logger, arcpy_messages=arcpy_messages)
     return reviewer_session
 
 def to_in_memory_fc(layer, new_field='ORIG_OBJECTID', check_fields=['ROUTE_ID', 'OBJECTID']):
     """
     This function creates an in memory feature class of the features selected in the `layer`
     parameter. Data Reviewer writes the OBJECTID of the identified features to the reviewer workspace,
-    so the function also adds a new column to the in memory feature class called ORIG_OBJECTID by default.
+    so the in memory feature class has a column called ORIG_OBJECTID by default.
     The new field is populated with the object ID of the input layer, so that the in_memory_fc.ORIG_OBJECTID
     field will identify the correct features in Milepoint when committed to the reviewer table.
 
+    The feature class is created with only the geometry, the `new_field` and the first of the `check_fields`,
+    and is filled with a single InsertCursor pass over the `layer`. Each call gets a unique name.
+
     Arguments
     ---------
     :param layer: An arcpy Feature Layer that has the features you would like to write to the
@@ -371,39 +501,292 @@ def to_in_memory_fc(layer, new_field='ORIG_OBJECTID', check_fields=['ROUTE_ID',
     :param new_field: Defaults to ORIG_OBJECTID. The name of the new field that will be added to
         the returned in memory feature class. It will be populated with the input `layer`'s OBJECTID
     :param check_fields: Defaults to a list of ['ROUTE_ID', 'OBJECTID']. These fields are passed into the
-        SearchCursor that reads the `layer`. The first field in the list will be used as the key value
-        in a dictionary that tracks the OBJECTIDs, the second field is the feature you would like
-        to use to populate the new column identified by the `new_field` param
+        SearchCursor that reads the `layer`. The first field in the list is copied to the in memory
+        feature class, the second field is the field you would like to use to populate the new column
+        identified by the `new_field` param
 
     Returns
     -------
     :returns in_memory_fc: A string pointing to the newly created in memory feature class
     """
-    in_memory_fc = 'in_memory\\fc_{}'.format(int(time.time()))
+    layer_fields = dict((field.name, field) for field in arcpy.ListFields(layer))
+    key_field = layer_fields[check_fields[0]]
+    # If the layer already has the new_field, its values are kept, as CopyFeatures would have kept them
+    value_field = new_field if new_field in layer_fields else check_fields[1]
 
-    arcpy.CopyFeatures_management(
+    # Create the feature class with its final schema, then fill it in a single pass over the layer
+    in_memory_fc = create_in_memory_fc(
         layer,
-        in_memory_fc
+        [
+            (new_field, 'LONG', None),
+            (key_field.name, _ADD_FIELD_TYPES.get(key_field.type, 'TEXT'), key_field.length),
+        ],
+        prefix='fc'
     )
+    with timing.span('to_in_memory_fc') as copy_span:
+        copy_span.rows = 0
+        with arcpy.da.InsertCursor(in_memory_fc, ['SHAPE@', new_field, key_field.name]) as insert_curs:
+            with arcpy.da.SearchCursor(layer, ['SHAPE@', value_field, key_field.name]) as search_curs:
+                for row in search_curs:
+                    insert_curs.insertRow(row)
+                    copy_span.rows += 1
+    scratch.add_rows(in_memory_fc, copy_span.rows)
+
+    return in_memory_fc
+
+def create_in_memory_fc(template_layer, fields, prefix='fc'):
+    """
+    Create an empty in memory feature class with the same geometry type, M and Z awareness, and spatial
+    reference as the `template_layer`. Only the `fields` are added to the new feature class, so it can be
+    filled with a single `arcpy.da.InsertCursor` pass rather than copied and updated.
 
-    field_names = [field.name for field in arcpy.ListFields(layer)]
+    Arguments
+    ---------
+    :param template_layer: An arcpy Feature Layer or feature class that defines the geometry of the new feature class
+    :param fields: A list of (field_name, field_type, field_length) tuples. The field_length is only used
+        for TEXT fields, and can be None otherwise
 
-    if not new_field in field_names:
+    Keyword Arguments
+    -----------------
+    :param prefix: Defaults to 'fc'. The prefix of the in memory feature class name
+
+    Returns
+    -------
+    :returns in_memory_fc: A string pointing to the newly created in memory feature class
+    """
+    description = arcpy.Describe(template_layer)
+    name = scratch.unique_name(prefix)
+
+    arcpy.CreateFeatureclass_management(
+        'in_memory',
+        name,
+        description.shapeType.upper(),
+        has_m='ENABLED' if description.hasM else 'DISABLED',
+        has_z='ENABLED' if description.hasZ else 'DISABLED',
+        spatial_reference=description.spatialReference
+    )
+    in_memory_fc = 'in_memory\\{}'.format(name)
+
+    for field_name, field_type, field_length in fields:
         arcpy.AddField_management(
             in_memory_fc,
-            new_field,
-            'LONG'
+            field_name,
+            field_type,
+            field_length=field_length
         )
-        oids = {row[0]: row[1] for row in arcpy.da.SearchCursor(layer, check_fields)}
-        update_fields = [new_field, check_fields[0]]
-        with arcpy.da.UpdateCursor(in_memory_fc, update_fields) as curs:
-            for row in curs:
-                route_id = row[1]
-                new_field_value = oids[route_id]
-                curs.updateRow([new_field_value, route_id])
 
     return in_memory_fc
 
+def in_clause_chunks(field, values, chunk_size=IN_CLAUSE_CHUNK_SIZE):
+    """
+    Split a list of values into `FIELD IN (...)` where clauses of no more than `chunk_size` values each.
+    Strings are quoted (with embedded single quotes escaped), and numbers are not.
+
+    Arguments
+    ---------
+    :param field: The name of the field that is compared to the values
+    :param values: An iterable of the values. Duplicates are removed and the values are sorted
+
+    Keyword Arguments
+    -----------------
+    :param chunk_size: Defaults to config.IN_CLAUSE_CHUNK_SIZE. The maximum number of values per where clause
+
+    Returns
+    -------
+    :returns list: A list of where clause strings
+    """
+    values = sorted(set(values))
+    clauses = []
+    for start in range(0, len(values), chunk_size):
+        literals = [sql_literal(value) for value in values[start:start + chunk_size]]
+        clauses.append('{field} IN ({values})'.format(field=field, values=', '.join(literals)))
+    return clauses
+
+def sql_literal(value):
+    """
+    Format a Python value as a literal for an ArcGIS where_clause.
+    """
+    if value is None:
+        return 'NULL'
+    if isinstance(value, numbers.Number) and not isinstance(value, bool):
+        return str(value)
+    return '\'{}\''.format(str(value).replace('\'', '\'\''))
+
+@timing.timed()
+def select_layer_by_clauses(layer, clauses, base_where_clause=None, clauses_per_selection=1,
+                            logger=None, arcpy_messages=None):
+    """
+    Select the features of the `layer` that match any of the `clauses`. Rather than joining every clause into
+    one where_clause, the clauses are applied in groups of `clauses_per_selection` using ADD_TO_SELECTION, so the
+    length of each where_clause the SDE server has to parse stays bounded.
+
+    Arguments
+    ---------
+    :param layer: An arcpy Feature Layer
+    :param clauses: A list of ArcGIS where_clause strings. A feature is selected if it matches any of them
+
+    Keyword Arguments
+    -----------------
+    :param base_where_clause: Defaults to None. If set, only features that also match this where_clause are selected
+    :param clauses_per_selection: Defaults to 1. The number of clauses that are combined with OR per selection
+    :param logger: Defaults to None. If set, should be Python logging module logger object.
+    :param arcpy_messages: Defaults to None. If set, should refer to the arcpy.Messages variable that is present
+        in the `execute` method of Python Toolboxes.
+
+    Returns
+    -------
+    :returns layer: The `layer` with the features selected
+    """
+    if not clauses:
+        # Nothing matches an empty list, so clear the selection rather than selecting everything
+        arcpy.SelectLayerByAttribute_management(layer, 'CLEAR_SELECTION')
+        return layer
+
+    selection_type = 'NEW_SELECTION'
+    for start in range(0, len(clauses), clauses_per_selection):
+        where_clause = ' OR '.join(
+            '({})'.format(clause) for clause in clauses[start:start + clauses_per_selection]
+        )
+        if base_where_clause:
+            where_clause = '({base_where}) AND ({where})'.format(base_where=base_where_clause, where=where_clause)
+
+        with timing.span('SelectLayerByAttribute_management'):
+            arcpy.SelectLayerByAttribute_management(
+                layer,
+                selection_type,
+                where_clause=where_clause
+            )
+        selection_type = 'ADD_TO_SELECTION'
+
+    log_it('Selected features with {count} where_clause(s)',
+        count=(len(clauses) + clauses_per_selection - 1) // clauses_per_selection,
+        level='debug', logger=logger, arcpy_messages=arcpy_messages)
+
+    return layer
+
+@timing.timed()
+def select_layer_by_values(layer, field, values, base_where_clause=None,
+                           chunk_size=IN_CLAUSE_CHUNK_SIZE, logger=None, arcpy_messages=None):
+    """
+    Select the features of the `layer` whose `field` value is in `values`, no matter how many values there are.
+    Up to `chunk_size` values are selected with a single `FIELD IN (...)` where_clause. Any more values are
+    selected with `chunk_size` values per where_clause, using ADD_TO_SELECTION.
+
+    Arguments
+    ---------
+    :param layer: An arcpy Feature Layer
+    :param field: The name of the field that is compared to the values
+    :param values: An iterable of the values to select
+
+    Keyword Arguments
+    -----------------
+    :param base_where_clause: Defaults to None. If set, only features that also match this where_clause are selected
+    :param chunk_size: Defaults to config.IN_CLAUSE_CHUNK_SIZE. The maximum number of values per where_clause
+    :param logger: Defaults to None. If set, should be Python logging module logger object.
+    :param arcpy_messages: Defaults to None. If set, should refer to the arcpy.Messages variable that is present
+        in the `execute` method of Python Toolboxes.
+
+    Returns
+    -------
+    :returns layer: The `layer` with the features selected
+    """
+    values = sorted(set(value for value in values if value is not None))
+
+    log_it('Selecting {count} {field} value(s) in chunks of {chunk_size}',
+        count=len(values), field=field, chunk_size=chunk_size,
+        level='debug', logger=logger, arcpy_messages=arcpy_messages)
+    return select_layer_by_clauses(
+        layer,
+        in_clause_chunks(field, values, chunk_size=chunk_size),
+        base_where_clause=base_where_clause,
+        logger=logger,
+        arcpy_messages=arcpy_messages
+    )
+
+def milepoint_attributes_to_array(layer, fields, where_clause=None, null_integer=NUMPY_NULL_INTEGER):
+    """
+    Read the attribute `fields` of the `layer` into a NumPy structured array using
+    `arcpy.da.TableToNumPyArray`. The array is read in one call, which is much faster than iterating
+    through an `arcpy.da.SearchCursor` one row at a time when every active route is validated.
+
+    NumPy arrays cannot store NULL values, so NULL text fields are read as an empty string and NULL numeric
+    fields are read as the `null_integer` value. Both of these are falsy or invalid in the same way
+    a Python None would be in the row-by-row validations. NULL dates are read as config.NUMPY_NULL_DATE.
+
+    Arguments
+    ---------
+    :param layer: An arcpy Feature Layer or feature class. If the layer has a selection, only the selected
+        features are read
+    :param fields: A list of the field names to read. The field names become the names of the array columns
+
+    Keyword Arguments
+    -----------------
+    :param where_clause: Defaults to None. An ArcGIS where_clause that limits the rows that are read
+    :param null_integer: Defaults to config.NUMPY_NULL_INTEGER. The value that is substituted for NULL numeric values
+
+    Returns
+    -------
+    :returns numpy.ndarray: A structured array with one column per field in `fields`
+    """
+    null_values = dict()
+    for field in arcpy.ListFields(layer):
+        if field.name not in fields:
+            continue
+        if field.type in ('String', 'Guid', 'GlobalID'):
+            null_values[field.name] = ''
+        elif field.type in ('SmallInteger', 'Integer', 'Single', 'Double', 'OID'):
+            null_values[field.name] = null_integer
+        elif field.type == 'Date':
+            null_values[field.name] = NUMPY_NULL_DATE
+
+    with timing.span('TableToNumPyArray') as read_span:
+        milepoint_rows = arcpy.da.TableToNumPyArray(
+            layer,
+            fields,
+            where_clause=where_clause,
+            null_value=null_values
+        )
+        read_span.rows = len(milepoint_rows)
+    return milepoint_rows
+
+def milepoint_attribute_chunks(layer, fields, chunk_size, where_clause=None):
+    """
+    Read the attribute `fields` of the `layer` with an `arcpy.da.SearchCursor`, and yield them in chunks of up to
+    `chunk_size` rows. Unlike `milepoint_attributes_to_array`, only one chunk is held in memory at a time, so the
+    memory used does not grow with the number of rows.
+
+    Each chunk is a dictionary of the field names to NumPy object arrays. NULL values stay Python None values, as
+    they are in the rows of the cursor, which the vectorized validations accept.
+
+    Arguments
+    ---------
+    :param layer: An arcpy Feature Layer or feature class. If the layer has a selection, only the selected
+        features are read. The cursor stays open until the last chunk is read, so the selection of the layer
+        must not change in the meantime
+    :param fields: A list of the field names to read
+    :param chunk_size: The number of rows of each chunk
+
+    Keyword Arguments
+    -----------------
+    :param where_clause: Defaults to None. An ArcGIS where_clause that limits the rows that are read
+
+    Returns
+    -------
+    :returns generator: A generator of dictionaries with the `fields` as keys and NumPy arrays as values
+    """
+    with arcpy.da.SearchCursor(layer, fields, where_clause=where_clause) as cursor:
+        cursor_rows = iter(cursor)
+        while True:
+            with timing.span('SearchCursor') as read_span:
+                rows = list(itertools.islice(cursor_rows, chunk_size))
+                read_span.rows = len(rows)
+            if not rows:
+                return
+            columns = list(zip(*rows))
+            yield dict(
+                (field, np.array(column, dtype=object)) for field, column in zip(fields, columns)
+            )
+
 def initialize_logger(log_path=None, log_level=logging.INFO):
     """
     A function to initialize a logger from the Python logging module. If no
@@ -441,15 +824,29 @@ def initialize_logger(log_path=None, log_level=logging.INFO):
 
     return root_logger
 
-def log_it(message, level='info', logger=None, arcpy_messages=None):
+def log_it(message, level='info', logger=None, arcpy_messages=None, **format_kwargs):
     """
     This function will log a message to the Python logger object and/or the
     arcpy Python Toolbox messages (the GP Tool's dialog) depending on the
     input parameters.
 
+    Nothing is built for a message whose level is turned off. Pass the values of a message as keyword arguments
+    (or the message as a function that returns it) rather than formatting it at the call site, and the message is
+    only formatted when it is logged:
+    >>> log_it('Calling SQL Query on database connection: "{sql}"', sql=violations_sql, level='debug', logger=logger)
+
+    The text values of the `format_kwargs` that are longer than config.LOG_MESSAGE_MAX_LENGTH characters, e.g.
+    where_clauses with thousands of ROUTE_IDs, are shortened to their start and end (see `truncate_message`). The
+    message itself is never shortened, and nothing of an 'error' message is, so tracebacks are logged in full.
+
+    The 'gp' level writes the messages of the last geoprocessing tool. They are added to the GP Tool's dialog
+    right away, and collected for the Python logger, which receives them in batches of
+    config.GP_MESSAGE_BATCH_SIZE tools, before the next message of another level, or when
+    `flush_gp_messages` is called. The validators and the worker processes call it before they return.
+
     Arguments
     ---------
-    :param message: A string that will be committed to the activated loggers
+    :param message: A string that will be committed to the activated loggers, or a function that returns it
 
     Keyword Arguments
     -----------------
@@ -458,11 +855,14 @@ def log_it(message, level='info', logger=None, arcpy_messages=None):
     :param logger: Defaults to None. If set, should be Python logging module logger object.
     :param messages: Defaults to None. If set, should refer to the arcpy.Messages variable that is present
         in the `execute` method of Python Toolboxes.
+    :param format_kwargs: If set, the message is formatted with `message.format(**format_kwargs)` once it is
+        known to be logged. Long text values are shortened, unless the level is 'error'
 
     Returns
     -------
     :returns bool: Returns True when successful
     """
+    level = level.lower()
     if not level in ('info', 'debug', 'error', 'warn', 'gp'):
         raise ValueError('Parameter \'level\' must be one of (info, debug, error, warn, gp)')
 
@@ -473,39 +873,136 @@ def log_it(message, level='info', logger=None, arcpy_messages=None):
         #  If there is no Python logger, fall back to info level logging
         logger_level = 20
 
-    arcpy_message = '{datetime} [{level:<5}]  {message}'.format(
-        datetime=datetime.datetime.now(),
-        level=level.upper(),
-        message=message
-    )
+    if level == 'gp':
+        _log_gp_messages(message, logger, logger_level, arcpy_messages)
+        return True
+    if (level == 'info' and logger_level > 20) or (level == 'debug' and logger_level > 10):
+        return True
+    if not logger and not arcpy_messages:
+        return True
+
+    # The GP messages that are waiting for the logger are written first, so the log stays in order
+    if _GP_MESSAGES:
+        flush_gp_messages()
+
+    message = _build_message(message, format_kwargs, truncate=level != 'error')
+    if arcpy_messages:
+        arcpy_message = '{datetime} [{level:<5}]  {message}'.format(
+            datetime=datetime.datetime.now(),
+            level=level.upper(),
+            message=message
+        )
 
-    if level.lower() == 'info' and logger_level <= 20:
+    if level == 'info':
         if logger:
             logging.info(message)
         if arcpy_messages:
             arcpy_messages.addMessage(arcpy_message)
-    elif level.lower() == 'debug' and logger_level <= 10:
+    elif level == 'debug':
         if logger:
             logging.debug(message)
         if arcpy_messages:
             arcpy_messages.addMessage(arcpy_message)
-    elif level.lower() == 'error':
+    elif level == 'error':
         if logger:
             logging.error(message)
         if arcpy_messages:
             arcpy_messages.addErrorMessage(arcpy_message)
-    elif level.lower() == 'warn':
+    elif level == 'warn':
         if logger:
             logger.warn(message)
         if arcpy_messages:
             arcpy_messages.addWarningMessage(arcpy_message)
-    elif level.lower() == 'gp':
-        if arcpy_messages:
-            arcpy_messages.addMessage(arcpy_message)
-            arcpy_messages.addGPMessages()
-            message = arcpy.GetMessages()
-            logger.info(message)
-    else:
-        pass
 
     return True
+
+def flush_gp_messages():
+    """
+    Write the GP messages that the 'gp' level of `log_it` collected to the Python logger, in one log record.
+    """
+    if not _GP_MESSAGES:
+        return
+    message = '\n'.join(_GP_MESSAGES)
+    del _GP_MESSAGES[:]
+    logging.info(message)
+
+def truncate_message(message, max_length=LOG_MESSAGE_MAX_LENGTH):
+    """
+    Shorten a `message` that is longer than `max_length` characters to its start and its end, with the number of
+    characters that were left out in between. Returns the `message` unchanged if it is short enough, or if
+    `max_length` is None.
+    """
+    if max_length is None or len(message) <= max_length:
+        return message
+    omitted = ' ... [{} characters omitted] ... '.format(len(message) - max_length)
+    # Keep more of the start, which usually says what the message is about
+    head_length = max(max_length - len(omitted), 0) * 3 // 4
+    tail_length = max(max_length - len(omitted) - head_length, 0)
+    return message[:head_length] + omitted + (message[-tail_length:] if tail_length else '')
+
+def _log_gp_messages(message, logger, logger_level, arcpy_messages):
+    """
+    Add the messages of the last geoprocessing tool to the GP Tool's dialog, and collect them for the logger.
+    arcpy.GetMessages is only called when the logger will write them.
+    """
+    if arcpy_messages:
+        if message:
+            arcpy_messages.addMessage('{datetime} [{level:<5}]  {message}'.format(
+                datetime=datetime.datetime.now(),
+                level='GP',
+                message=_build_message(message, {})
+            ))
+        arcpy_messages.addGPMessages()
+    if logger and logger_level <= 20:
+        _GP_MESSAGES.append(truncate_message(arcpy.GetMessages()))
+        if len(_GP_MESSAGES) >= GP_MESSAGE_BATCH_SIZE:
+            flush_gp_messages()
+
+def _build_message(message, format_kwargs, truncate=True):
+    """
+    Build the text of a `log_it` message: call it if it is a function, and format it with the `format_kwargs`. If
+    `truncate` is True, the text values of the `format_kwargs` are truncated first (see `truncate_message`).
+    Other values are formatted as they are, so format specs like {seconds:.2f} keep working.
+    """
+    if callable(message):
+        message = message()
+    if not format_kwargs:
+        return message
+    if truncate:
+        format_kwargs = dict(
+            (key, truncate_message(value) if isinstance(value, (str, type(u''))) else value)
+            for key, value in format_kwargs.items()
+        )
+    return message.format(**format_kwargs)
+
+def hold_extension(extension):
+    """
+    Check out an ArcGIS extension and keep it checked out: `check_in_extension` leaves it checked out until
+    `release_extension` is called. A resident worker (see worker.py) holds the extensions it needs, so each
+    validation run does not check them in and out of the license manager again.
+    """
+    arcpy.CheckOutExtension(extension)
+    _HELD_EXTENSIONS.add(extension)
+
+def release_extension(extension):
+    """
+    Stop holding an extension that `hold_extension` checked out, and check it in.
+    """
+    _HELD_EXTENSIONS.discard(extension)
+    arcpy.CheckInExtension(extension)
+
+def check_in_extension(extension):
+    """
+    Check in an extension at the end of a validation run, unless it is held (see `hold_extension`).
+    """
+    if extension not in _HELD_EXTENSIONS:
+        arcpy.CheckInExtension(extension)
+
+def set_worker_executable():
+    """
+    Point multiprocessing at the python.exe of the ArcGIS installation when this code runs inside ArcMap or
+    ArcCatalog. Otherwise, multiprocessing would start new copies of the desktop application.
+    """
+    executable = os.path.basename(sys.executable).lower()
+    if executable not in ('python.exe', 'pythonw.exe', 'python', 'python2', 'python2.7'):
+        multiprocessing.set_executable(os.path.join(sys.exec_prefix, 'python.exe'))
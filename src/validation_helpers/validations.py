@@ -1,24 +1,38 @@
 from collections import defaultdict
 import datetime
 import logging
-import re
 import time
 import traceback
 
 import arcpy
-
+import numpy as np
+
+import validation_helpers.rules as rules
+import validation_helpers.scratch as scratch
+import validation_helpers.sharding as sharding
+import validation_helpers.snapshot as snapshot
+import validation_helpers.tiling as tiling
+import validation_helpers.timing as timing
 import validation_helpers.utils as utils
 import validation_helpers.write as write
 from validation_helpers.config import (
     ACTIVE_ROUTES_WHERE_CLAUSE,
+    BATCH_JOB_TILE_GRID,
     DOMAIN,
+    EDIT_CLUSTER_TILES,
     EDITED_ROUTES_QUERY_FMT,
     LRSN_FC_WILDCARD,
-    UNIQUE_RDWY_ATTRS_QUERY,
-    UNIQUE_CO_DIR_QUERY,
+    ROADWAY_ATTRIBUTE_FIELDS,
+    ROADWAY_RULE_ENGINE,
+    ROADWAY_RULE_SHARDS,
+    ROADWAY_STREAM_CHUNK_SIZE,
+    UNIQUE_CO_DIR_ROUTES_QUERY,
+    UNIQUE_RDWY_ATTRS_ROUTES_QUERY,
 )
 
 
+@timing.timed()
+@scratch.scratch_scope
 def run_batch_on_buffered_edits(reviewer_ws, batch_job_file,
                                 production_ws, job__id,
                                 job__started_date, job__owned_by,
@@ -26,6 +40,9 @@ def run_batch_on_buffered_edits(reviewer_ws, batch_job_file,
                                 version_milepoint_layer=None,
                                 milepoint_fc=None,
                                 full_db_flag=False,
+                                tile_grid=BATCH_JOB_TILE_GRID,
+                                tile_progress_path=None,
+                                cluster_edits=EDIT_CLUSTER_TILES,
                                 logger=None, messages=None):
     """
     This function executes the Data Reviewer Batch Job. The workflow of the function is as follows:
@@ -35,9 +52,13 @@ def run_batch_on_buffered_edits(reviewer_ws, batch_job_file,
        job__started_date parameters are used to query the LRSN_Milepoint.EDITED_BY and LRSN_Milepoint.EDITED_DATE
        fields for recent updates. EDITED_BY and EDITED_DATE are automatically updated with the username and time
        of the transaction for edits of existing data and creation of new data
-    3. If the full_db_flag is False, buffer all edits conducted by job__owned_by since job__started_date by 10 meters
+    3. If the full_db_flag is False, buffer all edits conducted by job__owned_by since job__started_date by 10 meters.
+       With cluster_edits, the buffers are grouped into clusters of nearby edits, rather than dissolved into one
+       polygon, and the Batch Job runs once per cluster (see tiling.py)
     4. Run the Data Reviewer Batch Job using the Geoprocessing tool with the buffer polygons or LRSN_Milepoint
        extent as the area of interest (which is used is determined by the full_db_flag)
+    5. If the full_db_flag is True and a tile_grid is set, the LRSN_Milepoint extent is split into tiles and the
+       Batch Job runs once per tile in parallel processes (see tiling.py)
 
     Arguments
     ---------
@@ -56,6 +77,14 @@ def run_batch_on_buffered_edits(reviewer_ws, batch_job_file,
     -----------------
     :param full_db_flag: Defaults to False. If True, all features will be validated. If False, only
         features edited by the user in their version will be validated.
+    :param tile_grid: Defaults to config.BATCH_JOB_TILE_GRID. A tuple of (rows, columns). If set and the
+        full_db_flag is True, the Batch Job runs on a grid of tiles in parallel processes rather than on the
+        full extent at once
+    :param tile_progress_path: Defaults to None. If set, a JSON filepath where the completed tiles are recorded, so
+        an interrupted tiled Batch Job only runs the remaining tiles when it is run again
+    :param cluster_edits: Defaults to config.EDIT_CLUSTER_TILES. If True and the full_db_flag is False, the Batch Job
+        runs once per cluster of nearby edits. If False, or if no clusters were found, it runs once on a single
+        dissolved buffer of all of the edits
     :param logger: Defaults to None. If set, should be Python logging module logger object.
     :param messages: Defaults to None. If set, should refer to the arcpy.Messages variable that is present
         in the `execute` method of Python Toolboxes.
@@ -116,15 +145,19 @@ def run_batch_on_buffered_edits(reviewer_ws, batch_job_file,
             where_clause = ACTIVE_ROUTES_WHERE_CLAUSE
 
         utils.log_it(
-            'Using where_clause to find recent edits of {} | where_clause: {}'.format(milepoint_fc, where_clause),
+            'Using where_clause to find recent edits of {milepoint_fc} | where_clause: {where_clause}',
+            milepoint_fc=milepoint_fc, where_clause=where_clause,
             level='debug', logger=logger, arcpy_messages=messages)
 
-        version_select_milepoint_layer = arcpy.SelectLayerByAttribute_management(
-            version_milepoint_layer,
-            'NEW_SELECTION',
-            where_clause=where_clause
-        )
+        with timing.span('SelectLayerByAttribute_management'):
+            version_select_milepoint_layer = arcpy.SelectLayerByAttribute_management(
+                version_milepoint_layer,
+                'NEW_SELECTION',
+                where_clause=where_clause
+            )
 
+        # The tiles of the batch job, when it runs on grid tiles or clusters of edits instead of one area of interest
+        tiles = None
         if not full_db_flag:
             # Since the full_db_flag is False, let's find the features that were edited
             #  by this user in this version since it was created. We'll then buffer those
@@ -142,21 +175,37 @@ def run_batch_on_buffered_edits(reviewer_ws, batch_job_file,
 
             utils.log_it('Buffering {count} edited route(s) by 10 meters'.format(count=feature_count),
                 level='info', logger=logger, arcpy_messages=messages)
-            area_of_interest = 'in_memory\\mpbuff_{}'.format(int(time.time()))
 
             # Set the output coordinate reference for the Buffer_analysis call
             arcpy.env.outputCoordinateSystem = arcpy.Describe(milepoint_fc).spatialReference
 
-            arcpy.Buffer_analysis(
-                version_select_milepoint_layer,
-                area_of_interest,
-                '10 Meters',
-                dissolve_option='ALL'
-            )
-            utils.log_it('', level='gp', logger=logger, arcpy_messages=messages)
+            if cluster_edits:
+                # Group the buffered edits into compact clusters, and run the batch job once per cluster
+                tiles = tiling.edit_cluster_tiles(
+                    version_select_milepoint_layer,
+                    buffer_distance='10 Meters',
+                    logger=logger,
+                    arcpy_messages=messages
+                )
+                if not tiles:
+                    utils.log_it('No clusters were found in the buffered edits. Using a single dissolved buffer',
+                        level='warn', logger=logger, arcpy_messages=messages)
+            if not tiles:
+                area_of_interest = 'in_memory\\{}'.format(scratch.unique_name('mpbuff'))
+                with timing.span('Buffer_analysis', rows=feature_count):
+                    arcpy.Buffer_analysis(
+                        version_select_milepoint_layer,
+                        area_of_interest,
+                        '10 Meters',
+                        dissolve_option='ALL'
+                    )
+                scratch.add_rows(area_of_interest, 1)
+                utils.log_it('', level='gp', logger=logger, arcpy_messages=messages)
         else:
             # When the full_db_flag is True, we'll validate the entire geographic extent of the LRSN feature class
             area_of_interest = arcpy.Describe(version_milepoint_layer).extent
+            if tile_grid:
+                tiles = tiling.grid_tiles(area_of_interest, *tile_grid)
 
         # Data Reviewer WMX tokens are only supported in the default DR Step Types. We must back out
         #  the session name from the DR tables
@@ -171,35 +220,40 @@ def run_batch_on_buffered_edits(reviewer_ws, batch_job_file,
         utils.log_it('Calling ExecuteReviewerBatchJob_Reviewer geoprocessing tool',
             level='debug', logger=logger, arcpy_messages=messages)
 
-        reviewer_results = arcpy.ExecuteReviewerBatchJob_Reviewer(
-            reviewer_ws,
-            reviewer_session,
-            batch_job_file,
-            production_workspace=production_ws,
-            analysis_area=area_of_interest,
-            changed_features='ALL_FEATURES',
-            production_workspaceversion=production_ws_version
-        )
-        utils.log_it('', level='gp', logger=logger, arcpy_messages=messages)
+        if tiles:
+            # Run the batch job on each tile or cluster in parallel. The tiles hold the Reviewer write lock themselves
+            tiling.run_tiled_batch_job(
+                reviewer_ws,
+                reviewer_session,
+                batch_job_file,
+                production_ws,
+                production_ws_version,
+                tiles,
+                progress_path=tile_progress_path,
+                logger=logger,
+                arcpy_messages=messages
+            )
+        else:
+            # The batch job commits its results to the Reviewer session itself, so it holds the Reviewer write lock
+            with write.reviewer_write_lock(), timing.span('ExecuteReviewerBatchJob_Reviewer'):
+                reviewer_results = arcpy.ExecuteReviewerBatchJob_Reviewer(
+                    reviewer_ws,
+                    reviewer_session,
+                    batch_job_file,
+                    production_workspace=production_ws,
+                    analysis_area=area_of_interest,
+                    changed_features='ALL_FEATURES',
+                    production_workspaceversion=production_ws_version
+                )
+            utils.log_it('', level='gp', logger=logger, arcpy_messages=messages)
 
         try:
             # Try to cleanup the runtime environment. This was put in place to address an issue where WMX was holding
             # on to database connections, which meant that a job could not be closed if this tool had executed
             # until WMX is restarted. Since this code causes no harm to anything except our expectations of Python code
             # syntax, I've opted to leave it
-            arcpy.CheckInExtension('datareviewer')
-            arcpy.env.workspace = r'in_memory'
-            fcs = arcpy.ListFeatureClasses()
-            utils.log_it('in_memory fcs: {}'.format(fcs), level='debug', logger=logger, arcpy_messages=messages)
-            for in_memory_fc in fcs:
-                try:
-                    arcpy.Delete_management(in_memory_fc)
-                    utils.log_it(' Deleted: {}'.format(in_memory_fc),
-                        level='debug', logger=logger, arcpy_messages=messages)
-                except:
-                    utils.log_it(' Could not delete: {}'.format(in_memory_fc),
-                        level='debug', logger=logger, arcpy_messages=messages)
-                    pass
+            # The in_memory datasets created by this function are deleted by its scratch.scratch_scope
+            utils.check_in_extension('datareviewer')
         except Exception as exc:
             utils.log_it(traceback.format_exc(), level='error', logger=logger, arcpy_messages=messages)
             pass
@@ -214,7 +268,12 @@ def run_batch_on_buffered_edits(reviewer_ws, batch_job_file,
     # Return True on function success
     else:
         return True
+    finally:
+        # Write the GP messages that are still waiting for the logger, so the log of the run is complete
+        utils.flush_gp_messages()
 
+@timing.timed()
+@scratch.scratch_scope
 def run_sql_validations(reviewer_ws, production_ws, job__id,
                         job__started_date, job__owned_by,
                         production_ws_version=None,
@@ -302,17 +361,24 @@ def run_sql_validations(reviewer_ws, production_ws, job__id,
         change_versioned_view_sql = 'EXEC ELRS.sde.set_current_version \'{version_name}\';'.format(
             version_name=production_ws_version
         )
-        utils.log_it('Calling SQL Query on database connection: "{sql}"'.format(sql=change_versioned_view_sql),
+        utils.log_it('Calling SQL Query on database connection: "{sql}"', sql=change_versioned_view_sql,
             level='debug', logger=logger, arcpy_messages=messages)
-        connection.execute(change_versioned_view_sql)
+        with timing.span('set_current_version'):
+            connection.execute(change_versioned_view_sql)
 
-        utils.log_it('Calling SQL Query on database connection: "{sql}"'.format(sql=UNIQUE_RDWY_ATTRS_QUERY),
+        # These queries return the offending ROUTE_IDs and OBJECTIDs directly, so there is no need to group the
+        #  DOT_ID/COUNTY_ORDER results against the versioned layer in Python
+        utils.log_it('Calling SQL Query on database connection: "{sql}"', sql=UNIQUE_RDWY_ATTRS_ROUTES_QUERY,
             level='debug', logger=logger, arcpy_messages=messages)
-        unique_rdwy_attrs_result = connection.execute(UNIQUE_RDWY_ATTRS_QUERY)
+        with timing.span('UNIQUE_RDWY_ATTRS_ROUTES_QUERY') as query_span:
+            unique_rdwy_attrs_result = sql_result_rows(connection.execute(UNIQUE_RDWY_ATTRS_ROUTES_QUERY))
+            query_span.rows = len(unique_rdwy_attrs_result)
 
-        utils.log_it('Calling SQL Query on database connection: "{sql}"'.format(sql=UNIQUE_CO_DIR_QUERY),
+        utils.log_it('Calling SQL Query on database connection: "{sql}"', sql=UNIQUE_CO_DIR_ROUTES_QUERY,
             level='debug', logger=logger, arcpy_messages=messages)
-        unique_co_dir_result = connection.execute(UNIQUE_CO_DIR_QUERY)
+        with timing.span('UNIQUE_CO_DIR_ROUTES_QUERY') as query_span:
+            unique_co_dir_result = sql_result_rows(connection.execute(UNIQUE_CO_DIR_ROUTES_QUERY))
+            query_span.rows = len(unique_co_dir_result)
 
         # Try changing the connection/versioned view back to Lockroot to release locks on the edit version for WMX
         try:
@@ -321,14 +387,6 @@ def run_sql_validations(reviewer_ws, production_ws, job__id,
             utils.log_it('Failed to change versioned view to "ELRS.Lockroot", but the validation SQL succeeded',
                 level='debug', logger=logger, arcpy_messages=messages)
 
-        # If the query succeeds but the response is empty, arcpy returns a Python
-        #  boolean type with a value of True. Convert booleans to an empty list to
-        #  simplify the results handling logic.
-        if isinstance(unique_co_dir_result, bool):
-            unique_co_dir_result = []
-        if isinstance(unique_rdwy_attrs_result, bool):
-            unique_rdwy_attrs_result = []
-
         if len(unique_rdwy_attrs_result) > 0 or len(unique_co_dir_result) > 0:
             # Create a versioned arcpy feature layer of the Milepoint feature class
             if not milepoint_fc:
@@ -361,57 +419,37 @@ def run_sql_validations(reviewer_ws, production_ws, job__id,
                 arcpy_messages=messages
             )
 
-            if len(unique_rdwy_attrs_result) > 0:
-                unique_rdwy_attrs_check_title = 'ROUTE_ID with improper roadway-level attributes across DOT_ID'
+            unique_rdwy_attrs_check_title = 'ROUTE_ID with improper roadway-level attributes across DOT_ID'
+            unique_co_dir_check_title = 'Non-Unique COUNTY_ORDER and DIRECTION for this DOT_ID'
 
-                write.rdwy_attrs_sql_result_to_reviewer_table(
-                    unique_rdwy_attrs_result,
-                    version_milepoint_layer,
-                    reviewer_ws,
-                    reviewer_session_name,
-                    milepoint_fc,
-                    unique_rdwy_attrs_check_title,
-                    level='debug',
-                    logger=logger,
-                    arcpy_messages=messages,
-                    log_name='unique_rdwy_attrs_check'
-                )
+            # Each result row starts with the ROUTE_ID and OBJECTID of an offending route. The violations are kept
+            #  by OBJECTID, so only the offending features are written, even when other features share their ROUTE_ID
+            sql_violations = dict()
+            if len(unique_rdwy_attrs_result) > 0:
+                sql_violations[unique_rdwy_attrs_check_title] = [int(row[1]) for row in unique_rdwy_attrs_result]
             if len(unique_co_dir_result) > 0:
-                unique_co_dir_check_title = 'Non-Unique COUNTY_ORDER and DIRECTION for this DOT_ID'
+                sql_violations[unique_co_dir_check_title] = [int(row[1]) for row in unique_co_dir_result]
 
-                write.co_dir_sql_result_to_reviewer_table(
-                    unique_co_dir_result,
-                    version_milepoint_layer,
-                    reviewer_ws,
-                    reviewer_session_name,
-                    milepoint_fc,
-                    unique_co_dir_check_title,
-                    level='debug',
-                    logger=logger,
-                    arcpy_messages=messages,
-                    log_name='unique_co_dir_check'
-                )
+            write.batch_result_to_reviewer_table(
+                sql_violations,
+                version_milepoint_layer,
+                reviewer_ws,
+                reviewer_session_name,
+                milepoint_fc,
+                key_field='OBJECTID',
+                level='debug',
+                logger=logger,
+                arcpy_messages=messages
+            )
 
         try:
             # Try to cleanup the runtime environment
-            arcpy.CheckInExtension('datareviewer')
+            utils.check_in_extension('datareviewer')
             try:
                 del connection
             except Exception:
                 utils.log_it('validations.run_sql_validations(): Could not delete the database connection!',
                     level='warn', logger=logger, arcpy_messages=messages)
-            arcpy.env.workspace = r'in_memory'
-            fcs = arcpy.ListFeatureClasses()
-            utils.log_it('in_memory fcs: {}'.format(fcs), level='debug', logger=logger, arcpy_messages=messages)
-            for in_memory_fc in fcs:
-                try:
-                    arcpy.Delete_management(in_memory_fc)
-                    utils.log_it(' Deleted: {}'.format(in_memory_fc),
-                        level='debug', logger=logger, arcpy_messages=messages)
-                except:
-                    utils.log_it(' Could not delete: {}'.format(in_memory_fc),
-                        level='debug', logger=logger, arcpy_messages=messages)
-                    pass
         except Exception as exc:
             utils.log_it(traceback.format_exc(), level='error', logger=logger, arcpy_messages=messages)
             pass
@@ -426,13 +464,44 @@ def run_sql_validations(reviewer_ws, production_ws, job__id,
     # Return True on function success
     else:
         return True
+    finally:
+        # Write the GP messages that are still waiting for the logger, so the log of the run is complete
+        utils.flush_gp_messages()
 
+def sql_result_rows(result):
+    """
+    Normalize the return value of `arcpy.ArcSDESQLExecute.execute` to a list of rows. If the query succeeds but the
+    response is empty, arcpy returns a Python boolean type with a value of True. A single value is returned as is,
+    and a single row may be returned as a flat list of values.
+
+    Arguments
+    ---------
+    :param result: The return value of `arcpy.ArcSDESQLExecute.execute`
+
+    Returns
+    -------
+    :returns list: A list of lists, with one inner list per row of the query result
+    """
+    if isinstance(result, bool):
+        return []
+    if not isinstance(result, (list, tuple)):
+        return [[result]]
+    if len(result) > 0 and not isinstance(result[0], (list, tuple)):
+        return [list(result)]
+    return [list(row) for row in result]
+
+@timing.timed()
+@scratch.scratch_scope
 def run_roadway_level_attribute_checks(reviewer_ws, production_ws, job__id,
                                        job__started_date, job__owned_by,
                                        production_ws_version=None,
                                        version_milepoint_layer=None,
                                        milepoint_fc=None,
                                        full_db_flag=False,
+                                       snapshot_dir=None,
+                                       rule_engine=ROADWAY_RULE_ENGINE,
+                                       shards=ROADWAY_RULE_SHARDS,
+                                       stream_chunk_size=ROADWAY_STREAM_CHUNK_SIZE,
                                        logger=None, messages=None):
     """
     This function manages the execution of the "Roadway level attribute" validations on the
@@ -467,6 +536,22 @@ def run_roadway_level_attribute_checks(reviewer_ws, production_ws, job__id,
     -----------------
     :param full_db_flag: Defaults to False. If True, all features will be validated. If False, only
         features edited by the user in their version will be validated.
+    :param snapshot_dir: Defaults to None. If set, the active routes are read from a local snapshot of the
+        version in this directory (see snapshot.py). Only the rows edited since the snapshot was taken are read
+        from the SDE database
+    :param rule_engine: Defaults to config.ROADWAY_RULE_ENGINE. With the full_db_flag, 'sql' evaluates the rules
+        of rules.ROADWAY_LEVEL_RULES in the database with `roadway_level_rule_violations_sql`, rather than reading
+        their attributes of every active route into Python. The COUNTY_ORDER sequence validations always run in
+        Python, so the DOT_ID, COUNTY_ORDER, ROUTE_ID and DIRECTION of every active route are still read (see
+        `build_dot_id_routes`). Edits are always validated in Python
+    :param shards: Defaults to config.ROADWAY_RULE_SHARDS. With the full_db_flag and the 'python' rule_engine, a
+        number greater than 1 splits the active routes into this many shards of DOT_IDs, which are validated in
+        a pool of worker processes (see `roadway_level_violations_sharded`)
+    :param stream_chunk_size: Defaults to config.ROADWAY_STREAM_CHUNK_SIZE. If set (and the routes are not
+        validated in shards or with the 'sql' rule_engine), the routes are read from a cursor in chunks of this
+        many rows, and each chunk is validated and handed to a writer that commits the violations every
+        config.REVIEWER_FLUSH_SIZE violations (see `roadway_level_violation_chunks`). The memory used then does not
+        grow with the number of violations
     :param logger: Defaults to None. If set, should be Python logging module logger object.
     :param messages: Defaults to None. If set, should refer to the arcpy.Messages variable that is present
         in the `execute` method of Python Toolboxes.
@@ -515,24 +600,41 @@ def run_roadway_level_attribute_checks(reviewer_ws, production_ws, job__id,
                 production_ws_version
             )
 
-        # Since the search cursor on the feature layer is affected by previous where_clause's, let's grab all of
-        #  the dot_ids and route_id:direction combos before the where clause is applied. This gets passed into 
-        #  validate_county_order_value while looping through the validation features
-        dot_id_routes = dict()
-        fields = ['DOT_ID', 'COUNTY_ORDER', 'ROUTE_ID', 'DIRECTION']
-        with arcpy.da.SearchCursor(version_milepoint_layer, fields, where_clause=ACTIVE_ROUTES_WHERE_CLAUSE) as id_curs:
-            for row in id_curs:
-                dot_id, county_order, route_id, direction = row
-                try:
-                    if county_order is None:
-                        raise ValueError
-                    to_int = int(county_order)
-                    dot_id_routes[dot_id][int(county_order)].append(route_id + ':' + direction)
-                except KeyError:
-                    dot_id_routes[dot_id] = defaultdict(list)
-                    dot_id_routes[dot_id][(int(county_order))].append(route_id + ':' + direction)
-                except ValueError:
-                    pass
+        # A full database run in Python can validate the routes in shards of DOT_IDs in worker processes. Each
+        #  shard analyzes the COUNTY_ORDER sequences of its own DOT_IDs, so they are not analyzed here
+        sharded = full_db_flag and rule_engine == 'python' and bool(shards) and shards > 1
+        # Otherwise, the routes can be validated and committed chunk by chunk as they are read from a cursor
+        streamed = bool(stream_chunk_size) and not sharded and not (full_db_flag and rule_engine == 'sql')
+
+        if snapshot_dir:
+            # Read the active routes from the local snapshot of this version. When the version has changed since
+            #  the snapshot was taken, only the OBJECTID and EDITED_DATE of every route, and the rows that changed,
+            #  are read from the SDE database
+            state_id = snapshot.get_version_state_id(production_ws, production_ws_version)
+            snapshot_rows = snapshot.active_milepoint_rows(snapshot.load_milepoint_snapshot(
+                snapshot_dir,
+                production_ws_version,
+                state_id,
+                lambda: snapshot.read_milepoint_source(version_milepoint_layer),
+                read_keys=lambda: snapshot.read_milepoint_keys(version_milepoint_layer),
+                read_delta=lambda object_ids: snapshot.read_milepoint_delta(version_milepoint_layer, object_ids),
+                logger=logger,
+                arcpy_messages=messages
+            ))
+
+        if sharded:
+            dot_id_routes = dict()
+        elif snapshot_dir:
+            dot_id_routes = build_dot_id_routes(snapshot_rows)
+        else:
+            # Since reading the feature layer is affected by previous where_clause's, let's grab all of
+            #  the dot_ids and route_id:direction combos before the where clause is applied. This gets passed into
+            #  precompute_county_order_verdicts before looping through the validation features
+            dot_id_routes = build_dot_id_routes(utils.milepoint_attributes_to_array(
+                version_milepoint_layer,
+                ['DOT_ID', 'COUNTY_ORDER', 'ROUTE_ID', 'DIRECTION'],
+                where_clause=ACTIVE_ROUTES_WHERE_CLAUSE
+            ))
 
         # If the full_db_flag is True, run the validations on all active routes (routes with no TO_DATE).
         #  Otherwise, follow the typical pattern of selecting the data edited by this user
@@ -547,99 +649,127 @@ def run_roadway_level_attribute_checks(reviewer_ws, production_ws, job__id,
                 domain=DOMAIN,
                 active_routes=ACTIVE_ROUTES_WHERE_CLAUSE
             )
-        utils.log_it('Using where_clause to find recent edits of {}: {}'.format(milepoint_fc, where_clause),
-            level='debug', logger=logger, arcpy_messages=messages)
 
-        version_select_milepoint_layer = arcpy.SelectLayerByAttribute_management(
-            version_milepoint_layer,
-            'NEW_SELECTION',
-            where_clause=where_clause
-        )
-        utils.log_it('Validating {count} route(s) roadway level attributes'.format(
-            count=arcpy.GetCount_management(version_select_milepoint_layer).getOutput(0)),
-            level='info', logger=logger, arcpy_messages=messages)
+        # Analyze the COUNTY_ORDER sequence of each DOT_ID once, then look up the verdicts of the validated routes
+        with timing.span('precompute_county_order_verdicts', rows=len(dot_id_routes)):
+            county_order_verdicts = precompute_county_order_verdicts(dot_id_routes)
 
-        # If these fields in precisely this order are not passed to the SearchCursor,
-        #  the validate_roadway_type function will fail. Any updates to either function
-        #  should be careful with the field orders.
-        attribute_fields = [
-            'ROADWAY_TYPE', 'ROUTE_ID', 'DOT_ID', 'COUNTY_ORDER', 'SIGNING', 'ROUTE_NUMBER',
-            'ROUTE_SUFFIX', 'ROUTE_QUALIFIER', 'PARKWAY_FLAG', 'ROADWAY_FEATURE', 'DIRECTION',
-        ]
-        violations = defaultdict(list)
-        with arcpy.da.SearchCursor(version_select_milepoint_layer, attribute_fields) as curs:
-            for row in curs:
-                # Validate roadway level attributes
-                # Don't include ROADWAY_TYPE or DIRECTION in the attributes variable
-                roadway_type = row[0]
-                attributes = row[1:-1]
-
-                results = validate_by_roadway_type(roadway_type, attributes)
-                for rule_rids in results.items():
-                    violations[rule_rids[0]].append(*rule_rids[1])
-
-                # Validate the COUNTY_ORDER range for this DOT_ID
-                dot_id = row[2]
-                county_order = row[3]
-                try:
-                    county_order_int = int(county_order)
-                except ValueError:
-                    # If the county_order is not integer like (e.g. '01'), it will be caught in validate_by_roadway_type
-                    pass
-                except TypeError:
-                    # If there  is no county_order, it will be caught in validate_by_roadway_type
-                    pass
-                else:
-                    direction = row[-1]
-                    county_order_results = validate_county_order_value(
-                        dot_id_routes,
-                        dot_id,
-                        direction,
-                        logger=logger,
-                        arcpy_messages=messages
-                    )
-                    for violation_desc__rid in county_order_results.items():
-                        violations[violation_desc__rid[0]].extend(violation_desc__rid[1])
+        # The SQL form of the rules is written for the field types of the Milepoint layer
+        with timing.span('ListFields'):
+            field_types = dict((field.name, field.type) for field in arcpy.ListFields(version_milepoint_layer))
+
+        if streamed:
+            # The violations are found while they are committed, below
+            violations = None
+        elif full_db_flag and rule_engine == 'sql':
+            # Every active route is validated, so every DOT_ID's COUNTY_ORDER verdict is reported
+            violations = roadway_level_rule_violations_sql(
+                production_ws,
+                production_ws_version,
+                field_types=field_types,
+                logger=logger,
+                messages=messages
+            )
+            for dot_id in sorted(county_order_verdicts):
+                for violation_desc__rid in county_order_verdicts[dot_id].items():
+                    violations[violation_desc__rid[0]].extend(violation_desc__rid[1])
+        elif sharded:
+            if snapshot_dir:
+                milepoint_rows = snapshot_rows[ROADWAY_ATTRIBUTE_FIELDS]
+            else:
+                milepoint_rows = utils.milepoint_attributes_to_array(
+                    version_milepoint_layer,
+                    ROADWAY_ATTRIBUTE_FIELDS,
+                    where_clause=where_clause
+                )
+            violations = roadway_level_violations_sharded(milepoint_rows, shards, logger=logger, messages=messages)
+        else:
+            violations = _roadway_level_violations_python(
+                version_milepoint_layer,
+                milepoint_fc,
+                where_clause,
+                county_order_verdicts,
+                snapshot_rows=snapshot_rows if snapshot_dir and full_db_flag else None,
+                logger=logger,
+                messages=messages
+            )
 
-        if len(violations) == 0:
+        if violations is not None and len(violations) == 0:
             utils.log_it('  0 roadway level attribute violations found. Exiting with success code',
                 level='warn', logger=logger, arcpy_messages=messages)
             return True
 
-        session_name = utils.get_reviewer_session_name(
-            reviewer_ws,
-            job__owned_by,
-            job__id,
-            logger=logger,
-            arcpy_messages=messages
-        )
+        def reviewer_session_name():
+            return utils.get_reviewer_session_name(
+                reviewer_ws,
+                job__owned_by,
+                job__id,
+                logger=logger,
+                arcpy_messages=messages
+            )
 
-        write.roadway_level_attribute_result_to_reviewer_table(
-            violations,
-            version_milepoint_layer,
-            reviewer_ws,
-            session_name,
-            milepoint_fc,
-            base_where_clause=where_clause,
-            level='info',
-            logger=logger,
-            arcpy_messages=messages
-        )
+        if streamed:
+            stream_layer_name = None
+            if snapshot_dir and full_db_flag:
+                milepoint_rows = snapshot_rows[ROADWAY_ATTRIBUTE_FIELDS]
+                milepoint_chunks = (
+                    milepoint_rows[start:start + stream_chunk_size]
+                    for start in range(0, len(milepoint_rows), stream_chunk_size)
+                )
+            else:
+                # The writer changes the selection of the versioned layer, so the cursor reads from a layer of its own
+                arcpy.SelectLayerByAttribute_management(version_milepoint_layer, 'CLEAR_SELECTION')
+                stream_layer_name = scratch.unique_name('milepoint_stream', workspace=None)
+                stream_layer = arcpy.MakeFeatureLayer_management(version_milepoint_layer, stream_layer_name)
+                milepoint_chunks = utils.milepoint_attribute_chunks(
+                    stream_layer,
+                    ROADWAY_ATTRIBUTE_FIELDS,
+                    stream_chunk_size,
+                    where_clause=where_clause
+                )
+            try:
+                violation_count, record_count = write.violation_stream_to_reviewer_table(
+                    roadway_level_violation_chunks(milepoint_chunks, county_order_verdicts),
+                    version_milepoint_layer,
+                    reviewer_ws,
+                    # The session is looked up on the first flush, so a job without violations does not need one
+                    reviewer_session_name,
+                    milepoint_fc,
+                    base_where_clause=where_clause,
+                    level='info',
+                    logger=logger,
+                    arcpy_messages=messages
+                )
+            finally:
+                # Feature layers are not registered as scratch datasets, so the stream layer is deleted here
+                if stream_layer_name:
+                    scratch.delete(stream_layer_name)
+            if violation_count == 0:
+                utils.log_it('  0 roadway level attribute violations found',
+                    level='warn', logger=logger, arcpy_messages=messages)
+        else:
+            # A full database run can have tens of thousands of violating routes. Rather than selecting them by
+            #  ROUTE_ID, select them with the SQL form of the rules
+            selection_where_clause = None
+            if full_db_flag:
+                selection_where_clause = rules.violations_where_clause(field_types=field_types)
+
+            write.batch_result_to_reviewer_table(
+                violations,
+                version_milepoint_layer,
+                reviewer_ws,
+                reviewer_session_name(),
+                milepoint_fc,
+                base_where_clause=where_clause,
+                selection_where_clause=selection_where_clause,
+                level='info',
+                logger=logger,
+                arcpy_messages=messages
+            )
         try:
             # Try to cleanup the runtime environment
-            arcpy.CheckInExtension('datareviewer')
-            arcpy.env.workspace = r'in_memory'
-            fcs = arcpy.ListFeatureClasses()
-            utils.log_it('in_memory fcs: {}'.format(fcs), level='debug', logger=logger, arcpy_messages=messages)
-            for in_memory_fc in fcs:
-                try:
-                    arcpy.Delete_management(in_memory_fc)
-                    utils.log_it(' Deleted: {}'.format(in_memory_fc),
-                        level='debug', logger=logger, arcpy_messages=messages)
-                except:
-                    utils.log_it(' Could not delete: {}'.format(in_memory_fc),
-                        level='debug', logger=logger, arcpy_messages=messages)
-                    pass
+            # The in_memory datasets created by this function are deleted by its scratch.scratch_scope
+            utils.check_in_extension('datareviewer')
         except Exception as exc:
             utils.log_it(traceback.format_exc(), level='error', logger=logger, arcpy_messages=messages)
             pass
@@ -654,6 +784,281 @@ def run_roadway_level_attribute_checks(reviewer_ws, production_ws, job__id,
     # Return True on function success
     else:
         return True
+    finally:
+        # Write the GP messages that are still waiting for the logger, so the log of the run is complete
+        utils.flush_gp_messages()
+
+def _roadway_level_violations_python(version_milepoint_layer, milepoint_fc, where_clause, county_order_verdicts,
+                                     snapshot_rows=None, logger=None, messages=None):
+    """
+    Read the attributes of the routes that match the `where_clause` (or take them from `snapshot_rows`), validate
+    them with `validate_by_roadway_type_vectorized`, and add the COUNTY_ORDER verdicts of their DOT_IDs.
+    Returns the violations defaultdict.
+    """
+    if snapshot_rows is not None:
+        # Every active route is validated, and the snapshot already holds all of them
+        milepoint_rows = snapshot_rows[ROADWAY_ATTRIBUTE_FIELDS]
+        utils.log_it('Validating {count} route(s) roadway level attributes from the Milepoint snapshot'.format(
+            count=len(milepoint_rows)),
+            level='info', logger=logger, arcpy_messages=messages)
+    else:
+        utils.log_it('Using where_clause to find recent edits of {milepoint_fc}: {where_clause}',
+            milepoint_fc=milepoint_fc, where_clause=where_clause,
+            level='debug', logger=logger, arcpy_messages=messages)
+
+        with timing.span('SelectLayerByAttribute_management'):
+            version_select_milepoint_layer = arcpy.SelectLayerByAttribute_management(
+                version_milepoint_layer,
+                'NEW_SELECTION',
+                where_clause=where_clause
+            )
+        utils.log_it('Validating {count} route(s) roadway level attributes'.format(
+            count=arcpy.GetCount_management(version_select_milepoint_layer).getOutput(0)),
+            level='info', logger=logger, arcpy_messages=messages)
+
+        milepoint_rows = utils.milepoint_attributes_to_array(version_select_milepoint_layer, ROADWAY_ATTRIBUTE_FIELDS)
+
+    # Validate roadway level attributes of all selected routes at once
+    with timing.span('validate_by_roadway_type_vectorized', rows=len(milepoint_rows)):
+        violations = validate_by_roadway_type_vectorized(milepoint_rows)
+
+    with timing.span('county_order_verdict_lookup', rows=len(milepoint_rows)):
+        add_county_order_verdicts(violations, milepoint_rows, county_order_verdicts)
+
+    return violations
+
+@timing.timed()
+def roadway_level_violations_sharded(milepoint_rows, shard_count, processes=None, logger=None, messages=None):
+    """
+    Validate the roadway level attributes and COUNTY_ORDER sequences of every route in `milepoint_rows` in shards
+    of DOT_IDs (see sharding.py). Each shard holds every route of its DOT_IDs, so it analyzes their COUNTY_ORDER
+    sequences on its own with `roadway_level_violations`. The shards run in a pool of worker processes, unless
+    this function already runs in one (e.g. the roadway_level_attributes validator of
+    parallel.run_validators_in_parallel).
+
+    The violations of the shards are merged in shard order, so the result only depends on the routes and the
+    `shard_count`. It holds the same rule/ROUTE_ID pairs as validating all of the routes at once, although the
+    ROUTE_IDs of a rule are grouped by shard rather than in row order.
+
+    Arguments
+    ---------
+    :param milepoint_rows: A NumPy structured array of every active route, with the ROADWAY_ATTRIBUTE_FIELDS
+    :param shard_count: The number of shards
+
+    Keyword Arguments
+    -----------------
+    :param processes: Defaults to None, which starts one worker process per shard, up to the number of CPUs
+    :param logger: Defaults to None. If set, should be Python logging module logger object.
+    :param messages: Defaults to None. If set, should refer to the arcpy.Messages variable that is present
+        in the `execute` method of Python Toolboxes.
+
+    Returns
+    -------
+    :returns defaultdict(list): The violated rules' descriptions as keys, and the lists of violating ROUTE_IDs
+        as values
+    """
+    shards = sharding.shard_rows(milepoint_rows, 'DOT_ID', shard_count)
+    utils.log_it('Validating {routes} route(s) roadway level attributes in {shards} shard(s) of DOT_IDs',
+        routes=len(milepoint_rows), shards=len(shards),
+        level='info', logger=logger, arcpy_messages=messages)
+    with timing.span('roadway_level_violations', rows=len(milepoint_rows)):
+        shard_violations = sharding.map_shards(roadway_level_violations, shards, processes=processes)
+    return sharding.merge_violations(shard_violations)
+
+def roadway_level_violations(milepoint_rows):
+    """
+    Validate the roadway level attributes of `milepoint_rows` with `validate_by_roadway_type_vectorized`, and add
+    the COUNTY_ORDER verdicts of their DOT_IDs. The COUNTY_ORDER sequences are analyzed from the `milepoint_rows`
+    alone, so they must hold every active route of their DOT_IDs. This is the target of the worker processes of
+    `roadway_level_violations_sharded`.
+
+    Arguments
+    ---------
+    :param milepoint_rows: A NumPy structured array with the ROADWAY_ATTRIBUTE_FIELDS
+
+    Returns
+    -------
+    :returns defaultdict(list): The violations, like `validate_by_roadway_type_vectorized`
+    """
+    violations = validate_by_roadway_type_vectorized(milepoint_rows)
+    add_county_order_verdicts(
+        violations,
+        milepoint_rows,
+        precompute_county_order_verdicts(build_dot_id_routes(milepoint_rows))
+    )
+    return violations
+
+def roadway_level_violation_chunks(milepoint_chunks, county_order_verdicts):
+    """
+    Validate the roadway level attributes of each chunk of routes as it arrives, and yield its violations. This is
+    the validation stage of the streaming pipeline of `run_roadway_level_attribute_checks`: the chunks are read
+    from a cursor (see utils.milepoint_attribute_chunks), and the violations are committed by
+    write.violation_stream_to_reviewer_table, so only one chunk of routes is held in memory at a time.
+
+    The COUNTY_ORDER verdict of each DOT_ID is added once, to the chunk of its first validated route.
+
+    Arguments
+    ---------
+    :param milepoint_chunks: An iterable of NumPy structured arrays (or mappings of field names to columns) with
+        the ROADWAY_ATTRIBUTE_FIELDS
+    :param county_order_verdicts: The `precompute_county_order_verdicts` result of the DOT_IDs of the routes
+
+    Returns
+    -------
+    :returns generator: A generator of violations defaultdicts, one per chunk, like
+        `validate_by_roadway_type_vectorized`
+    """
+    reported_dot_ids = set()
+    for milepoint_rows in milepoint_chunks:
+        with timing.span('validate_by_roadway_type_vectorized', rows=len(milepoint_rows['ROUTE_ID'])):
+            violations = validate_by_roadway_type_vectorized(milepoint_rows)
+        add_county_order_verdicts(violations, milepoint_rows, county_order_verdicts,
+                                  reported_dot_ids=reported_dot_ids)
+        yield violations
+
+def add_county_order_verdicts(violations, milepoint_rows, county_order_verdicts, reported_dot_ids=None):
+    """
+    Add the COUNTY_ORDER verdicts of the DOT_IDs of the validated routes to their violations. Each DOT_ID's
+    verdict is added once, and routes whose COUNTY_ORDER is not integer like are skipped, since they are caught
+    in `validate_by_roadway_type`.
+
+    Arguments
+    ---------
+    :param violations: The violations defaultdict(list) of `validate_by_roadway_type_vectorized`, which is updated
+    :param milepoint_rows: A NumPy structured array (or a mapping of field names to columns) of the validated
+        routes, with the DOT_ID and COUNTY_ORDER fields
+    :param county_order_verdicts: The `precompute_county_order_verdicts` result of the DOT_IDs of the routes
+
+    Keyword Arguments
+    -----------------
+    :param reported_dot_ids: Defaults to None. A set of the DOT_IDs whose verdicts were already added, which is
+        updated. Pass the same set for each chunk of a stream of routes, so each verdict is added once
+    """
+    # Each DOT_ID's verdict only needs to be reported once
+    if reported_dot_ids is None:
+        reported_dot_ids = set()
+    for dot_id, county_order in zip(_column_values(milepoint_rows['DOT_ID']),
+                                    _column_values(milepoint_rows['COUNTY_ORDER'])):
+        # Validate the COUNTY_ORDER range for this DOT_ID
+        try:
+            county_order_int = int(county_order)
+        except ValueError:
+            # If the county_order is not integer like (e.g. '01'), it will be caught in validate_by_roadway_type
+            pass
+        except TypeError:
+            # If there  is no county_order, it will be caught in validate_by_roadway_type
+            pass
+        else:
+            if dot_id in reported_dot_ids:
+                continue
+            reported_dot_ids.add(dot_id)
+            for violation_desc__rid in county_order_verdicts.get(dot_id, {}).items():
+                violations[violation_desc__rid[0]].extend(violation_desc__rid[1])
+
+@timing.timed()
+def roadway_level_rule_violations_sql(production_ws, production_ws_version, field_types=None,
+                                      logger=None, messages=None):
+    """
+    Evaluate the rules of rules.ROADWAY_LEVEL_RULES on every active route with one query against the SDE versioned
+    view of the LRSN_Milepoint table (see rules.violations_query). The database returns the ROUTE_ID of each
+    violation, so the attributes that the rules check are not read into Python. The COUNTY_ORDER sequence
+    validations still need the DOT_ID, COUNTY_ORDER, ROUTE_ID and DIRECTION of every active route, which
+    `run_roadway_level_attribute_checks` reads for `build_dot_id_routes`. Like `run_sql_validations`, the query runs on an
+    `arcpy.ArcSDESQLExecute` connection that is switched to the version.
+
+    Arguments
+    ---------
+    :param production_ws: Filepath to the SDE file pointing to the correct database
+    :param production_ws_version: The database version to validate
+
+    Keyword Arguments
+    -----------------
+    :param field_types: Defaults to None. A dictionary of the Milepoint field names to arcpy field types. See
+        rules.violations_where_clause
+    :param logger: Defaults to None. If set, should be Python logging module logger object.
+    :param messages: Defaults to None. If set, should refer to the arcpy.Messages variable that is present
+        in the `execute` method of Python Toolboxes.
+
+    Returns
+    -------
+    :returns defaultdict(list): The same violations as `validate_by_roadway_type_vectorized` returns for the
+        active routes, with the ROUTE_IDs sorted
+    :raises AttributeError: Raises an AttributeError if any active route's roadway_type is not within the valid range
+    """
+    start_time = time.time()
+    connection = arcpy.ArcSDESQLExecute(production_ws)
+    try:
+        change_versioned_view_sql = 'EXEC ELRS.sde.set_current_version \'{version_name}\';'.format(
+            version_name=production_ws_version
+        )
+        utils.log_it('Calling SQL Query on database connection: "{sql}"', sql=change_versioned_view_sql,
+            level='debug', logger=logger, arcpy_messages=messages)
+        with timing.span('set_current_version'):
+            connection.execute(change_versioned_view_sql)
+
+        invalid_roadway_type_sql = rules.invalid_roadway_type_query()
+        utils.log_it('Calling SQL Query on database connection: "{sql}"', sql=invalid_roadway_type_sql,
+            level='debug', logger=logger, arcpy_messages=messages)
+        with timing.span('INVALID_ROADWAY_TYPE_QUERY'):
+            invalid_roadway_types = sql_result_rows(connection.execute(invalid_roadway_type_sql))
+        if invalid_roadway_types:
+            raise AttributeError(rules.roadway_type_error_message(invalid_roadway_types[0][0]))
+
+        violations_sql = rules.violations_query(field_types=field_types)
+        utils.log_it('Calling SQL Query on database connection: "{sql}"', sql=violations_sql,
+            level='debug', logger=logger, arcpy_messages=messages)
+        with timing.span('ROADWAY_LEVEL_RULES_QUERY') as query_span:
+            result = sql_result_rows(connection.execute(violations_sql))
+            query_span.rows = len(result)
+    finally:
+        # Try changing the connection/versioned view back to Lockroot to release locks on the edit version for WMX
+        try:
+            connection.execute('EXEC ELRS.sde.set_current_version "ELRS.Lockroot";')
+        except:
+            utils.log_it('Failed to change versioned view to "ELRS.Lockroot"',
+                level='debug', logger=logger, arcpy_messages=messages)
+        del connection
+
+    descriptions = dict((rule.rule_id, rule.description) for rule in rules.ROADWAY_LEVEL_RULES)
+    violations = defaultdict(list)
+    for route_id, object_id, rule_id in result:
+        violations[descriptions[rule_id]].append(route_id)
+
+    utils.log_it('Found {count} roadway level attribute violation(s) in the database in {seconds:.2f} seconds'.format(
+        count=len(result), seconds=time.time() - start_time),
+        level='info', logger=logger, arcpy_messages=messages)
+    return violations
+
+@timing.timed()
+def build_dot_id_routes(milepoint_rows):
+    """
+    Organize the routes by DOT_ID and COUNTY_ORDER for the COUNTY_ORDER validations. Routes with a COUNTY_ORDER
+    that is not integer like are skipped, since they are caught in `validate_by_roadway_type`.
+
+    Arguments
+    ---------
+    :param milepoint_rows: A NumPy structured array (or a mapping of field names to columns) with the
+        DOT_ID, COUNTY_ORDER, ROUTE_ID and DIRECTION fields
+
+    Returns
+    -------
+    :returns dict: A dictionary containing defaultdicts of lists. The dict key is the DOT_ID, the defaultdict
+        key is the COUNTY_ORDER (as an integer), and the list is a list of ROUTE_ID:DIRECTION strings
+    """
+    dot_id_routes = dict()
+    for dot_id, county_order, route_id, direction in zip(_column_values(milepoint_rows['DOT_ID']),
+                                                         _column_values(milepoint_rows['COUNTY_ORDER']),
+                                                         _column_values(milepoint_rows['ROUTE_ID']),
+                                                         _column_values(milepoint_rows['DIRECTION'])):
+        try:
+            county_order_int = int(county_order)
+        except (TypeError, ValueError):
+            continue
+        if dot_id not in dot_id_routes:
+            dot_id_routes[dot_id] = defaultdict(list)
+        dot_id_routes[dot_id][county_order_int].append('{}:{}'.format(route_id, direction))
+
+    return dot_id_routes
 
 def validate_county_order_value(dot_id_routes, dot_id, direction,
                                 active_routes_where_clause=ACTIVE_ROUTES_WHERE_CLAUSE,
@@ -664,10 +1069,14 @@ def validate_county_order_value(dot_id_routes, dot_id, direction,
     COUNTY_ORDER of 01. If a DOT_ID crosses three counties, the expected COUNTY_ORDER sequence is
     ('01, '02', '03').
 
+    The `dot_id_routes` are not modified, so the result for a DOT_ID does not depend on how many times or in
+    which order the function is called. When many routes are validated, use `precompute_county_order_verdicts`
+    to analyze each DOT_ID once rather than calling this function for every route.
+
     Arguments
     ---------
     :param dot_id_routes: A dictionary containing defaultdicts of lists. The dict key is the DOT_ID, the defaultdict
-        key is the COUNTY_ORDER (as an integer), and the list is a list of ROUTE_IDs
+        key is the COUNTY_ORDER (as an integer), and the list is a list of ROUTE_ID:DIRECTION strings
     :param dot_id: A string value of length 6 that identifies a unique roadway
     :param direction: A string value of one of ('0', '1', '2', '3') that represents the route's direction
         significance. Each code has a meaning associated with divided roadways and where the inventory data is stored
@@ -681,19 +1090,61 @@ def validate_county_order_value(dot_id_routes, dot_id, direction,
     :returns violations: A defaultdict of a list that has the violated rule as the key, and the list of violating
         route_ids as the values
     """
+    return county_order_violations(dot_id_routes[dot_id])
+
+def precompute_county_order_verdicts(dot_id_routes):
+    """
+    Analyze the COUNTY_ORDER sequence of every DOT_ID in `dot_id_routes` exactly once. The returned dictionary
+    is used as a lookup while looping through the validated routes, so a DOT_ID with many routes is not
+    re-analyzed for each of its routes.
+
+    Arguments
+    ---------
+    :param dot_id_routes: A dictionary containing defaultdicts of lists. The dict key is the DOT_ID, the defaultdict
+        key is the COUNTY_ORDER (as an integer), and the list is a list of ROUTE_ID:DIRECTION strings
+
+    Returns
+    -------
+    :returns dict: A dictionary with the DOT_ID as the key, and the `county_order_violations` result for
+        that DOT_ID as the value. DOT_IDs without violations are not included in the dictionary
+    """
+    verdicts = dict()
+    for dot_id, county_orders in dot_id_routes.items():
+        violations = county_order_violations(county_orders)
+        if violations:
+            verdicts[dot_id] = violations
+    return verdicts
+
+def county_order_violations(county_orders):
+    """
+    Determine the COUNTY_ORDER violations for the routes of a single DOT_ID. This is the analysis behind
+    `validate_county_order_value` and `precompute_county_order_verdicts`.
+
+    Arguments
+    ---------
+    :param county_orders: A dictionary with the COUNTY_ORDER (as an integer) as the key and a list of
+        ROUTE_ID:DIRECTION strings as the value. The dictionary is not modified
+
+    Returns
+    -------
+    :returns violations: A defaultdict of a list that has the violated rule as the key, and a sorted list of
+        violating route_ids as the values
+    """
     violations = defaultdict(list)
     rule_text_sequence = 'COUNTY_ORDER must increment by a value of 1 for this DOT_ID'
     rule_text_not_one = 'COUNTY_ORDER must equal \'01\' for singular DOT_ID'
     rule_text_length_error = 'COUNTY_ORDER has too many ROUTE_IDs for this DOT_ID'
 
-    county_orders = dot_id_routes[dot_id]
+    # Collapse the ROUTE_ID:DIRECTION strings into a new dictionary rather than in place, so the caller's
+    #  dictionary gives the same answer no matter how many times it is analyzed
+    collapsed_county_orders = dict()
 
     # Since multiple ROUTE_IDs for a COUNTY_ORDER is valid (with certain direction code combinations), we need to
     #  test that the direction codes are valid
-    for county_order, route_id_direction in county_orders.items():
+    for county_order, route_id_direction in sorted(county_orders.items()):
         # Length of one means there is only one ROUTE_ID for this COUNTY_ORDER, so add it to the dict witout :DIRECTION
         if len(route_id_direction) == 1:
-            county_orders[county_order] = [route_id_direction[0].split(':')[0]]
+            collapsed_county_orders[county_order] = [route_id_direction[0].split(':')[0]]
         else:
             direction_codes = [route_id_direction_str.split(':')[1] for route_id_direction_str in route_id_direction]
             if len(direction_codes) > 1:
@@ -715,45 +1166,42 @@ def validate_county_order_value(dot_id_routes, dot_id, direction,
             if all(valid_dir in direction_codes for valid_dir in valid_direction_codes):
                 # The directions are valid, so just store one ROUTE_ID in the list for this COUNTY_ORDER. This makes
                 #  the logic below simpler, since we can assume only one ROUTE_ID exists for each COUNTY_ORDER
-                county_orders[county_order] = [ route_id_direction[0].split(':')[0] ]
+                collapsed_county_orders[county_order] = [ route_id_direction[0].split(':')[0] ]
             else:
-                # The case where DIRECTION are not valid should be covered by the SQL validations TODO: Check this
-                pass
+                # The case where DIRECTION are not valid should be covered by the SQL validations
+                collapsed_county_orders[county_order] = [
+                    route_id_direction_str.split(':')[0] for route_id_direction_str in route_id_direction
+                ]
         if len(route_id_direction) > 2:
             # There should not be more than 2 ROUTE_IDs per DOT_ID/COUNTY_ORDER. Write just one ROUTE_ID as a violation
             violations[rule_text_length_error] = [ rid_dir.split(':')[0] for rid_dir in route_id_direction ]
 
-    
-    route_ids = [route_id for all_route_ids in county_orders.values() for route_id in all_route_ids]
-    expected_county_orders = range(1, len(route_ids)+1)
+    sorted_county_orders = sorted(collapsed_county_orders.keys())
+    route_ids = [route_id for all_route_ids in collapsed_county_orders.values() for route_id in all_route_ids]
+    expected_county_orders = list(range(1, len(route_ids)+1))
 
-    if sorted(county_orders.keys()) == sorted(expected_county_orders):
+    if sorted_county_orders == expected_county_orders:
         # The county orders increment correctly, so pass to function return
         pass
     else:
-        if len(county_orders.keys()) == 1:
-            if county_orders.keys()[0] != 1:
+        if len(sorted_county_orders) == 1:
+            if sorted_county_orders[0] != 1:
                 # There is only one COUNTY_ORDER, and it was not 01. Store the violation
-                for route_id_dirs in county_orders.values():
-                    violation_route_ids = [route_id.split(':')[0] for route_id in route_id_dirs]
-                    violations[rule_text_not_one] = violation_route_ids
+                violations[rule_text_not_one] = list(collapsed_county_orders[sorted_county_orders[0]])
         else:
             # There are numerous county orders. Test that element 1 minus element 0 == 1
             #  For example: ['01', '03'][1] - ['01', '03'][0] -> 3-1 != 1
-            for county_order_a, county_order_b in zip(county_orders.keys()[:-1], county_orders.keys()[1:]):
+            for county_order_a, county_order_b in zip(sorted_county_orders[:-1], sorted_county_orders[1:]):
                 difference = county_order_b - county_order_a
                 if difference == 1:
                     continue
                 else:
                     # If not equal to 1, write a violation
-                    violations[rule_text_sequence].append(*county_orders[county_order_b])
+                    violations[rule_text_sequence].extend(collapsed_county_orders[county_order_b])
 
-    # Make sure ROUTE_IDs are unique if they exist
-    # if violations:
-    #     violations[rule_text] = list(set(violations[rule_text]))
-    if violations:
-        for rule in violations.keys():
-            violations[rule] = list(set(violations[rule]))
+    # Make sure ROUTE_IDs are unique, and sort them so the results are deterministic
+    for rule in violations.keys():
+        violations[rule] = sorted(set(violations[rule]))
 
     return violations
 
@@ -761,11 +1209,10 @@ def validate_county_order_value(dot_id_routes, dot_id, direction,
 def validate_by_roadway_type(roadway_type, attributes):
     """
     This function validates a single feature based on its roadway type. The function is set up to
-    accept the "coded values" of the domains rather than the "descriptions". Based on the particular
-    ROADWAY_TYPE, the remaining roadway level attributes are passed through a series of if statements.
-    If the statement is True, the attributes violate the validations. A new entry is added to the
-    `violations` defaultdict, with the rule as the defaultdict key, and the values as a list of offending
-    ROUTE_IDs
+    accept the "coded values" of the domains rather than the "descriptions". The feature is checked against
+    the rules of rules.ROADWAY_LEVEL_RULES that apply to its ROADWAY_TYPE. For each rule the attributes
+    violate, a new entry is added to the `violations` defaultdict, with the rule as the defaultdict key,
+    and the values as a list of offending ROUTE_IDs
 
     The attribute fields must be in the following order:
     signing, route_number, route_suffix, route_qualifier, parkway_flag, and roadway_feature
@@ -791,77 +1238,56 @@ def validate_by_roadway_type(roadway_type, attributes):
     """
     (route_id, dot_id, county_order, signing, route_number,
         route_suffix, route_qualifier, parkway_flag, roadway_feature) = attributes
-    if roadway_type not in [1, 2, 3, 4, 5]:
-        raise AttributeError(
-            'ROADWAY_TYPE is outside of the valid range. Must be one of (1, 2, 3, 4 ,5). ' +
-            'Currently ROADWAY_TYPE={}'.format(roadway_type)
-        )
 
+    # The single feature is validated as a one row table, so the row by row and vectorized validations share
+    #  the rules of rules.ROADWAY_LEVEL_RULES. The columns hold Python objects, so the values are tested exactly
+    #  as they were read from the cursor
+    fields_values = [
+        ('ROADWAY_TYPE', roadway_type), ('ROUTE_ID', route_id), ('DOT_ID', dot_id), ('COUNTY_ORDER', county_order),
+        ('SIGNING', signing), ('ROUTE_NUMBER', route_number), ('ROUTE_SUFFIX', route_suffix),
+        ('ROUTE_QUALIFIER', route_qualifier), ('PARKWAY_FLAG', parkway_flag), ('ROADWAY_FEATURE', roadway_feature),
+    ]
+    return validate_by_roadway_type_vectorized(dict(
+        (field, np.array([value], dtype=object)) for field, value in fields_values
+    ))
+
+def validate_by_roadway_type_vectorized(milepoint_rows):
+    """
+    This function applies the same rules as `validate_by_roadway_type`, but it validates every feature at once.
+    The rules of rules.ROADWAY_LEVEL_RULES are evaluated as NumPy boolean masks over the whole array, rather than
+    calling `validate_by_roadway_type` once per cursor row. The output is identical to collecting the results of
+    `validate_by_roadway_type` for each row, in row order.
+
+    The `milepoint_rows` are typically read with `utils.milepoint_attributes_to_array`, which replaces NULL text
+    with an empty string and NULL numbers with config.NUMPY_NULL_INTEGER. A dictionary of lists (or any other
+    mapping of field name to a column of values) containing Python None values also works.
+
+    Arguments
+    ---------
+    :param milepoint_rows: A NumPy structured array or a mapping of field names to columns. The following fields
+        must be present: ROADWAY_TYPE, ROUTE_ID, DOT_ID, COUNTY_ORDER, SIGNING, ROUTE_NUMBER,
+        ROUTE_SUFFIX, ROUTE_QUALIFIER, PARKWAY_FLAG, ROADWAY_FEATURE
+
+    Returns
+    -------
+    :returns defaultdict(list): This function returns a default dict that contains a list of the offending ROUTE_IDs
+        as the dict items, and the rule(s) that was validated as the default dict keys.
+    :raises AttributeError: Raises an AttributeError if any roadway_type is not within the valid range
+    """
     violations = defaultdict(list)
+    if len(milepoint_rows['ROUTE_ID']) == 0:
+        return violations
 
-    # All validations regardless of ROADWAY_TYPE
-    if not re.match(r'^\d{9}$', str(route_id)):
-        violations['ROUTE_ID must be a nine digit number'].append(route_id)
-    if not re.match(r'^\d{6}$', str(dot_id)):
-        violations['DOT_ID must be a six digit number'].append(route_id)
-    if not re.match(r'^\d{2}$', str(county_order)):
-        violations['COUNTY_ORDER must be a zero padded two digit number (e.g. \'01\')'].append(route_id)
-
-    # Only run these validations if the county order is a number
-    if re.match(r'^\d{2}$', str(county_order)):
-        if county_order and int(county_order) == 0:
-            violations['COUNTY_ORDER must be greater than \'00\''].append(route_id)
-        if county_order and int(county_order) > 28:
-            violations['COUNTY_ORDER should be less than \'29\''].append(route_id)
-
-    # Validations for ROADWAY_TYPE = Road or Ramp
-    if roadway_type == 1 or roadway_type == 2:
-        if signing:
-            violations['SIGNING must be null when ROADWAY_TYPE in (\'Road\', \'Ramp\')'].append(route_id)
-        if route_number:
-            violations['ROUTE_NUMBER must be null when ROADWAY_TYPE in (\'Road\', \'Ramp\')'].append(route_id)
-        if route_suffix:
-            violations['ROUTE_SUFFIX must be null when ROADWAY_TYPE in (\'Road\', \'Ramp\')'].append(route_id)
-        if route_qualifier != 10:    # 10 is "No Qualifier"
-            violations[(
-                'ROUTE_QUALIFIER must be \'No Qualifier\' when ROADWAY_TYPE in (\'Road\', \'Ramp\')'
-            )].append(route_id)
-        if parkway_flag == 'T':      # T is "Yes"
-            violations['PARKWAY_FLAG must be \'No\' when ROADWAY_TYPE in (\'Road\', \'Ramp\')'].append(route_id)
-        if roadway_feature:
-            violations['ROADWAY_FEATURE must be null when ROADWAY_TYPE in (\'Road\', \'Ramp\')'].append(route_id)
-
-    # Validations for ROADWAY_TYPE = Route
-    elif roadway_type == 3:
-        if not route_number:
-            violations['ROUTE_NUMBER must not be null when ROADWAY_TYPE=Route'].append(route_id)
-        if roadway_feature:
-            violations['ROADWAY_FEATURE must be null when ROADWAY_TYPE=Route'].append(route_id)
-        if not signing and not re.match(r'^9\d{2}$', str(route_number)):
-            violations[(
-                'ROUTE_NUMBER must be a \'900\' route (i.e. 9xx) when ' +
-                'ROADWAY_TYPE=Route and SIGNING is null'
-            )].append(route_id)
-
-    # Validations for ROADWAY_TYPE = Non-Mainline
-    elif roadway_type == 5:
-        if signing:
-            violations['SIGNING must be null when ROADWAY_TYPE=Non-Mainline'].append(route_id)
-        if route_number:
-            violations['ROUTE_NUMBER must be null when ROADWAY_TYPE=Non-Mainline'].append(route_id)
-        if route_suffix:
-            violations['ROUTE_SUFFIX must be null when ROADWAY_TYPE=Non-Mainline'].append(route_id)
-        if route_qualifier != 10:   # 10 is "No Qualifier"
-            violations['ROUTE_QUALIFIER must be null when ROADWAY_TYPE=Non-Mainline'].append(route_id)
-        if parkway_flag == 'T':      # T is "Yes"
-            violations['PARKWAY_FLAG must be \'No\' when ROADWAY_TYPE=Non-Mainline'].append(route_id)
-        if not roadway_feature:
-            violations['ROADWAY_FEATURE must not be null when ROADWAY_TYPE=Non-Mainline'].append(route_id)
+    # ROADWAY_TYPE=4 is within the range of the domain, but there are no rules for it. The whole validation is
+    #  stopped at the first invalid ROADWAY_TYPE
+    rules.check_roadway_types(milepoint_rows)
 
-    else:
-        raise AttributeError(
-            'ROADWAY_TYPE is outside of the valid range. Must be one of (1, 2, 3, 4 ,5). ' +
-            'Currently ROADWAY_TYPE={}'.format(roadway_type)
-        )
+    return rules.evaluate(milepoint_rows)
 
-    return violations
+def _column_values(column):
+    """
+    Convert a column to a list of Python values, whether it is a NumPy array or a plain sequence.
+    """
+    if isinstance(column, np.ndarray):
+        return column.tolist()
+    return list(column)
@@ -0,0 +1,410 @@
+"""
+Run validation requests, either once per process (`python -m validation_helpers`) or in a resident worker that
+serves a request queue (`python -m validation_helpers serve`, see job_queue.py).
+
+A tool run from Workflow Manager pays for the start of a new process before it validates anything: importing arcpy,
+checking out the Data Reviewer extension, connecting to the SDE database and finding LRSN_Milepoint to create a
+versioned layer of it. The resident worker pays for them once: arcpy stays imported, the Data Reviewer extension
+stays checked out (see utils.hold_extension), the version names and Reviewer tables stay cached (see
+metadata_cache.py), and the versioned Milepoint layers of the last WORKER_LAYER_CACHE_SIZE database versions stay
+open between requests. Each request then costs the validation itself.
+
+The result of a request is the summary that `python -m validation_helpers` writes (see `run_request`), with the
+request_id and the seconds the request waited in the queue.
+"""
+import collections
+import logging
+import time
+import traceback
+
+import arcpy
+
+import validation_helpers.job_queue as job_queue
+import validation_helpers.parallel as parallel
+import validation_helpers.timing as timing
+import validation_helpers.utils as utils
+from validation_helpers.config import (
+    WORKER_HEARTBEAT_INTERVAL,
+    WORKER_LAYER_CACHE_SIZE,
+    WORKER_LEASE_TIMEOUT,
+    WORKER_POLL_INTERVAL,
+)
+
+
+# The validators of each command, in the order they run
+COMMAND_VALIDATORS = {
+    'roadway': ('roadway_level_attributes',),
+    'sql': ('network_sql',),
+    'rbj': ('batch_job',),
+    'all': parallel.VALIDATOR_NAMES,
+}
+
+# The validators that commit their violations with the write module, so the Reviewer records can be counted
+_COUNTED_VALIDATORS = ('roadway_level_attributes', 'network_sql')
+
+# The open versioned Milepoint layers of the resident worker. The keys are (production_ws, production_ws_version)
+#  tuples, and the values are (milepoint_fc, version_milepoint_layer) tuples, least recently used first
+_VERSION_LAYERS = collections.OrderedDict()
+
+
+def run_request(request, production_ws, reviewer_ws, batch_job_file=None, keep_layers=False,
+                log_path=None, log_level=logging.INFO, trace_path=None, logger=None):
+    """
+    Run the validators of a request in a timing.Trace, and summarize the run.
+
+    Arguments
+    ---------
+    :param request: A dictionary of the request (see job_queue.py)
+    :param production_ws: Filepath to the SDE file pointing to the correct database.
+    :param reviewer_ws: Filepath to the Reviewer Workspace, unless the request sets its own
+
+    Keyword Arguments
+    -----------------
+    :param batch_job_file: Defaults to None. Filepath to the Reviewer Batch Job file (.rbj), unless the request
+        sets its own
+    :param keep_layers: Defaults to False, which creates the versioned Milepoint layer for this request and
+        deletes it afterwards. If True, the layer is kept open for later requests (see `versioned_layer`)
+    :param log_path: Defaults to None. The log file, which also names the trace file (see timing.job_trace_path)
+        and the log files of parallel worker processes
+    :param log_level: Defaults to logging.INFO. The log level of parallel worker processes
+    :param trace_path: Defaults to None, which writes the trace file next to the `log_path`
+    :param logger: Defaults to None. If set, should be Python logging module logger object.
+
+    Returns
+    -------
+    :returns dict: A dictionary with the keys request_id, command, job_id, production_ws_version, full_db,
+        parallel, success, error, validators (the seconds, Reviewer records and error of each validator),
+        seconds (setup, validation and total) and stages (the summary of the trace)
+    """
+    request = dict(job_queue.REQUEST_DEFAULTS, **request)
+    validators = COMMAND_VALIDATORS[request['command']]
+    task = {
+        'reviewer_ws': request['reviewer_ws'] or reviewer_ws,
+        'batch_job_file': request['batch_job_file'] or batch_job_file,
+        'production_ws': production_ws,
+        'job__id': request['job__id'],
+        'job__started_date': request['job__started_date'],
+        'job__owned_by': request['job__owned_by'],
+        'production_ws_version': None,
+        'full_db_flag': request['full_db_flag'],
+    }
+    summary = {
+        'request_id': request.get('request_id'),
+        'command': request['command'],
+        'job_id': request['job__id'],
+        'production_ws_version': None,
+        'full_db': request['full_db_flag'],
+        'parallel': request['parallel'],
+        'success': False,
+        'error': None,
+        'validators': dict((name, {'seconds': None, 'reviewer_records': None, 'error': None}) for name in validators),
+        'seconds': {'setup': None, 'validation': None, 'total': None},
+    }
+
+    milepoint_fc, version_milepoint_layer = None, None
+    with timing.Trace(
+        'validation_helpers {}'.format(request['command']),
+        trace_path=trace_path or timing.job_trace_path(log_path),
+        logger=logger
+    ) as trace:
+        try:
+            with timing.span('setup') as setup_span:
+                arcpy.env.workspace = production_ws
+                task['production_ws_version'] = utils.resolve_production_ws_version(
+                    production_ws,
+                    request['production_ws_version_flag'],
+                    task['job__owned_by'],
+                    task['job__id'],
+                    logger=logger
+                )
+                summary['production_ws_version'] = task['production_ws_version']
+                if summary['parallel']:
+                    # Each worker process creates its own versioned layer, so the layer is not created here
+                    pass
+                elif keep_layers:
+                    milepoint_fc, version_milepoint_layer = versioned_layer(
+                        production_ws,
+                        task['production_ws_version'],
+                        logger=logger
+                    )
+                else:
+                    milepoint_fc, version_milepoint_layer = utils.get_version_milepoint_layer(
+                        production_ws,
+                        task['production_ws_version']
+                    )
+            summary['seconds']['setup'] = setup_span.seconds
+
+            with timing.span('validation') as validation_span:
+                if summary['parallel']:
+                    _run_in_parallel(task, validators, summary, log_path, log_level, logger)
+                else:
+                    for name in validators:
+                        _run_in_process(dict(task, validator=name), summary, version_milepoint_layer,
+                                        milepoint_fc, logger)
+            summary['seconds']['validation'] = validation_span.seconds
+        except Exception:
+            summary['error'] = traceback.format_exc()
+            utils.log_it(summary['error'], level='error', logger=logger)
+        finally:
+            if version_milepoint_layer and not keep_layers:
+                arcpy.Delete_management(version_milepoint_layer)
+            utils.flush_gp_messages()
+
+    trace_dict = trace.to_dict()
+    for name in validators:
+        if name in _COUNTED_VALIDATORS:
+            summary['validators'][name]['reviewer_records'] = _reviewer_records(trace_dict, name)
+    summary['seconds']['total'] = trace.seconds
+    summary['success'] = summary['error'] is None and not any(
+        result['error'] for result in summary['validators'].values())
+    summary['stages'] = trace_dict['summary']
+    return summary
+
+def serve(queue_dir, production_ws, reviewer_ws, batch_job_file=None,
+          poll_interval=WORKER_POLL_INTERVAL, max_requests=None, idle_timeout=None,
+          heartbeat_interval=WORKER_HEARTBEAT_INTERVAL, lease_timeout=WORKER_LEASE_TIMEOUT,
+          log_path=None, log_level=logging.INFO, logger=None):
+    """
+    Run the requests of a queue directory (see job_queue.py) until a stop is requested, `max_requests` requests
+    have run, or no request arrived for `idle_timeout` seconds. Before the first request, the worker checks out
+    the Data Reviewer extension and opens the versioned Milepoint layer of the Lockroot version (see `warm_up`).
+
+    Other workers may serve the same queue. The worker holds a lease on the queue while it runs, and every
+    `heartbeat_interval` seconds it runs the requests of workers whose lease expired again. If another worker finds
+    this worker's lease expired, this worker stops at its next heartbeat, and the result of the request it was
+    running is not written, since that request runs again elsewhere (see job_queue.LeaseLostError). A stop that was
+    requested before the worker started does not stop it.
+
+    Arguments
+    ---------
+    :param queue_dir: The queue directory
+    :param production_ws: Filepath to the SDE file pointing to the correct database.
+    :param reviewer_ws: Filepath to the Reviewer Workspace of the requests that do not set their own
+
+    Keyword Arguments
+    -----------------
+    :param batch_job_file: Defaults to None. Filepath to the Reviewer Batch Job file (.rbj) of the requests that
+        do not set their own
+    :param poll_interval: Defaults to WORKER_POLL_INTERVAL. The seconds between checks of an empty queue
+    :param max_requests: Defaults to None, which runs requests until the worker is stopped
+    :param idle_timeout: Defaults to None, which waits for requests until the worker is stopped
+    :param heartbeat_interval: Defaults to WORKER_HEARTBEAT_INTERVAL. The seconds between renewals of the lease,
+        and between checks for expired leases
+    :param lease_timeout: Defaults to WORKER_LEASE_TIMEOUT. The seconds after its last renewal that the lease of a
+        worker expires
+    :param log_path: Defaults to None. See `run_request`
+    :param log_level: Defaults to logging.INFO. See `run_request`
+    :param logger: Defaults to None. If set, should be Python logging module logger object.
+
+    Returns
+    -------
+    :returns int: The number of requests that ran
+    """
+    worker_id, started = job_queue.register_worker(queue_dir)
+
+    completed = 0
+    try:
+        with job_queue.keep_alive(queue_dir, worker_id, heartbeat_interval):
+            warm_up(production_ws, logger=logger)
+            utils.log_it('Serving validation requests from {queue_dir} as worker {worker_id}', queue_dir=queue_dir,
+                worker_id=worker_id, level='info', logger=logger)
+            idle_since = time.time()
+            checked_leases = None
+            while not job_queue.stop_requested(queue_dir, since=started):
+                if max_requests is not None and completed >= max_requests:
+                    break
+                if checked_leases is None or time.time() - checked_leases >= heartbeat_interval:
+                    try:
+                        now = job_queue.heartbeat(queue_dir, worker_id)
+                    except job_queue.LeaseLostError:
+                        utils.log_it('The lease of worker {worker_id} expired and another worker requeued its ' +
+                                     'requests. Stopping', worker_id=worker_id, level='warn', logger=logger)
+                        break
+                    requeued = job_queue.requeue_expired(queue_dir, lease_timeout, now=now)
+                    checked_leases = time.time()
+                    if requeued:
+                        utils.log_it('Requeued {count} request(s) of workers whose lease expired', count=requeued,
+                            level='warn', logger=logger)
+
+                claimed = job_queue.claim_next(queue_dir, worker_id)
+                if claimed is None:
+                    if idle_timeout is not None and time.time() - idle_since >= idle_timeout:
+                        utils.log_it('No requests for {seconds} seconds, stopping', seconds=idle_timeout,
+                            level='info', logger=logger)
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                claimed_path, request = claimed
+                result = serve_request(
+                    request,
+                    production_ws,
+                    reviewer_ws,
+                    batch_job_file=batch_job_file,
+                    log_path=log_path,
+                    log_level=log_level,
+                    logger=logger
+                )
+                idle_since = time.time()
+                if not job_queue.complete(queue_dir, claimed_path, result):
+                    utils.log_it('Request {request_id} was requeued while it ran, so its result is left to the ' +
+                                 'worker that runs it again', request_id=result.get('request_id'),
+                        level='warn', logger=logger)
+                    # The next heartbeat finds the lease gone, and stops the worker
+                    checked_leases = None
+                    continue
+                completed += 1
+    finally:
+        # Requests that were claimed but not completed (e.g. the worker was interrupted) run again elsewhere
+        job_queue.release_worker(queue_dir, worker_id)
+        release_layers()
+        utils.release_extension('datareviewer')
+        arcpy.ClearWorkspaceCache_management()
+        utils.log_it('Stopped serving {queue_dir} after {count} request(s)', queue_dir=queue_dir, count=completed,
+            level='info', logger=logger)
+    return completed
+
+def serve_request(request, production_ws, reviewer_ws, batch_job_file=None,
+                  log_path=None, log_level=logging.INFO, logger=None):
+    """
+    Run one request of the queue with the worker's open layers, and return its result. A request that cannot be
+    run (e.g. it is not valid JSON or has no command) gets a result with its error rather than stopping the worker.
+    """
+    if not request or request.get('command') not in COMMAND_VALIDATORS:
+        return {
+            'request_id': request.get('request_id') if request else None,
+            'success': False,
+            'error': 'Invalid request: {}'.format(request),
+        }
+
+    # The seconds between the submission of the request and the start of its run
+    queued_seconds = max(time.time() - request['submitted_time'], 0.0) if request.get('submitted_time') else None
+    utils.log_it('Running request {request_id}: {command} for job {job_id}', request_id=request.get('request_id'),
+        command=request['command'], job_id=request.get('job__id'), level='info', logger=logger)
+    try:
+        result = run_request(
+            request,
+            production_ws,
+            reviewer_ws,
+            batch_job_file=batch_job_file,
+            keep_layers=True,
+            log_path=log_path,
+            log_level=log_level,
+            # The requests share the worker's log file, so each request writes its own trace file
+            trace_path=timing.job_trace_path(
+                parallel.validator_log_path(log_path, 'request_{}'.format(request.get('request_id')))),
+            logger=logger
+        )
+    except Exception:
+        # A malformed request, e.g. one without a job__id
+        result = {'request_id': request.get('request_id'), 'success': False, 'error': traceback.format_exc()}
+    result.setdefault('seconds', {})['queued'] = queued_seconds
+    return result
+
+def warm_up(production_ws, production_ws_version_flag='ELRS.Lockroot', logger=None):
+    """
+    Pay the start up costs of the validators once: check out the Data Reviewer extension and keep it checked
+    out, list the versions of the production workspace, and open the versioned Milepoint layer of the Lockroot
+    version.
+    """
+    with timing.Trace('warm_up', logger=logger):
+        utils.hold_extension('datareviewer')
+        arcpy.env.workspace = production_ws
+        lockroot_version = utils.get_lockroot_version(production_ws, production_ws_version_flag)
+        if lockroot_version:
+            versioned_layer(production_ws, lockroot_version, logger=logger)
+
+def versioned_layer(production_ws, production_ws_version, cache_size=WORKER_LAYER_CACHE_SIZE, logger=None):
+    """
+    Return the versioned Milepoint layer of a database version, and keep it open for later requests. Once
+    `cache_size` layers are open, the least recently used layer is deleted. The selection of a reused layer is
+    cleared, so a request never starts from the selection of the one before it.
+
+    Returns
+    -------
+    :returns tuple: A tuple of the milepoint_fc and the versioned layer, like utils.get_version_milepoint_layer
+    """
+    key = (production_ws, production_ws_version)
+    if key in _VERSION_LAYERS:
+        milepoint_fc, version_milepoint_layer = _VERSION_LAYERS.pop(key)
+        _VERSION_LAYERS[key] = (milepoint_fc, version_milepoint_layer)
+        arcpy.SelectLayerByAttribute_management(version_milepoint_layer, 'CLEAR_SELECTION')
+        return milepoint_fc, version_milepoint_layer
+
+    _VERSION_LAYERS[key] = utils.get_version_milepoint_layer(production_ws, production_ws_version, logger=logger)
+    while len(_VERSION_LAYERS) > max(cache_size, 1):
+        (old_ws, old_version), (old_fc, old_layer) = _VERSION_LAYERS.popitem(last=False)
+        utils.log_it('Closing the versioned Milepoint layer of {version}', version=old_version,
+            level='debug', logger=logger)
+        arcpy.Delete_management(old_layer)
+    return _VERSION_LAYERS[key]
+
+def release_layers():
+    """
+    Delete the versioned Milepoint layers that `versioned_layer` kept open.
+    """
+    while _VERSION_LAYERS:
+        key, (milepoint_fc, version_milepoint_layer) = _VERSION_LAYERS.popitem()
+        try:
+            arcpy.Delete_management(version_milepoint_layer)
+        except Exception:
+            pass
+
+def _run_in_process(task, summary, version_milepoint_layer, milepoint_fc, logger):
+    """
+    Run one validator in this process, inside a span named after it, and record its seconds and error.
+    """
+    result = summary['validators'][task['validator']]
+    with timing.span(task['validator']) as validator_span:
+        try:
+            parallel.call_validator(
+                task,
+                version_milepoint_layer=version_milepoint_layer,
+                milepoint_fc=milepoint_fc,
+                logger=logger,
+                messages=None
+            )
+        except Exception:
+            result['error'] = traceback.format_exc()
+            utils.log_it('{validator} failed:\n{error}', validator=task['validator'], error=result['error'],
+                level='error', logger=logger)
+    result['seconds'] = validator_span.seconds
+
+def _run_in_parallel(task, validators, summary, log_path, log_level, logger):
+    """
+    Run the validators in worker processes, and record their seconds and errors.
+    """
+    try:
+        timings = parallel.run_validators_in_parallel(
+            task['reviewer_ws'],
+            task['batch_job_file'],
+            task['production_ws'],
+            task['job__id'],
+            task['job__started_date'],
+            task['job__owned_by'],
+            task['production_ws_version'],
+            full_db_flag=task['full_db_flag'],
+            validators=validators,
+            log_path=log_path,
+            log_level=log_level,
+            logger=logger
+        )
+    except parallel.ValidatorProcessError as exc:
+        # The workers' errors are in the message, keyed by validator name
+        for name in validators:
+            if '{}:\n'.format(name) in str(exc):
+                summary['validators'][name]['error'] = str(exc)
+        summary['error'] = str(exc)
+        return
+    for name, seconds in timings.items():
+        summary['validators'][name]['seconds'] = seconds
+
+def _reviewer_records(trace_dict, validator):
+    """
+    Add up the rows of the WriteToReviewerTable_Reviewer spans that ran under the span of a validator, which are
+    the Reviewer records it committed.
+    """
+    return sum(
+        recorded['rows'] or 0 for recorded in trace_dict['spans']
+        if recorded['name'] == 'WriteToReviewerTable_Reviewer' and validator in recorded['path'].split(' > ')
+    )
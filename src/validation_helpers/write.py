@@ -1,9 +1,20 @@
+from collections import defaultdict
+from contextlib import contextmanager
+import time
+
 import arcpy
 
+import validation_helpers.scratch as scratch
+import validation_helpers.timing as timing
 import validation_helpers.utils as utils
-from validation_helpers.config import ACTIVE_ROUTES_WHERE_CLAUSE
+from validation_helpers.config import ACTIVE_ROUTES_WHERE_CLAUSE, IN_CLAUSE_CHUNK_SIZE, REVIEWER_FLUSH_SIZE
+
+# When the validators run in parallel worker processes (see parallel.py), the processes share this lock so that only one
+#  of them commits to the Reviewer workspace at a time. It is None when the validators run in a single process
+REVIEWER_WRITE_LOCK = None
 
 
+@timing.timed()
 def roadway_level_attribute_result_to_reviewer_table(result_dict, versioned_layer, reviewer_ws,
                                                     reviewer_session, origin_table, base_where_clause=None,
                                                     level='info', logger=None, arcpy_messages=None):
@@ -38,81 +49,315 @@ def roadway_level_attribute_result_to_reviewer_table(result_dict, versioned_laye
     -------
     :returns bool: Returns True when successful.
     """
+    start_time = time.time()
     for rule_rids in result_dict.items():
         check_description = rule_rids[0]
         route_ids = rule_rids[1]
         if not route_ids:
             continue
 
-        # Some checks currently returns 20000+ ROUTE_IDs, which results in an error using the
-        #  ROUTE_ID IN () style query. Force a different where_clause for these cases to support
-        #  the full_db_flag
-        if check_description == 'SIGNING must be null when ROADWAY_TYPE in (\'Road\', \'Ramp\')':
-            where_clause = 'SIGNING IS NULL AND ROADWAY_TYPE IN (1, 2) AND ({})'.format(
-                ACTIVE_ROUTES_WHERE_CLAUSE
-            )
+        # Some checks return 20000+ ROUTE_IDs with the full_db_flag, which is too many for a single
+        #  ROUTE_ID IN () style query. select_layer_by_values splits the ROUTE_IDs into bounded chunks
+        violations_where_clause = _active_routes_where_clause(base_where_clause)
 
-        elif check_description == 'ROUTE_SUFFIX must be null when ROADWAY_TYPE in (\'Road\', \'Ramp\')':
-            where_clause = 'ROUTE_SUFFIX IS NOT NULL AND ROADWAY_TYPE IN (1, 2) AND ({})'.format(
-                ACTIVE_ROUTES_WHERE_CLAUSE
-            )
+        utils.log_it(
+            '{check_description}: selecting {count} ROUTE_ID(s) with base where_clause={where_clause}',
+            check_description=check_description, count=len(route_ids), where_clause=violations_where_clause,
+            level='info', logger=logger, arcpy_messages=arcpy_messages)
 
-        elif check_description == 'ROADWAY_FEATURE must be null when ROADWAY_TYPE in (\'Road\', \'Ramp\')':
-            where_clause = 'ROADWAY_FEATURE IS NOT NULL AND ROADWAY_TYPE IN (1, 2) AND ({})'.format(
-                ACTIVE_ROUTES_WHERE_CLAUSE
-            )
+        utils.select_layer_by_values(
+            versioned_layer,
+            'ROUTE_ID',
+            route_ids,
+            base_where_clause=violations_where_clause,
+            logger=logger,
+            arcpy_messages=arcpy_messages
+        )
 
-        elif check_description == 'ROUTE_QUALIFIER must be \'No Qualifier\' when ROADWAY_TYPE in (\'Road\', \'Ramp\')':
-            where_clause = (
-                '(ROUTE_QUALIFIER <> 10 OR ROUTE_QUALIFIER IS NULL) AND ' +
-                'ROADWAY_TYPE IN (1, 2) AND ({})'.format(ACTIVE_ROUTES_WHERE_CLAUSE)
+        in_memory_fc = utils.to_in_memory_fc(versioned_layer)
+        record_count = int(arcpy.GetCount_management(in_memory_fc).getOutput(0))
+
+        utils.log_it('Calling WriteToReviewerTable_Reviewer geoprocessing tool with {count} record(s)',
+            count=record_count, level='debug', logger=logger, arcpy_messages=arcpy_messages)
+
+        with reviewer_write_lock(), timing.span('WriteToReviewerTable_Reviewer', rows=record_count):
+            arcpy.WriteToReviewerTable_Reviewer(
+                reviewer_ws,
+                reviewer_session,
+                in_memory_fc,
+                'ORIG_OBJECTID',
+                origin_table,
+                check_description
             )
+        utils.log_it('', level='gp', logger=logger, arcpy_messages=arcpy_messages)
+        scratch.delete(in_memory_fc)
 
-        elif check_description == 'PARKWAY_FLAG must be \'No\' when ROADWAY_TYPE in (\'Road\', \'Ramp\')':
-            where_clause = 'PARKWAY_FLAG = \'T\' AND ROADWAY_TYPE IN (1, 2) AND ({})'.format(ACTIVE_ROUTES_WHERE_CLAUSE)
+    utils.log_it('Committed {rules} rule(s) to the Reviewer Table one rule at a time in {seconds:.2f} seconds'.format(
+        rules=len(result_dict), seconds=time.time() - start_time),
+        level=level, logger=logger, arcpy_messages=arcpy_messages)
+    return True
 
-        else:
-            where_clause = "ROUTE_ID IN ('" + "', '".join(route_ids) + "') AND ({})".format(ACTIVE_ROUTES_WHERE_CLAUSE)
+@timing.timed()
+def batch_result_to_reviewer_table(result_dict, versioned_layer, reviewer_ws,
+                                   reviewer_session, origin_table, base_where_clause=None, key_field='ROUTE_ID',
+                                   selection_where_clause=None, level='info', logger=None, arcpy_messages=None):
+    """
+    This function commits every violation in the `result_dict` to the Reviewer Table in one pass. It replaces the
+    select, copy, and write round trip per rule of `roadway_level_attribute_result_to_reviewer_table` with:
+    1. One selection of the violating ROUTE_IDs (or OBJECTIDs) on the `versioned_layer`, limited to the
+       `base_where_clause` and active routes. Long lists of values are selected in bounded chunks
+    2. One SearchCursor over the selection that keeps the geometry and OBJECTID of each feature of the violating
+       ROUTE_IDs. Several active features can share a ROUTE_ID, and each of them is kept
+    3. One InsertCursor that stages a copy of the geometry for every rule/feature pair in an in memory feature
+       class, with the rule text stored in a CHECK_DESCRIPTION field
+    4. One call to the WriteToReviewerTable_Reviewer geoprocessing tool per violated rule. The tool writes the same
+       review status for every record it is given, so each call writes the staged records of one rule, selected
+       by their CHECK_DESCRIPTION on a layer of the staged feature class
+
+    A feature that violates several rules is staged once per rule, and every feature of a violating ROUTE_ID is
+    staged, so the Reviewer Table contents are the same as the per rule writer.
 
-        if base_where_clause:
-            violations_where_clause = '({base_where}) AND ({validation_where})'.format(
-                base_where=base_where_clause,
-                validation_where=where_clause
-            )
-        else:
-            violations_where_clause = where_clause
+    Arguments
+    ---------
+    :param result_dict: A dictionary with the violated rules' descriptions as the keys, and a list of the ROUTE_IDs
+        (or the OBJECTIDs, see `key_field`) that violate the rule as the values
+    :param versioned_layer: An arcpy feature layer that points to the correct database version
+    :param reviewer_ws: Filepath to a Data Reviewer enabled geodatabase. Currently use file geodatabases, will
+        eventually use an SDE filepath
+    :param reviewer_session: The full reviewer session name
+    :param origin_table: The table that contains the violation, which will be committed to the Reviewer Table
+
+    Keyword Arguments
+    -----------------
+    :param base_where_clause: An ArcGIS where_clause that limits the results selection. Typically used to pass
+        the where_clause that identifies the edited data into this function, so that only relevant violations
+        are committed to the Reviewer Table
+    :param key_field: Defaults to 'ROUTE_ID'. The field of the values in the `result_dict`. If the exact
+        features that violate the rules are known (e.g. from a SQL query), pass 'OBJECTID' and lists of their
+        OBJECTIDs, and only those features are staged, rather than every feature of their ROUTE_IDs
+    :param selection_where_clause: Defaults to None. A where_clause that matches the violating routes in the
+        database, e.g. rules.violations_where_clause(). The routes are selected with it rather than by value, and
+        any violating ROUTE_IDs it did not select (e.g. violations that have no SQL form) are selected by value
+    :param level: A str that identifies the log level. Passed to the `log_it` function
+    :param logger: Defaults to None. If set, should be Python logging module logger object.
+    :param arcpy_messages: Defaults to None. If set, should refer to the arcpy.Messages variable that is present
+        in the `execute` method of Python Toolboxes.
 
+    Returns
+    -------
+    :returns int: Returns the number of records that were committed to the Reviewer Table
+    """
+    start_time = time.time()
 
-        utils.log_it(
-            '{}: roadway_level_attribute_result where_clause={}'.format(check_description, violations_where_clause),
-            level='info', logger=logger, arcpy_messages=arcpy_messages)
+    violating_keys = set(key for keys in result_dict.values() for key in keys)
+    if not violating_keys:
+        return 0
+
+    where_clause = _active_routes_where_clause(base_where_clause)
 
-        arcpy.SelectLayerByAttribute_management(
+    utils.log_it('Selecting {count} violating {key_field}(s) with base where_clause={where_clause}',
+        count=len(violating_keys), key_field=key_field, where_clause=where_clause,
+        level='debug', logger=logger, arcpy_messages=arcpy_messages)
+
+    if selection_where_clause:
+        utils.select_layer_by_clauses(
             versioned_layer,
-            'NEW_SELECTION',
-            where_clause=violations_where_clause
+            [selection_where_clause],
+            base_where_clause=where_clause,
+            logger=logger,
+            arcpy_messages=arcpy_messages
+        )
+    else:
+        utils.select_layer_by_values(
+            versioned_layer,
+            key_field,
+            violating_keys,
+            base_where_clause=where_clause,
+            logger=logger,
+            arcpy_messages=arcpy_messages
         )
 
-        in_memory_fc = utils.to_in_memory_fc(versioned_layer)
+    # Read the geometry of each violating feature once, no matter how many rules it violates
+    features = _violating_features(versioned_layer, violating_keys, key_field=key_field)
 
-        utils.log_it('Calling WriteToReviewerTable_Reviewer geoprocessing tool',
+    missing_keys = violating_keys.difference(features)
+    if selection_where_clause and missing_keys:
+        utils.log_it('Selecting {} violating {}(s) that the selection where_clause did not match'.format(
+            len(missing_keys), key_field),
             level='debug', logger=logger, arcpy_messages=arcpy_messages)
+        utils.select_layer_by_values(
+            versioned_layer,
+            key_field,
+            missing_keys,
+            base_where_clause=where_clause,
+            logger=logger,
+            arcpy_messages=arcpy_messages
+        )
+        features.update(_violating_features(versioned_layer, missing_keys, key_field=key_field))
 
-        arcpy.WriteToReviewerTable_Reviewer(
+    in_memory_fc = utils.create_in_memory_fc(
+        versioned_layer,
+        [('ORIG_OBJECTID', 'LONG', None), ('ROUTE_ID', 'TEXT', 255), ('CHECK_DESCRIPTION', 'TEXT', 255)],
+        prefix='violations'
+    )
+
+    record_count = 0
+    rule_record_counts = defaultdict(int)
+    insert_fields = ['SHAPE@', 'ORIG_OBJECTID', 'ROUTE_ID', 'CHECK_DESCRIPTION']
+    with timing.span('stage_violations') as stage_span:
+        with arcpy.da.InsertCursor(in_memory_fc, insert_fields) as curs:
+            for check_description, keys in sorted(result_dict.items()):
+                for key in sorted(set(keys)):
+                    if key not in features:
+                        # The route is not in the base selection, so it is not committed to the Reviewer Table
+                        continue
+                    for object_id, route_id, shape in features[key]:
+                        curs.insertRow([shape, object_id, route_id, check_description])
+                        rule_record_counts[check_description] += 1
+                        record_count += 1
+        stage_span.rows = record_count
+    scratch.add_rows(in_memory_fc, record_count)
+
+    if record_count > 0:
+        utils.log_it('Calling WriteToReviewerTable_Reviewer for {count} record(s) of {rules} rule(s)',
+            count=record_count, rules=len(rule_record_counts),
+            level='debug', logger=logger, arcpy_messages=arcpy_messages)
+
+        staged_layer = scratch.unique_name('violations_layer', workspace=None)
+        arcpy.MakeFeatureLayer_management(in_memory_fc, staged_layer)
+        try:
+            with reviewer_write_lock():
+                for check_description, rule_record_count in sorted(rule_record_counts.items()):
+                    arcpy.SelectLayerByAttribute_management(
+                        staged_layer,
+                        'NEW_SELECTION',
+                        where_clause='CHECK_DESCRIPTION = {}'.format(utils.sql_literal(check_description))
+                    )
+                    with timing.span('WriteToReviewerTable_Reviewer', rows=rule_record_count):
+                        arcpy.WriteToReviewerTable_Reviewer(
+                            reviewer_ws,
+                            reviewer_session,
+                            staged_layer,
+                            'ORIG_OBJECTID',
+                            origin_table,
+                            check_description
+                        )
+                    utils.log_it('', level='gp', logger=logger, arcpy_messages=arcpy_messages)
+        finally:
+            scratch.delete(staged_layer)
+
+    scratch.delete(in_memory_fc)
+
+    utils.log_it('Committed {count} record(s) for {rules} rule(s) to the Reviewer Table in {seconds:.2f} seconds'.format(
+        count=record_count, rules=len(result_dict), seconds=time.time() - start_time),
+        level=level, logger=logger, arcpy_messages=arcpy_messages)
+
+    return record_count
+
+@timing.timed()
+def violation_stream_to_reviewer_table(violation_chunks, versioned_layer, reviewer_ws,
+                                       reviewer_session, origin_table, base_where_clause=None,
+                                       flush_size=REVIEWER_FLUSH_SIZE, level='info',
+                                       logger=None, arcpy_messages=None):
+    """
+    Commit a stream of violations to the Reviewer Table, `flush_size` violations at a time. The violations of
+    the `violation_chunks` are buffered, and every time the buffer holds `flush_size` or more rule/ROUTE_ID
+    pairs, it is committed with `batch_result_to_reviewer_table` and emptied. Whatever is left is committed once
+    the stream ends.
+
+    The memory used does not grow with the number of violations, since no more than `flush_size` violations
+    plus one chunk are buffered, and the where_clauses that select the violating routes are bounded the same way.
+    The first records also reach the Reviewer session while the rest of the routes are still being validated.
+
+    Each flush is committed on its own, so a ROUTE_ID that violates the same rule in two chunks (e.g. two active
+    rows with the same ROUTE_ID) is committed once per chunk.
+
+    The `reviewer_session` can be a callable that returns the session name (e.g. a call of
+    `utils.get_reviewer_session_name`). It is then called once, on the first flush, so a stream without any
+    violations neither looks up the Reviewer session nor fails when the job does not have one.
+
+    Arguments
+    ---------
+    :param violation_chunks: An iterable of dictionaries with the violated rules' descriptions as the keys and
+        lists of ROUTE_IDs as the values, e.g. a generator that validates the rows of a cursor chunk by chunk
+    :param versioned_layer: An arcpy feature layer that points to the correct database version. It must not be
+        the layer that the `violation_chunks` are read from, since each flush changes its selection
+    :param reviewer_ws: Filepath to a Data Reviewer enabled geodatabase
+    :param reviewer_session: The full reviewer session name, or a callable without arguments that returns it
+    :param origin_table: The table that contains the violation, which will be committed to the Reviewer Table
+
+    Keyword Arguments
+    -----------------
+    :param base_where_clause: An ArcGIS where_clause that limits the results selection. See
+        `batch_result_to_reviewer_table`
+    :param flush_size: Defaults to config.REVIEWER_FLUSH_SIZE. The number of violations that are committed at once
+    :param level: Defaults to 'info'. The log level of the summary message
+    :param logger: Defaults to None. If set, should be Python logging module logger object.
+    :param arcpy_messages: Defaults to None. If set, should refer to the arcpy.Messages variable that is present
+        in the `execute` method of Python Toolboxes.
+
+    Returns
+    -------
+    :returns tuple: A tuple of the number of violations in the stream and the number of records that were
+        committed to the Reviewer Table
+    """
+    start_time = time.time()
+    buffered = defaultdict(list)
+    buffered_count = 0
+    violation_count = 0
+    record_count = 0
+    flush_count = 0
+
+    for violations in violation_chunks:
+        for rule, route_ids in violations.items():
+            buffered[rule].extend(route_ids)
+            buffered_count += len(route_ids)
+        if buffered_count < flush_size:
+            continue
+
+        if callable(reviewer_session):
+            reviewer_session = reviewer_session()
+        record_count += batch_result_to_reviewer_table(
+            buffered,
+            versioned_layer,
             reviewer_ws,
             reviewer_session,
-            in_memory_fc,
-            'ORIG_OBJECTID',
             origin_table,
-            check_description
+            base_where_clause=base_where_clause,
+            level='debug',
+            logger=logger,
+            arcpy_messages=arcpy_messages
         )
-        utils.log_it('', level='gp', logger=logger, arcpy_messages=arcpy_messages)
-        try:
-            arcpy.Delete_management(in_memory_fc)
-        except:
-            pass
-    return True
+        violation_count += buffered_count
+        flush_count += 1
+        buffered = defaultdict(list)
+        buffered_count = 0
+
+    if buffered_count:
+        if callable(reviewer_session):
+            reviewer_session = reviewer_session()
+        record_count += batch_result_to_reviewer_table(
+            buffered,
+            versioned_layer,
+            reviewer_ws,
+            reviewer_session,
+            origin_table,
+            base_where_clause=base_where_clause,
+            level='debug',
+            logger=logger,
+            arcpy_messages=arcpy_messages
+        )
+        violation_count += buffered_count
+        flush_count += 1
+
+    utils.log_it('Committed {count} record(s) of {violations} violation(s) to the Reviewer Table in {flushes} ' +
+                 'flush(es) in {seconds:.2f} seconds',
+        count=record_count, violations=violation_count, flushes=flush_count, seconds=time.time() - start_time,
+        level=level, logger=logger, arcpy_messages=arcpy_messages)
 
+    return violation_count, record_count
+
+@timing.timed()
 def co_dir_sql_result_to_reviewer_table(result_list, versioned_layer, reviewer_ws,
                                         reviewer_session, origin_table, check_description,
                                         dot_id_index=0, county_order_index=1,
@@ -153,46 +398,53 @@ def co_dir_sql_result_to_reviewer_table(result_list, versioned_layer, reviewer_w
     -------
     :returns bool: Returns True when successful.
     """
-    dot_ids = [result_row[dot_id_index] for result_row in result_list]
-    county_orders = [result_row[county_order_index] for result_row in result_list]
-
-    where_clause = ''
-    for dot_id, county_order in zip(dot_ids, county_orders):
-        where_clause += 'DOT_ID = \'{dot_id}\' AND COUNTY_ORDER = \'{county_order}\' AND ({active_routes}) OR '.format(
-            dot_id=dot_id,
-            county_order=county_order,
-            active_routes=ACTIVE_ROUTES_WHERE_CLAUSE
+    dot_id_county_orders = sorted(set(
+        (result_row[dot_id_index], result_row[county_order_index]) for result_row in result_list
+    ))
+    clauses = [
+        'DOT_ID = {dot_id} AND COUNTY_ORDER = {county_order}'.format(
+            dot_id=utils.sql_literal(dot_id),
+            county_order=utils.sql_literal(county_order)
         )
-    # Remove the extra ' OR ' from the where_clause from the last iteration
-    where_clause = where_clause[:-4]
-    utils.log_it('{}: SQL Results where_clause: {}'.format(log_name, where_clause),
+        for dot_id, county_order in dot_id_county_orders
+    ]
+    utils.log_it('{}: selecting {} DOT_ID/COUNTY_ORDER combination(s) from the SQL Results'.format(
+        log_name, len(clauses)),
         level='info', logger=logger, arcpy_messages=arcpy_messages)
 
-    arcpy.SelectLayerByAttribute_management(
+    # Apply the DOT_ID/COUNTY_ORDER combinations in bounded groups, rather than one unbounded chain of ORs
+    utils.select_layer_by_clauses(
         versioned_layer,
-        'NEW_SELECTION',
-        where_clause=where_clause
+        clauses,
+        base_where_clause=ACTIVE_ROUTES_WHERE_CLAUSE,
+        clauses_per_selection=IN_CLAUSE_CHUNK_SIZE // 10,
+        logger=logger,
+        arcpy_messages=arcpy_messages
     )
 
     in_memory_fc = utils.to_in_memory_fc(versioned_layer)
+    record_count = int(arcpy.GetCount_management(in_memory_fc).getOutput(0))
 
-    utils.log_it('Calling WriteToReviewerTable_Reviewer geoprocessing tool',
-        level='debug', logger=logger, arcpy_messages=arcpy_messages)
+    utils.log_it('Calling WriteToReviewerTable_Reviewer geoprocessing tool with {count} record(s)',
+        count=record_count, level='debug', logger=logger, arcpy_messages=arcpy_messages)
 
-    arcpy.WriteToReviewerTable_Reviewer(
-        reviewer_ws,
-        reviewer_session,
-        in_memory_fc,
-        'ORIG_OBJECTID',
-        origin_table,
-        check_description
-    )
+    with reviewer_write_lock(), timing.span('WriteToReviewerTable_Reviewer', rows=record_count):
+        arcpy.WriteToReviewerTable_Reviewer(
+            reviewer_ws,
+            reviewer_session,
+            in_memory_fc,
+            'ORIG_OBJECTID',
+            origin_table,
+            check_description
+        )
     utils.log_it('', level='gp', logger=logger, arcpy_messages=arcpy_messages)
+    scratch.delete(in_memory_fc)
     return True
 
+@timing.timed()
 def rdwy_attrs_sql_result_to_reviewer_table(result_list, versioned_layer, reviewer_ws,
                                             reviewer_session, origin_table, check_description,
-                                            dot_id_index=0, log_name='', level='info',
+                                            dot_id_index=0, county_order_index=1, log_name='', level='info',
                                             logger=None, arcpy_messages=None):
     """
     This function is used to commit the results of the roadway level attribute SQL query that
@@ -200,13 +452,14 @@ def rdwy_attrs_sql_result_to_reviewer_table(result_list, versioned_layer, review
     The main input is the result list, which is a list of tuples returned from the
     arcpy.ArcSDESQLExecute method.
 
-    The function uses a pretty crazy bit of Python code to determine the ROUTE_IDs of the features that
+    The routes of the offending DOT_IDs are read once, and `minority_attribute_route_ids` groups them by
+    DOT_ID/COUNTY_ORDER and attribute combination to determine the ROUTE_IDs of the features that
     violate this query. The features are then selected in the `versioned_layer` and committed to
     the Data Reviewer Table.
 
     Arguments
     ---------
-    :param result_list: A list of tuples or a list of lists that contains the COUNTY_ORDER and
+    :param result_list: A list of tuples or a list of lists that contains the DOT_ID, COUNTY_ORDER and
         COUNT of the routes that violate the rule(s).
     :param versioned_layer: An arcpy feature layer that points to the correct database version
     :param reviewer_ws: Filepath to a Data Reviewer enabled geodatabase. Currently use file geodatabases, will
@@ -219,6 +472,7 @@ def rdwy_attrs_sql_result_to_reviewer_table(result_list, versioned_layer, review
     Keyword Arguments
     -----------------
     :param dot_id_index: Defaults to 0. The index position of the DOT_ID in the `result_list`
+    :param county_order_index: Defaults to 1. The index position of the COUNTY_ORDER in the `result_list`
     :param log_name: Defaults to an empty string. The desired filepath for the log file
     :param level: Defaults to 'info'. The string identifying the log level, passed to the `utils.log_it` function
     :param logger: Defaults to None. If set, should be Python logging module logger object.
@@ -229,51 +483,34 @@ def rdwy_attrs_sql_result_to_reviewer_table(result_list, versioned_layer, review
     -------
     :returns bool: Returns True when successful
     """
-    # Get the DOT_IDs out of the SQL query results, and store them as a list
-    dot_ids = [result_row[dot_id_index] for result_row in result_list]
     # Account for the rare case where a DOT_ID does not exist, which will be caught in another validation
-    dot_ids = ['' if dot_id is None else dot_id for dot_id in dot_ids]
+    offending_groups = set(
+        (_null_to_empty(result_row[dot_id_index]), _null_to_empty(result_row[county_order_index]))
+        for result_row in result_list
+    )
+    dot_ids = sorted(set(dot_id for dot_id, county_order in offending_groups))
 
     # Select the DOT_IDs identified above on the active route data
-    where_clause = "DOT_ID IN ('" + "', '".join(dot_ids) + "') AND ({})".format(ACTIVE_ROUTES_WHERE_CLAUSE)
-    arcpy.SelectLayerByAttribute_management(
+    utils.select_layer_by_values(
         versioned_layer,
-        'NEW_SELECTION',
-        where_clause=where_clause
+        'DOT_ID',
+        dot_ids,
+        base_where_clause=ACTIVE_ROUTES_WHERE_CLAUSE,
+        logger=logger,
+        arcpy_messages=arcpy_messages
     )
 
-    # Store the attributes that are used in the SQL query in a dictionary, with the
-    #  ROUTE_ID as the key, and a list of the attributes as the value
+    # The attributes after ROUTE_ID, DOT_ID and COUNTY_ORDER are the attributes that are used in the SQL query
     fields = [
-        'ROUTE_ID', 'SIGNING', 'ROUTE_NUMBER', 'ROUTE_SUFFIX',
+        'ROUTE_ID', 'DOT_ID', 'COUNTY_ORDER', 'SIGNING', 'ROUTE_NUMBER', 'ROUTE_SUFFIX',
         'ROADWAY_TYPE', 'ROUTE_QUALIFIER', 'ROADWAY_FEATURE', 'PARKWAY_FLAG'
     ]
-    with arcpy.da.SearchCursor(versioned_layer, fields) as curs:
-        milepoint_attrs = {row[0]: list(row[1:]) for row in curs}
-
-    # This bit of code gets a little wild. Since a DOT_ID can refer to a whole slew of routes, and
-    #  there may be only a couple of those routes or even a single route that violate the
-    #  validation, the following code widdles the results down to just the ROUTE_IDs of the violations
-    #  It works by creating a list of all values stored in the milepoint_attrs dictionary, which is
-    #  a list of lists. A list comprehension then further organizes those results by creating a separate
-    #  list of lists, with the first element in the inner list being the count of the attribute occurrence
-    #  in the milepoint_attrs.values, and the second element of the inner list being a list of the attributes
-    #  themselves. A final list comprehension goes through the unique_attrs_occurrence_count list. If the
-    #  first element of the inner list, which is the count of the attribute occurrence, is equal to 1,
-    #  the index of those attributes in the milepoint_attrs.values dict is used to determine which key to
-    #  select. The key is the ROUTE_ID, so this final list contains all ROUTE_IDs which violate the validation.
-    milepoint_attr_values = milepoint_attrs.values()
-    unique_attrs_occurrence_count = [
-        [milepoint_attr_values.count(row), row] for row in milepoint_attr_values
-    ]
-    route_ids = [
-        milepoint_attrs.keys()[milepoint_attrs.values().index(row[1])] for row in unique_attrs_occurrence_count
-        if row[0] == 1
-    ]
-
-    output_where_clause = "ROUTE_ID IN ('" + "', '".join(route_ids) + "') AND ({})".format(ACTIVE_ROUTES_WHERE_CLAUSE)
+    with timing.span('minority_attribute_route_ids') as group_span:
+        with arcpy.da.SearchCursor(versioned_layer, fields) as curs:
+            route_ids = minority_attribute_route_ids(curs, offending_groups=offending_groups)
+        group_span.rows = len(route_ids)
 
-    utils.log_it('{}: SQL Results where_clause: {}'.format(log_name, output_where_clause),
+    utils.log_it('{}: {} ROUTE_ID(s) found in the SQL Results'.format(log_name, len(route_ids)),
         level='info', logger=logger, arcpy_messages=arcpy_messages)
 
     if len(route_ids) == 0:
@@ -281,25 +518,150 @@ def rdwy_attrs_sql_result_to_reviewer_table(result_list, versioned_layer, review
             level='info', logger=logger, arcpy_messages=arcpy_messages)
         return True
 
-    arcpy.SelectLayerByAttribute_management(
+    utils.select_layer_by_values(
         versioned_layer,
-        'NEW_SELECTION',
-        where_clause=output_where_clause
+        'ROUTE_ID',
+        route_ids,
+        base_where_clause=ACTIVE_ROUTES_WHERE_CLAUSE,
+        logger=logger,
+        arcpy_messages=arcpy_messages
     )
 
     in_memory_fc = utils.to_in_memory_fc(versioned_layer)
+    record_count = int(arcpy.GetCount_management(in_memory_fc).getOutput(0))
 
-    utils.log_it('Calling WriteToReviewerTable_Reviewer geoprocessing tool',
-        level='debug', logger=logger, arcpy_messages=arcpy_messages)
+    utils.log_it('Calling WriteToReviewerTable_Reviewer geoprocessing tool with {count} record(s)',
+        count=record_count, level='debug', logger=logger, arcpy_messages=arcpy_messages)
 
-    arcpy.WriteToReviewerTable_Reviewer(
-        reviewer_ws,
-        reviewer_session,
-        in_memory_fc,
-        'ORIG_OBJECTID',
-        origin_table,
-        check_description
-    )
+    with reviewer_write_lock(), timing.span('WriteToReviewerTable_Reviewer', rows=record_count):
+        arcpy.WriteToReviewerTable_Reviewer(
+            reviewer_ws,
+            reviewer_session,
+            in_memory_fc,
+            'ORIG_OBJECTID',
+            origin_table,
+            check_description
+        )
     utils.log_it('', level='gp', logger=logger, arcpy_messages=arcpy_messages)
+    scratch.delete(in_memory_fc)
 
     return True
+
+def set_reviewer_write_lock(lock):
+    """
+    Set the lock that serializes commits to the Reviewer workspace. This is the initializer of the
+    parallel.py worker processes.
+
+    Arguments
+    ---------
+    :param lock: A multiprocessing.Lock that is shared by the worker processes, or None to stop locking
+    """
+    global REVIEWER_WRITE_LOCK
+    REVIEWER_WRITE_LOCK = lock
+
+@contextmanager
+def reviewer_write_lock():
+    """
+    A context manager that holds the REVIEWER_WRITE_LOCK (if one is set) while the Reviewer workspace is written.
+
+    Example
+    -------
+    >>> with reviewer_write_lock():
+    >>>     arcpy.WriteToReviewerTable_Reviewer(reviewer_ws, reviewer_session, in_memory_fc, ...)
+    """
+    lock = REVIEWER_WRITE_LOCK
+    if lock is None:
+        yield
+        return
+    # The time spent waiting for the other worker processes to finish their commits
+    with timing.span('reviewer_write_lock_wait'):
+        lock.acquire()
+    try:
+        yield
+    finally:
+        lock.release()
+
+def minority_attribute_route_ids(rows, offending_groups=None):
+    """
+    Determine which ROUTE_IDs have a roadway level attribute combination that differs from the rest of their
+    DOT_ID/COUNTY_ORDER. The rows are grouped by (DOT_ID, COUNTY_ORDER) and attribute combination in a single
+    pass, so the work is linear in the number of rows. Within each DOT_ID/COUNTY_ORDER that has more than one
+    combination, the ROUTE_IDs of every combination except the most common one are returned. If several
+    combinations tie for most common, there is no way to tell which is correct, so all of their ROUTE_IDs are
+    returned.
+
+    NULL values are treated as empty strings when comparing attributes, just like the SQL CONCAT function in
+    UNIQUE_RDWY_ATTRS_QUERY.
+
+    Arguments
+    ---------
+    :param rows: An iterable (such as an arcpy.da.SearchCursor) of rows constructed in this order:
+        route_id, dot_id, county_order, followed by the roadway level attributes that are compared
+
+    Keyword Arguments
+    -----------------
+    :param offending_groups: Defaults to None. A set of (DOT_ID, COUNTY_ORDER) tuples, with NULL values as empty
+        strings. If set, rows outside of these groups are ignored
+
+    Returns
+    -------
+    :returns list: A sorted list of the ROUTE_IDs that violate the validation
+    """
+    groups = defaultdict(lambda: defaultdict(list))
+    for row in rows:
+        route_id = row[0]
+        group = (_null_to_empty(row[1]), _null_to_empty(row[2]))
+        if offending_groups is not None and group not in offending_groups:
+            continue
+        attributes = tuple(_null_to_empty(value) for value in row[3:])
+        groups[group][attributes].append(route_id)
+
+    route_ids = []
+    for combinations in groups.values():
+        if len(combinations) < 2:
+            continue
+        majority_count = max(len(combination_route_ids) for combination_route_ids in combinations.values())
+        majority_combinations = [
+            attributes for attributes, combination_route_ids in combinations.items()
+            if len(combination_route_ids) == majority_count
+        ]
+        for attributes, combination_route_ids in combinations.items():
+            if len(combination_route_ids) < majority_count or len(majority_combinations) > 1:
+                route_ids.extend(combination_route_ids)
+
+    return sorted(route_ids)
+
+def _violating_features(versioned_layer, keys, key_field='ROUTE_ID'):
+    """
+    Read the OBJECTID, ROUTE_ID and geometry of the selected features of the `versioned_layer` whose `key_field`
+    (ROUTE_ID or OBJECTID) value is in `keys`. Returns a dictionary of key to a list of (OBJECTID, ROUTE_ID,
+    geometry) tuples, one per feature, since several features can share a ROUTE_ID.
+    """
+    features = dict()
+    feature_count = 0
+    with timing.span('read_violating_features') as read_span:
+        with arcpy.da.SearchCursor(versioned_layer, ['OID@', 'ROUTE_ID', 'SHAPE@']) as curs:
+            for object_id, route_id, shape in curs:
+                key = object_id if key_field == 'OBJECTID' else route_id
+                if key in keys:
+                    features.setdefault(key, []).append((object_id, route_id, shape))
+                    feature_count += 1
+        read_span.rows = feature_count
+    return features
+
+def _active_routes_where_clause(base_where_clause=None):
+    """
+    Limit the `base_where_clause` to active routes, or return the active routes where_clause if there is no base.
+    """
+    if base_where_clause:
+        return '({base_where}) AND ({active_routes})'.format(
+            base_where=base_where_clause,
+            active_routes=ACTIVE_ROUTES_WHERE_CLAUSE
+        )
+    return ACTIVE_ROUTES_WHERE_CLAUSE
+
+def _null_to_empty(value):
+    """
+    Treat NULL values from the database as empty strings.
+    """
+    return '' if value is None else value